@@ -1,5 +1,6 @@
 import asyncio
 import json
+import os
 import re
 from typing import Optional
 
@@ -11,6 +12,9 @@ from agents import Agent, Runner, trace, WebSearchTool, function_tool
 from crawl4ai import AsyncWebCrawler, CrawlerRunConfig
 from crawl4ai.markdown_generation_strategy import DefaultMarkdownGenerator
 
+# Stage/agent/tool latencies, run summaries, local traces and --profile (thin copies of the painting pipeline's)
+from ufc_instrumentation import instrument_stage, metrics_hooks, start_metrics_server, write_run_summary, enable_trace_store, profiled
+
 # Set to True for detailed debug output
 DEBUG = True
 
@@ -50,6 +54,7 @@ def validate_ufc_url(url: str) -> bool:
 
 # CrawlAI web scraping function tool
 @function_tool
+@instrument_stage("crawl")
 async def crawl_url(url: str) -> str:
     """
     Fetches and scrapes content from a URL using crawl4ai
@@ -225,6 +230,7 @@ async def run(fighter_name: str):
         url_result = await Runner.run(
             url_finder_agent,
             f"Find the official profile URL for UFC fighter {fighter_name}",
+            hooks=metrics_hooks,
         )
         
         log_result("URL Finder", url_result)
@@ -244,6 +250,7 @@ async def run(fighter_name: str):
             ufc_result = await Runner.run(
                 ufc_fetch_extract_agent,
                 f"Fetch and extract data from this UFC URL: {urls.ufc_url}",
+                hooks=metrics_hooks,
             )
             
             log_result("UFC Fetch and Extract", ufc_result)
@@ -262,10 +269,15 @@ async def run(fighter_name: str):
     
     return fighter_data
 
-async def main():
+async def main(metrics_port: Optional[int] = None):
     # Define the fighter name you want to retrieve data for
     fighter_name = "Alexander Volkanovski"
     
+    if metrics_port:
+        start_metrics_server(metrics_port)
+    # Same database as the painting pipeline (utils/outputs/traces.db); query from 02_painting_to_video with: python -m utils.trace_store runs
+    enable_trace_store()
+    
     # Run without MCP server
     try:
         with trace(workflow_name="UFC Fighter Data Collection"):
@@ -279,6 +291,17 @@ async def main():
             print(f"\nData saved to {output_file}")
     except Exception as e:
         print(f"Critical error: {str(e)}")
+    finally:
+        write_run_summary(extra={"fighter_name": fighter_name})
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    import argparse
+    parser = argparse.ArgumentParser(description="Collect UFC fighter data")
+    parser.add_argument("--metrics-port", type=int, default=None, help="Serve metrics on http://127.0.0.1:<port>/metrics")
+    parser.add_argument("--profile", action="store_true", help="Record event-loop stalls and summarize the top blocking call sites at exit")
+    parser.add_argument("--profile-stages", action="store_true", help="Record event-loop stalls (as --profile), and also write a cProfile pstats file for the run")
+    args = parser.parse_args()
+    run_main = main(args.metrics_port)
+    if args.profile or args.profile_stages:
+        run_main = profiled(run_main, with_cprofile=args.profile_stages)
+    asyncio.run(run_main)
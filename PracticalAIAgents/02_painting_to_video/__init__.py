@@ -1,29 +1,35 @@
-from .artwork_agents import url_finder_agent, details_extractor_agent, prompt_generator_agent
-from .models import ArtworkImageURL, ArtworkDetails, GeneratedPrompt, ProcessingResult
-from .tools import validate_artwork_url, crawl_artwork_url
-from .prompt_generator import generate_image_prompt
-from .workflow import process_artwork, extract_artwork_details, extract_artwork_url, main
+from .agents_def.artwork_agents import details_extractor_agent, extract_artwork_details
+from .agents_def.prompt_agents import prompt_generator_agent
+from .models.models import ArtworkImageURL, ArtworkDetails, GeneratedPrompt, ProcessingResult, PreflightResult
+from .tools.crawl import crawl_artwork_url
+from .utils.preflight import validate_artwork_url
+from .utils.catalog import read_catalog
+from .agents_def.prompt_generator import generate_image_prompt
+from .workflow import process_artwork, animate_artwork, run_artwork, process_batch, main
 
 __all__ = [
     # Agents
-    'url_finder_agent',
-    'details_extractor_agent', 
+    'details_extractor_agent',
     'prompt_generator_agent',
-    
+
     # Models
     'ArtworkImageURL',
     'ArtworkDetails',
     'GeneratedPrompt',
     'ProcessingResult',
-    
+    'PreflightResult',
+
     # Tools
     'validate_artwork_url',
+    'read_catalog',
     'crawl_artwork_url',
     'generate_image_prompt',
-    
+
     # Workflow functions
     'process_artwork',
+    'animate_artwork',
+    'run_artwork',
+    'process_batch',
     'extract_artwork_details',
-    'extract_artwork_url',
     'main'
-] 
\ No newline at end of file
+]
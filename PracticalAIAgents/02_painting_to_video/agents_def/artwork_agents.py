@@ -1,10 +1,19 @@
-from agents import Agent, Runner
-from typing import Optional
+import contextlib
+import contextvars
+from agents import Agent, Runner, RunContextWrapper, function_tool
+from pydantic import BaseModel
+from typing import Dict, Optional
+from urllib.parse import urlsplit
 import structlog
 
+from config import IMAGE_SELECTION_ENABLED
 from models.models import ArtworkDetails
-from tools.crawl import crawl_artwork_url
+from tools.crawl import crawl_artwork_url, page_image_urls
+from utils.image_selection import select_source_image
 from utils.logger import log_result
+from utils.metrics import metrics_hooks
+from utils.cost_ledger import BudgetExceededError
+from agents_def.workflow_context import WorkflowContext
 
 logger = structlog.get_logger()
 
@@ -37,6 +46,47 @@ details_extractor_agent = Agent(
     model="gpt-4o-mini"
 )
 
+# Details known before any crawl (e.g. from a catalog), keyed by _prefill_key of the artwork URL
+_prefilled: contextvars.ContextVar[Dict[str, ArtworkDetails]] = contextvars.ContextVar("prefilled_details", default={})
+
+def _prefill_key(url: str) -> str:
+    parts = urlsplit(url.strip())
+    return f"{(parts.hostname or '').lower()}{parts.path.rstrip('/')}"
+
+@contextlib.contextmanager
+def prefill_scope(details: Dict[str, ArtworkDetails]):
+    """
+    Serve these details for their URLs instead of crawling and running the extractor agent
+    
+    Args:
+        details: ArtworkDetails by artwork page URL
+    """
+    token = _prefilled.set({_prefill_key(url): artwork_details for url, artwork_details in details.items()})
+    try:
+        yield
+    finally:
+        _prefilled.reset(token)
+
+def prefilled_details(artwork_url: str) -> Optional[ArtworkDetails]:
+    """Details given for this URL by the current prefill_scope(), if any."""
+    return _prefilled.get().get(_prefill_key(artwork_url))
+
+async def select_image(artwork_details: ArtworkDetails, artwork_url: str) -> ArtworkDetails:
+    """
+    Replace the extractor's main_image_url with the best image on the crawled page
+    
+    Args:
+        artwork_details: Details returned by the extractor agent
+        artwork_url: URL of the artwork page the extractor crawled
+    
+    Returns:
+        ArtworkDetails with the selected main_image_url
+    """
+    if not IMAGE_SELECTION_ENABLED:
+        return artwork_details
+    candidates = page_image_urls(artwork_url) or page_image_urls(artwork_details.image_urls.source_url or "")
+    return await select_source_image(artwork_details, candidates)
+
 async def extract_artwork_details(artwork_url: str) -> Optional[ArtworkDetails]:
     """
     Extract detailed information about an artwork from its webpage
@@ -47,18 +97,50 @@ async def extract_artwork_details(artwork_url: str) -> Optional[ArtworkDetails]:
     Returns:
         ArtworkDetails object with artwork information
     """
+    artwork_details = prefilled_details(artwork_url)
+    if artwork_details is not None:
+        logger.debug(f"Using prefilled artwork details for: {artwork_url}")
+        return artwork_details
     logger.debug(f"Extracting artwork details from: {artwork_url}")
     
     try:
         result = await Runner.run(
             details_extractor_agent,
             f"Extract all details from this artwork page: {artwork_url}",
+            hooks=metrics_hooks,
         )
         
         log_result(result)
-        artwork_details = result.final_output
-        
-        return artwork_details
+        return await select_image(result.final_output, artwork_url)
+    except BudgetExceededError:
+        raise
     except Exception as e:
         logger.error(f"Error extracting artwork details: {str(e)}")
         return None
+
+
+class ArtworkHandleOutput(BaseModel):
+    """Handle of the extracted artwork plus a short label for the coordinator"""
+    artwork: str
+    label: str
+
+@function_tool(name_override="extract_details")
+async def extract_details_tool(ctx: RunContextWrapper[WorkflowContext], artwork_url: str) -> ArtworkHandleOutput:
+    """
+    Extract artwork details given a URL. Returns an artwork handle to pass to later tools.
+    """
+    artwork_details = prefilled_details(artwork_url)
+    if artwork_details is None:
+        result = await Runner.run(
+            details_extractor_agent,
+            f"Extract all details from this artwork page: {artwork_url}",
+            context=ctx.context,
+            hooks=metrics_hooks,
+        )
+        log_result(result)
+        artwork_details = await select_image(result.final_output, artwork_url)
+    handle = ctx.context.artifacts.put("artwork", artwork_details)
+    return ArtworkHandleOutput(
+        artwork=handle,
+        label=f"{artwork_details.title or 'Untitled'} by {artwork_details.artist or 'Unknown'}"
+    )
@@ -1,11 +1,14 @@
 # path=openai/PracticalAIAgents/02/agents_def/coordination_agent.py
 from agents import Agent, RunContextWrapper
-from agents_def.artwork_agents import details_extractor_agent
-from agents_def.prompt_agents import prompt_generator_agent, video_prompt_generator_agent
-from agents_def.image_agents import image_generator_agent
-from agents_def.video_agents import video_generator_agent
-from models.models import ProcessingResult, ArtworkDetails
+from agents_def.artwork_agents import extract_details_tool
+from agents_def.prompt_agents import prompt_generator_agent, video_prompt_generator_agent, generate_prompt_tool, generate_video_prompt_tool
+from agents_def.image_agents import image_generator_agent, generate_image_tool
+from agents_def.video_agents import video_generator_agent, generate_video_tool
+from config import COORDINATOR_DIRECT_TOOLS
+from models.models import ProcessingHandles
 from agents_def.workflow_context import WorkflowContext
+from utils.failures import stage_tool_failure
+from utils.metrics import metrics_hooks
 
 def dynamic_coordinator_instructions(ctx: RunContextWrapper[WorkflowContext], agent: Agent) -> str:
     """Generate instructions based on whether video generation is enabled in context"""
@@ -13,56 +16,93 @@ def dynamic_coordinator_instructions(ctx: RunContextWrapper[WorkflowContext], ag
     instructions = (
         "You are a workflow coordinator for processing artwork URLs. You will receive input in the format:\n"
         "\"URL: <artwork_url>\".\n\n"
+        "Tools exchange short handles such as artwork:3f2a or prompt:91c0 instead of full data. "
+        "Pass handles between tools exactly as returned; never expand, rewrite or invent them.\n\n"
         "Follow these steps in order:\n"
-        "1. Call the extract_details tool with arguments artwork_url (string) to extract artwork details.\n"
-        "2. Call the generate_prompt tool with the returned ArtworkDetails object to generate a detailed image prompt.\n"
-        "3. Call the generate_image tool with the generated prompt string to generate an image and obtain image_path.\n"
+        "1. Call the extract_details tool with argument artwork_url (string) to obtain the artwork handle.\n"
+        "2. Call the generate_prompt tool with the artwork handle to obtain the prompt handle.\n"
+        "3. Call the generate_image tool with the prompt handle to generate an image and obtain image_path.\n"
     )
     if generate_video:
         instructions += (
-            "4. Call the generate_video_prompt tool with arguments artwork_details (from step 1), image_path (from step 3), and generated_prompt (from step 2) to generate a detailed video prompt.\n"
-            "5. Call the generate_video tool with arguments prompt (from step 4) and image_path (from step 3) to generate a video and obtain video_path.\n"
-            "6. Return a ProcessingResult object containing:\n"
-            "   - artwork_details: the ArtworkDetails from step 1\n"
-            "   - generated_prompt: the prompt string from step 2\n"
-            "   - generated_image_path: the image_path from step 3\n"
-            "   - generated_video_path: the video_path from step 5\n"
+            "4. Call the generate_video_prompt tool with arguments artwork (handle from step 1), image_path (from step 3), and image_prompt (prompt handle from step 2) to obtain the video prompt handle.\n"
+            "5. Call the generate_video tool with arguments prompt (video prompt handle from step 4) and image_path (from step 3) to generate a video and obtain video_path.\n"
+            "6. Return a ProcessingHandles object containing:\n"
+            "   - artwork: the artwork handle from step 1\n"
+            "   - prompt: the prompt handle from step 2\n"
+            "   - image_path: the image_path from step 3\n"
+            "   - video_prompt: the video prompt handle from step 4\n"
+            "   - video_path: the video_path from step 5\n"
         )
     else:
         instructions += (
-            "4. Return a ProcessingResult object containing:\n"
-            "   - artwork_details: the ArtworkDetails from step 1\n"
-            "   - generated_prompt: the prompt string from step 2\n"
-            "   - generated_image_path: the image_path from step 3\n"
-            "   - generated_video_path: None\n"
+            "4. Return a ProcessingHandles object containing:\n"
+            "   - artwork: the artwork handle from step 1\n"
+            "   - prompt: the prompt handle from step 2\n"
+            "   - image_path: the image_path from step 3\n"
+            "   - video_prompt: None\n"
+            "   - video_path: None\n"
         )
     return instructions
 
-coordination_agent = Agent(
-    name="Workflow Coordinator",
-    instructions=dynamic_coordinator_instructions,
-    tools=[
-        details_extractor_agent.as_tool(
-            tool_name="extract_details",
-            tool_description="Extract artwork details given a URL"
-        ),
-        prompt_generator_agent.as_tool(
-            tool_name="generate_prompt",
-            tool_description="Generate a detailed image prompt from artwork details"
-        ),
-        image_generator_agent.as_tool(
-            tool_name="generate_image",
-            tool_description="Generate an image from a prompt"
-        ),
-        video_prompt_generator_agent.as_tool(
-            tool_name="generate_video_prompt",
-            tool_description="Generate a detailed video prompt from artwork details"
-        ),
-        video_generator_agent.as_tool(
-            tool_name="generate_video",
-            tool_description="Generate a video given a prompt and an image path"
-        ),
-    ],
-    output_type=ProcessingResult,
-    model="gpt-4.1"
-) 
\ No newline at end of file
+def build_coordination_agent(direct_tools: bool = COORDINATOR_DIRECT_TOOLS) -> Agent:
+    """
+    Build the workflow coordinator
+
+    Args:
+        direct_tools: Register the prompt/image/video function tools directly on the
+            coordinator. When False, each is wrapped in a gpt-4o-mini agent-as-tool,
+            which costs a nested LLM run per step. extract_details always runs the
+            extractor agent, since extraction is where an LLM adds reasoning.
+            Either way a stage's StageError ends the run rather than being
+            handed to the coordinator to retry. The nested runs get the
+            workflow's metrics_hooks, so their model usage is priced and
+            budget-checked like the coordinator's.
+
+    Returns:
+        The coordinator Agent
+    """
+    if direct_tools:
+        stage_tools = [
+            generate_prompt_tool,
+            generate_image_tool,
+            generate_video_prompt_tool,
+            generate_video_tool,
+        ]
+    else:
+        stage_tools = [
+            prompt_generator_agent.as_tool(
+                tool_name="generate_prompt",
+                tool_description="Generate a detailed image prompt from an artwork handle; returns a prompt handle",
+                failure_error_function=stage_tool_failure,
+                hooks=metrics_hooks
+            ),
+            image_generator_agent.as_tool(
+                tool_name="generate_image",
+                tool_description="Generate an image from a prompt handle; returns the image path",
+                failure_error_function=stage_tool_failure,
+                hooks=metrics_hooks
+            ),
+            video_prompt_generator_agent.as_tool(
+                tool_name="generate_video_prompt",
+                tool_description="Generate a detailed video prompt from an artwork handle, image path and prompt handle; returns a video prompt handle",
+                failure_error_function=stage_tool_failure,
+                hooks=metrics_hooks
+            ),
+            video_generator_agent.as_tool(
+                tool_name="generate_video",
+                tool_description="Generate a video given a video prompt handle and an image path",
+                failure_error_function=stage_tool_failure,
+                hooks=metrics_hooks
+            ),
+        ]
+
+    return Agent(
+        name="Workflow Coordinator",
+        instructions=dynamic_coordinator_instructions,
+        tools=[extract_details_tool, *stage_tools],
+        output_type=ProcessingHandles,
+        model="gpt-4.1"
+    )
+
+coordination_agent = build_coordination_agent()
@@ -1,8 +1,12 @@
 # path=openai/PracticalAIAgents/02/agents_def/image_agents.py
-from agents import Agent, function_tool
+from agents import Agent, RunContextWrapper, function_tool
 from pydantic import BaseModel
 import structlog
 from tools.ImageGenerator import GeminiImageGenerator
+from agents_def.workflow_context import WorkflowContext
+from utils.perceptual_hash import source_hash, record_source, reusable_output
+from utils.postprocessing import normalize_url
+from utils.failures import stage_tool_failure
 
 logger = structlog.get_logger()
 
@@ -13,21 +17,38 @@ class ImageGenerationOutput(BaseModel):
     """Model for storing the path of the generated image"""
     image_path: str
 
-@function_tool(name_override="generate_image")
-async def generate_image_tool(prompt: str) -> ImageGenerationOutput:
+@function_tool(name_override="generate_image", failure_error_function=stage_tool_failure)
+async def generate_image_tool(ctx: RunContextWrapper[WorkflowContext], prompt: str) -> ImageGenerationOutput:
     """
-    Generate an image based on the prompt using GeminiImageGenerator and return the image path.
+    Generate an image from a prompt handle (e.g. prompt:91c0) using GeminiImageGenerator and return the image path.
     """
-    image_path = await image_generator.generate(prompt)
-    if not image_path:
-        logger.error("Image generation failed for prompt: %s", prompt)
-        raise ValueError("Failed to generate image")
+    # The prompt stage already found an earlier image for this source and handed over its prompt
+    reused = ctx.context.reused_images.get(prompt)
+    if reused:
+        ctx.context.artifacts.put("image", reused)
+        return ImageGenerationOutput(image_path=reused)
+    prompt = ctx.context.artifacts.resolve_text(prompt, "prompt")
+    # The run's source image was downloaded (and hashed) by the prompt stage
+    artworks = ctx.context.artifacts.handles("artwork")
+    source_url = ctx.context.artifacts.get(artworks[-1]).image_urls.main_image_url if artworks else None
+    source_url = normalize_url(source_url) if source_url else None
+    source = await source_hash(source_url)
+    await record_source(source, source_url)
+    reused = await reusable_output(source, "image")
+    if reused:
+        logger.info(f"Source image {source_url} already has a generated image; reusing {reused}")
+        ctx.context.artifacts.put("image", reused)
+        return ImageGenerationOutput(image_path=reused)
+    # Raises StageError on failure, which ends the run (see stage_tool_failure)
+    image_path = await image_generator.generate(prompt, source=source)
+    # Registered so a run stopped by a later stage still reports the image
+    ctx.context.artifacts.put("image", image_path)
     return ImageGenerationOutput(image_path=image_path)
 
 # Agent wrapping the image generation tool
 image_generator_agent = Agent(
     name="Image Generator",
-    instructions="Receive a detailed prompt and use the generate_image tool to produce an image, then return the local path to the generated image.",
+    instructions="Receive a prompt handle (e.g. prompt:91c0) and pass it to the generate_image tool to produce an image, then return the local path to the generated image.",
     tools=[generate_image_tool],
     output_type=ImageGenerationOutput,
     model="gpt-4o-mini"
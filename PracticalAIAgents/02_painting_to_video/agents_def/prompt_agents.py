@@ -1,10 +1,16 @@
 # path=openai/PracticalAIAgents/02/agents_def/prompt_agents.py
-from agents import Agent, function_tool
-from pydantic import BaseModel
+import asyncio
+from typing import Optional, Tuple
+from agents import Agent, RunContextWrapper, function_tool
+from pydantic import BaseModel, Field
 import structlog
 from tools.TextGenerator import TextGenerator
+from agents_def.workflow_context import WorkflowContext
+from config import PROMPT_MODEL, PROMPT_TEMPERATURE, PHASH_ENABLED, PHASH_REUSE_OUTPUTS
 from models.models import ArtworkDetails
-from config import PROMPT_MODEL, PROMPT_TEMPERATURE
+from utils.failures import stage_tool_failure
+from utils.perceptual_hash import source_hash, reusable_output
+from utils.postprocessing import normalize_url
 from agents_def.prompt_generator import generate_image_prompt as generate_image_prompt_impl, generate_video_prompt as generate_video_prompt_impl
 
 logger = structlog.get_logger()
@@ -16,33 +22,66 @@ text_generator.temperature = PROMPT_TEMPERATURE
 
 class PromptGenerationOutput(BaseModel):
     """Model for storing the generated prompt"""
-    prompt: str
+    prompt: str = Field(..., description="Handle of the generated image prompt, e.g. prompt:91c0")
 
 # Model for storing the generated video prompt
 class PromptVideoGenerationOutput(BaseModel):
     """Model for storing the generated video prompt"""
-    prompt: str
+    prompt: str = Field(..., description="Handle of the generated video prompt, e.g. video_prompt:5b1e")
 
-@function_tool(name_override="generate_prompt")
-async def generate_prompt_tool(artwork_details: ArtworkDetails) -> PromptGenerationOutput:
+async def find_reusable_image(artwork_details: ArtworkDetails) -> Tuple[Optional[str], Optional[str]]:
     """
-    Generate an image prompt using the prompt_generator implementation and return the prompt.
+    Look for an image generated earlier from the same source picture, before any prompt is written
+    
+    Only with PHASH_REUSE_OUTPUTS: the source image is downloaded (and hashed)
+    here if this process has not seen it yet, and the download is handed on
+    to prompt generation.
+    
+    Returns:
+        Tuple of (local path of the source image downloaded here or None, path of the reusable image or None)
     """
-    prompt = await generate_image_prompt_impl(artwork_details, text_generator)
-    if not prompt:
-        logger.error("Prompt generation failed for artwork details: %s", artwork_details)
-        raise ValueError("Failed to generate prompt")
-    return PromptGenerationOutput(prompt=prompt)
+    main_image_url = artwork_details.image_urls.main_image_url if artwork_details.image_urls else None
+    if not (PHASH_ENABLED and PHASH_REUSE_OUTPUTS) or not main_image_url:
+        return None, None
+    source_url = normalize_url(main_image_url)
+    source = await source_hash(source_url)
+    source_image = None
+    if source is None:
+        artifact = await asyncio.to_thread(text_generator.file_storage.download_image_artifact, source_url)
+        source_image = artifact.path if artifact else None
+        source = await source_hash(source_url)
+    return source_image, await reusable_output(source, "image")
 
-@function_tool(name_override="generate_video_prompt")
+@function_tool(name_override="generate_prompt", failure_error_function=stage_tool_failure)
+async def generate_prompt_tool(ctx: RunContextWrapper[WorkflowContext], artwork: str) -> PromptGenerationOutput:
+    """
+    Generate an image prompt for an artwork handle (e.g. artwork:3f2a) and return the prompt handle.
+    """
+    artwork_details = ctx.context.artifacts.get(artwork, "artwork")
+    # A rerun (or another print of the same plate) reuses the earlier image and the prompt saved with it
+    source_image, reused = await find_reusable_image(artwork_details)
+    prompt = text_generator.file_storage.load_image_prompt(reused) if reused else None
+    if prompt:
+        logger.info(f"Source image of {artwork_details.title} already has a generated image; reusing {reused} and its prompt")
+        handle = ctx.context.artifacts.put("prompt", prompt)
+        ctx.context.reused_images[handle] = reused
+        return PromptGenerationOutput(prompt=handle)
+    # A failed generation raises StageError, which ends the run instead of handing the coordinator an error to retry
+    prompt = await generate_image_prompt_impl(artwork_details, text_generator, source_image=source_image)
+    return PromptGenerationOutput(prompt=ctx.context.artifacts.put("prompt", prompt))
+
+@function_tool(name_override="generate_video_prompt", failure_error_function=stage_tool_failure)
 async def generate_video_prompt_tool(
-    artwork_details: ArtworkDetails,
+    ctx: RunContextWrapper[WorkflowContext],
+    artwork: str,
     image_path: str,
     image_prompt: str
 ) -> PromptVideoGenerationOutput:
     """
-    Generate a video prompt using the prompt_generator implementation, based on artwork details, the generated image, and the image prompt, then return the video prompt.
+    Generate a video prompt from an artwork handle, the generated image path and the image prompt handle, then return the video prompt handle.
     """
+    artwork_details = ctx.context.artifacts.get(artwork, "artwork")
+    image_prompt = ctx.context.artifacts.resolve_text(image_prompt, "prompt")
     # Call the implementation with full context for more accurate video prompts
     prompt = await generate_video_prompt_impl(
         artwork_details,
@@ -50,16 +89,13 @@ async def generate_video_prompt_tool(
         image_url=image_path,
         image_prompt=image_prompt
     )
-    if not prompt:
-        logger.error("Video prompt generation failed for artwork details: %s, image_path: %s, image_prompt: %s", artwork_details, image_path, image_prompt)
-        raise ValueError("Failed to generate video prompt")
-    return PromptVideoGenerationOutput(prompt=prompt)
+    return PromptVideoGenerationOutput(prompt=ctx.context.artifacts.put("video_prompt", prompt))
 
 
 # Agent wrapping the prompt generation tool
 prompt_generator_agent = Agent(
     name="Prompt Generator",
-    instructions="Receive artwork details and use the generate_prompt tool to produce a detailed image prompt.",
+    instructions="Receive an artwork handle (e.g. artwork:3f2a) and pass it to the generate_prompt tool to produce a detailed image prompt. Return the prompt handle exactly as the tool returned it.",
     tools=[generate_prompt_tool],
     output_type=PromptGenerationOutput,
     model="gpt-4o-mini"
@@ -69,8 +105,8 @@ prompt_generator_agent = Agent(
 # Agent wrapping the video prompt generation tool
 video_prompt_generator_agent = Agent(
     name="Video Prompt Generator",
-    instructions="Receive artwork details and use the generate_video_prompt tool to produce a detailed video prompt.",
+    instructions="Receive an artwork handle, an image path and an image prompt handle and pass them to the generate_video_prompt tool to produce a detailed video prompt. Return the video prompt handle exactly as the tool returned it.",
     tools=[generate_video_prompt_tool],
     output_type=PromptVideoGenerationOutput,
     model="gpt-4o-mini"
-) 
\ No newline at end of file
+)
@@ -1,19 +1,70 @@
+import asyncio
+import time
 from typing import Dict, Any, Optional
 
+from config import PROMPT_LOCAL_ANALYSIS, PROMPT_IMAGE_DETAIL, PROMPT_STREAMING, PROMPT_STREAM_INTERVAL
 from models.models import ArtworkDetails
 from tools.TextGenerator import TextGenerator
 from utils.postprocessing import normalize_url
+from utils.image_analysis import image_analyzer, describe_analysis
+from utils.metrics import emit_progress
+from utils.text_batch import use_batch_api
 import structlog
 
 logger = structlog.get_logger()
 
-async def generate_image_prompt(artwork_details: ArtworkDetails, text_generator: TextGenerator) -> str:
+async def generate_live(text_generator: TextGenerator, prompt_kind: str, system_prompt: str, user_message: str, image_url: Optional[str] = None, detail: str = "auto") -> str:
+    """
+    Generate text, reporting it to the current progress_scope() as it forms
+    
+    Deltas arriving within PROMPT_STREAM_INTERVAL of each other are merged
+    into one "prompt_delta" event ({"prompt", "offset", "delta"}); a
+    "prompt_done" event carries the final text. Without PROMPT_STREAMING
+    this is a plain generate call. When use_batch_api() the request is
+    parked for a Batch API job instead and only "prompt_done" is reported.
+    
+    Args:
+        text_generator: Initialized TextGenerator instance
+        prompt_kind: "image" or "video", to tell the prompts apart in events
+        system_prompt: Instructions for the AI model
+        user_message: The user's input message
+        image_url: Optional URL or path to an image to include in the request
+        detail: Detail level for image processing
+    
+    Returns:
+        The generated text
+    
+    Raises:
+        StageError: if generation failed; nothing is reported as "prompt_done"
+    """
+    if use_batch_api():
+        text = await text_generator.generate_batched(system_prompt, user_message, image_url, detail=detail)
+        emit_progress({"type": "prompt_done", "prompt": prompt_kind, "text": text})
+        return text
+    if not PROMPT_STREAMING:
+        return await text_generator.generate(system_prompt, user_message, image_url, detail=detail)
+    
+    sent = 0
+    last_emit = time.perf_counter()
+    text = ""
+    # Read to the end (no break), so the stream releases its provider slot and records its metrics
+    async for chunk in text_generator.generate_stream(system_prompt, user_message, image_url, detail=detail):
+        text = chunk.text
+        due = sent == 0 or time.perf_counter() - last_emit >= PROMPT_STREAM_INTERVAL
+        if len(text) > sent and (due or chunk.done):
+            emit_progress({"type": "prompt_delta", "prompt": prompt_kind, "offset": sent, "delta": text[sent:]})
+            sent, last_emit = len(text), time.perf_counter()
+    emit_progress({"type": "prompt_done", "prompt": prompt_kind, "text": text})
+    return text
+
+async def generate_image_prompt(artwork_details: ArtworkDetails, text_generator: TextGenerator, source_image: Optional[str] = None) -> str:
     """
     Generate a detailed prompt for image generation based on artwork details using TextGenerator
     
     Args:
         artwork_details: The artwork details including title, artist, description, and image URL
         text_generator: Initialized TextGenerator instance to use for prompt generation
+        source_image: Local path of the main image if it was already downloaded, so local analysis does not fetch it again
         
     Returns:
         A detailed prompt for image generation
@@ -37,6 +88,22 @@ async def generate_image_prompt(artwork_details: ArtworkDetails, text_generator:
     Make the prompt detailed enough for a text-to-image model to create a high-quality image.
     """
     
+    # Get the image URL from artwork details and normalize it
+    image_url = None
+    analysis_text = None
+    if artwork_details.image_urls and artwork_details.image_urls.main_image_url:
+        raw_url = artwork_details.image_urls.main_image_url
+        image_url = normalize_url(raw_url)
+        logger.debug(f"Using normalized image URL: {image_url}")
+        if PROMPT_LOCAL_ANALYSIS:
+            analysis_text, image_url = await analyze_source_image(source_image or image_url, text_generator)
+    
+    # Measured palette and composition let the model skip a high-detail look at the image
+    measured = f"""
+    Measured visual properties of the artwork image:
+    {analysis_text}
+    """ if analysis_text else ""
+    
     # Create the user message with artwork details
     user_message = f"""
     Create an inspiring, detailed image generation prompt based on this artwork:
@@ -45,19 +112,40 @@ async def generate_image_prompt(artwork_details: ArtworkDetails, text_generator:
     Artist: {artwork_details.artist or 'Unknown'}
     Medium: {artwork_details.medium or 'Unknown'}
     Description: {artwork_details.description or 'No description available'}
-    
+    {measured}
     Please provide a detailed, creative prompt that captures the essence of this artwork while adding your own creative extensions.
     """
     
-    # Get the image URL from artwork details and normalize it
-    image_url = None
-    if artwork_details.image_urls and artwork_details.image_urls.main_image_url:
-        raw_url = artwork_details.image_urls.main_image_url
-        image_url = normalize_url(raw_url)
-        logger.debug(f"Using normalized image URL: {image_url}")
+    # With local analysis the image is sent at reduced detail (or not at all); without it, keep the default
+    if analysis_text:
+        if PROMPT_IMAGE_DETAIL is None:
+            return await generate_live(text_generator, "image", system_prompt, user_message)
+        return await generate_live(text_generator, "image", system_prompt, user_message, image_url, detail=PROMPT_IMAGE_DETAIL)
     
     # Use the TextGenerator to generate the prompt, passing the image URL
-    return await text_generator.generate(system_prompt, user_message, image_url)
+    return await generate_live(text_generator, "image", system_prompt, user_message, image_url)
+
+async def analyze_source_image(image_url: str, text_generator: TextGenerator):
+    """
+    Run local palette/composition analysis on the source artwork image
+    
+    Args:
+        image_url: Normalized URL (or local path, if already downloaded) of the source image
+        text_generator: TextGenerator whose FileStorage downloads the image
+        
+    Returns:
+        Tuple of (analysis text or None, image reference to pass on). The reference
+        is the local path of the downloaded image so the text stage reuses the bytes.
+    """
+    try:
+        artifact = await asyncio.to_thread(text_generator.file_storage.load_image_artifact, image_url)
+        if artifact is None:
+            return None, image_url
+        analysis = await image_analyzer.analyze(artifact)
+        return describe_analysis(analysis), artifact.path or image_url
+    except Exception as e:
+        logger.error(f"Local image analysis failed for {image_url}: {str(e)}")
+        return None, image_url
 
 async def generate_video_prompt(
     artwork_details: ArtworkDetails,
@@ -71,8 +159,8 @@ async def generate_video_prompt(
     Args:
         artwork_details: The artwork details including title, artist, description, and image URLs
         text_generator: Initialized TextGenerator instance to use for prompt generation
-        image_url: The local path or URL of the generated image from step 3
-        image_prompt: The image prompt string used to generate the image
+        image_url: The local path or URL of the generated image from step 3 (or of the source artwork)
+        image_prompt: The image prompt string used to generate the image (None when animating the source artwork)
         
     Returns:
         A detailed prompt for video generation
@@ -123,6 +211,13 @@ Utilize prompt engineering tools: Consider exploring prompt engineering tools or
     Make the prompt detailed enough for a text-to-video model to create a high-quality video.
     """
 
+    # Describe the input image: a generated image with its prompt, or the original artwork itself
+    if image_prompt:
+        image_context = f"""The generated image can be found at: {image_url or 'N/A'}
+    It was created using the prompt: {image_prompt}"""
+    else:
+        image_context = f"The video will animate the original artwork image found at: {image_url or 'N/A'}"
+
     # Create the user message with artwork details and image context
     user_message = f"""
     Create a dynamic video generation prompt based on this artwork:
@@ -131,9 +226,8 @@ Utilize prompt engineering tools: Consider exploring prompt engineering tools or
     Artist: {artwork_details.artist or 'Unknown'}
     Description: {artwork_details.description or 'No description available'}
 
-    The generated image can be found at: {image_url or 'N/A'}
-    It was created using the prompt: {image_prompt or 'N/A'}
+    {image_context}
     """
 
     # Use the TextGenerator to generate the video prompt, passing the image context
-    return await text_generator.generate(system_prompt, user_message, image_url) 
\ No newline at end of file
+    return await generate_live(text_generator, "video", system_prompt, user_message, image_url) 
\ No newline at end of file
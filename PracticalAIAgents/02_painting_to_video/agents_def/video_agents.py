@@ -1,8 +1,10 @@
 # path=openai/PracticalAIAgents/02/agents_def/video_agents.py
-from agents import Agent, function_tool
+from agents import Agent, RunContextWrapper, function_tool
 from pydantic import BaseModel
 import structlog
 from tools.VideoGenerator import GeminiVideoGenerator
+from agents_def.workflow_context import WorkflowContext
+from utils.failures import stage_tool_failure
 
 logger = structlog.get_logger()
 
@@ -13,21 +15,20 @@ class VideoGenerationOutput(BaseModel):
     """Model for storing the path of the generated video"""
     video_path: str
 
-@function_tool(name_override="generate_video")
-async def generate_video_tool(prompt: str, image_path: str) -> VideoGenerationOutput:
+@function_tool(name_override="generate_video", failure_error_function=stage_tool_failure)
+async def generate_video_tool(ctx: RunContextWrapper[WorkflowContext], prompt: str, image_path: str) -> VideoGenerationOutput:
     """
-    Generate a video based on the prompt and optional image using GeminiVideoGenerator and return the video path.
+    Generate a video from a video prompt handle (e.g. video_prompt:5b1e) and an image path using GeminiVideoGenerator and return the video path.
     """
+    prompt = ctx.context.artifacts.resolve_text(prompt, "video_prompt")
+    # Raises StageError on failure, which ends the run (see stage_tool_failure)
     video_path = await video_generator.generate(prompt=prompt, image_path=image_path)
-    if not video_path:
-        logger.error("Video generation failed for prompt: %s", prompt)
-        raise ValueError("Failed to generate video")
     return VideoGenerationOutput(video_path=video_path)
 
 # Agent wrapping the video generation tool
 video_generator_agent = Agent(
     name="Video Generator",
-    instructions="Receive a detailed prompt and image path, use the generate_video tool to produce a video, then return the local path to the generated video.",
+    instructions="Receive a video prompt handle and an image path and pass them to the generate_video tool to produce a video, then return the local path to the generated video.",
     tools=[generate_video_tool],
     output_type=VideoGenerationOutput,
     model="gpt-4o-mini"
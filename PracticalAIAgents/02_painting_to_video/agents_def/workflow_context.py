@@ -1,7 +1,91 @@
 # path=openai/PracticalAIAgents/02/agents_def/workflow_context.py
-from dataclasses import dataclass
+import hashlib
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional
+
+from pydantic import BaseModel
+
+from models.models import ArtworkDetails, ArtworkImageURL, ProcessingHandles, ProcessingResult
+
+
+class ArtifactRegistry:
+    """
+    Per-run registry mapping short handles (e.g. "artwork:3f2a") to real data.
+
+    Tools store their outputs here and hand the coordinator only the handle,
+    so large objects never travel through model text between agents.
+    """
+
+    def __init__(self):
+        self._items: Dict[str, Any] = {}
+
+    def put(self, kind: str, value: Any) -> str:
+        """
+        Register a value and return its handle.
+
+        Handles are derived from the content, so registering the same value
+        twice yields the same handle.
+        """
+        if isinstance(value, BaseModel):
+            payload = value.model_dump_json()
+        else:
+            payload = str(value)
+        digest = hashlib.sha1(payload.encode("utf-8")).hexdigest()
+        # Lengthen the handle only if a different value already owns the short one
+        for length in range(4, len(digest) + 1):
+            handle = f"{kind}:{digest[:length]}"
+            if handle not in self._items or self._items[handle] == value:
+                self._items[handle] = value
+                return handle
+        raise RuntimeError(f"Could not allocate a handle for {kind}")
+
+    def get(self, handle: str, kind: Optional[str] = None) -> Any:
+        """
+        Resolve a handle to its value.
+
+        Raises:
+            KeyError: if the handle is unknown or of the wrong kind
+        """
+        if kind and not handle.startswith(f"{kind}:"):
+            raise KeyError(f"Expected a {kind} handle, got {handle!r}. Known: {self.handles(kind)}")
+        if handle not in self._items:
+            raise KeyError(f"Unknown handle {handle!r}. Known: {self.handles(kind)}")
+        return self._items[handle]
+
+    def resolve_text(self, value: str, kind: str) -> str:
+        """Resolve a text handle, passing literal text through unchanged."""
+        if value in self._items and value.startswith(f"{kind}:"):
+            return self._items[value]
+        return value
+
+    def handles(self, kind: Optional[str] = None):
+        """List registered handles, optionally of a single kind."""
+        return [h for h in self._items if kind is None or h.startswith(f"{kind}:")]
+
+    def to_processing_result(self, handles: ProcessingHandles) -> ProcessingResult:
+        """Expand the coordinator's handle-based output into a full ProcessingResult."""
+        error = handles.error
+        try:
+            artwork_details = self.get(handles.artwork or "", "artwork")
+        except KeyError:
+            # The run stopped before extraction produced an artwork
+            artwork_details = ArtworkDetails(image_urls=ArtworkImageURL())
+            error = error or f"No artwork details for handle {handles.artwork!r}"
+        return ProcessingResult(
+            artwork_details=artwork_details,
+            generated_prompt=self.resolve_text(handles.prompt, "prompt") if handles.prompt else None,
+            generated_video_prompt=self.resolve_text(handles.video_prompt, "video_prompt") if handles.video_prompt else None,
+            generated_image_path=handles.image_path,
+            generated_video_path=handles.video_path,
+            error=error,
+        )
+
 
 @dataclass
 class WorkflowContext:
     """Context for the workflow run, including flags."""
-    generate_video: bool 
\ No newline at end of file
+    generate_video: bool
+    # Handle -> data for everything tools produce during the run
+    artifacts: ArtifactRegistry = field(default_factory=ArtifactRegistry)
+    # Prompt handle -> earlier generated image, when the prompt stage found one to reuse
+    reused_images: Dict[str, str] = field(default_factory=dict)
@@ -0,0 +1,136 @@
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import statistics
+import time
+from collections import Counter
+
+import structlog
+from agents import add_trace_processor
+from agents.tracing import TracingProcessor
+
+from agents_def.coordination_agent import build_coordination_agent
+from utils.renditions import shutdown_rendition_pipeline
+from workflow import process_artwork
+
+logger = structlog.get_logger()
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+
+
+class LLMCallCounter(TracingProcessor):
+    """Counts model calls and agent runs per trace, including nested agent-as-tool runs."""
+
+    def __init__(self):
+        self.llm_calls = Counter()
+        self.agent_runs = Counter()
+
+    def on_trace_start(self, trace):
+        pass
+
+    def on_trace_end(self, trace):
+        pass
+
+    def on_span_start(self, span):
+        pass
+
+    def on_span_end(self, span):
+        span_type = span.span_data.type
+        if span_type in ("response", "generation"):
+            self.llm_calls[span.trace_id] += 1
+        elif span_type == "agent":
+            self.agent_runs[span.trace_id] += 1
+
+    def shutdown(self):
+        pass
+
+    def force_flush(self):
+        pass
+
+
+async def run_topology(name: str, direct_tools: bool, urls, generate_video: bool, counter: LLMCallCounter):
+    """
+    Process each URL with one coordinator topology and collect call counts and latency
+
+    Args:
+        name: Label for the topology
+        direct_tools: Whether stage tools are registered directly on the coordinator
+        urls: Artwork URLs to process
+        generate_video: Include the video stages
+        counter: Trace processor collecting LLM calls
+
+    Returns:
+        Per-run measurements
+    """
+    coordinator = build_coordination_agent(direct_tools=direct_tools)
+    runs = []
+    for url in urls:
+        seen = set(counter.llm_calls)
+        start = time.perf_counter()
+        result = await process_artwork(url, generate_video, coordinator=coordinator)
+        elapsed = time.perf_counter() - start
+        trace_ids = [t for t in set(counter.llm_calls) | set(counter.agent_runs) if t not in seen]
+        runs.append({
+            "topology": name,
+            "url": url,
+            "seconds": round(elapsed, 2),
+            "llm_calls": sum(counter.llm_calls[t] for t in trace_ids),
+            "agent_runs": sum(counter.agent_runs[t] for t in trace_ids),
+            "error": result.error,
+        })
+        logger.info(f"[{name}] {url}: {runs[-1]}")
+    return runs
+
+
+def summarize(runs):
+    """Aggregate runs per topology."""
+    summary = {}
+    for name in sorted({r["topology"] for r in runs}):
+        subset = [r for r in runs if r["topology"] == name]
+        summary[name] = {
+            "runs": len(subset),
+            "failed": sum(1 for r in subset if r["error"]),
+            "mean_llm_calls": round(statistics.mean(r["llm_calls"] for r in subset), 2),
+            "mean_agent_runs": round(statistics.mean(r["agent_runs"] for r in subset), 2),
+            "median_seconds": round(statistics.median(r["seconds"] for r in subset), 2),
+            "mean_seconds": round(statistics.mean(r["seconds"] for r in subset), 2),
+        }
+    return summary
+
+
+async def main(urls, repeat: int, generate_video: bool):
+    counter = LLMCallCounter()
+    add_trace_processor(counter)
+
+    urls = list(urls) * repeat
+    runs = []
+    # Alternate topologies so provider-side drift affects both equally
+    for url in urls:
+        runs += await run_topology("wrapper_agents", False, [url], generate_video, counter)
+        runs += await run_topology("direct_tools", True, [url], generate_video, counter)
+    await asyncio.to_thread(shutdown_rendition_pipeline)
+
+    report = {
+        "timestamp": datetime.datetime.now().isoformat(),
+        "generate_video": generate_video,
+        "summary": summarize(runs),
+        "runs": runs,
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output_file = os.path.join(RESULTS_DIR, f"coordinator_topology_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output_file, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps(report["summary"], indent=2))
+    print(f"Results saved to {output_file}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare LLM calls and latency of wrapper-agent vs direct-tool coordinators")
+    parser.add_argument("--url", action="append", required=True, help="Artwork URL (repeatable)")
+    parser.add_argument("--repeat", type=int, default=1, help="Times to process each URL per topology")
+    parser.add_argument("--video", action="store_true", help="Include video prompt and video generation stages")
+    args = parser.parse_args()
+
+    asyncio.run(main(args.url, args.repeat, args.video))
@@ -0,0 +1,137 @@
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import time
+from collections import Counter
+
+import structlog
+
+from benchmarks.throughput import RESULTS_DIR, git_commit, stage_percentiles
+from config import FAULT_PROFILES
+from utils.providers import set_provider_mode
+from utils.renditions import shutdown_rendition_pipeline
+
+logger = structlog.get_logger()
+
+
+def is_usable(result, mode: str, generate_video: bool) -> bool:
+    """Whether a result delivered everything the run asked for."""
+    if result.error:
+        return False
+    if mode == "direct-video":
+        return bool(result.generated_video_path)
+    return bool(result.generated_image_path) and (bool(result.generated_video_path) or not generate_video)
+
+
+async def run_scenario(profile: str, artworks: int, concurrency: int, mode: str, generate_video: bool, seed: int) -> dict:
+    """
+    Run one batch under a fault profile
+
+    Args:
+        profile: FAULT_PROFILES name, or "baseline" for no faults
+        artworks: Batch size
+        concurrency: Artworks in flight
+        mode: "full" or "direct-video"
+        generate_video: Include the video stages in full mode
+        seed: Seed for fault draws
+
+    Returns:
+        Goodput, wasted spend, injected faults, stage errors and the stages artworks stopped at
+    """
+    import workflow
+    from utils.cost_ledger import CostLedger
+    from utils.faults import faults
+    from utils.metrics import registry
+    from utils.standins import STANDIN_HOST
+
+    faults.configure(None if profile == "baseline" else profile, seed=seed)
+    registry.reset()
+    urls = [f"https://{STANDIN_HOST}/art/{profile}-{i}" for i in range(artworks)]
+    batch_ledger = CostLedger("batch", budget_usd=None, budget_tokens=None, budget_calls=None)
+    start = time.perf_counter()
+    results = await workflow.process_batch(urls, generate_video, mode, concurrency, ledger=batch_ledger)
+    elapsed = time.perf_counter() - start
+
+    # Artwork ledgers are labelled by URL
+    artwork_ledgers = {child.label: child for child in batch_ledger.children}
+    usable = 0
+    wasted_usd = 0.0
+    for url, result in zip(urls, results):
+        if is_usable(result, mode, generate_video):
+            usable += 1
+        elif url in artwork_ledgers:
+            wasted_usd += artwork_ledgers[url].cost_usd
+
+    snapshot = registry.snapshot()
+    scenario = {
+        "profile": profile,
+        "faults": FAULT_PROFILES.get(profile, {}),
+        "artworks": artworks,
+        "usable": usable,
+        "seconds": round(elapsed, 2),
+        "goodput_per_minute": round(usable / elapsed * 60, 2) if elapsed else 0.0,
+        "spend_usd": round(batch_ledger.cost_usd, 4),
+        "wasted_usd": round(wasted_usd, 4),
+        "wasted_share": round(wasted_usd / batch_ledger.cost_usd, 3) if batch_ledger.cost_usd else 0.0,
+        "usd_per_usable": round(batch_ledger.cost_usd / usable, 4) if usable else None,
+        "injected": snapshot.get("artwork_faults_injected_total", {}),
+        "errors": snapshot.get("artwork_stage_errors_total", {}),
+        "failed_stages": dict(Counter(result.failed_stage for result in results if result.failed_stage)),
+        "stages": stage_percentiles(snapshot),
+    }
+    logger.info(f"{profile}: {usable}/{artworks} usable, goodput {scenario['goodput_per_minute']}/min, "
+                f"wasted ${scenario['wasted_usd']:.4f} of ${scenario['spend_usd']:.4f}")
+    return scenario
+
+
+async def main(profiles, artworks: int, concurrency: int, mode: str, generate_video: bool, latency_scale: float, seed: int):
+    from agents_def.video_agents import video_generator
+    # Poll (and give up on) Veo stand-in operations on the same compressed time scale
+    video_generator.poll_interval = max(0.05, video_generator.poll_interval * latency_scale)
+    video_generator.timeout = video_generator.timeout * latency_scale
+
+    scenarios = []
+    for profile in ["baseline"] + [p for p in profiles if p != "baseline"]:
+        scenarios.append(await run_scenario(profile, artworks, concurrency, mode, generate_video, seed))
+    await asyncio.to_thread(shutdown_rendition_pipeline)
+
+    report = {
+        "timestamp": datetime.datetime.now().isoformat(),
+        "git_commit": git_commit(),
+        "settings": {
+            "mode": mode,
+            "generate_video": generate_video,
+            "artworks": artworks,
+            "concurrency": concurrency,
+            "latency_scale": latency_scale,
+            "seed": seed,
+        },
+        "scenarios": scenarios,
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output_file = os.path.join(RESULTS_DIR, f"faults_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output_file, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"{'profile':<26}{'usable':>8}{'goodput/min':>13}{'spend $':>10}{'wasted $':>10}{'wasted %':>10}")
+    for s in scenarios:
+        print(f"{s['profile']:<26}{s['usable']:>4}/{s['artworks']:<3}{s['goodput_per_minute']:>13}{s['spend_usd']:>10.4f}{s['wasted_usd']:>10.4f}{s['wasted_share'] * 100:>9.1f}%")
+    print(f"Results saved to {output_file}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Goodput and wasted spend of offline batch runs under injected provider faults")
+    parser.add_argument("--profiles", nargs="+", default=sorted(FAULT_PROFILES), choices=sorted(FAULT_PROFILES) + ["baseline"],
+                        help="FAULT_PROFILES entries to run (a fault-free baseline always runs first)")
+    parser.add_argument("--artworks", type=int, default=12, help="Artworks per scenario")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--mode", choices=["full", "direct-video"], default="full")
+    parser.add_argument("--video", action="store_true", help="Include video stages in full mode")
+    parser.add_argument("--latency-scale", type=float, default=0.05, help="Multiplier for stand-in latencies and spikes")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    set_provider_mode("offline", latency_scale=args.latency_scale, seed=args.seed)
+    asyncio.run(main(args.profiles, args.artworks, args.concurrency, args.mode, args.video, args.latency_scale, args.seed))
@@ -0,0 +1,184 @@
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import resource
+import subprocess
+import time
+
+import structlog
+
+from utils.providers import set_provider_mode
+
+logger = structlog.get_logger()
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "results")
+RSS_SAMPLE_INTERVAL = 0.1  # Seconds between memory samples
+
+
+def current_rss_bytes() -> int:
+    """
+    Resident memory of this process plus its direct children (process pools).
+
+    Reads /proc on Linux; elsewhere falls back to the peak RSS of this process.
+    """
+    try:
+        pids = [str(os.getpid())]
+        for task in os.listdir("/proc/self/task"):
+            with open(f"/proc/self/task/{task}/children") as f:
+                pids += f.read().split()
+        total = 0
+        for pid in pids:
+            try:
+                with open(f"/proc/{pid}/statm") as f:
+                    total += int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+            except OSError:
+                pass  # Child exited between listing and reading
+        return total
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+async def sample_peak_rss(peak: dict):
+    """Record the highest RSS seen until cancelled."""
+    while True:
+        peak["bytes"] = max(peak["bytes"], current_rss_bytes())
+        await asyncio.sleep(RSS_SAMPLE_INTERVAL)
+
+
+def stage_percentiles(snapshot: dict) -> dict:
+    """p50/p99 of successful calls per stage from a metrics snapshot."""
+    stages = {}
+    for key, stats in snapshot.get("artwork_stage_latency_seconds", {}).items():
+        stage, status = key.split(",")
+        if status == "ok":
+            stages[stage] = {"count": stats["count"], "p50": stats["p50"], "p99": stats["p99"]}
+    return stages
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__))
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+async def run_level(concurrency: int, artworks: int, mode: str, generate_video: bool) -> dict:
+    """
+    Drive workflow.main with one batch at a given concurrency
+
+    Args:
+        concurrency: Artworks in flight
+        artworks: Batch size
+        mode: "full" or "direct-video"
+        generate_video: Include the video stages in full mode
+
+    Returns:
+        Throughput, stage latency percentiles, errors and peak RSS for the level
+    """
+    import workflow
+    from utils.metrics import registry
+    from utils.standins import STANDIN_HOST
+
+    registry.reset()
+    # Unique URLs per level so per-image caches don't carry over between levels
+    urls = [f"https://{STANDIN_HOST}/art/c{concurrency}-{i}" for i in range(artworks)]
+    peak = {"bytes": current_rss_bytes()}
+    sampler = asyncio.create_task(sample_peak_rss(peak))
+    start = time.perf_counter()
+    try:
+        results = await workflow.main(artwork_urls=urls, generate_video=generate_video, mode=mode, concurrency=concurrency) or []
+    finally:
+        elapsed = time.perf_counter() - start
+        sampler.cancel()
+
+    succeeded = sum(1 for r in results if not r.error)
+    snapshot = registry.snapshot()
+    level = {
+        "concurrency": concurrency,
+        "artworks": artworks,
+        "succeeded": succeeded,
+        "seconds": round(elapsed, 2),
+        "artworks_per_minute": round(succeeded / elapsed * 60, 2) if elapsed else 0.0,
+        "peak_rss_mb": round(peak["bytes"] / 2**20, 1),
+        "stages": stage_percentiles(snapshot),
+        "errors": snapshot.get("artwork_stage_errors_total", {}),
+    }
+    logger.info(f"concurrency={concurrency}: {level['artworks_per_minute']} artworks/min, {succeeded}/{artworks} ok, peak RSS {level['peak_rss_mb']} MB")
+    return level
+
+
+async def main(concurrency_levels, artworks: int, mode: str, generate_video: bool, latency_scale: float, seed: int):
+    from agents_def.video_agents import video_generator
+    # Poll Veo stand-in operations on the same compressed time scale
+    video_generator.poll_interval = max(0.05, video_generator.poll_interval * latency_scale)
+
+    levels = []
+    for concurrency in concurrency_levels:
+        levels.append(await run_level(concurrency, artworks, mode, generate_video))
+
+    report = {
+        "timestamp": datetime.datetime.now().isoformat(),
+        "git_commit": git_commit(),
+        "settings": {
+            "mode": mode,
+            "generate_video": generate_video,
+            "artworks": artworks,
+            "latency_scale": latency_scale,
+            "seed": seed,
+        },
+        "levels": levels,
+    }
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output_file = os.path.join(RESULTS_DIR, f"throughput_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output_file, "w") as f:
+        json.dump(report, f, indent=2)
+    print(json.dumps([{k: v for k, v in level.items() if k not in ("stages", "errors")} for level in levels], indent=2))
+    print(f"Results saved to {output_file}")
+
+
+def compare(baseline_file: str, candidate_file: str):
+    """Print throughput, p99 stage latency and memory changes between two result files."""
+    with open(baseline_file) as f:
+        baseline = json.load(f)
+    with open(candidate_file) as f:
+        candidate = json.load(f)
+    print(f"{baseline['git_commit']} -> {candidate['git_commit']}")
+    baseline_levels = {level["concurrency"]: level for level in baseline["levels"]}
+    for level in candidate["levels"]:
+        old = baseline_levels.get(level["concurrency"])
+        if old is None:
+            continue
+        change = (level["artworks_per_minute"] - old["artworks_per_minute"]) / old["artworks_per_minute"] * 100 if old["artworks_per_minute"] else 0.0
+        print(f"concurrency {level['concurrency']}: {old['artworks_per_minute']} -> {level['artworks_per_minute']} artworks/min ({change:+.1f}%), "
+              f"peak RSS {old['peak_rss_mb']} -> {level['peak_rss_mb']} MB")
+        for stage, stats in sorted(level["stages"].items()):
+            if stage in old["stages"]:
+                print(f"  {stage}: p99 {old['stages'][stage]['p99']}s -> {stats['p99']}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline end-to-end throughput benchmark using provider stand-ins")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 2, 4, 8], help="Concurrency levels to run")
+    parser.add_argument("--artworks", type=int, default=16, help="Artworks per level")
+    parser.add_argument("--mode", choices=["full", "direct-video"], default="full")
+    parser.add_argument("--video", action="store_true", help="Include video stages in full mode")
+    parser.add_argument("--latency-scale", type=float, default=0.05, help="Multiplier for stand-in latencies (1.0 = realistic)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Failure probability applied to every stand-in provider")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--compare", nargs=2, metavar=("BASELINE", "CANDIDATE"), help="Compare two result files instead of running")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+    else:
+        failure_rates = None
+        if args.failure_rate:
+            from config import STANDIN_LATENCY
+            failure_rates = {provider: args.failure_rate for provider in STANDIN_LATENCY}
+        set_provider_mode("offline", latency_scale=args.latency_scale, failure_rates=failure_rates, seed=args.seed)
+        asyncio.run(main(args.concurrency, args.artworks, args.mode, args.video, args.latency_scale, args.seed))
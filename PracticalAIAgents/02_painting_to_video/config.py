@@ -4,14 +4,208 @@ DEBUG = True
 # Content settings
 MAX_CONTENT_LENGTH = 2500  # Maximum length of crawled content
 
+# Preflight settings (cheap URL checks before any agent runs, see utils/preflight.py)
+PREFLIGHT_ENABLED = True
+PREFLIGHT_TIMEOUT = 3  # Seconds per HEAD/GET probe
+PREFLIGHT_MAX_REDIRECTS = 5
+PREFLIGHT_CONTENT_TYPES = ['text/html', 'application/xhtml+xml']
+PREFLIGHT_ALLOW_UNLISTED = False  # Accept URLs on hosts outside PREFLIGHT_MUSEUMS (content checks still apply)
+PREFLIGHT_MUSEUMS = {  # Museum -> hosts its pages (and redirects) may be on, and regexes an artwork page path must match
+    "met": {"hosts": ["metmuseum.org"], "paths": [r"^/art/collection/search/\d+"]},
+    "artic": {"hosts": ["artic.edu"], "paths": [r"^/artworks/\d+"]},
+    "rijksmuseum": {"hosts": ["rijksmuseum.nl"], "paths": [r"^/(en|nl)/(collectie|collection)/[\w-]+"]},
+    "nga": {"hosts": ["nga.gov"], "paths": [r"^/collection/art-object-page\.\d+", r"^/artworks/\d+"]},
+    "artgallerytheone": {"hosts": ["artgallerytheone.com"], "paths": [r"^/products/[\w-]+"]},
+}
+
 # Image settings
 MINIMUM_IMAGE_SIZE = 1024  # Minimum width/height for high-res images
 PREFERRED_IMAGE_FORMATS = ['.jpg', '.jpeg', '.png', '.webp']
+IMAGE_SELECTION_ENABLED = True  # Probe the page's images and pick the source image by the rules above before downloading
+IMAGE_PROBE_BYTES = 32 * 1024  # Bytes fetched per candidate (HTTP Range) to read its dimensions and format
+IMAGE_PROBE_TIMEOUT = 5  # Seconds per candidate probe
+IMAGE_PROBE_MAX_CANDIDATES = 12  # Candidate images probed per artwork
 
 # Model settings
 DEFAULT_MODEL = "gpt-4.1"
+COORDINATOR_DIRECT_TOOLS = True  # Call stage function tools directly instead of via gpt-4o-mini wrapper agents
 PROMPT_MODEL = "gpt-4.1"
 PROMPT_TEMPERATURE = 0.7  # Temperature for creative prompt generation
+PROMPT_LOCAL_ANALYSIS = True  # Measure palette/tone/composition locally and add it to the image prompt request
+PROMPT_STREAMING = True  # Stream prompt generation, reporting the text to progress listeners as it forms
+PROMPT_STREAM_INTERVAL = 0.25  # Seconds between prompt progress events (deltas in between are merged)
+PROMPT_BATCH_MODE = "off"  # Send prompt requests through the OpenAI Batch API: "off", "bulk" (bulk-class work) or "always"
+PROMPT_IMAGE_DETAIL = "low"  # Vision detail when local analysis is available: 'low', 'high', 'auto' or None (text-only)
+
+# Metrics settings
+METRICS_PORT = None  # Port for the local /metrics endpoint (None disables it)
+
+# Provider settings
+PROVIDER_MODE = "live"  # "live", "offline" for in-process stand-ins (utils/standins.py), or "record"/"replay" a cassette
+VIDEO_POLL_INTERVAL = 10  # Seconds between Veo operation polls
+VIDEO_TIMEOUT = 600  # Seconds to wait for a Veo operation before cancelling it
+PROVIDER_CONCURRENCY = {  # Generator calls in flight per provider across the whole process (None/0 = unlimited)
+    "openai": 16,
+    "imagen": 4,
+    "veo": 2,
+}
+# Priority classes sharing those slots (and the daemon/service artwork slots), see utils/scheduler.py.
+# weight: fair-queuing share while classes compete; max_share: fraction of a resource's slots the class
+# may hold at once; preempts: classes whose queued work waits while this class has work queued
+PRIORITY_CLASSES = {
+    "interactive": {"weight": 8, "max_share": 1.0, "preempts": ["bulk"]},
+    "bulk": {"weight": 1, "max_share": 0.75},
+}
+PROVIDER_CLASS_SHARES = {  # Per-provider max_share overrides, e.g. keep half of Veo free of bulk work
+    "veo": {"bulk": 0.5},
+}
+DEFAULT_PRIORITY_CLASS = "interactive"  # Class of CLI runs and of single-artwork jobs submitted without one
+BATCH_PRIORITY_CLASS = "bulk"  # Class of multi-artwork jobs submitted without one
+DEFAULT_TENANT = "default"
+TENANT_WEIGHTS = {}  # Fair-queuing weight per tenant within a class (default 1)
+
+# Offline stand-in settings
+STANDIN_LATENCY = {  # (median, p99) seconds per provider, drawn from a lognormal
+    "openai": (1.2, 6.0),
+    "imagen": (7.0, 18.0),
+    "veo_submit": (1.0, 3.0),
+    "veo": (60.0, 150.0),
+    "upload": (0.8, 3.0),
+    "download": (0.4, 2.0),
+    "crawl": (2.0, 8.0),
+    "preflight": (0.1, 0.5),
+    "batch": (20.0, 90.0),
+}
+STANDIN_FAILURE_RATES = {}  # Provider -> probability a call fails (e.g. {"openai": 0.02}); "veo" fails the operation, "veo_submit" the submit
+STANDIN_LATENCY_SCALE = 1.0  # Multiplier for all stand-in latencies (benchmarks shrink it)
+STANDIN_TEXT_WORDS = 120  # Words in stand-in text responses
+STANDIN_FIRST_TOKEN_SHARE = 0.3  # Share of a streamed stand-in response's latency before its first event
+STANDIN_VIDEO_BYTES = 2 * 1024 * 1024  # Size of stand-in video downloads
+
+# Profiling settings (--profile / --profile-stages)
+PROFILE_STALL_THRESHOLD = 0.1  # Event-loop stalls longer than this (seconds) are recorded with stack traces
+PROFILE_WATCH_INTERVAL = 0.02  # Seconds between loop heartbeats, and between stack samples during a stall
+PROFILE_SAMPLE_INTERVAL = 0.005  # Seconds between stage sampler stack samples
+PROFILE_TOP_SITES = 10  # Blocking call sites listed in the exit summary
+
+# Fault injection settings (utils/faults.py), applied by the offline stand-ins
+FAULT_PROFILE = None  # Name of a FAULT_PROFILES entry to inject, or None
+FAULT_SPIKE_SECONDS = 30.0  # Extra latency of an injected spike (scaled like stand-in latencies)
+FAULT_PROFILES = {  # Target (stand-in provider or "stage:<name>") -> fault kind -> probability
+    "openai_rate_limited": {"openai": {"error_429": 0.3}},
+    "openai_latency_spikes": {"openai": {"latency_spike": 0.2}},
+    "openai_refusals": {"openai": {"rai_filtered": 0.1}},
+    "imagen_errors": {"imagen": {"error_429": 0.2, "error_500": 0.1}},
+    "imagen_rai_filtered": {"imagen": {"rai_filtered": 0.3}},
+    "veo_submit_rate_limited": {"veo_submit": {"error_429": 0.3}},
+    "veo_rai_filtered": {"veo": {"rai_filtered": 0.3}},
+    "veo_hangs": {"veo": {"hang": 0.2}},
+    "truncated_downloads": {"download": {"truncate": 0.3}},
+    "crawl_failures": {"crawl": {"error_500": 0.2, "latency_spike": 0.2}},
+    "prompt_stage_errors": {"stage:text_generation": {"error_500": 0.3}},
+}
+
+# Record/replay settings (utils/cassette.py)
+CASSETTE_DIR = None  # Cassette directory; None uses utils/outputs/cassettes/latest
+CASSETTE_BLOB_THRESHOLD = 16 * 1024  # Response bodies larger than this (or binary) are stored as content-addressed blobs
+REPLAY_TIMING = "original"  # "original" waits each call's recorded duration, "fast" answers immediately
+
+# Local trace store settings
+TRACE_STORE_ENABLED = True
+TRACE_STORE_PATH = None  # SQLite file for spans (None uses utils/outputs/traces.db)
+TRACE_STORE_SPAN_TYPES = ['agent', 'function', 'generation', 'response', 'handoff', 'custom']
+TRACE_EXPORT_HOSTED = True  # Also send traces to the hosted backend (disable on air-gapped machines)
+
+# Cost settings
+# USD per 1M tokens ("input", "cached_input", "output") or per image / video second ("per_unit")
+MODEL_PRICING = {
+    "gpt-4.1": {"input": 2.00, "cached_input": 0.50, "output": 8.00},
+    "gpt-4o-mini": {"input": 0.15, "cached_input": 0.075, "output": 0.60},
+    "imagen-3.0-generate-002": {"per_unit": 0.03},
+    "veo-2.0-generate-001": {"per_unit": 0.50},
+}
+COST_BUDGET_USD = None  # Abort an artwork run above this spend (None = unlimited)
+COST_BUDGET_TOKENS = None  # Abort an artwork run above this many LLM tokens
+COST_BUDGET_CALLS = None  # Abort an artwork run above this many provider calls
+BATCH_COST_BUDGET_USD = None  # Abort a whole batch above this spend
+BATCH_CONCURRENCY = 2  # Artworks processed at once in batch mode
+BATCH_API_PRICE_FACTOR = 0.5  # Batch API calls cost this fraction of MODEL_PRICING
+
+# Batch API settings (prompt requests parked for OpenAI Batch jobs, see utils/text_batch.py)
+TEXT_BATCH_WINDOW = 60  # Seconds to collect requests before submitting them as one batch
+TEXT_BATCH_MAX_REQUESTS = 1000  # Requests per batch
+TEXT_BATCH_MAX_BYTES = 100 * 1024 * 1024  # Batch file size (image inputs travel as data URLs; the API allows 200 MB)
+TEXT_BATCH_POLL_INTERVAL = 30  # Seconds between batch status polls
+
+# Catalog ingestion settings (Met Open Access CSV driving batch runs, see ingest.py)
+CATALOG_CHUNK_SIZE = 50  # Catalog rows handed to the batch pipeline at a time
+CATALOG_OBJECT_API = "https://collectionapi.metmuseum.org/public/collection/v1/objects/{object_id}"  # Looks up primaryImage (not in the CSV)
+CATALOG_IMAGE_TIMEOUT = 10  # Seconds per object API lookup
+CATALOG_LOOKUP_CONCURRENCY = 8  # Object API lookups in flight (the API allows 80 requests per second)
+
+# Daemon settings (warm worker accepting jobs over a Unix socket, see daemon.py)
+DAEMON_SOCKET_PATH = None  # Unix socket path (None uses utils/outputs/daemon.sock)
+DAEMON_MAX_REQUEST_BYTES = 16 * 1024 * 1024  # Longest request line accepted (about 200,000 artwork URLs in one submit)
+DAEMON_CONCURRENCY = 4  # Artworks processed at once across all submitted jobs
+DAEMON_JOB_HISTORY = 100  # Finished jobs kept for status and watch requests
+
+# HTTP service settings (see service.py; artwork slots and job history follow the daemon settings)
+SERVICE_HOST = "127.0.0.1"
+SERVICE_PORT = 8080
+SERVICE_QUEUE_SIZE = 32  # Artworks waiting or running before new jobs get 429
+SERVICE_RETRY_AFTER = 30  # Retry-After seconds sent with 429
+SERVICE_SSE_KEEPALIVE = 15  # Seconds between SSE comment pings on an idle stream
+SERVICE_MAX_BATCH = 100  # Artwork URLs accepted in one job
+
+# Worker fleet settings (processes leasing artwork jobs from a shared SQLite queue, see fleet.py)
+JOB_QUEUE_PATH = None  # SQLite file (None uses utils/outputs/job_queue.db); on a shared filesystem for multi-host fleets
+JOB_QUEUE_JOURNAL_MODE = "WAL"  # "WAL" when every worker is on one host; "DELETE" for a queue file shared across hosts (WAL needs shared memory)
+JOB_QUEUE_SHARDS = 64  # URL-hash shards; worker i of n leases shards with shard % n == i first
+JOB_QUEUE_STEAL = True  # Lease other workers' shards when the own ones are empty
+JOB_QUEUE_LEASE_SECONDS = 120  # A job is handed out again if its worker misses heartbeats this long
+JOB_QUEUE_HEARTBEAT = 30  # Seconds between lease renewals
+JOB_QUEUE_MAX_ATTEMPTS = 3  # Leases before a failing job is marked failed
+JOB_QUEUE_RETRY_BACKOFF = 30  # Seconds before the first retry, doubled per attempt
+JOB_QUEUE_POLL_INTERVAL = 2  # Seconds between lease attempts while the queue is empty
+WORKER_CONCURRENCY = 2  # Artworks in flight per worker process
 
 # Workflow settings
-WORKFLOW_NAME = "Artwork to Image Generation" 
\ No newline at end of file
+WORKFLOW_NAME = "Artwork to Image Generation" 
+DIRECT_VIDEO_WORKFLOW_NAME = "Artwork to Video (direct)"
+
+# Rendition settings (thumbnails and compact copies of saved images)
+RENDITIONS_ENABLED = True
+RENDITION_THUMBNAIL_SIZES = [256, 768]  # Longest edge in pixels
+RENDITION_FORMATS = ['webp', 'avif']  # Full-size compact copies
+RENDITION_QUALITY = 80
+RENDITION_WORKERS = 2  # Processes in the encode pool
+RENDITION_QUEUE_SIZE = 16  # Pending images before new ones are skipped
+RENDITION_SUBMIT_TIMEOUT = 0  # Seconds save_image waits for a queue slot (0 skips the image at once when the queue is full)
+RENDITION_MAX_POOL_RESTARTS = 3  # Broken encode pools (e.g. a worker OOM-killed) replaced before renditions are disabled
+
+# Artifact settings (in-memory handoff of image bytes between stages)
+ARTIFACT_CACHE_MAX_BYTES = 256 * 1024 * 1024  # Image bytes kept in memory for later stages
+ARTIFACT_MAX_FAILED = 16  # Artifacts whose disk write failed kept in memory anyway (oldest dropped first)
+ARTIFACT_PERSIST_WORKERS = 2  # Threads writing artifacts to disk in the background
+
+# Video source image reuse (upload once, reference by URI across Veo jobs)
+# Only Vertex AI clients (GOOGLE_GENAI_USE_VERTEXAI=true) accept an image by URI; the Gemini Developer API takes inline bytes only
+IMAGE_REFERENCE_CACHE_ENABLED = False
+IMAGE_REFERENCE_UPLOADER = "gcs"  # "gcs" (Cloud Storage, Vertex AI) or "local" (offline stand-in only)
+IMAGE_REFERENCE_GCS_BUCKET = None  # Bucket the "gcs" uploader writes to
+IMAGE_REFERENCE_GCS_PREFIX = "veo-inputs"  # Object name prefix in that bucket
+IMAGE_REFERENCE_TTL = 47 * 3600  # Seconds a reference is reused before it is uploaded again
+IMAGE_REFERENCE_REFRESH_MARGIN = 600  # Re-upload when fewer seconds than this remain
+
+# Local image analysis settings
+ANALYSIS_WORKERS = 2  # Processes in the analysis pool
+ANALYSIS_PALETTE_SIZE = 6  # Dominant colors extracted with k-means
+ANALYSIS_CACHE_SIZE = 512  # Analyses kept per image hash
+
+# Perceptual hashing (near-duplicate sources and generated images, see utils/perceptual_hash.py)
+PHASH_ENABLED = True
+PHASH_INDEX_PATH = None  # Append-only binary hash file (None uses utils/outputs/phash_index.bin); refs go beside it in phash_index.refs
+PHASH_SOURCE_DISTANCE = 8  # Max differing bits (of 64, in both pHash and dHash) for two sources to be the same picture
+PHASH_OUTPUT_DISTANCE = 6  # Max differing bits for a generated image to be flagged as redundant
+PHASH_REUSE_OUTPUTS = True  # Reuse the image/video generated for a duplicate source instead of generating again
+PHASH_URL_CACHE_SIZE = 4096  # Source hashes remembered per image URL
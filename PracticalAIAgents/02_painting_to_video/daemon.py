@@ -0,0 +1,296 @@
+import asyncio
+import argparse
+import json
+import os
+import signal
+import socket
+import sys
+from typing import Optional
+
+from config import DAEMON_SOCKET_PATH, DAEMON_MAX_REQUEST_BYTES, METRICS_PORT, PRIORITY_CLASSES
+
+# Serve and submit share this module; only serve pays for the SDK imports
+DEFAULT_SOCKET_PATH = DAEMON_SOCKET_PATH or os.path.join(os.path.dirname(os.path.abspath(__file__)), "utils", "outputs", "daemon.sock")
+
+# Protocol: the client sends one JSON request per connection, e.g.
+#   {"op": "submit", "artwork_urls": [...], "generate_video": false, "mode": "full", "priority": "bulk", "tenant": "...", "watch": true}
+#   {"op": "status"} / {"op": "status", "job_id": "..."}
+#   {"op": "watch", "job_id": "..."}
+# (at most DAEMON_MAX_REQUEST_BYTES long) and reads newline-delimited JSON events until
+# the daemon closes the connection.
+
+
+async def _send(writer: asyncio.StreamWriter, message: dict):
+    writer.write((json.dumps(message) + "\n").encode("utf-8"))
+    await writer.drain()
+
+
+async def _stream_job(writer: asyncio.StreamWriter, job):
+    async for event in job.stream():
+        await _send(writer, event)
+
+
+async def _read_request(reader: asyncio.StreamReader) -> Optional[bytes]:
+    """The request line, or None if it is longer than the reader's limit."""
+    try:
+        return await reader.readuntil(b"\n")
+    except asyncio.IncompleteReadError as e:
+        return e.partial  # Client closed without a newline; take what arrived
+    except asyncio.LimitOverrunError as e:
+        overrun = e
+    # Read past the rest of the line, so the client is not cut off mid-send and gets the error
+    while True:
+        await reader.readexactly(overrun.consumed)
+        try:
+            await reader.readuntil(b"\n")
+            return None
+        except asyncio.IncompleteReadError:
+            return None
+        except asyncio.LimitOverrunError as e:
+            overrun = e
+
+
+async def handle_client(manager, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """Answer one client request over the socket."""
+    try:
+        line = await _read_request(reader)
+        if line is None:
+            await _send(writer, {"type": "error", "error": f"Request longer than {DAEMON_MAX_REQUEST_BYTES} bytes; split the URLs over several jobs"})
+            return
+        try:
+            request = json.loads(line)
+        except ValueError:
+            await _send(writer, {"type": "error", "error": "Request must be one line of JSON"})
+            return
+        if not isinstance(request, dict):
+            await _send(writer, {"type": "error", "error": "Request must be a JSON object"})
+            return
+        op = request.get("op")
+        if op == "submit":
+            urls = request.get("artwork_urls") or []
+            mode = request.get("mode", "full")
+            if not urls or mode not in ("full", "direct-video"):
+                await _send(writer, {"type": "error", "error": "submit needs artwork_urls and a mode of full or direct-video"})
+                return
+            try:
+                job = manager.submit(urls, bool(request.get("generate_video")), mode, request.get("priority"), request.get("tenant"))
+            except ValueError as e:
+                await _send(writer, {"type": "error", "error": str(e)})
+                return
+            await _send(writer, {"type": "accepted", "job_id": job.job_id})
+            if request.get("watch", True):
+                await _stream_job(writer, job)
+        elif op == "status":
+            if request.get("job_id"):
+                job = manager.get(request["job_id"])
+                await _send(writer, {"type": "status", "job": job.summary()} if job else {"type": "error", "error": f"Unknown job {request['job_id']}"})
+            else:
+                from utils.limits import provider_limits
+                await _send(writer, {
+                    "type": "status",
+                    "jobs": [job.summary() for job in manager.jobs.values()],
+                    "scheduler": {"artworks": manager.slots.snapshot(), **provider_limits.snapshot()},
+                })
+        elif op == "watch":
+            job = manager.get(request.get("job_id"))
+            if job is None:
+                await _send(writer, {"type": "error", "error": f"Unknown job {request.get('job_id')}"})
+                return
+            await _stream_job(writer, job)
+        else:
+            await _send(writer, {"type": "error", "error": f"Unknown op {op!r}, expected submit, status or watch"})
+    except (ConnectionResetError, BrokenPipeError):
+        pass  # Client went away; its job keeps running
+    finally:
+        # Half-close explicitly: pool workers forked mid-request hold a copy of the socket,
+        # so close() alone would not reach the client
+        if not writer.is_closing() and writer.can_write_eof():
+            try:
+                await writer.drain()
+                writer.write_eof()
+            except (ConnectionResetError, BrokenPipeError):
+                pass
+        writer.close()
+
+
+async def serve(socket_path: str, metrics_port: int = METRICS_PORT):
+    """
+    Warm up once, then accept jobs on the Unix socket until SIGINT/SIGTERM
+
+    Args:
+        socket_path: Path of the Unix socket to listen on
+        metrics_port: Serve Prometheus metrics on this port while running (None disables)
+    """
+    import structlog
+    from utils.jobs import JobManager, warm_up, cool_down
+
+    logger = structlog.get_logger()
+    await warm_up(metrics_port)
+
+    manager = JobManager()
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)  # Stale socket from a daemon that did not shut down cleanly
+    os.makedirs(os.path.dirname(socket_path), exist_ok=True)
+    server = await asyncio.start_unix_server(lambda r, w: handle_client(manager, r, w), path=socket_path, limit=DAEMON_MAX_REQUEST_BYTES)
+    os.chmod(socket_path, 0o600)
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    logger.info(f"Daemon ready on {socket_path} ({manager.concurrency} artworks at once)")
+    try:
+        await stop.wait()
+    finally:
+        logger.info("Daemon shutting down")
+        server.close()
+        await cool_down(manager)
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+
+def request(socket_path: str, message: dict):
+    """
+    Send one request to the daemon and yield its events
+
+    Args:
+        socket_path: Path of the daemon's Unix socket
+        message: The request
+
+    Yields:
+        Each JSON event the daemon sends
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            sys.exit(f"No daemon listening on {socket_path}; start one with: python daemon.py serve")
+        try:
+            sock.sendall((json.dumps(message) + "\n").encode("utf-8"))
+            with sock.makefile("r", encoding="utf-8") as events:
+                for line in events:
+                    if not line.endswith("\n"):
+                        return  # Cut off mid-event
+                    yield json.loads(line)
+        except (ConnectionResetError, BrokenPipeError):
+            return
+
+
+def print_event(event: dict):
+    """One line of human-readable progress"""
+    kind = event["type"]
+    url = event.get("artwork_url", "")
+    if kind == "accepted":
+        print(f"Job {event['job_id']} accepted")
+    elif kind == "stage":
+        seconds = f" in {event['seconds']}s" if "seconds" in event else ""
+        print(f"  {url}: {event['stage']} {event['status']}{seconds}")
+    elif kind == "prompt_done":
+        # Deltas (prompt_delta) of concurrent artworks would interleave; --json shows them
+        print(f"  {url}: {event['prompt']} prompt: {event['text'][:100]}...")
+    elif kind == "artwork_queued":
+        print(f"  {url}: queued")
+    elif kind == "result":
+        result = event["result"]
+        if result["error"]:
+            print(f"  {url}: error: {result['error']}")
+        else:
+            print(f"  {url}: {result['artwork_details'].get('title')} by {result['artwork_details'].get('artist')}")
+            for key in ("generated_image_path", "generated_video_path"):
+                if result.get(key):
+                    print(f"    {key}: {result[key]}")
+    elif kind == "job_done":
+        summary = event["summary"]
+        print(f"Job {event['job_id']} {event['status']}: {summary['completed'] - summary['failed']}/{summary['artworks']} succeeded, ${summary['cost_usd']:.4f}")
+    elif kind == "status":
+        for job in event.get("jobs", [event.get("job")]):
+            print(f"{job['job_id']}  {job['status']:<9} {job['completed']}/{job['artworks']} artworks  {job['mode']:<12} {job['priority']:<11} {job['tenant']:<10} ${job['cost_usd']:.4f}  {job['submitted_at']}")
+        for resource, state in event.get("scheduler", {}).items():
+            classes = "  ".join(f"{cls} {c['in_flight']}/{c['limit']} running, {c['waiting']} waiting" for cls, c in state["classes"].items())
+            print(f"  {resource:<10} {state['capacity']} slots: {classes}")
+    elif kind == "error":
+        print(f"Error: {event['error']}", file=sys.stderr)
+
+
+def _final_event(message: dict) -> str:
+    """Type of the event that completes the answer to a request"""
+    if message["op"] == "status":
+        return "status"
+    if message["op"] == "submit" and not message.get("watch", True):
+        return "accepted"
+    return "job_done"
+
+
+def run_client(socket_path: str, message: dict, as_json: bool) -> int:
+    """Print the daemon's events; returns the exit code (non-zero if the stream ended early)"""
+    status = 0
+    final_event = _final_event(message)
+    finished = False
+    for event in request(socket_path, message):
+        if as_json:
+            print(json.dumps(event), flush=True)
+        else:
+            print_event(event)
+            sys.stdout.flush()
+        if event["type"] == "error" or (event["type"] == "job_done" and (event["status"] != "done" or event["summary"]["failed"])):
+            status = 1
+        finished = finished or event["type"] in (final_event, "error")
+    if not finished:
+        print("Error: the daemon closed the connection before answering (did it shut down?)", file=sys.stderr)
+        status = 1
+    return status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Warm worker daemon: keep the SDKs, clients and crawler loaded and accept jobs over a Unix socket")
+    parser.add_argument("--socket", default=DEFAULT_SOCKET_PATH, help="Unix socket path")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="Start the daemon")
+    serve_parser.add_argument("--offline", action="store_true", help="Use in-process stand-ins instead of the live providers (no API spend)")
+    serve_parser.add_argument("--metrics-port", type=int, default=METRICS_PORT, help="Serve Prometheus-style metrics on this port")
+    serve_parser.add_argument("--batch-api", choices=["off", "bulk", "always"], default=None,
+                              help="Send prompt requests through the OpenAI Batch API: bulk-class jobs only, or all (default: PROMPT_BATCH_MODE)")
+
+    submit_parser = commands.add_parser("submit", help="Submit a job and stream its progress")
+    source = submit_parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--url", type=str, help="URL of the artwork page to process")
+    source.add_argument("--urls-file", type=str, help="Submit every artwork URL in this file (one per line) as one job")
+    submit_parser.add_argument("--video", action="store_true", help="Generate video if this flag is set")
+    submit_parser.add_argument("--mode", choices=["full", "direct-video"], default="full")
+    submit_parser.add_argument("--priority", choices=sorted(PRIORITY_CLASSES), default=None,
+                               help="Priority class (default: interactive for --url, bulk for --urls-file)")
+    submit_parser.add_argument("--tenant", default=None, help="Tenant to share the class's slots fairly with")
+    submit_parser.add_argument("--detach", action="store_true", help="Print the job id and return without waiting")
+    submit_parser.add_argument("--json", action="store_true", help="Print raw JSON events")
+
+    status_parser = commands.add_parser("status", help="List jobs, or show one")
+    status_parser.add_argument("job_id", nargs="?")
+    status_parser.add_argument("--json", action="store_true", help="Print raw JSON")
+
+    watch_parser = commands.add_parser("watch", help="Stream a job's progress (from the start) until it finishes")
+    watch_parser.add_argument("job_id")
+    watch_parser.add_argument("--json", action="store_true", help="Print raw JSON events")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        from utils.providers import set_provider_mode
+        if args.offline:
+            set_provider_mode("offline")
+        if args.batch_api:
+            from utils.text_batch import set_batch_mode
+            set_batch_mode(args.batch_api)
+        asyncio.run(serve(args.socket, args.metrics_port))
+    elif args.command == "submit":
+        if args.urls_file:
+            with open(args.urls_file) as f:
+                artwork_urls = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+        else:
+            artwork_urls = [args.url]
+        message = {"op": "submit", "artwork_urls": artwork_urls, "generate_video": args.video, "mode": args.mode,
+                   "priority": args.priority, "tenant": args.tenant, "watch": not args.detach}
+        sys.exit(run_client(args.socket, message, args.json))
+    elif args.command == "status":
+        sys.exit(run_client(args.socket, {"op": "status", "job_id": args.job_id}, args.json))
+    else:
+        sys.exit(run_client(args.socket, {"op": "watch", "job_id": args.job_id}, args.json))
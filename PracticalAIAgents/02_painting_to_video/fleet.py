@@ -0,0 +1,210 @@
+import asyncio
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+from typing import Dict
+
+import structlog
+
+from config import JOB_QUEUE_HEARTBEAT, JOB_QUEUE_POLL_INTERVAL, WORKER_CONCURRENCY
+from utils.job_queue import SQLiteJobQueue, DEFAULT_DB_PATH, owned_shards
+
+logger = structlog.get_logger()
+
+# Failed stages a retry cannot fix: the URL was rejected (a dead link, an off-site redirect) before any work
+PERMANENT_FAILURE_STAGES = {"preflight"}
+
+
+async def _heartbeats(queue: SQLiteJobQueue, worker_id: str, in_flight: Dict[int, asyncio.Task]):
+    """Renew the worker's leases; stop work whose lease another worker has taken over."""
+    while True:
+        await asyncio.sleep(JOB_QUEUE_HEARTBEAT)
+        lost = await asyncio.to_thread(queue.heartbeat, worker_id, list(in_flight))
+        for job_id in lost:
+            logger.warning(f"{worker_id}: lost the lease on job {job_id}, cancelling it")
+            task = in_flight.get(job_id)
+            if task:
+                task.cancel()
+
+
+async def run_worker(db_path: str, index: int, workers: int, concurrency: int = WORKER_CONCURRENCY, drain: bool = False):
+    """
+    Lease artwork jobs from the shared queue and process them until stopped
+
+    Args:
+        db_path: SQLite job queue file
+        index: This worker's position in the fleet (0-based), which picks its shards
+        workers: Number of workers in the fleet
+        concurrency: Artworks in flight in this process
+        drain: Exit once no job is queued or leased anywhere
+    """
+    import workflow
+    from utils.cost_ledger import CostLedger
+    from utils.jobs import warm_up
+    from utils.providers import stop_shared_crawler
+    from utils.renditions import shutdown_rendition_pipeline
+
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    queue = SQLiteJobQueue(db_path)
+    shards = owned_shards(index, workers, queue.shards)
+    await warm_up()
+
+    semaphore = asyncio.Semaphore(concurrency)
+    in_flight: Dict[int, asyncio.Task] = {}
+
+    async def process(job: Dict):
+        # Own ledger per job, so cost is known per attempt and nothing accumulates in the worker
+        ledger = CostLedger(f"job:{job['id']}", budget_usd=None, budget_tokens=None, budget_calls=None)
+        result = await workflow.run_batch_item(job["artwork_url"], job["generate_video"], job["mode"], ledger, semaphore)
+        if result.error:
+            permanent = result.failed_stage in PERMANENT_FAILURE_STAGES
+            status = await asyncio.to_thread(queue.fail, job["id"], worker_id, result.error, result.model_dump(), ledger.cost_usd, permanent=permanent)
+            logger.warning(f"{worker_id}: job {job['id']} attempt {job['attempts']} failed ({result.error}), now {status}")
+        elif await asyncio.to_thread(queue.complete, job["id"], worker_id, result.model_dump(), ledger.cost_usd):
+            logger.info(f"{worker_id}: job {job['id']} done (${ledger.cost_usd:.4f})")
+        else:
+            logger.warning(f"{worker_id}: job {job['id']} finished after its lease was lost, result discarded")
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    stopping = loop.create_task(stop.wait())
+    heartbeat = loop.create_task(_heartbeats(queue, worker_id, in_flight))
+    logger.info(f"{worker_id}: worker {index + 1}/{workers} ready, {len(shards)} of {queue.shards} shards, {concurrency} artworks at once")
+
+    try:
+        while not stop.is_set():
+            leased = await asyncio.to_thread(queue.lease, worker_id, shards, concurrency - len(in_flight))
+            for job in leased:
+                task = loop.create_task(process(job))
+                in_flight[job["id"]] = task
+                task.add_done_callback(lambda _, job_id=job["id"]: in_flight.pop(job_id, None))
+            if drain and not in_flight and await asyncio.to_thread(queue.unfinished) == 0:
+                logger.info(f"{worker_id}: queue drained")
+                break
+            if not leased or len(in_flight) >= concurrency:
+                # Wait for a free slot, new work (next poll) or shutdown
+                await asyncio.wait([stopping, *in_flight.values()], timeout=JOB_QUEUE_POLL_INTERVAL, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        heartbeat.cancel()
+        stopping.cancel()
+        unfinished = list(in_flight.items())
+        for job_id, task in unfinished:
+            task.cancel()
+            await asyncio.to_thread(queue.release, job_id, worker_id)
+        await asyncio.gather(*(task for _, task in unfinished), return_exceptions=True)
+        await stop_shared_crawler()
+        await asyncio.to_thread(shutdown_rendition_pipeline)
+        queue.close()
+
+
+def run_host(db_path: str, processes: int, host_index: int, hosts: int, concurrency: int, drain: bool, offline: bool) -> int:
+    """
+    Run this host's share of the fleet
+
+    One worker runs in this process; more are started as separate
+    `fleet.py worker --processes 1` processes, each taking its own slot
+    (host_index * processes + i of hosts * processes) and so its own shards.
+
+    Args:
+        db_path: SQLite job queue file
+        processes: Worker processes on this host
+        host_index: This host's position among the hosts sharing the queue
+        hosts: Hosts sharing the queue (each running the same number of processes)
+        concurrency: Artworks in flight per process
+        drain: Exit once the queue is empty
+        offline: Use the provider stand-ins
+
+    Returns:
+        Exit code (non-zero if a worker failed)
+    """
+    if processes == 1:
+        if offline:
+            from utils.providers import set_provider_mode
+            set_provider_mode("offline")
+        asyncio.run(run_worker(db_path, host_index, hosts, concurrency, drain))
+        return 0
+
+    # Separate interpreters rather than multiprocessing children, so each worker
+    # builds its own clients and crawler and runs the normal exit hooks (pool shutdown)
+    workers = []
+    for i in range(processes):
+        command = [
+            sys.executable, os.path.abspath(__file__), "--queue", db_path, "worker", "--processes", "1",
+            "--host-index", str(host_index * processes + i), "--hosts", str(hosts * processes),
+            "--concurrency", str(concurrency),
+        ] + (["--drain"] if drain else []) + (["--offline"] if offline else [])
+        workers.append(subprocess.Popen(command))
+
+    def forward(signum, frame):
+        for worker in workers:
+            if worker.poll() is None:
+                worker.send_signal(signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    codes = [worker.wait() for worker in workers]
+    failed = [i for i, code in enumerate(codes) if code not in (0, -signal.SIGTERM)]
+    if failed:
+        logger.error(f"Worker processes exited abnormally: {', '.join(f'#{i} ({codes[i]})' for i in failed)}")
+    return 1 if failed else 0
+
+
+def print_status(queue: SQLiteJobQueue):
+    counts = queue.counts()
+    print("  ".join(f"{status}: {counts.get(status, 0)}" for status in ("queued", "leased", "done", "failed")))
+    for job in queue.jobs(status="leased", limit=20):
+        print(f"  leased  #{job['id']:<6} attempt {job['attempts']}/{job['max_attempts']}  {job['lease_owner']}  {job['artwork_url']}")
+    for job in queue.jobs(status="failed", limit=20):
+        print(f"  failed  #{job['id']:<6} after {job['attempts']} attempts: {job['last_error']}  {job['artwork_url']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Worker fleet over a shared SQLite job queue")
+    parser.add_argument("--queue", default=DEFAULT_DB_PATH, help="SQLite job queue file (shared by every worker)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    enqueue_parser = commands.add_parser("enqueue", help="Add artwork jobs to the queue")
+    source = enqueue_parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--url", type=str, help="URL of the artwork page to process")
+    source.add_argument("--urls-file", type=str, help="Enqueue every artwork URL in this file (one per line)")
+    enqueue_parser.add_argument("--video", action="store_true", help="Generate video if this flag is set")
+    enqueue_parser.add_argument("--mode", choices=["full", "direct-video"], default="full")
+
+    worker_parser = commands.add_parser("worker", help="Run worker processes on this host")
+    worker_parser.add_argument("--processes", type=int, default=os.cpu_count() or 1, help="Worker processes on this host")
+    worker_parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY, help="Artworks in flight per process")
+    worker_parser.add_argument("--host-index", type=int, default=0, help="This host's position among the hosts sharing the queue")
+    worker_parser.add_argument("--hosts", type=int, default=1, help="Hosts sharing the queue")
+    worker_parser.add_argument("--drain", action="store_true", help="Exit once no job is queued or leased")
+    worker_parser.add_argument("--offline", action="store_true", help="Use in-process stand-ins instead of the live providers (no API spend)")
+
+    commands.add_parser("status", help="Job counts, current leases and failures")
+    results_parser = commands.add_parser("results", help="Finished jobs and their results")
+    results_parser.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+
+    if args.command == "enqueue":
+        if args.urls_file:
+            with open(args.urls_file) as f:
+                artwork_urls = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+        else:
+            artwork_urls = [args.url]
+        if not artwork_urls:
+            parser.error(f"No artwork URLs in {args.urls_file}")
+        ids = SQLiteJobQueue(args.queue).enqueue(artwork_urls, args.video, args.mode)
+        print(f"Enqueued {len(ids)} jobs ({ids[0]}-{ids[-1]})")
+    elif args.command == "worker":
+        if not 0 <= args.host_index < args.hosts:
+            parser.error("--host-index must be between 0 and --hosts - 1")
+        sys.exit(run_host(args.queue, args.processes, args.host_index, args.hosts, args.concurrency, args.drain, args.offline))
+    elif args.command == "status":
+        print_status(SQLiteJobQueue(args.queue))
+    else:
+        for job in SQLiteJobQueue(args.queue).jobs(status="done", limit=args.limit):
+            print(json.dumps({"id": job["id"], "artwork_url": job["artwork_url"], "attempts": job["attempts"], "cost_usd": job["cost_usd"], "result": job["result"]}))
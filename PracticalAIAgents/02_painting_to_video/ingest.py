@@ -0,0 +1,154 @@
+import asyncio
+import argparse
+import json
+import sys
+from itertools import islice
+from typing import Dict, List, Optional
+
+import structlog
+
+from config import CATALOG_CHUNK_SIZE, CATALOG_LOOKUP_CONCURRENCY, BATCH_CONCURRENCY, BATCH_COST_BUDGET_USD, TRACE_STORE_ENABLED
+from models.models import ArtworkDetails
+from utils.catalog import CatalogFilter, read_catalog, chunked, object_url, artwork_details, resolve_image_url
+from utils.providers import set_provider_mode
+from utils.renditions import shutdown_rendition_pipeline
+
+logger = structlog.get_logger()
+
+
+async def prefill_chunk(rows: List[Dict[str, str]]) -> Dict[str, ArtworkDetails]:
+    """
+    ArtworkDetails for a chunk of catalog rows, by object page URL
+
+    Image URLs missing from the rows are looked up concurrently
+    (CATALOG_LOOKUP_CONCURRENCY at a time); objects without an image are
+    dropped, since every pipeline mode needs one.
+    """
+    semaphore = asyncio.Semaphore(CATALOG_LOOKUP_CONCURRENCY)
+
+    async def lookup(row: Dict[str, str]) -> Optional[str]:
+        async with semaphore:
+            return await asyncio.to_thread(resolve_image_url, row)
+
+    image_urls = await asyncio.gather(*(lookup(row) for row in rows))
+    details = {}
+    for row, image_url in zip(rows, image_urls):
+        if image_url:
+            details[object_url(row)] = artwork_details(row, image_url)
+        else:
+            logger.info(f"Skipping {object_url(row)}: no Open Access image")
+    return details
+
+
+async def ingest(source: str, catalog_filter: CatalogFilter, chunk_size: int = CATALOG_CHUNK_SIZE, limit: Optional[int] = None,
+                 generate_video: bool = False, mode: str = "full", concurrency: int = BATCH_CONCURRENCY,
+                 metrics_port: Optional[int] = None, results_path: Optional[str] = None) -> Dict[str, int]:
+    """
+    Feed catalog rows to the batch pipeline chunk by chunk
+
+    Each chunk's details are prefilled from the catalog, so the crawl and the
+    extractor agent are skipped and the run starts at the prompt stage. All
+    chunks share one batch ledger; ingestion stops once BATCH_COST_BUDGET_USD
+    is spent.
+
+    Args:
+        source: Catalog CSV path (.csv or .csv.gz), or "-" for stdin
+        catalog_filter: Rows to process
+        chunk_size: Rows per batch run
+        limit: Stop after this many matching rows
+        generate_video: Flag to generate video (full mode only)
+        mode: "full" or "direct-video"
+        concurrency: Artworks processed at once within a chunk
+        metrics_port: Serve Prometheus metrics on this port while running (None disables)
+        results_path: Append each result to this JSONL file
+
+    Returns:
+        Counts of matched, skipped, processed and failed artworks
+    """
+    # Imported here, after the provider mode is set, since generators create their clients on import
+    from agents_def.artwork_agents import prefill_scope
+    from utils.cost_ledger import CostLedger, BudgetExceededError
+    from utils.metrics import start_metrics_server, write_run_summary
+    from utils.trace_store import enable_trace_store
+    from workflow import process_batch, log_result_summary, METRICS_DIR
+
+    if metrics_port:
+        start_metrics_server(metrics_port)
+    if TRACE_STORE_ENABLED:
+        enable_trace_store()
+
+    counts = {"matched": 0, "skipped": 0, "processed": 0, "failed": 0}
+    batch_ledger = CostLedger("catalog", budget_usd=BATCH_COST_BUDGET_USD, budget_tokens=None, budget_calls=None)
+    rows = read_catalog(source, catalog_filter)
+    results_file = open(results_path, "a") if results_path else None
+    try:
+        for number, chunk in enumerate(chunked(islice(rows, limit), chunk_size), 1):
+            counts["matched"] += len(chunk)
+            details = await prefill_chunk(chunk)
+            counts["skipped"] += len(chunk) - len(details)
+            if not details:
+                continue
+            logger.info(f"Chunk {number}: processing {len(details)} artworks")
+            with prefill_scope(details):
+                results = await process_batch(list(details), generate_video, mode, concurrency, ledger=batch_ledger, check_urls=False)
+            for url, result in zip(details, results):
+                log_result_summary(result)
+                counts["failed" if result.error else "processed"] += 1
+                if results_file:
+                    results_file.write(json.dumps({"artwork_url": url, **result.model_dump()}) + "\n")
+            if results_file:
+                results_file.flush()
+            logger.info(f"Chunk {number} done; {counts['processed']} processed, {counts['failed']} failed so far, ${batch_ledger.cost_usd:.4f} spent")
+            try:
+                batch_ledger.check()
+            except BudgetExceededError as e:
+                logger.error(f"Stopping ingestion: {str(e)}")
+                break
+    finally:
+        if results_file:
+            results_file.close()
+        await asyncio.to_thread(shutdown_rendition_pipeline)
+        write_run_summary(METRICS_DIR, {
+            "catalog": source,
+            "mode": mode,
+            "generate_video": generate_video,
+            "counts": counts,
+            "cost": batch_ledger.summary(),
+        })
+    logger.info(f"Ingestion finished: {counts['matched']} matched, {counts['skipped']} skipped, {counts['processed']} processed, {counts['failed']} failed")
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the pipeline over a Met Open Access catalog (MetObjects.csv) instead of pasted URLs")
+    parser.add_argument("catalog", help="MetObjects.csv (or .csv.gz, or a similar dump); - reads stdin")
+    parser.add_argument("--department", action="append", default=[], help="Keep this department (repeatable), e.g. 'European Paintings'")
+    parser.add_argument("--date-from", type=int, default=None, help="Keep objects made in or after this year (negative for BCE)")
+    parser.add_argument("--date-to", type=int, default=None, help="Keep objects made in or before this year")
+    parser.add_argument("--public-domain", action="store_true", help="Keep only public-domain (Open Access) objects")
+    parser.add_argument("--medium", action="append", default=[], help="Keep objects whose medium contains this text (repeatable), e.g. 'oil on canvas'")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after this many matching objects")
+    parser.add_argument("--chunk-size", type=int, default=CATALOG_CHUNK_SIZE, help="Objects handed to the batch pipeline at a time")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY, help="Artworks processed at once within a chunk")
+    parser.add_argument("--list", action="store_true", help="Print the matching object URLs (for main.py --urls-file or fleet.py enqueue) and exit")
+    parser.add_argument("--video", action="store_true", help="Generate video if this flag is set")
+    parser.add_argument("--mode", choices=["full", "direct-video"], default="full")
+    parser.add_argument("--results", metavar="JSONL", default=None, help="Append each artwork's result to this file")
+    parser.add_argument("--offline", action="store_true", help="Use in-process stand-ins instead of the live providers (no API spend)")
+    parser.add_argument("--batch-api", action="store_true", help="Send the prompt requests through the OpenAI Batch API")
+    parser.add_argument("--metrics-port", type=int, default=None, help="Serve Prometheus-style metrics on this port while running")
+    args = parser.parse_args()
+
+    catalog_filter = CatalogFilter(args.department, args.date_from, args.date_to, args.public_domain, args.medium)
+    if args.list:
+        for row in islice(read_catalog(args.catalog, catalog_filter), args.limit):
+            print(object_url(row))
+        sys.exit(0)
+
+    if args.offline:
+        set_provider_mode("offline")
+    if args.batch_api:
+        from utils.text_batch import set_batch_mode
+        set_batch_mode("always")
+    asyncio.run(ingest(args.catalog, catalog_filter, args.chunk_size, args.limit, args.video, args.mode,
+                       args.concurrency, args.metrics_port, args.results))
@@ -1,21 +1,88 @@
 import asyncio
 import argparse
-from workflow import main
+from utils.providers import set_provider_mode
 
 # https://www.metmuseum.org/art/collection/search/437127
 
 if __name__ == "__main__":
     # Parse command line arguments
     parser = argparse.ArgumentParser(description="Process artwork URL to generate image prompt and optional video")
-    parser.add_argument(
-        "--url", type=str, required=True,
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument(
+        "--url", type=str,
         help="URL of the artwork page to process"
     )
+    source.add_argument(
+        "--urls-file", type=str,
+        help="Process every artwork URL in this file (one per line) as a batch"
+    )
     parser.add_argument(
         "--video", action="store_true",
         help="Generate video if this flag is set"
     )
+    parser.add_argument(
+        "--mode", choices=["full", "direct-video"], default="full",
+        help="full: prompt rewrite + image + optional video; direct-video: animate the source artwork directly"
+    )
+    providers = parser.add_mutually_exclusive_group()
+    providers.add_argument(
+        "--offline", action="store_true",
+        help="Use in-process stand-ins instead of OpenAI, Gemini and live crawling (no API spend)"
+    )
+    providers.add_argument(
+        "--record", metavar="CASSETTE_DIR",
+        help="Run live and record all OpenAI, Gemini, crawl and download traffic to this cassette"
+    )
+    providers.add_argument(
+        "--replay", metavar="CASSETTE_DIR",
+        help="Serve all provider traffic from a recorded cassette (no API spend)"
+    )
+    parser.add_argument(
+        "--replay-timing", choices=["original", "fast"], default=None,
+        help="original: wait each call's recorded duration (default); fast: answer immediately"
+    )
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="Record event-loop stalls with stack traces and summarize the top blocking call sites at exit"
+    )
+    parser.add_argument(
+        "--profile-stages", action="store_true",
+        help="Record event-loop stalls (as --profile), and also sample stacks per stage (folded flamegraph stacks) and write a cProfile pstats file"
+    )
+    parser.add_argument(
+        "--stream-prompts", action="store_true",
+        help="Print the image and video prompts to stderr as they are generated (single --url runs)"
+    )
+    parser.add_argument(
+        "--batch-api", action="store_true",
+        help="Send the prompt requests through the OpenAI Batch API (half price, results within 24h)"
+    )
+    parser.add_argument(
+        "--metrics-port", type=int, default=None,
+        help="Serve Prometheus-style metrics on http://127.0.0.1:<port>/metrics while running"
+    )
     args = parser.parse_args()
 
+    artwork_urls = None
+    if args.urls_file:
+        with open(args.urls_file) as f:
+            artwork_urls = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+    if args.offline:
+        set_provider_mode("offline")
+    elif args.record:
+        set_provider_mode("record", cassette=args.record)
+    elif args.replay:
+        set_provider_mode("replay", cassette=args.replay, replay_timing=args.replay_timing)
+    if args.batch_api:
+        from utils.text_batch import set_batch_mode
+        set_batch_mode("always")
+    # Imported after the provider mode is set, since generators create their clients on import
+    from workflow import main
+
     # Run the main workflow with video flag
-    asyncio.run(main(args.url, args.video))
+    workflow_run = main(args.url, args.video, args.mode, args.metrics_port, artwork_urls, stream_prompts=args.stream_prompts)
+    if args.profile or args.profile_stages:
+        from utils.profiling import profiled
+        workflow_run = profiled(workflow_run, sample_stages=args.profile_stages)
+    asyncio.run(workflow_run)
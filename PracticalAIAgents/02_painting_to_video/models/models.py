@@ -1,4 +1,4 @@
-from typing import Optional
+from typing import List, Optional
 from pydantic import BaseModel, Field
 
 class ArtworkImageURL(BaseModel):
@@ -23,7 +23,29 @@ class GeneratedPrompt(BaseModel):
 class ProcessingResult(BaseModel):
     """Model for storing the complete processing result"""
     artwork_details: ArtworkDetails = Field(..., description="Details of the original artwork")
-    generated_prompt: str = Field(..., description="Generated prompt for image generation")
+    generated_prompt: Optional[str] = Field(None, description="Generated prompt for image generation")
+    generated_video_prompt: Optional[str] = Field(None, description="Generated prompt for video generation")
     generated_image_path: Optional[str] = Field(None, description="Local path to the generated image")
     generated_video_path: Optional[str] = Field(None, description="Local path to the generated video")
-    error: Optional[str] = Field(None, description="Error message if processing failed") 
\ No newline at end of file
+    error: Optional[str] = Field(None, description="Error message if processing failed")
+    failed_stage: Optional[str] = Field(None, description="Stage that failed (e.g. image_generation); later stages were not run")
+
+class ProcessingHandles(BaseModel):
+    """Coordinator output referencing run artifacts by handle instead of by value"""
+    artwork: Optional[str] = Field(None, description="Artwork handle from extract_details, e.g. artwork:3f2a")
+    prompt: Optional[str] = Field(None, description="Image prompt handle from generate_prompt, e.g. prompt:91c0")
+    image_path: Optional[str] = Field(None, description="Local path to the generated image")
+    video_prompt: Optional[str] = Field(None, description="Video prompt handle from generate_video_prompt")
+    video_path: Optional[str] = Field(None, description="Local path to the generated video")
+    error: Optional[str] = Field(None, description="Error message if processing failed")
+
+class PreflightResult(BaseModel):
+    """Outcome of the cheap URL checks run before any agent"""
+    url: str = Field(..., description="Artwork URL as submitted")
+    ok: bool = Field(..., description="Whether the URL may go on to the workflow")
+    reason: Optional[str] = Field(None, description="Why the URL was rejected, or why an inconclusive probe was let through")
+    museum: Optional[str] = Field(None, description="PREFLIGHT_MUSEUMS entry the URL matched")
+    status_code: Optional[int] = Field(None, description="HTTP status of the final response")
+    content_type: Optional[str] = Field(None, description="Content type of the final response")
+    final_url: Optional[str] = Field(None, description="URL after following redirects")
+    redirects: List[str] = Field(default_factory=list, description="Redirect targets followed, in order")
@@ -0,0 +1,200 @@
+import argparse
+import json
+from typing import Dict, Optional
+
+import structlog
+from aiohttp import web
+
+from config import (
+    METRICS_PORT, DAEMON_CONCURRENCY, SERVICE_HOST, SERVICE_PORT, SERVICE_QUEUE_SIZE,
+    SERVICE_RETRY_AFTER, SERVICE_SSE_KEEPALIVE, SERVICE_MAX_BATCH,
+)
+from utils.file_storage_utils import FileStorage
+from utils.jobs import Job, JobManager, QueueFullError, warm_up, cool_down
+from utils.limits import provider_limits
+
+logger = structlog.get_logger()
+
+MANAGER = web.AppKey("manager", JobManager)
+STORAGE = web.AppKey("storage", FileStorage)
+ARTIFACT_FIELDS = {"generated_image_path": "image", "generated_video_path": "video"}
+
+# Endpoints:
+#   POST /jobs                     {"artwork_url": ...} or {"artwork_urls": [...]}, "generate_video", "mode", "priority", "tenant" -> 202 {"job_id", ...}
+#   GET  /jobs                     summaries of recent jobs
+#   GET  /jobs/{job_id}            summary and results so far
+#   GET  /jobs/{job_id}/events     server-sent events (resumable with Last-Event-ID)
+#   GET  /artifacts/{kind}/{name}  generated images, videos and renditions (Range supported)
+#   GET  /healthz                  queue depth and scheduler state
+
+
+def _error(status: int, message: str, headers: Optional[Dict] = None) -> web.Response:
+    return web.json_response({"error": message}, status=status, headers=headers)
+
+
+def _with_artifacts(storage: FileStorage, result: Dict) -> Dict:
+    """Result plus download URLs for its generated files."""
+    artifacts = {}
+    for field, name in ARTIFACT_FIELDS.items():
+        ref = storage.output_ref(result.get(field))
+        if ref:
+            artifacts[name] = f"/artifacts/{ref[0]}/{ref[1]}"
+    return {**result, "artifacts": artifacts}
+
+
+def _job_links(job: Job) -> Dict:
+    return {"self": f"/jobs/{job.job_id}", "events": f"/jobs/{job.job_id}/events"}
+
+
+async def submit_job(request: web.Request) -> web.Response:
+    try:
+        body = await request.json()
+    except ValueError:
+        # JSONDecodeError, or UnicodeDecodeError for a body that is not UTF-8
+        return _error(400, "Body must be JSON")
+    if not isinstance(body, dict):
+        return _error(400, "Body must be a JSON object")
+    for field in ("mode", "priority", "tenant"):
+        if body.get(field) is not None and not isinstance(body[field], str):
+            return _error(400, f"{field} must be a string")
+
+    urls = body.get("artwork_urls") or ([body["artwork_url"]] if body.get("artwork_url") else [])
+    mode = body.get("mode", "full")
+    if not isinstance(urls, list) or not urls or not all(isinstance(url, str) and url.startswith(("http://", "https://")) for url in urls):
+        return _error(400, "Provide artwork_url or artwork_urls as http(s) URLs")
+    if len(urls) > SERVICE_MAX_BATCH:
+        return _error(400, f"At most {SERVICE_MAX_BATCH} artwork URLs per job")
+    if mode not in ("full", "direct-video"):
+        return _error(400, "mode must be full or direct-video")
+
+    manager = request.app[MANAGER]
+    tenant = body.get("tenant") or request.headers.get("X-Tenant")
+    try:
+        job = manager.submit(urls, bool(body.get("generate_video")), mode, body.get("priority"), tenant)
+    except QueueFullError as e:
+        return _error(429, f"Queue full: {str(e)}", headers={"Retry-After": str(SERVICE_RETRY_AFTER)})
+    except ValueError as e:
+        return _error(400, str(e))
+    return web.json_response(
+        {"job_id": job.job_id, "status": job.status, "links": _job_links(job)},
+        status=202, headers={"Location": f"/jobs/{job.job_id}"},
+    )
+
+
+async def list_jobs(request: web.Request) -> web.Response:
+    return web.json_response({"jobs": [job.summary() for job in request.app[MANAGER].jobs.values()]})
+
+
+async def get_job(request: web.Request) -> web.Response:
+    job = request.app[MANAGER].get(request.match_info["job_id"])
+    if job is None:
+        return _error(404, "Unknown job")
+    storage = request.app[STORAGE]
+    results = [_with_artifacts(storage, result) if result else None for result in job.results]
+    return web.json_response({**job.summary(), "artwork_urls": job.artwork_urls, "results": results, "links": _job_links(job)})
+
+
+async def job_events(request: web.Request) -> web.StreamResponse:
+    """Stream a job's events as SSE: history first (after Last-Event-ID), then live until job_done."""
+    job = request.app[MANAGER].get(request.match_info["job_id"])
+    if job is None:
+        return _error(404, "Unknown job")
+    after = 0
+    if "Last-Event-ID" in request.headers:
+        last_event_id = request.headers["Last-Event-ID"]
+        # Event ids are seq numbers of this job's events; a negative one would replay from the end of the history
+        try:
+            last_seq = int(last_event_id)
+        except ValueError:
+            last_seq = -1
+        if not 0 <= last_seq < len(job.events):
+            return _error(400, f"Last-Event-ID {last_event_id!r} is not an event of job {job.job_id}")
+        after = last_seq + 1
+
+    response = web.StreamResponse(headers={
+        "Content-Type": "text/event-stream",
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",  # Don't let a reverse proxy hold events back
+    })
+    await response.prepare(request)
+    storage = request.app[STORAGE]
+    try:
+        async for event in job.stream(after=after, keepalive=SERVICE_SSE_KEEPALIVE):
+            if event is None:
+                await response.write(b": keepalive\n\n")
+                continue
+            if event["type"] == "result":
+                event = {**event, "result": _with_artifacts(storage, event["result"])}
+            await response.write(f"id: {event['seq']}\nevent: {event['type']}\ndata: {json.dumps(event)}\n\n".encode("utf-8"))
+    except ConnectionResetError:
+        pass  # Client went away; the job keeps running
+    return response
+
+
+async def get_artifact(request: web.Request) -> web.StreamResponse:
+    path = request.app[STORAGE].output_path(request.match_info["kind"], request.match_info["name"])
+    if path is None:
+        return _error(404, "Unknown artifact")
+    # FileResponse handles Range, If-Range and conditional requests
+    return web.FileResponse(path)
+
+
+async def healthz(request: web.Request) -> web.Response:
+    manager = request.app[MANAGER]
+    return web.json_response({
+        "status": "ok",
+        "pending_artworks": manager.pending_artworks,
+        "max_pending": manager.max_pending,
+        "concurrency": manager.concurrency,
+        "scheduler": {"artworks": manager.slots.snapshot(), **provider_limits.snapshot()},
+    })
+
+
+def create_app(concurrency: int = DAEMON_CONCURRENCY, queue_size: int = SERVICE_QUEUE_SIZE, metrics_port: Optional[int] = METRICS_PORT) -> web.Application:
+    """
+    Build the HTTP service
+
+    Args:
+        concurrency: Artworks processed at once across all jobs
+        queue_size: Artworks waiting or running before submissions get 429
+        metrics_port: Serve Prometheus metrics on this port while running (None disables)
+
+    Returns:
+        The aiohttp application; the workflow is warmed up on startup
+    """
+    app = web.Application()
+    app[MANAGER] = JobManager(concurrency=concurrency, max_pending=queue_size)
+    app[STORAGE] = FileStorage()
+
+    async def on_startup(app: web.Application):
+        await warm_up(metrics_port)
+        logger.info(f"Service ready ({concurrency} artworks at once, {queue_size} pending at most)")
+
+    async def on_cleanup(app: web.Application):
+        await cool_down(app[MANAGER])
+
+    app.on_startup.append(on_startup)
+    app.on_cleanup.append(on_cleanup)
+    app.router.add_post("/jobs", submit_job)
+    app.router.add_get("/jobs", list_jobs)
+    app.router.add_get("/jobs/{job_id}", get_job)
+    app.router.add_get("/jobs/{job_id}/events", job_events)
+    app.router.add_get("/artifacts/{kind}/{name}", get_artifact)
+    app.router.add_get("/healthz", healthz)
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HTTP job service for the artwork pipeline with SSE progress streaming")
+    parser.add_argument("--host", default=SERVICE_HOST)
+    parser.add_argument("--port", type=int, default=SERVICE_PORT)
+    parser.add_argument("--concurrency", type=int, default=DAEMON_CONCURRENCY, help="Artworks processed at once across all jobs")
+    parser.add_argument("--queue-size", type=int, default=SERVICE_QUEUE_SIZE, help="Artworks waiting or running before new jobs get 429")
+    parser.add_argument("--offline", action="store_true", help="Use in-process stand-ins instead of the live providers (no API spend)")
+    parser.add_argument("--metrics-port", type=int, default=METRICS_PORT, help="Serve Prometheus-style metrics on this port")
+    args = parser.parse_args()
+
+    if args.offline:
+        from utils.providers import set_provider_mode
+        set_provider_mode("offline")
+    web.run_app(create_app(args.concurrency, args.queue_size, args.metrics_port), host=args.host, port=args.port)
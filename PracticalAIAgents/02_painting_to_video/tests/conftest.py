@@ -0,0 +1,11 @@
+import os
+import sys
+
+# Tests import the pipeline's modules the way its scripts do, from the package directory
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PACKAGE_DIR)
+
+from utils.providers import set_provider_mode  # noqa: E402
+
+# Never reach a live provider; stand-ins answer at once
+set_provider_mode("offline", latency_scale=0.0, seed=1)
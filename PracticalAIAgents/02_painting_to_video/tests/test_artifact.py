@@ -0,0 +1,55 @@
+from concurrent.futures import Future
+
+from utils.artifact import ArtifactStore, ImageArtifact
+
+
+def artifact(path, size=10, persisted="done"):
+    artifact = ImageArtifact.from_bytes(b"x" * size, "image/png", path=path)
+    artifact.persisted = Future()
+    if persisted == "done":
+        artifact.persisted.set_result(path)
+    elif persisted == "failed":
+        artifact.persisted.set_exception(OSError(28, "No space left on device"))
+    return artifact
+
+
+def test_bytes_and_views_round_trip_without_copies():
+    data = b"\x89PNG image bytes"
+    image = ImageArtifact.from_bytes(data, "image/png")
+    assert image.to_bytes() is data
+    assert image.size == len(data)
+    assert image.data_url.startswith("data:image/png;base64,")
+    assert image.wait_persisted() is None
+
+
+def test_least_recently_used_persisted_artifacts_are_evicted_first():
+    store = ArtifactStore(max_bytes=25)
+    for path in ("a", "b"):
+        store.put(artifact(path))
+    store.get("a")
+    store.put(artifact("c"))
+
+    assert store.get("b") is None
+    assert store.get("a") is not None and store.get("c") is not None
+
+
+def test_pending_writes_are_never_evicted():
+    store = ArtifactStore(max_bytes=15)
+    store.put(artifact("pending", persisted="pending"))
+    store.put(artifact("b"))
+    store.put(artifact("c"))
+
+    assert store.get("pending") is not None
+    assert store.get("b") is None
+
+
+def test_failed_writes_are_kept_only_up_to_max_failed():
+    store = ArtifactStore(max_bytes=1000, max_failed=2)
+    for path in ("f1", "f2", "f3"):
+        store.put(artifact(path, persisted="failed"))
+    store.put(artifact("ok"))
+
+    # The oldest failure is dropped even though the store is under its byte budget
+    assert store.get("f1") is None
+    assert all(store.get(path) is not None for path in ("f2", "f3", "ok"))
+    assert store._total_bytes == 30
@@ -0,0 +1,45 @@
+import time
+
+import pytest
+
+from utils.cassette import Cassette, CassetteMissError
+
+KEY = "POST api.openai.com/v1/responses"
+
+
+def record(path, interactions):
+    cassette = Cassette(str(path), "record")
+    for request_body, response_body in interactions:
+        cassette.record("openai", KEY, request_body, time.monotonic(), 200, response_body)
+    cassette.close()
+
+
+def test_match_prefers_an_identical_request_body(tmp_path):
+    record(tmp_path, [(b"first", b"answer 1"), (b"second", b"answer 2")])
+    cassette = Cassette(str(tmp_path), "replay", "fast")
+
+    assert cassette.body(cassette.match(KEY, b"second")) == b"answer 2"
+    assert cassette.body(cassette.match(KEY, b"first")) == b"answer 1"
+
+
+def test_match_falls_back_to_recorded_order(tmp_path):
+    record(tmp_path, [(b"first", b"answer 1"), (b"second", b"answer 2")])
+    cassette = Cassette(str(tmp_path), "replay", "fast")
+
+    assert cassette.body(cassette.match(KEY, b"changed")) == b"answer 1"
+    assert cassette.body(cassette.match(KEY, b"changed")) == b"answer 2"
+    with pytest.raises(CassetteMissError):
+        cassette.match(KEY, b"changed")
+    with pytest.raises(CassetteMissError):
+        cassette.match("GET standin.local/other")
+
+
+def test_binary_bodies_round_trip_through_blobs(tmp_path):
+    image = bytes(range(256)) * 8
+    record(tmp_path, [(b"", image)])
+    cassette = Cassette(str(tmp_path), "replay", "fast")
+
+    entry = cassette.match(KEY)
+    assert "blob" in entry
+    assert cassette.body(entry) == image
+    assert cassette.delay(entry) == 0.0
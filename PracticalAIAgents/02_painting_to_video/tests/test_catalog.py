@@ -0,0 +1,83 @@
+import asyncio
+import csv
+import gzip
+import json
+
+import pytest
+
+import ingest
+from utils import catalog
+from utils.catalog import CatalogFilter, artwork_details, chunked, object_url, read_catalog, resolve_image_url
+from utils.standins import StandInHTTPResponse
+
+MET_HEADER = ["Object ID", "Is Public Domain", "Department", "Object Begin Date", "Object End Date", "Title", "Medium", "Culture", "Object Date"]
+MET_ROWS = [
+    ["1", "True", "European Paintings", "1660", "1665", "Young Woman", "Oil on canvas", "", "ca. 1662"],
+    ["2", "False", "European Paintings", "1880", "1880", "Haystacks", "Oil on canvas", "", "1880"],
+    ["3", "True", "Asian Art", "-200", "-100", "Jar", "Earthenware", "China", ""],
+    ["4", "True", "European Paintings", "", "", " Untitled ", "Tempera on wood", "", ""],
+]
+
+
+def write_csv(path, header, rows, opener=open):
+    with opener(path, "wt", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+    return str(path)
+
+
+def ids(rows):
+    return [row["object_id"] for row in rows]
+
+
+def test_filters_combine_and_date_spans_overlap(tmp_path):
+    source = write_csv(tmp_path / "MetObjects.csv", MET_HEADER, MET_ROWS)
+
+    assert ids(read_catalog(source)) == ["1", "2", "3", "4"]
+    assert ids(read_catalog(source, CatalogFilter(public_domain=True, departments=["european paintings"]))) == ["1", "4"]
+    assert ids(read_catalog(source, CatalogFilter(media=["tempera", "earthen"]))) == ["3", "4"]
+    # Undated objects never match a date filter; BCE years are negative
+    assert ids(read_catalog(source, CatalogFilter(date_from=1664, date_to=1900))) == ["1", "2"]
+    assert ids(read_catalog(source, CatalogFilter(date_to=0))) == ["3"]
+
+
+def test_gzipped_api_style_dumps_are_read(tmp_path):
+    source = write_csv(tmp_path / "objects.csv.gz", ["objectURL", "title", "primaryImage"],
+                       [["http://www.metmuseum.org/art/collection/search/9", "Harbor", "https://images.example/9.jpg"]], gzip.open)
+
+    [row] = read_catalog(source)
+    assert object_url(row) == "https://www.metmuseum.org/art/collection/search/9"
+    assert resolve_image_url(row) == "https://images.example/9.jpg"
+
+
+def test_catalog_without_an_object_column_is_refused(tmp_path):
+    source = write_csv(tmp_path / "other.csv", ["Title"], [["Harbor"]])
+    with pytest.raises(ValueError, match="neither an object ID nor an object URL"):
+        list(read_catalog(source))
+
+
+def test_rows_become_artwork_details(tmp_path):
+    [row] = read_catalog(write_csv(tmp_path / "MetObjects.csv", MET_HEADER, MET_ROWS[:1]))
+    details = artwork_details(row, "https://images.example/1.jpg")
+
+    assert (details.title, details.medium) == ("Young Woman", "Oil on canvas")
+    assert details.description == "Date: ca. 1662; Department: European Paintings"
+    assert details.image_urls.source_url == "https://www.metmuseum.org/art/collection/search/1"
+    assert details.image_urls.main_image_url == "https://images.example/1.jpg"
+    assert list(map(len, chunked(range(5), 2))) == [2, 2, 1]
+
+
+def test_missing_images_are_looked_up_and_objects_without_one_dropped(monkeypatch):
+    rows = [{"object_id": "1", "title": "Found"}, {"object_id": "2", "title": "Restricted"}]
+    assert resolve_image_url(rows[0]).endswith(".jpg")
+
+    def api(url, **kwargs):
+        # The API leaves primaryImage empty for objects whose images are not Open Access
+        record = {"primaryImage": "https://images.example/1.jpg" if url.endswith("/1") else ""}
+        return StandInHTTPResponse(url, 200, json.dumps(record).encode("utf-8"), "application/json")
+
+    monkeypatch.setattr(catalog, "http_get", api)
+    details = asyncio.run(ingest.prefill_chunk(rows))
+    assert list(details) == ["https://www.metmuseum.org/art/collection/search/1"]
+    assert details["https://www.metmuseum.org/art/collection/search/1"].image_urls.main_image_url == "https://images.example/1.jpg"
@@ -0,0 +1,70 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from agents import Agent, Runner
+
+from utils.cost_ledger import (
+    BudgetExceededError, CostLedger, check_budget, current_ledger, ledger_scope, price_call,
+    record_response_usage, record_usage,
+)
+from utils.metrics import metrics_hooks
+
+
+def test_calls_are_priced_per_token_and_per_unit():
+    # gpt-4.1: $2 input, $0.50 cached input, $8 output per million tokens
+    assert price_call("gpt-4.1", input_tokens=1_000_000, cached_input_tokens=500_000, output_tokens=100_000) == pytest.approx(1.0 + 0.25 + 0.8)
+    assert price_call("veo-2.0-generate-001", units=8) == pytest.approx(4.0)
+    assert price_call("unpriced-model", input_tokens=10 ** 6) == 0.0
+
+
+def test_entries_reach_every_parent_and_budgets_are_checked_up_the_chain():
+    batch = CostLedger("batch", budget_usd=None, budget_tokens=1500, budget_calls=None)
+    artwork = CostLedger("artwork", parent=batch, budget_usd=None, budget_tokens=None, budget_calls=2)
+
+    with ledger_scope(artwork):
+        record_usage("prompt", "gpt-4.1", input_tokens=1000, output_tokens=200)
+        check_budget()
+        record_usage("image", "imagen-3.0-generate-002", units=2)
+        check_budget()
+        record_usage("prompt", "gpt-4.1", input_tokens=300, output_tokens=100)
+        with pytest.raises(BudgetExceededError, match="artwork: calls 3 > 2"):
+            check_budget()
+    assert current_ledger() is None
+
+    assert (batch.calls, batch.tokens) == (3, 1600)
+    assert batch.exceeded() == "tokens 1600 > 1500"
+    assert artwork.by_stage()["image"] == {"calls": 1, "input_tokens": 0, "output_tokens": 0, "units": 2, "cost_usd": 0.06}
+    assert batch.summary()["children"][0]["label"] == "artwork"
+
+
+def test_usage_objects_and_batch_result_dicts_are_recorded_alike():
+    ledger = CostLedger("run")
+    usage = SimpleNamespace(input_tokens=1000, output_tokens=10, input_tokens_details=SimpleNamespace(cached_tokens=1000))
+    with ledger_scope(ledger):
+        record_response_usage("prompt", "gpt-4.1", usage)
+        record_response_usage("prompt", "gpt-4.1", {"input_tokens": 1000, "output_tokens": 10, "input_tokens_details": {"cached_tokens": 1000}}, price_factor=0.5)
+        record_response_usage("prompt", "gpt-4.1", None)
+
+    costs = [entry.cost_usd for entry in ledger.entries]
+    assert costs == pytest.approx([0.00058, 0.00029])
+    # Outside a scope nothing is recorded
+    record_usage("prompt", "gpt-4.1", input_tokens=1)
+    assert ledger.calls == 2
+
+
+def test_sub_agents_run_as_tools_are_charged_to_the_run():
+    describer = Agent(name="Describer", instructions="Describe the artwork.", model="gpt-4o-mini")
+    coordinator = Agent(name="Coordinator", instructions="Call describe.", model="gpt-4.1", tools=[
+        describer.as_tool(tool_name="describe", tool_description="Describe an artwork", hooks=metrics_hooks),
+    ])
+    ledger = CostLedger("run")
+
+    async def run():
+        with ledger_scope(ledger):
+            await Runner.run(coordinator, "A harbor at dusk", hooks=metrics_hooks)
+
+    asyncio.run(run())
+    stages = ledger.by_stage()
+    assert stages["agent:Coordinator"]["calls"] == 2
+    assert stages["agent:Describer"]["calls"] == 1
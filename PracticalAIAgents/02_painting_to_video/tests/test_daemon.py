@@ -0,0 +1,100 @@
+import asyncio
+import json
+import os
+import socket
+import threading
+
+import pytest
+
+import daemon
+
+
+class FakeJob:
+    job_id = "job-1"
+
+    async def stream(self):
+        yield {"type": "artwork_queued", "artwork_url": "https://a.example/1"}
+        yield {"type": "job_done", "job_id": self.job_id, "status": "done", "summary": {"completed": 1, "failed": 0, "artworks": 1, "cost_usd": 0.0}}
+
+
+class FakeManager:
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, urls, generate_video, mode, priority, tenant):
+        if priority == "vip":
+            raise ValueError("Unknown priority class 'vip'")
+        self.submitted.append(urls)
+        return FakeJob()
+
+    def get(self, job_id):
+        return FakeJob() if job_id == "job-1" else None
+
+
+@pytest.fixture
+def socket_path(tmp_path, monkeypatch):
+    """A daemon socket served by handle_client with a fake job manager, on a thread of its own."""
+    path = os.path.join(str(tmp_path), "d.sock")
+    manager = FakeManager()
+    monkeypatch.setattr(daemon, "DAEMON_MAX_REQUEST_BYTES", 4096)
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+
+    async def start():
+        server = await asyncio.start_unix_server(lambda r, w: daemon.handle_client(manager, r, w), path=path, limit=4096)
+        ready.set()
+        return server
+
+    thread = threading.Thread(target=lambda: (loop.run_until_complete(start()), loop.run_forever()), daemon=True)
+    thread.start()
+    ready.wait(5)
+    yield path
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+
+
+def raw(socket_path, payload: bytes):
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_path)
+        sock.sendall(payload)
+        with sock.makefile("r", encoding="utf-8") as events:
+            return [json.loads(line) for line in events]
+
+
+def test_submit_streams_the_job_until_it_is_done(socket_path):
+    events = list(daemon.request(socket_path, {"op": "submit", "artwork_urls": ["https://a.example/1"]}))
+    assert [event["type"] for event in events] == ["accepted", "artwork_queued", "job_done"]
+    assert daemon.run_client(socket_path, {"op": "watch", "job_id": "job-1"}, as_json=True) == 0
+
+
+@pytest.mark.parametrize("payload, error", [
+    (b"not json\n", "one line of JSON"),
+    (b"[1, 2]\n", "JSON object"),
+    (b'"submit"\n', "JSON object"),
+    (b'{"op": "submit", "artwork_urls": []}\n', "submit needs artwork_urls"),
+    (b'{"op": "submit", "artwork_urls": ["u"], "priority": "vip"}\n', "Unknown priority class"),
+    (b'{"op": "watch", "job_id": "job-9"}\n', "Unknown job job-9"),
+    (b'{"op": "delete"}\n', "Unknown op 'delete'"),
+])
+def test_bad_requests_get_an_error_event(socket_path, payload, error):
+    [event] = raw(socket_path, payload)
+    assert event["type"] == "error" and error in event["error"]
+
+
+def test_oversized_request_gets_an_error_instead_of_a_dropped_connection(socket_path):
+    urls = [f"https://a.example/{i}" for i in range(1000)]
+    [event] = raw(socket_path, (json.dumps({"op": "submit", "artwork_urls": urls}) + "\n").encode("utf-8"))
+    assert event["type"] == "error" and "longer than 4096 bytes" in event["error"]
+    # The connection after it is served normally
+    assert raw(socket_path, b'{"op": "watch", "job_id": "job-1"}\n')[-1]["type"] == "job_done"
+
+
+def test_client_fails_when_the_stream_ends_early(socket_path, monkeypatch, capsys):
+    accepted_only = [{"type": "accepted", "job_id": "job-1"}]
+    monkeypatch.setattr(daemon, "request", lambda path, message: iter(accepted_only))
+
+    assert daemon.run_client(socket_path, {"op": "submit", "artwork_urls": ["u"], "watch": True}, as_json=False) == 1
+    assert "closed the connection" in capsys.readouterr().err
+    assert daemon.run_client(socket_path, {"op": "submit", "artwork_urls": ["u"], "watch": False}, as_json=False) == 0
+    monkeypatch.setattr(daemon, "request", lambda path, message: iter([]))
+    assert daemon.run_client(socket_path, {"op": "status", "job_id": None}, as_json=False) == 1
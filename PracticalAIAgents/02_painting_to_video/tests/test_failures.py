@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+from agents import RunContextWrapper, UserError, function_tool
+from agents.tool_context import ToolContext
+
+from utils.failures import StageError, find_stage_error, require_prompt, stage_tool_failure
+
+
+@function_tool(name_override="stage_tool", failure_error_function=stage_tool_failure)
+async def stage_tool(ctx: RunContextWrapper, outcome: str) -> str:
+    """Fail the way a stage tool does."""
+    if outcome == "stage_error":
+        raise StageError("image_generation", "no image returned", error="rai_filtered")
+    if outcome == "bad_handle":
+        raise KeyError("Unknown handle 'prompt:zzzz'")
+    return "ok"
+
+
+def invoke(outcome):
+    arguments = f'{{"outcome": "{outcome}"}}'
+    context = ToolContext(context=None, tool_name="stage_tool", tool_call_id="call_1", tool_arguments=arguments)
+    return asyncio.run(stage_tool.on_invoke_tool(context, arguments))
+
+
+def test_stage_error_ends_the_run_instead_of_going_back_to_the_model():
+    with pytest.raises(Exception) as raised:
+        invoke("stage_error")
+
+    stage_error = find_stage_error(raised.value)
+    assert stage_error is not None
+    assert (stage_error.stage, stage_error.error) == ("image_generation", "rai_filtered")
+
+
+def test_other_tool_errors_go_back_to_the_model():
+    assert isinstance(invoke("bad_handle"), str)
+    assert invoke("ok") == "ok"
+
+
+def test_find_stage_error_follows_sdk_wrapping():
+    stage_error = StageError("video_generation", "timed out", error="timeout")
+    try:
+        try:
+            raise stage_error
+        except StageError as e:
+            raise UserError("Error running tool generate_video") from e
+    except UserError as e:
+        wrapped = e
+
+    assert find_stage_error(wrapped) is stage_error
+    assert find_stage_error(UserError("unrelated")) is None
+    assert StageError("x", "y").error == "StageError"
+
+
+def test_require_prompt_refuses_blank_prompts():
+    assert require_prompt("image_generation", "a harbor at dusk") == "a harbor at dusk"
+    for prompt in (None, "", "  \n"):
+        with pytest.raises(StageError) as raised:
+            require_prompt("image_generation", prompt)
+        assert raised.value.error == "empty_prompt"
+
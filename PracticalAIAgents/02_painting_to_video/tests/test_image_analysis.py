@@ -0,0 +1,62 @@
+import asyncio
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from utils.artifact import ImageArtifact
+from utils.image_analysis import ImageAnalyzer, analyze_image_bytes, describe_analysis, kmeans_palette
+
+
+def png(array):
+    buffer = BytesIO()
+    Image.fromarray(array.astype(np.uint8)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def test_palette_recovers_two_flat_colours_with_their_shares():
+    pixels = np.array([[200, 30, 30]] * 75 + [[20, 20, 120]] * 25, dtype=np.float32)
+    centroids, shares = kmeans_palette(pixels, 2)
+
+    assert np.allclose(centroids, [[200, 30, 30], [20, 20, 120]])
+    assert np.allclose(shares, [0.75, 0.25])
+
+
+def test_flat_image_has_no_edges_and_a_striped_one_does():
+    flat = analyze_image_bytes(png(np.full((40, 60, 3), 128)))
+    assert (flat["width"], flat["height"], flat["aspect_ratio"]) == (60, 40, 1.5)
+    assert flat["edge_density"] == 0.0 and flat["contrast"] == 0.0
+    assert sum(flat["luminance_histogram"]) == 1.0
+
+    stripes = np.zeros((40, 60, 3))
+    stripes[:, ::4] = 255
+    assert analyze_image_bytes(png(stripes))["edge_density"] >= 0.5
+
+
+def test_one_pixel_strips_are_analyzed_without_edges():
+    for shape in ((1, 50, 3), (50, 1, 3), (1, 1, 3)):
+        assert analyze_image_bytes(png(np.full(shape, 90)))["edge_density"] == 0.0
+
+
+def test_description_leaves_out_palette_slivers():
+    image = np.zeros((100, 100, 3))
+    image[:99] = [240, 240, 240]
+    text = describe_analysis(analyze_image_bytes(png(image)))
+
+    assert "Dimensions: 100x100 (square, aspect 1.0)" in text
+    assert "#f0f0f0 (99%)" in text and "#000000" not in text
+
+
+def test_analyzer_shares_one_computation_per_image():
+    analyzer = ImageAnalyzer(max_workers=1)
+    artifact = ImageArtifact.from_bytes(png(np.full((8, 8, 3), 10)), "image/png")
+
+    async def scenario():
+        return await asyncio.gather(*(analyzer.analyze(artifact) for _ in range(3)))
+
+    try:
+        results = asyncio.run(scenario())
+    finally:
+        analyzer._get_executor().shutdown()
+    assert all(result is results[0] for result in results)
+    assert list(analyzer._cache) == [artifact.sha256]
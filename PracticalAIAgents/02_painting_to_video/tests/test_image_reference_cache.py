@@ -0,0 +1,61 @@
+import asyncio
+import time
+
+import pytest
+from google.genai import types
+
+from utils.artifact import ImageArtifact
+from utils.image_reference_cache import ImageReferenceCache, LocalImageUploader
+from utils.standins import StandInGenaiClient
+
+
+class CountingUploader(LocalImageUploader):
+    def __init__(self, upload_dir):
+        super().__init__(upload_dir)
+        self.calls = 0
+
+    def upload(self, artifact):
+        self.calls += 1
+        time.sleep(0.01)
+        return super().upload(artifact)
+
+
+def test_concurrent_requests_share_one_upload(tmp_path):
+    uploader = CountingUploader(str(tmp_path))
+    cache = ImageReferenceCache(uploader, refresh_margin=0)
+    artifact = ImageArtifact.from_bytes(b"\x89PNG fake", "image/png")
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get_reference(artifact) for _ in range(5)))
+
+    references = asyncio.run(scenario())
+    assert uploader.calls == 1
+    assert len({reference.uri for reference in references}) == 1
+    assert references[0].uri.startswith("file://") and references[0].uri.endswith(f"{artifact.sha256}.png")
+    assert cache.stats["uploads"] == 1 and cache.stats["hits"] == 4
+
+
+def test_references_near_expiry_and_invalidated_ones_are_uploaded_again(tmp_path):
+    uploader = CountingUploader(str(tmp_path))
+    artifact = ImageArtifact.from_bytes(b"\x89PNG fake", "image/png")
+
+    expiring = ImageReferenceCache(uploader, refresh_margin=10 ** 9)
+    asyncio.run(expiring.get_reference(artifact))
+    asyncio.run(expiring.get_reference(artifact))
+    assert uploader.calls == 2
+
+    cache = ImageReferenceCache(uploader, refresh_margin=0)
+    asyncio.run(cache.get_reference(artifact))
+    cache.invalidate(artifact)
+    asyncio.run(cache.get_reference(artifact))
+    assert uploader.calls == 4
+
+
+def test_standin_veo_rejects_gcs_uri_outside_vertex_ai(monkeypatch):
+    monkeypatch.delenv("GOOGLE_GENAI_USE_VERTEXAI", raising=False)
+    image = types.Image(gcs_uri="gs://bucket/veo-inputs/source.png", mime_type="image/png")
+
+    with pytest.raises(ValueError, match="gcs_uri"):
+        StandInGenaiClient().models.generate_videos(model="veo-2.0-generate-001", prompt="slow pan", image=image)
+    operation = StandInGenaiClient(vertexai=True).models.generate_videos(model="veo-2.0-generate-001", prompt="slow pan", image=image)
+    assert operation.name and not operation.done
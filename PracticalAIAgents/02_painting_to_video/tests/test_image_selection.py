@@ -0,0 +1,41 @@
+import asyncio
+
+from models.models import ArtworkDetails, ArtworkImageURL
+from utils.image_selection import ImageProbe, _stem, pick_best, probe_image, select_source_image
+from utils.standins import STANDIN_HOST
+
+IMAGES = f"https://{STANDIN_HOST}/images"
+
+
+def test_size_markers_are_stripped_from_file_names():
+    assert _stem("https://x.example/a/DT1502-thumb.jpg") == "dt1502"
+    assert _stem("https://x.example/img_800x600.png?w=1") == "img"
+    assert _stem("https://x.example/photo@2x_large.webp") == "photo"
+
+
+def test_probe_reads_dimensions_from_a_ranged_request():
+    probe = probe_image(f"{IMAGES}/abc.jpg", probe_bytes=4096)
+    assert (probe.width, probe.height, probe.extension) == (1200, 1600, ".jpg")
+    assert probe.meets_size and probe.preferred_format
+    assert probe_image(f"https://{STANDIN_HOST}/collectionapi.metmuseum.org/public/collection/v1/objects/1") is None
+
+
+def test_large_preferred_renditions_of_the_chosen_image_win():
+    chosen = "https://x.example/dt1502-thumb.jpg"
+    probes = [
+        ImageProbe(chosen, 300, 400, ".jpg"),
+        ImageProbe("https://x.example/banner.jpg", 4000, 1000, ".jpg"),
+        ImageProbe("https://x.example/dt1502.jpg", 1200, 1600, ".jpg"),
+        ImageProbe("https://x.example/dt1502.tiff", 6000, 8000, ".tiff"),
+    ]
+    assert pick_best(probes, chosen).url == "https://x.example/dt1502.jpg"
+    assert pick_best(probes).url == "https://x.example/banner.jpg"
+    assert pick_best([]) is None
+
+
+def test_thumbnail_choice_is_replaced_by_the_full_image():
+    details = ArtworkDetails(title="Study", image_urls=ArtworkImageURL(main_image_url=f"{IMAGES}/abc-thumb.jpg"))
+    selected = asyncio.run(select_source_image(details, [f"{IMAGES}/abc.jpg", "data:image/png;base64,AAAA"]))
+
+    assert selected.image_urls.main_image_url == f"{IMAGES}/abc.jpg"
+    assert details.image_urls.main_image_url == f"{IMAGES}/abc-thumb.jpg"
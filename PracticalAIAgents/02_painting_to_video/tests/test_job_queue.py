@@ -0,0 +1,113 @@
+import pytest
+
+from utils.job_queue import SQLiteJobQueue
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = SQLiteJobQueue(str(tmp_path / "jobs.db"), shards=1)
+    yield queue
+    queue.close()
+
+
+def status_of(queue, job_id):
+    return next(job for job in queue.jobs() if job["id"] == job_id)
+
+
+def test_lease_hands_out_each_ready_job_once(queue):
+    first, second = queue.enqueue(["https://a.example/1", "https://a.example/2"])
+
+    leased = queue.lease("w1", [0], limit=1)
+    assert [job["id"] for job in leased] == [first]
+    assert leased[0]["attempts"] == 1
+    assert [job["id"] for job in queue.lease("w2", [0], limit=5)] == [second]
+    assert queue.lease("w3", [0], limit=5) == []
+    assert queue.counts() == {"leased": 2}
+
+
+def test_expired_lease_is_taken_over(queue):
+    (job_id,) = queue.enqueue(["https://a.example/1"])
+    queue.lease("w1", [0], limit=1, lease_seconds=-1)
+
+    leased = queue.lease("w2", [0], limit=1)
+    assert [job["id"] for job in leased] == [job_id]
+    assert leased[0]["attempts"] == 2
+    # The first worker lost the job and can no longer finish it
+    assert queue.heartbeat("w1", [job_id]) == [job_id]
+    assert not queue.complete(job_id, "w1", {"ok": True})
+    assert queue.complete(job_id, "w2", {"ok": True})
+
+
+def test_expired_lease_on_last_attempt_fails_the_job(queue):
+    (job_id,) = queue.enqueue(["https://a.example/1"], max_attempts=1)
+    queue.lease("w1", [0], limit=1, lease_seconds=-1)
+
+    assert queue.lease("w2", [0], limit=1) == []
+    job = status_of(queue, job_id)
+    assert job["status"] == "failed"
+    assert "Lease expired" in job["last_error"]
+
+
+def test_fail_requeues_until_max_attempts(queue):
+    (job_id,) = queue.enqueue(["https://a.example/1"], max_attempts=2)
+
+    queue.lease("w1", [0], limit=1)
+    assert queue.fail(job_id, "w1", "boom", cost_usd=0.25, backoff=0) == "queued"
+    queue.lease("w1", [0], limit=1)
+    assert queue.fail(job_id, "w1", "boom again", cost_usd=0.25, backoff=0) == "failed"
+
+    job = status_of(queue, job_id)
+    assert job["last_error"] == "boom again"
+    assert job["cost_usd"] == pytest.approx(0.5)
+    assert queue.fail(job_id, "w1", "late") is None
+
+
+def test_fail_backs_off_before_the_retry(queue):
+    (job_id,) = queue.enqueue(["https://a.example/1"])
+    queue.lease("w1", [0], limit=1)
+    queue.fail(job_id, "w1", "boom", backoff=60)
+
+    assert queue.lease("w1", [0], limit=1) == []
+    assert status_of(queue, job_id)["status"] == "queued"
+
+
+def test_release_does_not_count_the_attempt(queue):
+    (job_id,) = queue.enqueue(["https://a.example/1"])
+    queue.lease("w1", [0], limit=1)
+
+    assert queue.release(job_id, "w1")
+    assert status_of(queue, job_id)["attempts"] == 0
+    assert queue.lease("w2", [0], limit=1)[0]["attempts"] == 1
+
+
+def test_complete_keeps_the_spend_of_failed_attempts(queue):
+    (job_id,) = queue.enqueue(["https://a.example/1"])
+    queue.lease("w1", [0], limit=1)
+    queue.fail(job_id, "w1", "boom", cost_usd=0.1, backoff=0)
+    queue.lease("w1", [0], limit=1)
+
+    assert queue.complete(job_id, "w1", {"generated_image_path": "x.png"}, cost_usd=0.2)
+    job = status_of(queue, job_id)
+    assert job["status"] == "done"
+    assert job["result"] == {"generated_image_path": "x.png"}
+    assert job["cost_usd"] == pytest.approx(0.3)
+    assert queue.unfinished() == 0
+
+
+def test_permanent_failure_is_not_retried(queue):
+    (job_id,) = queue.enqueue(["https://a.example/gone"], max_attempts=3)
+    queue.lease("w1", [0], limit=1)
+
+    assert queue.fail(job_id, "w1", "Preflight failed: HTTP 404", backoff=0, permanent=True) == "failed"
+    assert queue.lease("w1", [0], limit=1) == []
+    assert status_of(queue, job_id)["attempts"] == 1
+
+
+def test_journal_mode_is_configurable_for_shared_filesystems(tmp_path):
+    queue = SQLiteJobQueue(str(tmp_path / "shared.db"), journal_mode="delete")
+    try:
+        assert queue._conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+    finally:
+        queue.close()
+    with pytest.raises(ValueError, match="journal mode"):
+        SQLiteJobQueue(str(tmp_path / "other.db"), journal_mode="memory")
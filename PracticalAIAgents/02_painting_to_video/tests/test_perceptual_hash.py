@@ -0,0 +1,100 @@
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from utils.artifact import ImageArtifact
+from utils.perceptual_hash import RECORD, ImageHash, PerceptualHashIndex, hash_image_bytes, remember_source, source_hash
+
+SOURCE = ImageHash(0x0123456789ABCDEF, 0xFEDCBA9876543210)
+
+
+def flip(image_hash, phash_bits=0, dhash_bits=0):
+    """Hash differing from image_hash in the lowest phash_bits / dhash_bits bits."""
+    return ImageHash(image_hash.phash ^ ((1 << phash_bits) - 1), image_hash.dhash ^ ((1 << dhash_bits) - 1))
+
+
+def png(array):
+    buffer = BytesIO()
+    Image.fromarray(array.astype(np.uint8)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def test_search_finds_entries_within_distance_in_both_hashes(tmp_path):
+    index = PerceptualHashIndex(str(tmp_path / "index.bin"))
+    index.add("source", SOURCE, "https://a.example/exact.jpg")
+    index.add("source", flip(SOURCE, 3, 1), "https://a.example/near.jpg")
+    index.add("source", flip(SOURCE, 0, 20), "https://a.example/dhash_far.jpg")
+    index.add("source", flip(SOURCE, 20, 0), "https://a.example/phash_far.jpg")
+
+    assert index.search(SOURCE, "source", 8) == [("https://a.example/exact.jpg", 0), ("https://a.example/near.jpg", 3)]
+    assert index.search(SOURCE, "source", 8, limit=1) == [("https://a.example/exact.jpg", 0)]
+
+
+def test_search_filters_by_kind_and_prefers_the_newest_among_equals(tmp_path):
+    index = PerceptualHashIndex(str(tmp_path / "index.bin"))
+    index.add("source", SOURCE, "https://a.example/source.jpg")
+    index.add("image", SOURCE, "/outputs/old.png", own=flip(SOURCE, 30, 30))
+    index.add("image", SOURCE, "/outputs/new.png", own=flip(SOURCE, 30, 30))
+
+    assert index.search(SOURCE, "image", 8) == [("/outputs/new.png", 0), ("/outputs/old.png", 0)]
+    assert index.search(SOURCE, "video", 8) == []
+    # By their own hashes the generated images are far from the source
+    assert index.search(SOURCE, "image", 8, by="own") == []
+    assert index.search(flip(SOURCE, 30, 30), "image", 0, by="own")[0] == ("/outputs/new.png", 0)
+
+
+def test_entries_survive_a_reload(tmp_path):
+    path = str(tmp_path / "index.bin")
+    PerceptualHashIndex(path).add("video", SOURCE, "/outputs/video.mp4")
+    # A torn last record (crash mid-write) is skipped, not fatal
+    with open(path, "ab") as f:
+        f.write(b"\x01" * 20)
+
+    reloaded = PerceptualHashIndex(path)
+    assert len(reloaded) == 1
+    assert reloaded.search(SOURCE, "video", 0) == [("/outputs/video.mp4", 0)]
+    # The next append cuts the torn record off and lands on a record boundary
+    reloaded.add("video", flip(SOURCE, 1, 1), "/outputs/other.mp4")
+    assert os.path.getsize(path) == 2 * RECORD.itemsize
+    assert [ref for ref, _ in PerceptualHashIndex(path).search(SOURCE, "video", 2)] == ["/outputs/video.mp4", "/outputs/other.mp4"]
+
+
+def test_entries_added_by_another_process_are_picked_up(tmp_path):
+    path = str(tmp_path / "index.bin")
+    mine, theirs = PerceptualHashIndex(path), PerceptualHashIndex(path)
+    mine.add("source", SOURCE, "https://a.example/mine.jpg")
+    theirs.add("source", flip(SOURCE, 2, 2), "https://a.example/théirs.jpg")
+
+    assert [ref for ref, _ in mine.search(SOURCE, "source", 4)] == ["https://a.example/mine.jpg", "https://a.example/théirs.jpg"]
+    # Both wrote in file order, so a fresh load agrees with each of them
+    mine.add("source", flip(SOURCE, 3, 3), "https://a.example/third.jpg")
+    assert len(theirs.search(SOURCE, "source", 4)) == 3 and len(PerceptualHashIndex(path)) == 3
+
+
+def test_source_hashes_are_computed_in_the_background():
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        artifact = ImageArtifact.from_bytes(png(painting(3)), "image/png")
+        future = remember_source("https://a.example/source.png", artifact, executor)
+
+        image_hash = asyncio.run(source_hash("https://a.example/source.png"))
+    assert future.result() == image_hash == hash_image_bytes(artifact.to_bytes())
+    assert asyncio.run(source_hash("https://a.example/unseen.png")) is None
+
+
+def painting(seed):
+    """Smooth 256x256 image made of an 8x8 grid of random colours."""
+    blocks = np.random.default_rng(seed).integers(0, 256, (8, 8, 3)).astype(np.uint8)
+    return np.asarray(Image.fromarray(blocks).resize((256, 256), Image.BILINEAR))
+
+
+def test_resized_copy_hashes_close_to_the_original():
+    original = painting(0)
+    image_hash = hash_image_bytes(png(original))
+    resized = np.asarray(Image.fromarray(original).resize((160, 120)))
+
+    assert max(image_hash.distance(hash_image_bytes(png(resized)))) <= 8
+    assert min(image_hash.distance(hash_image_bytes(png(painting(1))))) > 8
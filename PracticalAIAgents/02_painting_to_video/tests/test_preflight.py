@@ -0,0 +1,89 @@
+import pytest
+import requests
+
+from utils import preflight
+from utils.preflight import museum_of, validate_artwork_url
+from utils.standins import StandInHTTPResponse
+
+ARTWORK = "https://www.metmuseum.org/art/collection/search/437127"
+
+
+@pytest.fixture
+def site(monkeypatch):
+    """Answer probes from a url -> (status, headers) map; unknown URLs are HTML pages."""
+    pages = {}
+
+    def head(url, **kwargs):
+        answer = pages.get(url, (200, {}))
+        if isinstance(answer, Exception):
+            raise answer
+        status, headers = answer
+        headers = dict(headers)
+        return StandInHTTPResponse(url, status, b"", headers.pop("content-type", "text/html"), headers)
+
+    monkeypatch.setattr(preflight, "http_head", head)
+    monkeypatch.setattr(preflight, "provider_mode", lambda: "live")
+    return pages
+
+
+def test_museum_is_matched_by_host_and_subdomain():
+    assert museum_of(ARTWORK) == "met"
+    assert museum_of("https://artic.edu/artworks/1") == "artic"
+    assert museum_of("https://metmuseum.org.example.com/art/1") is None
+
+
+def test_artwork_page_passes(site):
+    result = validate_artwork_url(ARTWORK)
+    assert result.ok and result.museum == "met" and result.final_url == ARTWORK
+
+
+def test_unlisted_hosts_and_non_http_urls_are_rejected(site):
+    assert validate_artwork_url("ftp://www.metmuseum.org/x").reason == "Not an http(s) URL"
+    result = validate_artwork_url("https://example.com/art/1")
+    assert not result.ok and "not a known museum site" in result.reason
+
+
+def test_redirects_are_followed_on_site_only(site):
+    moved = "https://www.metmuseum.org/art/collection/search/1"
+    site[moved] = (301, {"location": "/art/collection/search/437127"})
+    result = validate_artwork_url(moved)
+    assert result.ok and result.redirects == [ARTWORK]
+
+    site[ARTWORK] = (302, {"location": "https://spam.example/"})
+    assert "Redirected off the met site" in validate_artwork_url(ARTWORK).reason
+
+
+def test_redirect_without_location_or_to_a_search_page_is_rejected(site):
+    site[ARTWORK] = (302, {})
+    assert validate_artwork_url(ARTWORK).reason == "HTTP 302 without a Location header"
+
+    site[ARTWORK] = (302, {"location": "/art/collection/search?q=gone"})
+    assert validate_artwork_url(ARTWORK).reason.startswith("Not a met artwork page (redirected to")
+
+
+def test_redirect_loops_give_up(site):
+    site[ARTWORK] = (302, {"location": ARTWORK})
+    assert validate_artwork_url(ARTWORK, max_redirects=2).reason == "More than 2 redirects"
+
+
+def test_dead_links_and_non_pages_are_rejected(site):
+    site[ARTWORK] = (404, {})
+    assert validate_artwork_url(ARTWORK).reason == "HTTP 404"
+    site[ARTWORK] = (200, {"content-type": "application/pdf"})
+    assert validate_artwork_url(ARTWORK).reason == "Not a web page (application/pdf)"
+
+
+def test_inconclusive_answers_let_the_url_through(site):
+    site[ARTWORK] = (503, {})
+    assert validate_artwork_url(ARTWORK).ok
+    site[ARTWORK] = requests.Timeout()
+    result = validate_artwork_url(ARTWORK, timeout=1)
+    assert result.ok and result.reason == "No answer within 1s"
+    site[ARTWORK] = requests.ConnectionError()
+    assert validate_artwork_url(ARTWORK).reason == "Unreachable (ConnectionError)"
+
+
+def test_head_refusals_fall_back_to_get(site, monkeypatch):
+    site[ARTWORK] = (405, {})
+    monkeypatch.setattr(preflight, "http_get", lambda url, **kwargs: StandInHTTPResponse(url, 200, b"", "text/html"))
+    assert validate_artwork_url(ARTWORK).ok
@@ -0,0 +1,94 @@
+import json
+import os
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+from PIL import Image
+
+from utils import renditions
+from utils.renditions import RenditionPipeline, summarize_stats
+
+
+class FakePool:
+    def __init__(self):
+        self.shut_down = False
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    pipeline = RenditionPipeline(
+        output_dir=str(tmp_path / "renditions"), stats_path=str(tmp_path / "stats.jsonl"),
+        thumbnail_sizes=[32], formats=["webp"], max_workers=2, queue_size=1, max_pool_restarts=1,
+    )
+    yield pipeline
+    pipeline.shutdown()
+
+
+def read_stats(pipeline):
+    with open(pipeline.stats_path) as f:
+        return [json.loads(line) for line in f]
+
+
+def broken_future():
+    future = Future()
+    future.set_exception(BrokenProcessPool("A worker process terminated abruptly"))
+    return future
+
+
+def test_shutdown_renders_every_queued_image(pipeline, tmp_path, monkeypatch):
+    source = str(tmp_path / "painting.png")
+    Image.new("RGB", (120, 80), (200, 40, 40)).save(source)
+    monkeypatch.setattr(renditions, "_pipeline", pipeline)
+
+    assert pipeline.submit(source, timeout=None)
+    renditions.shutdown_rendition_pipeline()
+
+    records = {record["kind"]: record for record in read_stats(pipeline)}
+    assert (records["thumb32"]["width"], records["thumb32"]["height"]) == (32, 21)
+    assert records["full"]["format"] == "webp" and "error" not in records["full"]
+    assert summarize_stats(pipeline.stats_path)["thumb32/webp"]["count"] == 1
+    # A stopped pipeline starts again on the next image
+    assert pipeline.submit(source, timeout=None)
+
+
+def test_queue_full_leaves_the_stats_write_to_the_background_threads(pipeline, monkeypatch):
+    monkeypatch.setattr(pipeline, "_ensure_started", lambda: None)
+    assert pipeline.submit("a.png", timeout=0)
+
+    assert not pipeline.submit("b.png", timeout=0)
+    assert not pipeline.submit("c.png", timeout=0)
+    # Nothing written on the caller's thread
+    assert not os.path.exists(pipeline.stats_path)
+    pipeline._write_stats([{"source": "a.png", "kind": "thumb32"}])
+    assert [(r["source"], r.get("error")) for r in read_stats(pipeline)] == [
+        ("b.png", "queue full"), ("c.png", "queue full"), ("a.png", None),
+    ]
+
+
+def test_a_broken_pool_is_replaced_once_however_many_images_it_failed(pipeline):
+    broken = FakePool()
+    pipeline._executor = broken
+    for path in ("a.png", "b.png"):
+        pipeline._slots.acquire()
+        pipeline._on_done(broken_future(), path, 0.0, broken)
+
+    assert broken.shut_down
+    assert pipeline.pool_restarts == 1 and pipeline._executor is not broken
+    assert not pipeline.disabled
+    assert all("BrokenProcessPool" in record["error"] for record in read_stats(pipeline))
+    pipeline._executor.shutdown()
+
+
+def test_renditions_turn_off_after_too_many_broken_pools(pipeline):
+    pipeline.pool_restarts = pipeline.max_pool_restarts
+    broken = FakePool()
+    pipeline._executor = broken
+    pipeline._slots.acquire()
+    pipeline._on_done(broken_future(), "a.png", 0.0, broken)
+
+    assert pipeline.disabled and pipeline._executor is broken
+    assert not pipeline.submit("b.png")
@@ -0,0 +1,80 @@
+import asyncio
+
+from utils.scheduler import FairScheduler, priority_scope
+
+
+def waiting(scheduler, cls):
+    return scheduler.snapshot()["classes"][cls]["waiting"]
+
+
+def test_preempting_class_is_served_before_earlier_queued_work():
+    async def scenario():
+        scheduler = FairScheduler("test", 1)
+        held = await scheduler.acquire("interactive")
+        order = []
+
+        async def worker(cls):
+            granted = await scheduler.acquire(cls)
+            order.append(cls)
+            scheduler.release(granted)
+
+        bulk = asyncio.create_task(worker("bulk"))
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(worker("interactive"))
+        await asyncio.sleep(0)
+        scheduler.release(held)
+        await asyncio.gather(bulk, interactive)
+        return order
+
+    assert asyncio.run(scenario()) == ["interactive", "bulk"]
+
+
+def test_class_never_holds_more_than_its_max_share():
+    async def scenario():
+        scheduler = FairScheduler("test", 4)
+        assert scheduler.limits["bulk"] == 3
+        for _ in range(3):
+            await scheduler.acquire("bulk")
+        fourth = asyncio.create_task(scheduler.acquire("bulk"))
+        await asyncio.sleep(0)
+        assert not fourth.done()
+        assert waiting(scheduler, "bulk") == 1
+        # The slot kept free is still there for the other class
+        await asyncio.wait_for(scheduler.acquire("interactive"), 1)
+        scheduler.release("bulk")
+        await asyncio.wait_for(fourth, 1)
+        assert scheduler.in_flight == {"interactive": 1, "bulk": 3}
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        scheduler = FairScheduler("test", 1)
+        held = await scheduler.acquire("bulk")
+        waiter = asyncio.create_task(scheduler.acquire("bulk"))
+        await asyncio.sleep(0)
+        assert waiting(scheduler, "bulk") == 1
+
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        assert waiting(scheduler, "bulk") == 0
+        scheduler.release(held)
+        assert scheduler.in_flight == {"interactive": 0, "bulk": 0}
+        await asyncio.wait_for(scheduler.acquire("bulk"), 1)
+
+    asyncio.run(scenario())
+
+
+def test_slot_goes_back_to_the_class_it_was_granted_to():
+    async def scenario():
+        scheduler = FairScheduler("test", 2)
+        with priority_scope("bulk"):
+            async with scheduler:
+                assert scheduler.in_flight["bulk"] == 1
+                # A scope change inside the block must not move the slot
+                with priority_scope("interactive"):
+                    pass
+        assert scheduler.in_flight == {"interactive": 0, "bulk": 0}
+
+    asyncio.run(scenario())
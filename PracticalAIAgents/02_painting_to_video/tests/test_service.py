@@ -0,0 +1,111 @@
+import asyncio
+import json
+
+import pytest
+from aiohttp.test_utils import TestClient, TestServer
+
+import service
+
+ARTWORK_URL = "https://www.metmuseum.org/art/collection/search/436535"
+
+
+def run(scenario, **app_options):
+    """Run scenario(client) against the service on a local test server."""
+    async def main():
+        app = service.create_app(**{"concurrency": 2, "queue_size": 4, "metrics_port": None, **app_options})
+        async with TestClient(TestServer(app)) as client:
+            return await scenario(client)
+
+    return asyncio.run(main())
+
+
+def parse_sse(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if not line.startswith(":"))
+        if fields:
+            events.append((int(fields["id"]), fields["event"], json.loads(fields["data"])))
+    return events
+
+
+async def finished_job(client):
+    """Submit one artwork and read its event stream to the end."""
+    response = await client.post("/jobs", json={"artwork_url": ARTWORK_URL})
+    assert response.status == 202
+    body = await response.json()
+    assert response.headers["Location"] == body["links"]["self"]
+    events = parse_sse(await (await client.get(body["links"]["events"])).text())
+    return body["job_id"], events
+
+
+@pytest.mark.parametrize("body, error", [
+    ("not json", "Body must be JSON"),
+    ([ARTWORK_URL], "JSON object"),
+    ({"artwork_url": "ftp://example.org/x"}, "http(s) URLs"),
+    ({"artwork_url": ARTWORK_URL, "mode": "sketch"}, "mode must be"),
+    ({"artwork_url": ARTWORK_URL, "tenant": 7}, "tenant must be a string"),
+    ({"artwork_url": ARTWORK_URL, "priority": "vip"}, "Unknown priority class"),
+])
+def test_bad_submissions_get_400(body, error):
+    async def scenario(client):
+        payload = {"data": body} if isinstance(body, str) else {"json": body}
+        response = await client.post("/jobs", **payload)
+        return response.status, await response.json()
+
+    status, reply = run(scenario)
+    assert status == 400 and error in reply["error"]
+
+
+def test_submissions_past_the_queue_limit_get_429():
+    async def scenario(client):
+        response = await client.post("/jobs", json={"artwork_urls": [f"{ARTWORK_URL}?copy={i}" for i in range(3)]})
+        return response.status, response.headers.get("Retry-After")
+
+    status, retry_after = run(scenario, queue_size=2)
+    assert status == 429 and retry_after
+
+
+def test_job_events_stream_to_job_done_and_results_link_artifacts():
+    async def scenario(client):
+        job_id, events = await finished_job(client)
+        job = await (await client.get(f"/jobs/{job_id}")).json()
+        image_url = job["results"][0]["artifacts"]["image"]
+        image = await client.get(image_url, headers={"Range": "bytes=0-7"})
+        return events, job, image.status, await image.read()
+
+    events, job, status, head = run(scenario)
+    assert [seq for seq, _, _ in events] == list(range(len(events)))
+    assert events[-1][1] == "job_done"
+    assert job["status"] == "done" and job["results"][0]["error"] is None
+    assert (status, head) == (206, b"\x89PNG\r\n\x1a\n")
+
+
+def test_last_event_id_resumes_after_that_event():
+    async def scenario(client):
+        job_id, events = await finished_job(client)
+        resumed = await client.get(f"/jobs/{job_id}/events", headers={"Last-Event-ID": "1"})
+        return events, parse_sse(await resumed.text())
+
+    events, resumed = run(scenario)
+    assert resumed == events[2:]
+
+
+@pytest.mark.parametrize("last_event_id", ["-3", "9999", "abc"])
+def test_last_event_id_outside_the_stream_gets_400(last_event_id):
+    async def scenario(client):
+        job_id, _ = await finished_job(client)
+        response = await client.get(f"/jobs/{job_id}/events", headers={"Last-Event-ID": last_event_id})
+        return response.status, await response.json()
+
+    status, reply = run(scenario)
+    assert status == 400 and "not an event of job" in reply["error"]
+
+
+def test_unknown_jobs_and_artifacts_get_404():
+    async def scenario(client):
+        paths = ["/jobs/nope", "/jobs/nope/events", "/artifacts/images/missing.png", "/artifacts/secrets/x", "/artifacts/images/..%2Fconfig.py"]
+        return [(await client.get(path)).status for path in paths], await (await client.get("/healthz")).json()
+
+    statuses, health = run(scenario)
+    assert statuses == [404] * 5
+    assert health["status"] == "ok" and health["pending_artworks"] == 0
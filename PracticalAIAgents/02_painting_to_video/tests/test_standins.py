@@ -0,0 +1,124 @@
+import asyncio
+import json
+from io import BytesIO
+
+import pytest
+from google.genai import errors as genai_errors
+from google.genai import types
+from PIL import Image
+
+from utils import standins
+from utils.providers import get_openai_client
+from utils.standins import (
+    STANDIN_HOST, StandInCrawler, StandInGenaiClient, StandInResponder, StandInSettings,
+    standin_http_get, standin_http_head, synthetic_image,
+)
+
+
+def tool(name, *parameters):
+    return {"type": "function", "name": name, "parameters": {"type": "object", "properties": {p: {"type": "string"} for p in parameters}}}
+
+
+def test_responder_calls_each_tool_once_in_order_then_answers_with_the_schema():
+    responder = StandInResponder()
+    body = {
+        "instructions": "Call extract_details, then generate_prompt.",
+        "input": [{"role": "user", "content": "URL: https://www.metmuseum.org/art/collection/search/437127"}],
+        "tools": [tool("extract_details", "artwork_url"), tool("generate_prompt", "artwork")],
+        "text": {"format": {"type": "json_schema", "schema": {"type": "object", "properties": {"prompt": {"type": "string"}}}}},
+    }
+
+    first = responder.respond(body)["output"][0]
+    assert first["name"] == "extract_details"
+    assert json.loads(first["arguments"]) == {"artwork_url": "https://www.metmuseum.org/art/collection/search/437127"}
+
+    body["input"] += [first, {"type": "function_call_output", "call_id": first["call_id"], "output": '{"artwork": "artwork:3f2a"}'}]
+    second = responder.respond(body)["output"][0]
+    assert second["name"] == "generate_prompt"
+    assert json.loads(second["arguments"]) == {"artwork": "artwork:3f2a"}
+
+    body["input"] += [second, {"type": "function_call_output", "call_id": second["call_id"], "output": '{"prompt": "prompt:91c0"}'}]
+    final = responder.respond(body)
+    assert json.loads(final["output"][0]["content"][0]["text"]) == {"prompt": "prompt:91c0"}
+    assert final["usage"]["input_tokens"] > 0
+
+
+def test_responder_stops_calling_tools_after_a_tool_error():
+    responder = StandInResponder()
+    call = {"type": "function_call", "name": "generate_image", "call_id": "call_1", "arguments": "{}"}
+    body = {
+        "input": [{"role": "user", "content": "prompt:91c0"}, call,
+                  {"type": "function_call_output", "call_id": "call_1", "output": "An error occurred while running the tool."}],
+        "tools": [tool("generate_image", "prompt"), tool("generate_video", "prompt")],
+    }
+    assert responder.respond(body)["output"][0]["type"] == "message"
+
+
+def test_openai_client_gets_deterministic_text_offline():
+    client = get_openai_client()
+    first = client.responses.create(model="gpt-4.1", input="Describe a harbor at dusk")
+    second = client.responses.create(model="gpt-4.1", input="Describe a harbor at dusk")
+    assert first.output_text and first.output_text == second.output_text
+    assert first.usage.output_tokens > 0
+
+
+def test_settings_scale_latency_and_inject_failures():
+    settings = StandInSettings(latency={"imagen": (2.0, 4.0)}, failure_rates={"imagen": 1.0}, latency_scale=0.5, seed=1)
+    samples = [settings.sample_latency("imagen") for _ in range(200)]
+    assert all(sample > 0 for sample in samples)
+    assert sorted(samples)[100] == pytest.approx(1.0, rel=0.3)
+    assert settings.sample_latency("unknown") == 0.0
+    assert settings.should_fail("imagen") and not settings.should_fail("veo")
+
+
+def test_synthetic_images_differ_by_seed_and_honour_size():
+    image = Image.open(BytesIO(synthetic_image("a", 64, 48)))
+    assert image.size == (64, 48)
+    assert synthetic_image("a", 64, 48) != synthetic_image("b", 64, 48)
+
+
+def test_http_stand_ins_serve_images_ranges_and_pages():
+    url = f"https://{STANDIN_HOST}/images/abc.jpg"
+    full = standin_http_get(url)
+    assert full.status_code == 200 and Image.open(BytesIO(full.content)).size == (1200, 1600)
+    assert Image.open(BytesIO(standin_http_get(f"https://{STANDIN_HOST}/images/abc-thumb.jpg").content)).size == (300, 400)
+
+    part = standin_http_get(url, headers={"Range": "bytes=0-99"})
+    assert part.status_code == 206 and part.content == full.content[:100]
+    assert part.headers["content-range"] == f"bytes 0-99/{len(full.content)}"
+    assert standin_http_head(f"https://{STANDIN_HOST}/art/1").headers["content-type"].startswith("text/html")
+
+
+def test_injected_download_failure_is_an_http_error(monkeypatch):
+    monkeypatch.setitem(standins.settings.failure_rates, "download", 1.0)
+    response = standin_http_get(f"https://{STANDIN_HOST}/images/abc.jpg")
+    assert response.status_code in (429, 500, 503)
+    with pytest.raises(Exception):
+        response.raise_for_status()
+
+
+def test_genai_stand_in_generates_images_and_videos(monkeypatch):
+    client = StandInGenaiClient()
+    images = client.models.generate_images(model="imagen", prompt="harbor", config=types.GenerateImagesConfig(number_of_images=2, aspect_ratio="9:16"))
+    assert [Image.open(BytesIO(g.image.image_bytes)).size for g in images.generated_images] == [(768, 1344)] * 2
+
+    operation = client.models.generate_videos(model="veo", prompt="slow pan")
+    operation = client.operations.get(operation)
+    assert operation.done
+    video = operation.response.generated_videos[0].video
+    assert len(client.files.download(file=video)) == standins.STANDIN_VIDEO_BYTES
+
+    monkeypatch.setitem(standins.settings.failure_rates, "imagen", 1.0)
+    with pytest.raises(genai_errors.APIError):
+        client.models.generate_images(model="imagen", prompt="harbor")
+
+
+def test_crawler_page_lists_a_thumbnail_before_the_main_image():
+    async def crawl():
+        async with StandInCrawler() as crawler:
+            return await crawler.arun(f"https://{STANDIN_HOST}/art/1")
+
+    page = asyncio.run(crawl())
+    assert page.success
+    assert "Title: Stand-in Study" in page.cleaned_html
+    assert page.cleaned_html.index("-thumb.jpg") < page.cleaned_html.index('.jpg" alt="main image"')
@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from utils import standins
+from utils.providers import get_async_openai_client
+from utils.text_batch import BatchRequestError, ResponsesBatcher, output_text
+
+
+def request(text):
+    return {"model": "gpt-4.1", "input": [{"role": "user", "content": text}]}
+
+
+async def submit_all(batcher, count):
+    return await asyncio.gather(*(batcher.submit(request(f"prompt {i}")) for i in range(count)), return_exceptions=True)
+
+
+def test_requests_in_one_window_share_a_batch():
+    async def scenario():
+        batcher = ResponsesBatcher(get_async_openai_client(), window=0.05, poll_seconds=0)
+        before = len(standins.batch_store.batches)
+        results = await submit_all(batcher, 3)
+        return results, len(standins.batch_store.batches) - before
+
+    results, batches = asyncio.run(scenario())
+    assert batches == 1
+    assert all(output_text(body) for body in results)
+
+
+def test_full_batch_is_sent_without_waiting_for_the_window():
+    async def scenario():
+        batcher = ResponsesBatcher(get_async_openai_client(), window=60, max_requests=2, poll_seconds=0)
+        before = len(standins.batch_store.batches)
+        results = await asyncio.wait_for(submit_all(batcher, 2), 5)
+        return results, len(standins.batch_store.batches) - before
+
+    results, batches = asyncio.run(scenario())
+    assert batches == 1
+    assert all(output_text(body) for body in results)
+
+
+def test_failed_batch_fails_every_waiting_request(monkeypatch):
+    monkeypatch.setitem(standins.settings.failure_rates, "batch", 1.0)
+
+    async def scenario():
+        batcher = ResponsesBatcher(get_async_openai_client(), window=0.05, poll_seconds=0)
+        return await submit_all(batcher, 3)
+
+    results = asyncio.run(scenario())
+    assert len(results) == 3
+    for result in results:
+        assert isinstance(result, BatchRequestError)
+        assert "failed" in str(result)
+
+
+def test_failure_does_not_leak_into_later_batches(monkeypatch):
+    monkeypatch.setitem(standins.settings.failure_rates, "batch", 1.0)
+
+    async def scenario():
+        batcher = ResponsesBatcher(get_async_openai_client(), window=0.01, poll_seconds=0)
+        with pytest.raises(BatchRequestError):
+            await batcher.submit(request("lost"))
+        monkeypatch.setitem(standins.settings.failure_rates, "batch", 0.0)
+        return await batcher.submit(request("kept"))
+
+    assert output_text(asyncio.run(scenario()))
@@ -0,0 +1,47 @@
+import asyncio
+import threading
+
+from tools.TextGenerator import TextGenerator
+
+
+def test_generate_keeps_the_request_off_the_event_loop(monkeypatch):
+    generator = TextGenerator()
+    build_input = generator._request_input
+    threads = []
+
+    def request_input(user_message, image_url, detail):
+        threads.append(threading.current_thread())
+        return build_input(user_message, image_url, detail)
+
+    monkeypatch.setattr(generator, "_request_input", request_input)
+
+    async def generate():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                ticks += 1
+                await asyncio.sleep(0)
+
+        ticking = asyncio.create_task(ticker())
+        text = await generator.generate("Write an image prompt.", "A harbor at dusk")
+        ticking.cancel()
+        return text, ticks
+
+    text, ticks = asyncio.run(generate())
+    assert text
+    assert threads and threads[0] is not threading.main_thread()
+    # The loop kept running other tasks while the request was in flight
+    assert ticks > 1
+
+
+def test_stream_ends_with_the_whole_response():
+    generator = TextGenerator()
+
+    async def stream():
+        return [chunk async for chunk in generator.generate_stream("Write an image prompt.", "A harbor at dusk")]
+
+    chunks = asyncio.run(stream())
+    assert chunks[-1].done and not any(chunk.done for chunk in chunks[:-1])
+    assert "".join(chunk.delta for chunk in chunks).strip() == chunks[-1].text != ""
@@ -0,0 +1,96 @@
+import datetime
+import importlib.util
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from utils.trace_store import SCHEMA, SQLiteTraceProcessor, TraceStore, percentile, span_name
+
+T0 = datetime.datetime(2026, 1, 1, tzinfo=datetime.timezone.utc).timestamp()
+
+
+def iso(offset):
+    return datetime.datetime.fromtimestamp(T0 + offset, datetime.timezone.utc).isoformat()
+
+
+def span(span_id, data, start, end, parent_id=None, error=None):
+    return SimpleNamespace(
+        span_id=span_id, trace_id="trace_1", parent_id=parent_id, error=error,
+        started_at=iso(start), ended_at=iso(end), span_data=SimpleNamespace(export=lambda: data),
+    )
+
+
+@pytest.fixture
+def store(tmp_path):
+    db_path = str(tmp_path / "traces.db")
+    processor = SQLiteTraceProcessor(db_path, span_types=["agent", "function", "custom"])
+    processor.on_trace_start(SimpleNamespace(trace_id="trace_1", name="Painting to video", group_id=None, metadata={"url": "x"}))
+    processor.on_span_end(span("agent", {"type": "agent", "name": "Coordinator"}, 0, 10))
+    # Two tool calls running side by side under the agent
+    processor.on_span_end(span("image", {"type": "function", "name": "generate_image", "output": "x" * 5000}, 1, 6, "agent"))
+    processor.on_span_end(span("prompt", {"type": "function", "name": "generate_prompt"}, 4, 8, "agent", error={"message": "boom"}))
+    processor.on_span_end(span("stage", {"type": "custom", "name": "stage:crawl"}, 7, 8, "agent"))
+    processor.on_span_end(span("llm", {"type": "generation", "model": "gpt-4.1"}, 0, 1, "agent"))
+    processor.on_trace_end(SimpleNamespace(trace_id="trace_1"))
+    processor.shutdown()
+    return TraceStore(db_path)
+
+
+def test_span_names_are_stable_per_type():
+    assert span_name({"type": "function", "name": "generate_image"}) == "tool:generate_image"
+    assert span_name({"type": "generation", "model": "gpt-4.1"}) == "generation:gpt-4.1"
+    assert span_name({"type": "handoff", "from_agent": "A", "to_agent": "B"}) == "handoff:A->B"
+    assert span_name({"type": "custom", "name": "stage:crawl"}) == "stage:crawl"
+    assert span_name({"type": "agent", "name": "Coordinator"}) == "agent:Coordinator"
+
+
+def test_percentiles_use_nearest_rank():
+    values = list(range(1, 101))
+    assert (percentile(values, 0.5), percentile(values, 0.99), percentile([7], 0.95)) == (50, 99, 7)
+
+
+def test_only_configured_span_types_are_stored(store):
+    spans = store.slowest_spans()
+    assert [s["name"] for s in spans] == ["agent:Coordinator", "tool:generate_image", "tool:generate_prompt", "stage:crawl"]
+    assert spans[0]["duration_ms"] == pytest.approx(10000)
+    assert store.slowest_spans(span_type="function", limit=1)[0]["name"] == "tool:generate_image"
+    assert store.span_percentiles()["tool:generate_prompt"]["count"] == 1
+
+    [run] = store.slowest_runs()
+    assert (run["trace_id"], run["spans"], run["errors"]) == ("trace_1", 4, 1)
+
+
+def test_chrome_trace_puts_overlapping_siblings_on_separate_lanes(store):
+    trace = store.chrome_trace("trace_1")
+    events = {event["name"]: event for event in trace["traceEvents"]}
+
+    assert events["agent:Coordinator"]["tid"] == 0 and events["agent:Coordinator"]["dur"] == 10_000_000
+    assert events["tool:generate_image"]["tid"] == 0
+    assert events["tool:generate_prompt"]["tid"] == 1
+    # Nested inside the agent once the image call has ended, so back on the first lane
+    assert events["stage:crawl"]["tid"] == 0
+    assert events["tool:generate_prompt"]["args"]["error"] == {"message": "boom"}
+    assert events["tool:generate_image"]["args"]["output"].endswith("...")
+    with pytest.raises(KeyError):
+        store.chrome_trace("missing")
+
+
+def test_ufc_script_writes_runs_the_store_can_read(tmp_path):
+    # The UFC script keeps its own copy of the processor; it must stay compatible with this store
+    path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "ufc_instrumentation.py")
+    spec = importlib.util.spec_from_file_location("ufc_instrumentation", path)
+    ufc = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(ufc)
+    assert ufc.TRACE_SCHEMA == SCHEMA
+
+    db_path = str(tmp_path / "traces.db")
+    processor = ufc.SQLiteTraceProcessor(db_path)
+    processor.on_trace_start(SimpleNamespace(trace_id="trace_1", name="UFC Fighter Data Collection", group_id=None, metadata=None))
+    processor.on_span_end(span("tool", {"type": "function", "name": "crawl_url"}, 0, 2))
+    processor.on_trace_end(SimpleNamespace(trace_id="trace_1"))
+    processor.shutdown()
+
+    [run] = TraceStore(db_path).slowest_runs()
+    assert (run["workflow_name"], run["spans"]) == ("UFC Fighter Data Collection", 1)
+    assert TraceStore(db_path).slowest_spans()[0]["name"] == "tool:crawl_url"
@@ -1,14 +1,21 @@
 #ImageGenerator.py
 
+import asyncio
 import traceback
 
 import requests
 import os
+from typing import Optional
 
 from utils.file_storage_utils import FileStorage
+from utils.metrics import instrument_stage, bytes_transferred
+from utils.limits import limited
+from utils.providers import get_genai_client
+from utils.cost_ledger import check_budget, record_usage
+from utils.perceptual_hash import ImageHash, hash_artifact, record_output
+from utils.failures import StageError, require_prompt
 import structlog
 from google.genai import types
-from google import genai
 logger = structlog.get_logger()
 
 class GeminiImageGenerator:
@@ -17,31 +24,45 @@ class GeminiImageGenerator:
         self.model = "imagen-3.0-generate-002"
         self.aspect_ratio = "9:16"
         # Instantiate the Gemini client with API key
-        self.client = genai.Client(
+        self.client = get_genai_client(
             api_key=os.environ.get("GOOGLE_API_KEY"),
             http_options={"api_version": "v1alpha"}
         )
         # Instantiate the FileStorage utility
         self.file_storage = FileStorage()
 
-    async def generate(self, image_prompt: str):
+    @limited("imagen")
+    @instrument_stage("image_generation")
+    async def generate(self, image_prompt: str, source: Optional[ImageHash] = None) -> str:
+        """
+        Generate an image with Imagen and save it locally
+        
+        The output is perceptually hashed and added to the index; an output
+        nearly identical to an earlier generated image is logged and counted
+        as redundant.
+        
+        Args:
+            image_prompt: Prompt for the image
+            source: Perceptual hash of the source artwork the prompt was written from, if known
+        
+        Returns:
+            Local path of the generated image
+        
+        Raises:
+            StageError: if there is no prompt, the request failed or no image came back
+        """
+        check_budget()
+        # Checked before the try below so a missing prompt never reaches Imagen
+        image_prompt = require_prompt("image_generation", image_prompt)
         try:
-            if image_prompt is None:
-                logger.error("GeminiImageGenerator: image_prompt is required")
-                return None
-
             test_mode = False
             if test_mode:
                 logger.info("GeminiImageGenerator: test_mode")
                 # Return test data if enabled
                 finalUrl = "https://myaiappess3bucketnonprod.s3.eu-south-2.amazonaws.com/1/assets/chat/1/20241130_fd938d0c_tmp9edokoto.png"
-                # Also save it locally if it's a valid URL
-                try:
-                    response = requests.get(finalUrl)
-                    response.raise_for_status()
-                    local_path = self.file_storage.save_image(response.content, prompt)
-                except Exception as e:
-                    logger.error(f"Failed to save test image locally: {str(e)}")
+                response = requests.get(finalUrl)
+                response.raise_for_status()
+                local_path = await asyncio.to_thread(self.file_storage.persist_image(response.content, image_prompt).wait_persisted)
             else:
                 logger.info("GeminiImageGenerator: image_prompt %s", image_prompt)
 
@@ -58,24 +79,35 @@ class GeminiImageGenerator:
                     config=config
                 )
 
+                # Priced per returned image
+                record_usage("image_generation", self.model, units=len(response.generated_images or []))
+
                 if not response.generated_images:
+                    # Imagen answers a prompt blocked by its safety filters with no images
                     logger.error("GeminiImageGenerator: No images generated")
-                    return None
+                    raise StageError("image_generation", "no images generated (the prompt may have been filtered)", error="no_output")
                 generated_image = response.generated_images[0]
                 image_bytes = generated_image.image.image_bytes
+                bytes_transferred.inc(len(image_bytes), stage="image_generation", direction="in")
 
-                # Save the generated image locally
-                local_path = self.file_storage.save_image(image_bytes, image_prompt)
-
-            if local_path:
-                logger.info(f"Generated image saved locally at: {local_path}")
-                return local_path
-            else:
-                logger.error("GeminiImageGenerator: Failed to save image locally")
-                return None
+                # Keep the bytes in memory for later stages and write them to disk in the background
+                artifact = self.file_storage.persist_image(image_bytes, image_prompt)
+                own = await hash_artifact(artifact)
+                # The path is only reported (and indexed) once the file is really there
+                local_path = await asyncio.to_thread(artifact.wait_persisted)
+                if local_path:
+                    await record_output(source, "image", local_path, own=own)
 
+        except StageError:
+            raise
         except Exception as e:
             logger.error("Error in generate_image (GeminiImageGenerator)")
             logger.error(e)
             traceback.print_exc()
-            return None
+            raise StageError.from_exception("image_generation", e) from e
+
+        if not local_path:
+            logger.error("GeminiImageGenerator: Failed to save image locally")
+            raise StageError("image_generation", "the generated image could not be saved", error="save_failed")
+        logger.info(f"Generated image saved locally at: {local_path}")
+        return local_path
@@ -1,11 +1,26 @@
+import asyncio
 import os
-from typing import Dict, Any, Optional
-from openai import OpenAI
+from dataclasses import dataclass
+from typing import Dict, Any, AsyncIterator, Optional, Union, List
 import structlog
 from utils.file_storage_utils import FileStorage
+from utils.providers import get_async_openai_client
+from utils.metrics import instrument_stage, bytes_transferred
+from utils.limits import limited
+from utils.cost_ledger import check_budget, record_response_usage
+from utils.text_batch import get_batcher, output_text
+from utils.failures import StageError
+from config import BATCH_API_PRICE_FACTOR
 
 logger = structlog.get_logger()
 
+@dataclass
+class TextChunk:
+    """One step of a streamed text response"""
+    delta: str  # Text added by this chunk
+    text: str  # Text so far; the full response (stripped) on the final chunk
+    done: bool = False
+
 class TextGenerator:
     """
     A class for generating text content using OpenAI models with support for image inputs
@@ -13,8 +28,8 @@ class TextGenerator:
     
     def __init__(self):
         """Initialize the text generator with default settings"""
-        # Initialize OpenAI client
-        self.client = OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+        # Initialize OpenAI client (or the offline stand-in); async, so no request blocks the event loop
+        self.async_client = get_async_openai_client()
         
         # Default settings
         self.model = "gpt-4o-mini"
@@ -39,6 +54,8 @@ class TextGenerator:
             if "temperature" in text_settings:
                 self.temperature = float(text_settings["temperature"])
 
+    @limited("openai")
+    @instrument_stage("text_generation")
     async def generate(self, system_prompt: str, user_message: str, image_url: Optional[str] = None, detail: str = "auto") -> str:
         """
         Generate a text response using OpenAI's Response API, optionally with an image input
@@ -51,77 +68,172 @@ class TextGenerator:
             
         Returns:
             Generated text response
+            
+        Raises:
+            StageError: if the request failed or the response has no text
         """
         logger.debug(f"Generating text response using model: {self.model}")
+        # Raised outside the try below so an exhausted budget aborts as BudgetExceededError
+        check_budget()
         
         try:
-            # Handle text-only request (no image)
-            if not image_url:
-                response = self.client.responses.create(
-                    model=self.model,
-                    instructions=system_prompt,
-                    input=user_message,
-                    temperature=self.temperature
-                )
-                
-                text = response.output_text.strip()
-                logger.debug(f"Generated text (preview): {text[:100]}...")
-                return text
-            
-            # Process the image if provided
-            image_data_url = None
-            
-            # Handle data URL, local file, or remote URL
-            if image_url.startswith("data:"):
-                # Already a data URL
-                image_data_url = image_url
-            elif os.path.exists(image_url):
-                # Local file path - encode to base64
-                image_data_url = self.file_storage.encode_image_to_base64(image_url)
-            else:
-                # Remote URL - download and encode
-                local_path = self.file_storage.download_image(image_url)
-                if local_path and not local_path.startswith("data:"):
-                    image_data_url = self.file_storage.encode_image_to_base64(local_path)
-                else:
-                    # If download failed or returned a data URL already
-                    image_data_url = local_path or image_url
-            
-            # Create content structure for the input
-            content = [
-                {"type": "input_text", "text": user_message}
-            ]
-            
-            # Add image data if we have a valid URL
-            if image_data_url:
-                content.append({
-                    "type": "input_image",
-                    "image_url": image_data_url,
-                    "detail": detail
-                })
+            # Loading the image may download it; keep that off the event loop
+            input_data = await asyncio.to_thread(self._request_input, user_message, image_url, detail)
+            response = await self.async_client.responses.create(
+                model=self.model,
+                instructions=system_prompt,
+                input=input_data,
+                temperature=self.temperature
+            )
+        except Exception as e:
+            logger.error(f"Error generating text response: {str(e)}")
+            raise StageError.from_exception("text_generation", e) from e
+        record_response_usage("text_generation", self.model, response.usage)
+        
+        # Extract and return the generated text
+        text = self._require_text(response.output_text)
+        logger.debug(f"Generated text{' with image' if image_url else ''} (preview): {text[:100]}...")
+        return text
+
+    @limited("openai")
+    @instrument_stage("text_generation")
+    async def generate_stream(self, system_prompt: str, user_message: str, image_url: Optional[str] = None, detail: str = "auto") -> AsyncIterator[TextChunk]:
+        """
+        Stream a text response from OpenAI's Responses API as it is generated
+        
+        Takes the same arguments as generate. Usage is recorded when the
+        response completes, so close the stream early only if the cost of the
+        partial response does not matter.
+        
+        Args:
+            system_prompt: Instructions for the AI model
+            user_message: The user's input message
+            image_url: Optional URL or path to an image to include in the request
+            detail: Detail level for image processing ('low', 'high', or 'auto')
             
-            # Create the input structure with role and content
-            input_data = [{
-                "role": "user",
-                "content": content
-            }]
+        Yields:
+            A TextChunk per text delta, then a final chunk (done=True) with the whole response
             
-            # Make the API call with image
-            response = self.client.responses.create(
+        Raises:
+            StageError: if the request or the stream failed, or the response has no text
+        """
+        logger.debug(f"Streaming text response using model: {self.model}")
+        check_budget()
+        
+        text = ""
+        try:
+            # Loading the image may download it; keep that off the event loop
+            input_data = await asyncio.to_thread(self._request_input, user_message, image_url, detail)
+            stream = await self.async_client.responses.create(
                 model=self.model,
                 instructions=system_prompt,
                 input=input_data,
-                temperature=self.temperature
+                temperature=self.temperature,
+                stream=True
             )
+            async with stream:
+                async for event in stream:
+                    if event.type == "response.output_text.delta":
+                        text += event.delta
+                        yield TextChunk(event.delta, text)
+                    elif event.type == "response.completed":
+                        record_response_usage("text_generation", self.model, event.response.usage)
+                    elif event.type == "response.failed":
+                        raise StageError("text_generation", f"Response failed: {event.response.error}", error="response_failed")
+                    elif event.type == "error":
+                        raise StageError("text_generation", event.message, error="stream_error")
+        except StageError:
+            raise
+        except Exception as e:
+            logger.error(f"Error streaming text response: {str(e)}")
+            raise StageError.from_exception("text_generation", e) from e
+        
+        text = self._require_text(text)
+        logger.debug(f"Streamed text (preview): {text[:100]}...")
+        yield TextChunk("", text, done=True)
+
+    @instrument_stage("text_batch")
+    async def generate_batched(self, system_prompt: str, user_message: str, image_url: Optional[str] = None, detail: str = "auto") -> str:
+        """
+        Generate a text response through the OpenAI Batch API
+        
+        Takes the same arguments as generate. The request is parked with the
+        process-wide ResponsesBatcher and goes out in the next batch job; the
+        caller waits for that job (minutes, up to the 24h window) without
+        holding an "openai" slot or a connection, at BATCH_API_PRICE_FACTOR
+        of the regular price. If the batch fails, the request is retried
+        with generate.
+        
+        Args:
+            system_prompt: Instructions for the AI model
+            user_message: The user's input message
+            image_url: Optional URL or path to an image to include in the request
+            detail: Detail level for image processing ('low', 'high', or 'auto')
             
-            # Extract and return the generated text
-            text = response.output_text.strip()
-            logger.debug(f"Generated text with image (preview): {text[:100]}...")
-            return text
+        Returns:
+            Generated text response
             
+        Raises:
+            StageError: if the batched response has no text, or the direct retry failed
+        """
+        logger.debug(f"Batching text request for model: {self.model}")
+        check_budget()
+        
+        try:
+            # Loading the image may download it; keep that off the event loop
+            input_data = await asyncio.to_thread(self._request_input, user_message, image_url, detail)
+            body = {
+                "model": self.model,
+                "instructions": system_prompt,
+                "input": input_data,
+                "temperature": self.temperature
+            }
+            response = await get_batcher(self.async_client).submit(body)
         except Exception as e:
-            error_msg = f"Error generating text response: {str(e)}"
-            logger.error(error_msg)
-            return f"Failed to generate text: {error_msg}"
+            logger.warning(f"Batch request failed, generating directly: {type(e).__name__}: {str(e)}")
+            return await self.generate(system_prompt, user_message, image_url, detail=detail)
+        
+        record_response_usage("text_generation", self.model, response.get("usage"), price_factor=BATCH_API_PRICE_FACTOR)
+        text = self._require_text(output_text(response))
+        logger.debug(f"Batched text (preview): {text[:100]}...")
+        return text
 
-    
\ No newline at end of file
+    def _require_text(self, text: Optional[str]) -> str:
+        """The stripped response text; a refusal or empty response is a failure, not a prompt"""
+        text = (text or "").strip()
+        if not text:
+            raise StageError("text_generation", f"{self.model} returned no text", error="empty_result")
+        return text
+
+    def _request_input(self, user_message: str, image_url: Optional[str], detail: str) -> Union[str, List[Dict[str, Any]]]:
+        """Responses API input: the message alone, or the message plus the image"""
+        # Handle text-only request (no image)
+        if not image_url:
+            return user_message
+        
+        # Resolve the image to an in-memory artifact (reuses bytes produced by earlier stages)
+        artifact = self.file_storage.load_image_artifact(image_url)
+        # Fall back to passing the URL through if the image could not be loaded
+        image_data_url = artifact.data_url if artifact else image_url
+        
+        if image_data_url and image_data_url.startswith("data:"):
+            bytes_transferred.inc(len(image_data_url), stage="text_generation", direction="out")
+        
+        # Create content structure for the input
+        content = [
+            {"type": "input_text", "text": user_message}
+        ]
+        
+        # Add image data if we have a valid URL
+        if image_data_url:
+            content.append({
+                "type": "input_image",
+                "image_url": image_data_url,
+                "detail": detail
+            })
+        
+        # Create the input structure with role and content
+        return [{
+            "role": "user",
+            "content": content
+        }]
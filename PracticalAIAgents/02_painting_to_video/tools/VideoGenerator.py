@@ -4,9 +4,15 @@ import structlog
 import time
 import os
 import asyncio
-import PIL.Image
 
+from config import IMAGE_REFERENCE_CACHE_ENABLED, IMAGE_REFERENCE_UPLOADER, IMAGE_REFERENCE_GCS_BUCKET, VIDEO_POLL_INTERVAL, VIDEO_TIMEOUT
 from utils.file_storage_utils import FileStorage
+from utils.metrics import instrument_stage, bytes_transferred
+from utils.limits import limited
+from utils.providers import get_genai_client, provider_mode, poll_interval, LIVE_PROVIDER_MODES
+from utils.cost_ledger import check_budget, record_usage
+from utils.image_reference_cache import ImageReferenceCache, GCSImageUploader, LocalImageUploader
+from utils.failures import StageError, require_prompt
 from google.genai import types
 from google import genai
 
@@ -21,20 +27,60 @@ class GeminiVideoGenerator:
         self.duration_seconds = 5  # Default duration 5 seconds, can be between 5-8
         self.enhance_prompt = True
         self.video_mode = None  # text2video or img2video
+        self.poll_interval = poll_interval(VIDEO_POLL_INTERVAL)  # Seconds between operation polls
+        self.timeout = VIDEO_TIMEOUT  # Seconds before an unfinished operation is cancelled
         # Instantiate the Gemini client with API key
         api_key = os.environ.get("GOOGLE_API_KEY")
-        if not api_key:
+        if not api_key and provider_mode() in LIVE_PROVIDER_MODES:
             # Log error and potentially raise a more specific configuration error
             logger.error("GOOGLE_API_KEY environment variable not set.")
             raise ValueError("GOOGLE_API_KEY must be set in environment variables.")
-        self.client = genai.Client(
+        self.client = get_genai_client(
             api_key=api_key,
             #http_options={"api_version": "v1alpha"}
         )
         # Instantiate the FileStorage utility
         self.file_storage = FileStorage()
+        # Upload-once cache so sweeps over one image don't resend its bytes inline
+        self.image_reference_cache = None
+        if IMAGE_REFERENCE_CACHE_ENABLED:
+            self.image_reference_cache = self._build_image_reference_cache()
 
-    async def generate(self, prompt: str, image_path: str | None = None) -> str | None:
+    def _build_image_reference_cache(self) -> ImageReferenceCache | None:
+        """Image reference cache for this client, or None where references cannot be used."""
+        # The Developer API rejects Image(gcs_uri=...); only Vertex AI reads images by URI
+        if not getattr(self.client, "vertexai", False):
+            logger.warning("GeminiVideoGenerator: Image references need a Vertex AI client (GOOGLE_GENAI_USE_VERTEXAI=true); sending images inline")
+            return None
+        if IMAGE_REFERENCE_UPLOADER == "local":
+            if provider_mode() in LIVE_PROVIDER_MODES:
+                logger.warning("GeminiVideoGenerator: The local image uploader only works with offline stand-ins; sending images inline")
+                return None
+            return ImageReferenceCache(LocalImageUploader(os.path.join(self.file_storage.outputs_dir, "uploads")))
+        return ImageReferenceCache(GCSImageUploader(IMAGE_REFERENCE_GCS_BUCKET))
+
+    async def _build_api_image(self, artifact) -> types.Image:
+        """
+        Build the API image for img2video, preferring an uploaded reference over inline bytes.
+
+        Args:
+            artifact: ImageArtifact holding the input image
+
+        Returns:
+            types.Image pointing at an uploaded file, or carrying the bytes inline
+        """
+        if self.image_reference_cache:
+            try:
+                reference = await self.image_reference_cache.get_reference(artifact)
+                return types.Image(gcs_uri=reference.uri, mime_type=reference.mime_type)
+            except Exception as e:
+                logger.error(f"GeminiVideoGenerator: Image upload failed, sending bytes inline: {str(e)}")
+        bytes_transferred.inc(artifact.size, stage="video_generation", direction="out")
+        return types.Image(image_bytes=artifact.to_bytes(), mime_type=artifact.mime_type)
+
+    @limited("veo")
+    @instrument_stage("video_generation")
+    async def generate(self, prompt: str, image_path: str | None = None) -> str:
         """
         Generates a video based on a text prompt and an optional input image path.
         Uses instance attributes for configuration parameters.
@@ -44,34 +90,40 @@ class GeminiVideoGenerator:
             image_path: Optional path to a local image file for image-to-video generation.
 
         Returns:
-            The local path to the generated video file, or None if generation failed.
+            The local path to the generated video file.
+
+        Raises:
+            StageError: if there is no prompt, the input image could not be used,
+                or Veo failed, timed out or returned no video.
         """
+        check_budget()
+        # Checked before the try below so a missing prompt never reaches Veo
+        prompt = require_prompt("video_generation", prompt)
         try:
-            if not prompt:
-                logger.error("GeminiVideoGenerator: Prompt is required")
-                return None
-
-            image_prompt_pil = None
+            api_image = None
             video_mode = "text2video"
             # Process input image if path is provided
             if image_path:
                 try:
-                    if not os.path.exists(image_path):
-                        logger.error(f"GeminiVideoGenerator: Input image path does not exist: {image_path}")
-                        return None
-                    image_prompt_pil = PIL.Image.open(image_path)
+                    # Served from memory when the image was produced earlier in this process
+                    artifact = self.file_storage.load_image_artifact(image_path)
+                    if artifact is None:
+                        logger.error(f"GeminiVideoGenerator: Input image could not be loaded: {image_path}")
+                        raise StageError("video_generation", f"input image could not be loaded: {image_path}", error="input_image")
                     video_mode = "img2video"
                     logger.info(f"GeminiVideoGenerator: Using input image from path: {image_path} for {video_mode}")
-                    # Build API Image object from file
-                    api_image = types.Image.from_file(location=image_path)
+                    # Build API Image object (uploaded reference or in-memory bytes)
+                    api_image = await self._build_api_image(artifact)
+                except StageError:
+                    raise
                 except Exception as e:
                     logger.error(f"Error processing input image file: {str(e)}")
                     traceback.print_exc()
-                    return None
+                    raise StageError("video_generation", f"input image could not be used: {type(e).__name__}: {str(e)}", error="input_image") from e
 
             # Track the async operation
             operation: genai.Operation
-            if image_prompt_pil:
+            if api_image:
                 # Image-to-video generation
                 config = types.GenerateVideosConfig(
                     aspect_ratio=self.aspect_ratio,
@@ -80,12 +132,28 @@ class GeminiVideoGenerator:
                 )
                 logger.info(f"GeminiVideoGenerator using model: {self.model}, mode: {video_mode}, config: {config}")
                 logger.info("GeminiVideoGenerator: Initiating image-to-video generation")
-                operation = self.client.models.generate_videos(
-                    model=self.model,
-                    prompt=prompt,
-                    image=api_image,
-                    config=config
-                )
+                submit_start = time.time()
+                try:
+                    operation = self.client.models.generate_videos(
+                        model=self.model,
+                        prompt=prompt,
+                        image=api_image,
+                        config=config
+                    )
+                except Exception as e:
+                    if not api_image.gcs_uri:
+                        raise
+                    # The uploaded reference was rejected (e.g. expired): drop it and resend inline
+                    logger.error(f"GeminiVideoGenerator: Submit with image reference {api_image.gcs_uri} failed, retrying inline: {str(e)}")
+                    self.image_reference_cache.invalidate(artifact)
+                    api_image = types.Image(image_bytes=artifact.to_bytes(), mime_type=artifact.mime_type)
+                    operation = self.client.models.generate_videos(
+                        model=self.model,
+                        prompt=prompt,
+                        image=api_image,
+                        config=config
+                    )
+                logger.info(f"GeminiVideoGenerator: Submitted image-to-video job in {time.time() - submit_start:.2f} seconds")
             else:
                 # Text-to-video generation
                 config = types.GenerateVideosConfig(
@@ -104,7 +172,7 @@ class GeminiVideoGenerator:
                 )
 
             # Poll until operation is complete
-            timeout = 600  # 10 minutes maximum wait time
+            timeout = self.timeout
             start_time = time.time()
             logger.info(f"GeminiVideoGenerator: Polling operation {operation.name} for completion...")
 
@@ -117,9 +185,9 @@ class GeminiVideoGenerator:
                         logger.info(f"Attempted to cancel operation {operation.name}")
                     except Exception as cancel_err:
                         logger.error(f"Failed to cancel operation {operation.name}: {cancel_err}")
-                    return None
+                    raise StageError("video_generation", f"operation {operation.name} timed out after {timeout} seconds", error="timeout")
 
-                await asyncio.sleep(10)  # Use asyncio.sleep in async function
+                await asyncio.sleep(self.poll_interval)  # Use asyncio.sleep in async function
                 # Refresh operation state
                 try:
                     operation = self.client.operations.get(operation)
@@ -131,14 +199,14 @@ class GeminiVideoGenerator:
                 except Exception as get_op_err:
                     logger.error(f"Error refreshing operation status for {operation.name}: {get_op_err}")
                     # Potentially retry or fail based on error type
-                    await asyncio.sleep(15) # Wait longer before next poll attempt after error
+                    await asyncio.sleep(self.poll_interval * 1.5) # Wait longer before next poll attempt after error
 
             logger.info(f"GeminiVideoGenerator: Operation {operation.name} completed in {time.time() - start_time:.2f} seconds")
 
             # Check for operation errors
             if operation.error:
                 logger.error(f"GeminiVideoGenerator: Operation {operation.name} failed with error: {operation.error}")
-                return None
+                raise StageError("video_generation", f"operation {operation.name} failed: {operation.error}", error="operation_failed")
 
             if not operation.response or not operation.response.generated_videos:
                 # No videos created: capture detailed diagnostics
@@ -154,7 +222,12 @@ class GeminiVideoGenerator:
                 # Check for operation error payload
                 if operation.error:
                     logger.error(f"GeminiVideoGenerator: Operation error details: {operation.error}")
-                return None
+                if rai_count:
+                    raise StageError("video_generation", f"{rai_count} videos filtered: {'; '.join(rai_reasons or [])}", error="rai_filtered")
+                raise StageError("video_generation", f"no videos generated for operation {operation.name}", error="no_output")
+
+            # Veo is priced per second of generated video
+            record_usage("video_generation", self.model, units=self.duration_seconds * len(operation.response.generated_videos))
 
             # Process the first generated video
             generated_video = operation.response.generated_videos[0]
@@ -169,10 +242,13 @@ class GeminiVideoGenerator:
                 video_bytes = generated_video.video.video_bytes
                 if not video_bytes:
                     logger.error(f"GeminiVideoGenerator: Failed to download video bytes from {video_uri}")
-                    return None
+                    raise StageError("video_generation", f"no video bytes downloaded from {video_uri}", error="download_failed")
+                bytes_transferred.inc(len(video_bytes), stage="video_generation", direction="in")
+            except StageError:
+                raise
             except Exception as download_err:
                 logger.error(f"GeminiVideoGenerator: Error downloading video from {video_uri}: {download_err}")
-                return None
+                raise StageError("video_generation", f"download from {video_uri} failed: {download_err}", error="download_failed") from download_err
 
             # Save the first generated video locally
             local_path = self.file_storage.save_video(video_bytes, prompt)
@@ -181,10 +257,12 @@ class GeminiVideoGenerator:
                 return local_path
             else:
                 logger.error("Failed to save video locally using FileStorage")
-                return None
+                raise StageError("video_generation", "the generated video could not be saved", error="save_failed")
 
+        except StageError:
+            raise
         except Exception as e:
             logger.error("Unhandled error in generate_video (GeminiVideoGenerator)")
             logger.error(str(e))
             traceback.print_exc()
-            return None
+            raise StageError.from_exception("video_generation", e) from e
@@ -1,13 +1,38 @@
 import re
+from collections import OrderedDict
+from typing import List
+from urllib.parse import urljoin
+
 import structlog
 
 from agents import function_tool
-from crawl4ai import AsyncWebCrawler, CrawlerRunConfig
+from crawl4ai import CrawlerRunConfig
 from crawl4ai.markdown_generation_strategy import DefaultMarkdownGenerator
+from config import IMAGE_PROBE_MAX_CANDIDATES
+from utils.metrics import instrument_stage, stage_errors, bytes_transferred
+from utils.providers import get_crawler
 
 logger = structlog.get_logger()
 
+# Image URLs found on recently crawled pages (absolute, in page order), for source image selection
+_page_images: "OrderedDict[str, List[str]]" = OrderedDict()
+_PAGE_IMAGES_KEPT = 256
+
+
+def page_image_urls(url: str) -> List[str]:
+    """Image URLs the crawler found on a page, or [] if it was not crawled recently."""
+    return list(_page_images.get(url, []))
+
+
+def _remember_page_images(url: str, img_urls: List[str]):
+    images = [urljoin(url, src) for src in img_urls if not src.startswith("data:")]
+    _page_images[url] = list(dict.fromkeys(images))[:IMAGE_PROBE_MAX_CANDIDATES * 2]
+    _page_images.move_to_end(url)
+    while len(_page_images) > _PAGE_IMAGES_KEPT:
+        _page_images.popitem(last=False)
+
 @function_tool
+@instrument_stage("crawl")
 async def crawl_artwork_url(url: str) -> str:
     """
     Fetches and scrapes content from an artwork URL using crawl4ai
@@ -26,13 +51,14 @@ async def crawl_artwork_url(url: str) -> str:
     )
     
     try:
-        async with AsyncWebCrawler() as crawler:
+        async with get_crawler() as crawler:
             # Ensure proper awaiting of the crawler run
             result = await crawler.arun(url=url, config=config)
             
             if result.success:
                 # Use cleaned_html which has better structure than extraction
                 content = result.cleaned_html
+                bytes_transferred.inc(len(content), stage="crawl", direction="in")
                 
                 # Clean up the content
                 content = re.sub(r'</(div|li|ul|p|span)>', '', content)
@@ -41,6 +67,7 @@ async def crawl_artwork_url(url: str) -> str:
                 
                 # Extract image URLs
                 img_urls = re.findall(r'<img[^>]+src="([^"]+)"', content)
+                _remember_page_images(url, img_urls)
                 if img_urls:
                     logger.debug(f"Found {len(img_urls)} image URLs")
                     content += "\nImage URLs found:\n" + "\n".join(img_urls)
@@ -56,8 +83,10 @@ async def crawl_artwork_url(url: str) -> str:
             else:
                 error_msg = f"Failed to crawl URL: {result.error_message}"
                 logger.error(error_msg)
+                stage_errors.inc(stage="crawl", error="crawl_failed")
                 return error_msg
     except Exception as e:
         error_msg = f"Error crawling URL: {str(e)}"
         logger.error(error_msg)
+        stage_errors.inc(stage="crawl", error=type(e).__name__)
         return error_msg 
\ No newline at end of file
@@ -0,0 +1,140 @@
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Optional
+
+import structlog
+
+from config import ARTIFACT_CACHE_MAX_BYTES, ARTIFACT_MAX_FAILED
+
+logger = structlog.get_logger()
+
+
+@dataclass(eq=False)
+class ImageArtifact:
+    """
+    Image bytes handed between pipeline stages without touching disk.
+
+    Holds a zero-copy memoryview of the encoded image plus its MIME type.
+    The base64 form and data URL are computed once, on first use.
+    """
+    data: memoryview
+    mime_type: str
+    path: Optional[str] = None
+    # Completes when the background write to `path` has finished
+    persisted: Optional[Future] = field(default=None, repr=False)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, mime_type: str, path: Optional[str] = None) -> "ImageArtifact":
+        """Wrap encoded image bytes without copying them."""
+        return cls(data=memoryview(data), mime_type=mime_type, path=path)
+
+    @property
+    def size(self) -> int:
+        """Size of the encoded image in bytes."""
+        return self.data.nbytes
+
+    @cached_property
+    def sha256(self) -> str:
+        """Hex SHA-256 of the image bytes, used as a content key by caches."""
+        return hashlib.sha256(self.data).hexdigest()
+
+    @cached_property
+    def base64(self) -> str:
+        """Base64 encoding of the image bytes."""
+        return base64.b64encode(self.data).decode("utf-8")
+
+    @cached_property
+    def data_url(self) -> str:
+        """The image as a data URL, as accepted by OpenAI image inputs."""
+        return f"data:{self.mime_type};base64,{self.base64}"
+
+    def to_bytes(self) -> bytes:
+        """Return the bytes, reusing the underlying object when it already is bytes."""
+        if isinstance(self.data.obj, bytes) and len(self.data.obj) == self.data.nbytes:
+            return self.data.obj
+        return self.data.tobytes()
+
+    @property
+    def persist_failed(self) -> bool:
+        """Whether the background disk write finished with an error (the bytes exist only in memory)."""
+        return self.persisted is not None and self.persisted.done() and self.persisted.exception() is not None
+
+    def wait_persisted(self, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        Block until the background disk write has finished.
+
+        Returns:
+            The local path, or None if the write failed
+        """
+        if self.persisted is None:
+            return self.path
+        try:
+            return self.persisted.result(timeout=timeout)
+        except Exception:
+            # Logged and counted by the writer
+            return None
+
+
+class ArtifactStore:
+    """
+    In-memory LRU of image artifacts keyed by local path.
+
+    Lets later stages resolve a path produced earlier in the same process to
+    the bytes already in memory. Artifacts whose disk write is still pending
+    are never evicted, since the path cannot be read back yet. Those whose
+    write failed are kept outside the byte budget too, but only the
+    max_failed most recently used, so a full or read-only disk cannot pin
+    every image of a long run in memory.
+    """
+
+    def __init__(self, max_bytes: int = ARTIFACT_CACHE_MAX_BYTES, max_failed: int = ARTIFACT_MAX_FAILED):
+        self.max_bytes = max_bytes
+        self.max_failed = max_failed
+        self._artifacts = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def put(self, artifact: ImageArtifact):
+        """Register an artifact under its path."""
+        if not artifact.path:
+            return
+        with self._lock:
+            previous = self._artifacts.pop(artifact.path, None)
+            if previous is not None:
+                self._total_bytes -= previous.size
+            self._artifacts[artifact.path] = artifact
+            self._total_bytes += artifact.size
+            self._evict()
+
+    def get(self, path: str) -> Optional[ImageArtifact]:
+        """Return the artifact registered under path, if still cached."""
+        with self._lock:
+            artifact = self._artifacts.get(path)
+            if artifact is not None:
+                self._artifacts.move_to_end(path)
+            return artifact
+
+    def _evict(self):
+        """Drop failed artifacts beyond max_failed, then persisted ones (least recently used first) until under budget."""
+        failed = [path for path, artifact in self._artifacts.items() if artifact.persist_failed]
+        for path in failed[:max(0, len(failed) - self.max_failed)]:
+            self._total_bytes -= self._artifacts.pop(path).size
+            logger.warning(f"Dropped artifact {path} from memory; its disk write failed, so the image is lost")
+        for path in list(self._artifacts):
+            if self._total_bytes <= self.max_bytes:
+                break
+            artifact = self._artifacts[path]
+            if artifact.persisted is not None and (not artifact.persisted.done() or artifact.persist_failed):
+                continue
+            del self._artifacts[path]
+            self._total_bytes -= artifact.size
+            logger.debug(f"Evicted artifact {path} from memory")
+
+
+# Shared across FileStorage instances so every stage sees the same artifacts
+artifact_store = ArtifactStore()
@@ -0,0 +1,376 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+import requests
+import structlog
+
+from config import CASSETTE_BLOB_THRESHOLD
+
+logger = structlog.get_logger()
+
+REPLAY_TIMINGS = ("original", "fast")
+INTERACTIONS_FILE = "interactions.jsonl"
+# Response headers not worth keeping: bodies are stored decoded, the rest differ per call
+DROPPED_HEADERS = {
+    "content-encoding", "content-length", "transfer-encoding", "connection", "keep-alive",
+    "set-cookie", "date", "server", "alt-svc", "cf-ray", "server-timing", "x-envoy-upstream-service-time",
+}
+# Query parameters left out of request keys (credentials)
+DROPPED_QUERY_PARAMS = {"key"}
+
+
+class CassetteMissError(LookupError):
+    """Raised in replay mode when a request has no recorded interaction left."""
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def request_key(method: str, url) -> str:
+    """Method, host, path and non-credential query of a request, e.g. "POST api.openai.com/v1/responses"."""
+    url = httpx.URL(str(url))
+    params = sorted((k, v) for k, v in url.params.multi_items() if k not in DROPPED_QUERY_PARAMS)
+    query = "&".join(f"{k}={v}" for k, v in params)
+    return f"{method} {url.host}{url.path}" + (f"?{query}" if query else "")
+
+
+def _kept_headers(headers) -> Dict[str, str]:
+    return {k.lower(): v for k, v in headers.items() if k.lower() not in DROPPED_HEADERS}
+
+
+class Cassette:
+    """
+    Provider traffic recorded from a live run, served back in replay mode.
+
+    A cassette is a directory holding interactions.jsonl (one line per call:
+    provider, request key and body hash, start offset, duration, response
+    status and headers) and blobs/, where response bodies larger than
+    CASSETTE_BLOB_THRESHOLD or not valid UTF-8 (images, videos, base64-heavy
+    JSON) are stored once under their SHA-256. Request headers are never
+    stored, so API keys stay out of cassettes.
+
+    Replay matches on the request key. Among the unused interactions for that
+    key, one with an identical request body wins; otherwise the earliest
+    recorded one is served, since bodies legitimately differ between runs
+    (output paths, timestamps).
+    """
+
+    def __init__(self, path: str, mode: str = "replay", timing: str = "original"):
+        if timing not in REPLAY_TIMINGS:
+            raise ValueError(f"Unknown replay timing {timing!r}, expected one of {REPLAY_TIMINGS}")
+        self.path = path
+        self.mode = mode
+        self.timing = timing
+        self.blobs_dir = os.path.join(path, "blobs")
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self._recorded = 0
+        self._served = 0
+        self._pending: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        self._file = None
+        self._closed = False
+        if mode == "record":
+            os.makedirs(self.blobs_dir, exist_ok=True)
+            self._file = open(os.path.join(path, INTERACTIONS_FILE), "w")
+            logger.info(f"Recording provider traffic to {path}")
+        else:
+            with open(os.path.join(path, INTERACTIONS_FILE)) as f:
+                entries = [json.loads(line) for line in f if line.strip()]
+            for entry in sorted(entries, key=lambda e: e["started"]):
+                self._pending[entry["key"]].append(entry)
+            logger.info(f"Replaying {len(entries)} recorded interactions from {path} ({timing} timing)")
+
+    # Recording
+    def _store_body(self, data: bytes) -> Dict[str, str]:
+        if len(data) <= CASSETTE_BLOB_THRESHOLD:
+            try:
+                return {"body": data.decode("utf-8")}
+            except UnicodeDecodeError:
+                pass
+        digest = content_hash(data)
+        blob_path = os.path.join(self.blobs_dir, digest)
+        if not os.path.exists(blob_path):
+            tmp_path = f"{blob_path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, blob_path)
+        return {"blob": digest}
+
+    def record(
+        self,
+        provider: str,
+        key: str,
+        request_body: bytes,
+        started: float,
+        status: int,
+        body: bytes,
+        headers: Optional[Dict[str, str]] = None,
+        meta: Optional[Dict[str, Any]] = None,
+    ):
+        """
+        Append one interaction.
+
+        Args:
+            provider: "openai", "gemini", "crawl", "http" or "name"
+            key: Request key used for matching in replay
+            request_body: Raw request body (only its hash is kept)
+            started: time.monotonic() when the call was issued
+            status: HTTP status (or 200/500 for crawl success/failure)
+            body: Response body
+            headers: Response headers to replay
+            meta: Extra response fields (e.g. crawl error message)
+        """
+        entry = {
+            "provider": provider,
+            "key": key,
+            "request_hash": content_hash(request_body),
+            "started": round(started - self._start, 4),
+            "duration": round(time.monotonic() - started, 4),
+            "status": status,
+            **self._store_body(body),
+        }
+        if headers:
+            entry["headers"] = headers
+        if meta:
+            entry["meta"] = meta
+        line = json.dumps(entry, separators=(",", ":"))
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            self._recorded += 1
+
+    # Replay
+    def match(self, key: str, request_body: bytes = b"") -> Dict[str, Any]:
+        """
+        Take the recorded interaction that answers a request.
+
+        Raises:
+            CassetteMissError: when no unused interaction is left for the key
+        """
+        digest = content_hash(request_body)
+        with self._lock:
+            queue = self._pending.get(key)
+            if not queue:
+                raise CassetteMissError(f"No recorded interaction left for {key} in {self.path}")
+            index = next((i for i, entry in enumerate(queue) if entry["request_hash"] == digest), 0)
+            self._served += 1
+            return queue.pop(index)
+
+    def body(self, entry: Dict[str, Any]) -> bytes:
+        if "blob" in entry:
+            with open(os.path.join(self.blobs_dir, entry["blob"]), "rb") as f:
+                return f.read()
+        return entry.get("body", "").encode("utf-8")
+
+    def delay(self, entry: Dict[str, Any]) -> float:
+        """Seconds to wait before answering: the recorded duration, or 0 when replaying fast."""
+        return entry["duration"] if self.timing == "original" else 0.0
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._file:
+            self._file.close()
+            self._file = None
+            logger.info(f"Recorded {self._recorded} interactions to {self.path}")
+        elif self.mode == "replay":
+            unused = sum(len(queue) for queue in self._pending.values())
+            logger.info(f"Replayed {self._served} interactions from {self.path} ({unused} unused)")
+
+
+# OpenAI and Gemini clients (both accept a custom httpx client)
+def _httpx_response(cassette: Cassette, entry: Dict[str, Any], request: httpx.Request) -> httpx.Response:
+    return httpx.Response(entry["status"], headers=entry.get("headers", {}), content=cassette.body(entry), request=request)
+
+
+class RecordingTransport(httpx.BaseTransport):
+    """httpx transport that forwards requests and records every exchange (sync clients)."""
+
+    def __init__(self, cassette: Cassette, provider: str, transport: Optional[httpx.BaseTransport] = None):
+        self.cassette = cassette
+        self.provider = provider
+        self._transport = transport or httpx.HTTPTransport()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request_body = request.read()
+        started = time.monotonic()
+        response = self._transport.handle_request(request)
+        try:
+            content = response.read()
+        finally:
+            response.close()
+        headers = _kept_headers(response.headers)
+        self.cassette.record(self.provider, request_key(request.method, request.url), request_body, started, response.status_code, content, headers)
+        return httpx.Response(response.status_code, headers=headers, content=content, request=request)
+
+    def close(self):
+        self._transport.close()
+
+
+class AsyncRecordingTransport(httpx.AsyncBaseTransport):
+    """httpx transport that forwards requests and records every exchange (async clients)."""
+
+    def __init__(self, cassette: Cassette, provider: str, transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.cassette = cassette
+        self.provider = provider
+        self._transport = transport or httpx.AsyncHTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        request_body = await request.aread()
+        started = time.monotonic()
+        response = await self._transport.handle_async_request(request)
+        try:
+            content = await response.aread()
+        finally:
+            await response.aclose()
+        headers = _kept_headers(response.headers)
+        self.cassette.record(self.provider, request_key(request.method, request.url), request_body, started, response.status_code, content, headers)
+        return httpx.Response(response.status_code, headers=headers, content=content, request=request)
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+class ReplayTransport(httpx.BaseTransport):
+    """httpx transport answering requests from a cassette (sync clients)."""
+
+    def __init__(self, cassette: Cassette):
+        self.cassette = cassette
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        entry = self.cassette.match(request_key(request.method, request.url), request.read())
+        time.sleep(self.cassette.delay(entry))
+        return _httpx_response(self.cassette, entry, request)
+
+
+class AsyncReplayTransport(httpx.AsyncBaseTransport):
+    """httpx transport answering requests from a cassette (async clients)."""
+
+    def __init__(self, cassette: Cassette):
+        self.cassette = cassette
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        entry = self.cassette.match(request_key(request.method, request.url), await request.aread())
+        await asyncio.sleep(self.cassette.delay(entry))
+        return _httpx_response(self.cassette, entry, request)
+
+
+# crawl4ai
+class RecordingCrawler:
+    """Wraps an AsyncWebCrawler and records the arun() fields the crawl tools use."""
+
+    def __init__(self, cassette: Cassette, crawler):
+        self.cassette = cassette
+        self._crawler = crawler
+
+    async def __aenter__(self):
+        await self._crawler.__aenter__()
+        return self
+
+    async def __aexit__(self, *exc):
+        return await self._crawler.__aexit__(*exc)
+
+    async def arun(self, url: str, config=None, **kwargs):
+        started = time.monotonic()
+        result = await self._crawler.arun(url=url, config=config, **kwargs)
+        self.cassette.record(
+            "crawl", f"CRAWL {url}", b"", started,
+            200 if result.success else 500,
+            (result.cleaned_html or "").encode("utf-8"),
+            meta={"error_message": result.error_message},
+        )
+        return result
+
+
+class ReplayCrawler:
+    """Async context manager mimicking AsyncWebCrawler.arun() from a cassette."""
+
+    def __init__(self, cassette: Cassette):
+        self.cassette = cassette
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def arun(self, url: str, config=None, **kwargs):
+        entry = self.cassette.match(f"CRAWL {url}")
+        await asyncio.sleep(self.cassette.delay(entry))
+        return SimpleNamespace(
+            success=entry["status"] == 200,
+            cleaned_html=self.cassette.body(entry).decode("utf-8"),
+            error_message=entry.get("meta", {}).get("error_message"),
+        )
+
+
+# Plain HTTP downloads (FileStorage), preflight and image probes
+def _http_key(method: str, url: str, kwargs: Dict[str, Any]) -> str:
+    # Range requests (image probes) get their own key, so they never consume the full download's entry
+    byte_range = (kwargs.get("headers") or {}).get("Range")
+    return f"{method} {url}" + (f" {byte_range}" if byte_range else "")
+
+
+def recording_http_get(cassette: Cassette, url: str, **kwargs) -> requests.Response:
+    started = time.monotonic()
+    response = requests.get(url, **kwargs)
+    # Streamed requests only want the headers (preflight) unless they asked for a byte range
+    key = _http_key("GET", url, kwargs)
+    body = b"" if kwargs.get("stream") and key == f"GET {url}" else response.content
+    cassette.record("http", key, b"", started, response.status_code, body, _kept_headers(response.headers))
+    return response
+
+
+def replay_http_get(cassette: Cassette, url: str, **kwargs):
+    return _replay_http(cassette, _http_key("GET", url, kwargs), url)
+
+
+def recording_http_head(cassette: Cassette, url: str, **kwargs) -> requests.Response:
+    started = time.monotonic()
+    response = requests.head(url, **kwargs)
+    cassette.record("http", _http_key("HEAD", url, kwargs), b"", started, response.status_code, b"", _kept_headers(response.headers))
+    return response
+
+
+def replay_http_head(cassette: Cassette, url: str, **kwargs):
+    return _replay_http(cassette, _http_key("HEAD", url, kwargs), url)
+
+
+def _replay_http(cassette: Cassette, key: str, url: str):
+    from utils.standins import StandInHTTPResponse
+    entry = cassette.match(key)
+    time.sleep(cassette.delay(entry))
+    headers = entry.get("headers", {})
+    content_type = headers.get("content-type", "application/octet-stream")
+    return StandInHTTPResponse(url, entry["status"], cassette.body(entry), content_type, headers)
+
+
+# Locally generated names that recorded responses refer back to (e.g. output paths)
+def recorded_name(cassette: Cassette, kind: str, make: Callable[[], str]) -> str:
+    """
+    Record a generated name, or reuse the recorded one in replay.
+
+    Model responses in a cassette mention paths such as the generated image's
+    filename; replay has to produce the same names for those tool calls to
+    resolve.
+    """
+    key = f"NAME {kind}"
+    if cassette.mode == "record":
+        name = make()
+        cassette.record("name", key, b"", time.monotonic(), 200, name.encode("utf-8"))
+        return name
+    try:
+        return cassette.body(cassette.match(key)).decode("utf-8")
+    except CassetteMissError:
+        logger.warning(f"No recorded {kind} name left, generating a new one")
+        return make()
@@ -0,0 +1,193 @@
+import csv
+import gzip
+import io
+import sys
+from dataclasses import dataclass, field
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import structlog
+
+from config import CATALOG_OBJECT_API, CATALOG_IMAGE_TIMEOUT
+from models.models import ArtworkDetails, ArtworkImageURL
+from utils.metrics import stage_errors
+from utils.providers import http_get
+
+logger = structlog.get_logger()
+
+# Catalog fields and the columns that may hold them: MetObjects.csv headers first, then
+# the Met Collection API's field names (for JSON-to-CSV exports and similar dumps)
+COLUMNS = {
+    "object_id": ("Object ID", "objectID"),
+    "title": ("Title", "title"),
+    "artist": ("Artist Display Name", "artistDisplayName"),
+    "artist_bio": ("Artist Display Bio", "artistDisplayBio"),
+    "medium": ("Medium", "medium"),
+    "department": ("Department", "department"),
+    "object_date": ("Object Date", "objectDate"),
+    "begin_date": ("Object Begin Date", "objectBeginDate"),
+    "end_date": ("Object End Date", "objectEndDate"),
+    "public_domain": ("Is Public Domain", "isPublicDomain"),
+    "culture": ("Culture", "culture"),
+    "period": ("Period", "period"),
+    "classification": ("Classification", "classification"),
+    "dimensions": ("Dimensions", "dimensions"),
+    "credit_line": ("Credit Line", "creditLine"),
+    "tags": ("Tags", "tags"),
+    "url": ("Link Resource", "objectURL"),
+    "image_url": ("Primary Image", "primaryImage"),
+}
+# Fields folded into ArtworkDetails.description, in this order
+DESCRIPTION_FIELDS = (
+    ("object_date", "Date"),
+    ("culture", "Culture"),
+    ("period", "Period"),
+    ("classification", "Classification"),
+    ("artist_bio", "Artist"),
+    ("dimensions", "Dimensions"),
+    ("department", "Department"),
+    ("credit_line", "Credit line"),
+    ("tags", "Tags"),
+)
+OBJECT_PAGE = "https://www.metmuseum.org/art/collection/search/{object_id}"
+
+
+@dataclass
+class CatalogFilter:
+    """Which catalog rows to process; unset criteria match everything."""
+    departments: List[str] = field(default_factory=list)  # Exact names, case-insensitive
+    date_from: Optional[int] = None  # Objects made in or after this year (negative for BCE)
+    date_to: Optional[int] = None  # Objects made in or before this year
+    public_domain: bool = False  # Only Open Access (public-domain) objects
+    media: List[str] = field(default_factory=list)  # Substrings of the medium, case-insensitive
+
+    def matches(self, row: Dict[str, str]) -> bool:
+        if self.departments and row.get("department", "").lower() not in {d.lower() for d in self.departments}:
+            return False
+        if self.public_domain and row.get("public_domain", "").lower() not in ("true", "1"):
+            return False
+        if self.media and not any(m.lower() in row.get("medium", "").lower() for m in self.media):
+            return False
+        if self.date_from is not None or self.date_to is not None:
+            begin, end = _year(row.get("begin_date")), _year(row.get("end_date"))
+            if begin is None and end is None:
+                return False
+            # Date ranges overlap the requested span
+            if self.date_from is not None and (end if end is not None else begin) < self.date_from:
+                return False
+            if self.date_to is not None and (begin if begin is not None else end) > self.date_to:
+                return False
+        return True
+
+
+def _year(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _open(source: str) -> io.TextIOBase:
+    """Text stream over a CSV path, a gzipped CSV, or stdin ("-")."""
+    if source == "-":
+        return io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8-sig", newline="")
+    if source.endswith(".gz"):
+        return gzip.open(source, "rt", encoding="utf-8-sig", newline="")
+    return open(source, encoding="utf-8-sig", newline="")
+
+
+def read_catalog(source: str, catalog_filter: Optional[CatalogFilter] = None) -> Iterator[Dict[str, str]]:
+    """
+    Stream matching rows of a Met Open Access CSV (MetObjects.csv) or a similar dump.
+
+    Rows are read one at a time, so memory stays flat however large the file.
+    Each row is returned under the field names of COLUMNS, with surrounding
+    whitespace stripped.
+
+    Args:
+        source: CSV path (.csv or .csv.gz), or "-" for stdin
+        catalog_filter: Rows to keep (all if None)
+
+    Yields:
+        Matching rows as {field: value}
+    """
+    catalog_filter = catalog_filter or CatalogFilter()
+    with _open(source) as stream:
+        reader = csv.DictReader(stream)
+        headers = set(reader.fieldnames or [])
+        mapping = {name: next((column for column in columns if column in headers), None) for name, columns in COLUMNS.items()}
+        if mapping["object_id"] is None and mapping["url"] is None:
+            raise ValueError(f"{source} has neither an object ID nor an object URL column")
+        # Malformed lines (the Met file has a few) are kept by csv but may lack fields; .get copes
+        for raw in reader:
+            row = {name: (raw.get(column) or "").strip() for name, column in mapping.items() if column}
+            if catalog_filter.matches(row):
+                yield row
+
+
+def chunked(rows: Iterable[Dict[str, str]], size: int) -> Iterator[List[Dict[str, str]]]:
+    """Consecutive lists of up to size rows, read lazily."""
+    iterator = iter(rows)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def object_url(row: Dict[str, str]) -> str:
+    """Collection page of a row's object (https, so it matches the crawled/preflighted form)."""
+    if row.get("object_id"):
+        return OBJECT_PAGE.format(object_id=row["object_id"])
+    return row["url"].replace("http://", "https://", 1)
+
+
+def artwork_details(row: Dict[str, str], image_url: Optional[str] = None) -> ArtworkDetails:
+    """
+    ArtworkDetails filled from a catalog row, as the extractor agent would have filled it from the page.
+
+    Args:
+        row: Row from read_catalog
+        image_url: Main image URL (the row's own, or one resolved by resolve_image_url)
+
+    Returns:
+        The artwork's details
+    """
+    description = "; ".join(f"{label}: {row[name]}" for name, label in DESCRIPTION_FIELDS if row.get(name))
+    return ArtworkDetails(
+        title=row.get("title") or None,
+        artist=row.get("artist") or None,
+        medium=row.get("medium") or None,
+        description=description or None,
+        image_urls=ArtworkImageURL(main_image_url=image_url or row.get("image_url") or None, source_url=object_url(row)),
+    )
+
+
+def resolve_image_url(row: Dict[str, str], timeout: float = CATALOG_IMAGE_TIMEOUT) -> Optional[str]:
+    """
+    Main image URL of a row's object.
+
+    MetObjects.csv has no image column, so the object's primaryImage is read
+    from the Met Collection API (CATALOG_OBJECT_API): one small JSON request
+    instead of a crawl and an extraction run. The API leaves it empty for
+    objects whose images are not Open Access.
+
+    Args:
+        row: Row from read_catalog
+        timeout: Seconds for the API request
+
+    Returns:
+        The image URL, or None if the object has none (or the lookup failed)
+    """
+    if row.get("image_url"):
+        return row["image_url"]
+    if not row.get("object_id"):
+        return None
+    try:
+        response = http_get(CATALOG_OBJECT_API.format(object_id=row["object_id"]), timeout=timeout)
+        response.raise_for_status()
+        return response.json().get("primaryImage") or None
+    except Exception as e:
+        logger.warning(f"Could not look up the image of object {row['object_id']}: {type(e).__name__}: {str(e)}")
+        stage_errors.inc(stage="catalog", error=type(e).__name__)
+        return None
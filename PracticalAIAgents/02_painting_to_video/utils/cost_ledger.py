@@ -0,0 +1,242 @@
+import contextlib
+import contextvars
+import threading
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Optional
+
+import structlog
+
+from config import MODEL_PRICING, COST_BUDGET_USD, COST_BUDGET_TOKENS, COST_BUDGET_CALLS
+
+logger = structlog.get_logger()
+
+
+class BudgetExceededError(RuntimeError):
+    """Raised when a ledger passes its token, money or call-count budget."""
+
+
+@dataclass
+class LedgerEntry:
+    """One priced provider call."""
+    stage: str
+    model: str
+    input_tokens: int = 0
+    cached_input_tokens: int = 0
+    output_tokens: int = 0
+    units: float = 0  # Images or video seconds for per-unit priced models
+    cost_usd: float = 0.0
+
+
+# Models already warned about as unpriced
+_unpriced_models = set()
+
+
+def price_call(model: str, input_tokens: int = 0, cached_input_tokens: int = 0, output_tokens: int = 0, units: float = 0) -> float:
+    """
+    Price one call with MODEL_PRICING.
+
+    Token prices are per million tokens; image and video models are priced per
+    unit (image or second of video). Unknown models cost 0 and are logged once.
+
+    Args:
+        model: Model name as sent to the provider
+        input_tokens: Prompt tokens, including cached ones
+        cached_input_tokens: Prompt tokens served from the provider cache
+        output_tokens: Completion tokens
+        units: Images or video seconds
+
+    Returns:
+        Cost in USD
+    """
+    prices = MODEL_PRICING.get(model)
+    if prices is None:
+        if model not in _unpriced_models:
+            _unpriced_models.add(model)
+            logger.warning(f"No pricing configured for model {model}, counting it as free")
+        return 0.0
+    uncached = input_tokens - cached_input_tokens
+    cost = (
+        uncached * prices.get("input", 0)
+        + cached_input_tokens * prices.get("cached_input", prices.get("input", 0))
+        + output_tokens * prices.get("output", 0)
+    ) / 1_000_000
+    return cost + units * prices.get("per_unit", 0)
+
+
+class CostLedger:
+    """
+    Records priced provider calls and enforces a budget.
+
+    Ledgers nest: an artwork ledger created with parent=batch_ledger forwards
+    every entry to the batch, so totals are available per artwork and per batch,
+    and either level can carry its own budget.
+    """
+
+    def __init__(
+        self,
+        label: str,
+        parent: Optional["CostLedger"] = None,
+        budget_usd: Optional[float] = COST_BUDGET_USD,
+        budget_tokens: Optional[int] = COST_BUDGET_TOKENS,
+        budget_calls: Optional[int] = COST_BUDGET_CALLS,
+    ):
+        self.label = label
+        self.parent = parent
+        self.budget_usd = budget_usd
+        self.budget_tokens = budget_tokens
+        self.budget_calls = budget_calls
+        self.entries: List[LedgerEntry] = []
+        self.children: List["CostLedger"] = []
+        self._lock = threading.Lock()
+        if parent:
+            parent.children.append(self)
+
+    def record(self, entry: LedgerEntry):
+        """Add an entry here and in every parent ledger."""
+        with self._lock:
+            self.entries.append(entry)
+        if self.parent:
+            self.parent.record(entry)
+
+    @property
+    def cost_usd(self) -> float:
+        return sum(e.cost_usd for e in self.entries)
+
+    @property
+    def tokens(self) -> int:
+        return sum(e.input_tokens + e.output_tokens for e in self.entries)
+
+    @property
+    def calls(self) -> int:
+        return len(self.entries)
+
+    def exceeded(self) -> Optional[str]:
+        """Describe the first exceeded budget, or None if within budget."""
+        if self.budget_usd is not None and self.cost_usd > self.budget_usd:
+            return f"cost ${self.cost_usd:.4f} > ${self.budget_usd}"
+        if self.budget_tokens is not None and self.tokens > self.budget_tokens:
+            return f"tokens {self.tokens} > {self.budget_tokens}"
+        if self.budget_calls is not None and self.calls > self.budget_calls:
+            return f"calls {self.calls} > {self.budget_calls}"
+        return None
+
+    def check(self):
+        """
+        Raise if this ledger or any parent is over budget.
+
+        Raises:
+            BudgetExceededError: naming the ledger and the exceeded limit
+        """
+        ledger = self
+        while ledger:
+            reason = ledger.exceeded()
+            if reason:
+                raise BudgetExceededError(f"Budget exceeded for {ledger.label}: {reason}")
+            ledger = ledger.parent
+
+    def by_stage(self) -> Dict[str, Dict]:
+        """Totals per stage."""
+        stages: Dict[str, Dict] = {}
+        for entry in self.entries:
+            totals = stages.setdefault(entry.stage, {"calls": 0, "input_tokens": 0, "output_tokens": 0, "units": 0, "cost_usd": 0.0})
+            totals["calls"] += 1
+            totals["input_tokens"] += entry.input_tokens
+            totals["output_tokens"] += entry.output_tokens
+            totals["units"] += entry.units
+            totals["cost_usd"] += entry.cost_usd
+        for totals in stages.values():
+            totals["cost_usd"] = round(totals["cost_usd"], 6)
+        return stages
+
+    def summary(self, include_entries: bool = False) -> Dict:
+        summary = {
+            "label": self.label,
+            "calls": self.calls,
+            "tokens": self.tokens,
+            "cost_usd": round(self.cost_usd, 6),
+            "by_stage": self.by_stage(),
+        }
+        if include_entries:
+            summary["entries"] = [asdict(e) for e in self.entries]
+        if self.children:
+            summary["children"] = [child.summary(include_entries) for child in self.children]
+        return summary
+
+
+# Ledger of the artwork run currently executing (copied into tasks and tool threads)
+_current_ledger: contextvars.ContextVar[Optional[CostLedger]] = contextvars.ContextVar("current_ledger", default=None)
+
+
+def current_ledger() -> Optional[CostLedger]:
+    return _current_ledger.get()
+
+
+@contextlib.contextmanager
+def ledger_scope(ledger: CostLedger):
+    """Make ledger the target of record_usage() calls inside the block."""
+    token = _current_ledger.set(ledger)
+    try:
+        yield ledger
+    finally:
+        _current_ledger.reset(token)
+
+
+def record_usage(stage: str, model: str, input_tokens: int = 0, cached_input_tokens: int = 0, output_tokens: int = 0, units: float = 0, price_factor: float = 1.0):
+    """
+    Price a provider call and add it to the current ledger, if any.
+
+    Args:
+        stage: Pipeline stage or agent the call belongs to
+        model: Model name used for pricing
+        input_tokens: Prompt tokens
+        cached_input_tokens: Prompt tokens served from cache
+        output_tokens: Completion tokens
+        units: Images or video seconds for per-unit priced models
+        price_factor: Multiplier on MODEL_PRICING (e.g. the Batch API discount)
+    """
+    ledger = current_ledger()
+    if ledger is None:
+        return
+    cost = price_call(model, input_tokens, cached_input_tokens, output_tokens, units) * price_factor
+    ledger.record(LedgerEntry(stage, model, input_tokens, cached_input_tokens, output_tokens, units, cost))
+
+
+def record_response_usage(stage: str, model: str, usage, price_factor: float = 1.0):
+    """
+    Record token usage from an OpenAI Responses API or Agents SDK usage object.
+
+    Args:
+        stage: Pipeline stage or agent the call belongs to
+        model: Model name used for pricing
+        usage: Object with input_tokens, output_tokens and input_tokens_details,
+            or the same fields as a dict (a Batch API result body)
+        price_factor: Multiplier on MODEL_PRICING (e.g. the Batch API discount)
+    """
+    if usage is None:
+        return
+    if isinstance(usage, dict):
+        details = usage.get("input_tokens_details") or {}
+        input_tokens, output_tokens, cached = usage.get("input_tokens"), usage.get("output_tokens"), details.get("cached_tokens")
+    else:
+        details = getattr(usage, "input_tokens_details", None)
+        input_tokens, output_tokens, cached = usage.input_tokens, usage.output_tokens, getattr(details, "cached_tokens", 0)
+    record_usage(
+        stage,
+        model,
+        input_tokens=input_tokens or 0,
+        cached_input_tokens=cached or 0,
+        output_tokens=output_tokens or 0,
+        price_factor=price_factor,
+    )
+
+
+def check_budget():
+    """
+    Raise if the current ledger (or its batch) is over budget.
+
+    Raises:
+        BudgetExceededError: when a budget is exceeded
+    """
+    ledger = current_ledger()
+    if ledger is not None:
+        ledger.check()
@@ -0,0 +1,72 @@
+from typing import Any, Optional
+
+from agents import RunContextWrapper, default_tool_error_function
+
+
+class StageError(RuntimeError):
+    """
+    Raised when a pipeline stage produced nothing usable.
+
+    Generators raise it instead of returning None or an error string, so a
+    failed stage can never hand its error message to the next stage as a
+    prompt. The workflow stops at the first StageError and records it in
+    ProcessingResult.error and failed_stage.
+    """
+
+    def __init__(self, stage: str, reason: str, error: Optional[str] = None):
+        """
+        Args:
+            stage: Stage label as used in metrics (e.g. "image_generation")
+            reason: What went wrong, for logs and results
+            error: Short error label for artwork_stage_errors_total (e.g. "rai_filtered", "timeout")
+        """
+        super().__init__(f"{stage} failed: {reason}")
+        self.stage = stage
+        self.reason = reason
+        self.error = error or "StageError"
+
+    @classmethod
+    def from_exception(cls, stage: str, e: Exception) -> "StageError":
+        """StageError for an unexpected exception raised by a provider call; raise it from e."""
+        return cls(stage, f"{type(e).__name__}: {str(e)}", error=type(e).__name__)
+
+
+def require_prompt(stage: str, prompt: Optional[str]) -> str:
+    """
+    The prompt a paid generation stage is about to send, refusing empty ones.
+
+    Raises:
+        StageError: if the prompt is missing or blank
+    """
+    if not prompt or not prompt.strip():
+        raise StageError(stage, "no prompt", error="empty_prompt")
+    return prompt
+
+
+def find_stage_error(error: BaseException) -> Optional[StageError]:
+    """
+    The StageError behind an exception, if any.
+
+    The Agents SDK re-raises a tool's exception wrapped in a UserError
+    ("Error running tool ..."), once per nested agent run, so the cause
+    chain is followed.
+    """
+    while error is not None:
+        if isinstance(error, StageError):
+            return error
+        error = error.__cause__
+    return None
+
+
+def stage_tool_failure(ctx: RunContextWrapper[Any], error: Exception) -> Optional[str]:
+    """
+    failure_error_function for the stage tools.
+
+    A StageError is re-raised, which ends the coordinator run, instead of
+    being turned into a "please try again" message the model would retry.
+    Other errors (a mistyped handle, say) still go back to the model, as
+    with the SDK default.
+    """
+    if find_stage_error(error) is not None:
+        return None
+    return default_tool_error_function(ctx, error)
@@ -0,0 +1,110 @@
+import random
+import threading
+from dataclasses import dataclass, fields
+from typing import Dict, List, Optional, Union
+
+import structlog
+
+from config import FAULT_PROFILE, FAULT_PROFILES, FAULT_SPIKE_SECONDS
+from utils.metrics import registry, current_stage
+
+logger = structlog.get_logger()
+
+faults_injected = registry.counter("artwork_faults_injected_total", "Faults injected into stand-in providers", ["provider", "kind"])
+
+
+@dataclass
+class FaultRule:
+    """Probabilities of each fault kind for one provider or stage."""
+    latency_spike: float = 0.0
+    spike_seconds: float = FAULT_SPIKE_SECONDS  # Extra latency of a spike, before latency scaling
+    error_429: float = 0.0
+    error_500: float = 0.0
+    truncate: float = 0.0  # Downloads: body cut short
+    rai_filtered: float = 0.0  # Empty result with safety-filter metadata
+    hang: float = 0.0  # Veo: operation never completes
+
+
+FAULT_KINDS = tuple(f.name for f in fields(FaultRule) if f.name != "spike_seconds")
+
+
+class FaultInjector:
+    """
+    Decides which faults the offline stand-ins inject.
+
+    A profile maps targets to FaultRule fields. A target is a stand-in provider
+    (openai, imagen, veo_submit, veo, upload, download, crawl) or
+    "stage:<name>" for every provider call made inside that instrumented
+    stage, e.g. {"stage:text_generation": {"error_500": 0.3}}. When both match,
+    either rule can fire.
+    """
+
+    def __init__(self, seed: Optional[int] = None):
+        self.profile: Optional[str] = None
+        self.rules: Dict[str, FaultRule] = {}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def configure(self, profile: Union[str, Dict, None], seed: Optional[int] = None):
+        """
+        Activate a fault profile.
+
+        Args:
+            profile: Name of a FAULT_PROFILES entry, a profile dict, or None to disable faults
+            seed: Seed for fault draws
+        """
+        if isinstance(profile, str):
+            if profile not in FAULT_PROFILES:
+                raise ValueError(f"Unknown fault profile {profile!r}, expected one of {sorted(FAULT_PROFILES)}")
+            self.profile, spec = profile, FAULT_PROFILES[profile]
+        else:
+            self.profile, spec = ("custom" if profile else None), profile or {}
+        self.rules = {target: FaultRule(**rule) for target, rule in spec.items()}
+        if seed is not None:
+            self._random.seed(seed)
+        if self.rules:
+            logger.info(f"Fault injection enabled: {self.profile} {spec}")
+
+    def _matching_rules(self, provider: str) -> List[FaultRule]:
+        rules = []
+        if provider in self.rules:
+            rules.append(self.rules[provider])
+        stage = current_stage()
+        if stage and f"stage:{stage}" in self.rules:
+            rules.append(self.rules[f"stage:{stage}"])
+        return rules
+
+    def _draw(self, provider: str, kind: str, rule: FaultRule) -> bool:
+        """Draw whether one rule's fault of this kind hits the call (and count it)."""
+        rate = getattr(rule, kind)
+        if rate <= 0:
+            return False
+        with self._lock:
+            hit = self._random.random() < rate
+        if hit:
+            faults_injected.inc(provider=provider, kind=kind)
+        return hit
+
+    def fires(self, provider: str, kind: str) -> bool:
+        """Draw whether a fault of this kind hits the current call to provider (and count it)."""
+        return any(self._draw(provider, kind, rule) for rule in self._matching_rules(provider))
+
+    def spike(self, provider: str) -> float:
+        """Extra seconds of latency for this call: spike_seconds of the rule whose spike fired, else 0."""
+        for rule in self._matching_rules(provider):
+            if self._draw(provider, "latency_spike", rule):
+                return rule.spike_seconds
+        return 0.0
+
+    def error_status(self, provider: str) -> Optional[int]:
+        """HTTP status of an injected error for this call, or None."""
+        if self.fires(provider, "error_429"):
+            return 429
+        if self.fires(provider, "error_500"):
+            return 500
+        return None
+
+
+faults = FaultInjector()
+if FAULT_PROFILE:
+    faults.configure(FAULT_PROFILE)
@@ -1,17 +1,42 @@
 import os
 import datetime
 import base64
+import time
 import uuid
-import requests
 from PIL import Image
 from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
 
 from pathlib import Path
 import structlog
+from config import ARTIFACT_PERSIST_WORKERS
 from utils.postprocessing import normalize_url
+from utils.renditions import get_rendition_pipeline
+from utils.artifact import ImageArtifact, artifact_store
+from utils.metrics import bytes_transferred, stage_errors, stage_latency
+from utils.providers import http_get, generated_name
+from utils.perceptual_hash import remember_source
 
 logger = structlog.get_logger()
 
+# MIME type <-> file extension mappings for supported images
+IMAGE_EXTENSIONS = {
+    "image/png": ".png",
+    "image/jpeg": ".jpg",
+    "image/webp": ".webp",
+    "image/gif": ".gif"
+}
+IMAGE_MIME_TYPES = {
+    ".png": "image/png",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".webp": "image/webp",
+    ".gif": "image/gif"
+}
+
+# Background writer shared by all FileStorage instances
+_persist_executor = ThreadPoolExecutor(max_workers=ARTIFACT_PERSIST_WORKERS, thread_name_prefix="artifact-persist")
+
 class FileStorage:
     def __init__(self):
         # Create base directories if they don't exist
@@ -19,21 +44,58 @@ class FileStorage:
         self.outputs_dir = os.path.join(self.base_dir, "outputs")
         self.images_dir = os.path.join(self.outputs_dir, "images")
         self.videos_dir = os.path.join(self.outputs_dir, "videos")
+        self.renditions_dir = os.path.join(self.outputs_dir, "renditions")
         
         self._ensure_dirs_exist()
+        # Shared post-save pipeline for thumbnails and compact copies (None if disabled)
+        self.rendition_pipeline = get_rendition_pipeline(self.renditions_dir)
     
     def _ensure_dirs_exist(self):
         """Ensure all required directories exist."""
-        for dir_path in [self.outputs_dir, self.images_dir, self.videos_dir]:
+        for dir_path in [self.outputs_dir, self.images_dir, self.videos_dir, self.renditions_dir]:
             if not os.path.exists(dir_path):
                 os.makedirs(dir_path)
                 logger.info(f"Created directory: {dir_path}")
     
+    def _output_dirs(self):
+        return {"images": self.images_dir, "videos": self.videos_dir, "renditions": self.renditions_dir}
+    
+    def output_path(self, kind, filename):
+        """
+        Resolve a saved output file by kind and name.
+        
+        Args:
+            kind: "images", "videos" or "renditions"
+            filename: Bare file name, without directories
+        
+        Returns:
+            Absolute path of the file, or None if the kind is unknown, the name has a directory part, or the file does not exist
+        """
+        directory = self._output_dirs().get(kind)
+        if directory is None or not filename or filename != os.path.basename(filename) or filename.startswith("."):
+            return None
+        path = os.path.join(directory, filename)
+        return path if os.path.isfile(path) else None
+    
+    def output_ref(self, path):
+        """
+        Reverse of output_path: (kind, filename) of a saved output, or None if the path is outside the output directories.
+        """
+        if not path or path.startswith("data:"):
+            return None
+        directory, filename = os.path.split(os.path.abspath(path))
+        for kind, kind_dir in self._output_dirs().items():
+            if directory == kind_dir:
+                return kind, filename
+        return None
+    
     def _generate_filename(self, prefix="file", extension=""):
-        """Generate a unique filename with timestamp and UUID."""
-        timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
-        unique_id = str(uuid.uuid4())[:8]
-        return f"{prefix}_{timestamp}_{unique_id}{extension}"
+        """Generate a unique filename with timestamp and UUID (reused from the cassette in replay mode)."""
+        def make():
+            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            unique_id = str(uuid.uuid4())[:8]
+            return f"{prefix}_{timestamp}_{unique_id}{extension}"
+        return generated_name(f"{prefix}{extension}", make)
     
     def download_image(self, image_url):
         """
@@ -45,37 +107,88 @@ class FileStorage:
         Returns:
             filepath: Path to the downloaded image
         """
+        # Skip if already a data URL
+        if image_url.startswith("data:"):
+            return image_url
+        
+        artifact = self.download_image_artifact(image_url)
+        return artifact.path if artifact else None
+    
+    def download_image_artifact(self, image_url):
+        """
+        Download an image into memory and persist it in the background.
+        
+        Args:
+            image_url: URL of the image to download
+        
+        Returns:
+            artifact: ImageArtifact holding the downloaded bytes, or None on failure
+        """
         try:
-            # Skip if already a data URL
-            if image_url.startswith("data:"):
-                return image_url
-            
             # Normalize the URL before downloading
             normalized_url = normalize_url(image_url)
             logger.debug(f"Normalized URL: {normalized_url}")
-                
+            
             # Request the image
-            response = requests.get(normalized_url, stream=True)
+            start = time.perf_counter()
+            response = http_get(normalized_url)
             response.raise_for_status()
+            stage_latency.observe(time.perf_counter() - start, stage="download", status="ok")
+            bytes_transferred.inc(len(response.content), stage="download", direction="in")
             
             # Determine extension from content type
-            content_type = response.headers.get("content-type", "image/jpeg")
-            ext = {
-                "image/png": ".png",
-                "image/jpeg": ".jpg",
-                "image/webp": ".webp",
-                "image/gif": ".gif"
-            }.get(content_type, ".jpg")
+            content_type = response.headers.get("content-type", "image/jpeg").split(";")[0].strip()
+            ext = IMAGE_EXTENSIONS.get(content_type, ".jpg")
+            mime_type = content_type if content_type in IMAGE_EXTENSIONS else "image/jpeg"
             
-            # Save the image
-            image_bytes = response.content
-            filepath = self.save_image(image_bytes, extension=ext)
-            
-            logger.info(f"Downloaded image from {normalized_url} to {filepath}")
-            return filepath
+            # Save the image without blocking the caller on the disk write
+            artifact = self.persist_image(ImageArtifact.from_bytes(response.content, mime_type), extension=ext)
+            # Later stages look the source's perceptual hash up by URL to spot duplicates; it is
+            # computed on the persist threads, beside the write, and awaited only where needed
+            remember_source(normalized_url, artifact, _persist_executor)
             
+            logger.info(f"Downloaded image from {normalized_url} to {artifact.path}")
+            return artifact
+        
         except Exception as e:
             logger.error(f"Failed to download image from {image_url}: {str(e)}")
+            stage_errors.inc(stage="download", error=type(e).__name__)
+            return None
+    
+    def load_image_artifact(self, image_ref):
+        """
+        Resolve a data URL, local path or remote URL to an ImageArtifact.
+        
+        Artifacts produced earlier in this process are served from memory,
+        so the common path (generate, then reuse) never re-reads the file.
+        
+        Args:
+            image_ref: Data URL, local file path or remote URL
+        
+        Returns:
+            artifact: ImageArtifact, or None if the image could not be loaded
+        """
+        try:
+            artifact = artifact_store.get(image_ref)
+            if artifact is not None:
+                return artifact
+            
+            if image_ref.startswith("data:"):
+                header, encoded = image_ref.split(",", 1)
+                mime_type = header[len("data:"):].split(";")[0] or "image/jpeg"
+                return ImageArtifact.from_bytes(base64.b64decode(encoded), mime_type)
+            
+            if os.path.exists(image_ref):
+                with open(image_ref, "rb") as image_file:
+                    image_data = image_file.read()
+                mime_type = IMAGE_MIME_TYPES.get(Path(image_ref).suffix.lower(), "image/jpeg")
+                artifact = ImageArtifact.from_bytes(image_data, mime_type, path=image_ref)
+                artifact_store.put(artifact)
+                return artifact
+            
+            return self.download_image_artifact(image_ref)
+        except Exception as e:
+            logger.error(f"Failed to load image {image_ref}: {str(e)}")
             return None
     
     def encode_image_to_base64(self, image_path):
@@ -84,35 +197,52 @@ class FileStorage:
         
         Args:
             image_path: Path to the image file
-            
+        
         Returns:
             data_url: Base64 encoded image as a data URL
         """
         try:
-            with open(image_path, "rb") as image_file:
-                image_data = image_file.read()
-                
-            # Determine MIME type based on file extension
-            ext = Path(image_path).suffix.lower()
-            mime_type = {
-                ".png": "image/png",
-                ".jpg": "image/jpeg",
-                ".jpeg": "image/jpeg",
-                ".webp": "image/webp",
-                ".gif": "image/gif"
-            }.get(ext, "image/jpeg")
-            
-            encoded = base64.b64encode(image_data).decode("utf-8")
-            data_url = f"data:{mime_type};base64,{encoded}"
+            artifact = self.load_image_artifact(image_path)
+            if artifact is None:
+                return None
             
+            data_url = artifact.data_url
             logger.debug(f"Encoded image {image_path} to base64")
             return data_url
-            
+        
         except Exception as e:
             logger.error(f"Failed to encode image to base64: {str(e)}")
             return None
     
-    def save_image(self, image_bytes, prompt=None, extension=".png"):
+    def persist_image(self, image, prompt=None, extension=".png"):
+        """
+        Register an image in memory and write it to disk in the background.
+        
+        The returned artifact already carries its final local path, so later
+        stages can pass the path around while the write is still in flight.
+        Call artifact.wait_persisted() before reporting the path anywhere
+        outside the process; a failed write is logged, counted under the
+        "persist" stage and leaves the bytes in memory only.
+        
+        Args:
+            image: ImageArtifact or raw image bytes
+            prompt: Optional prompt text to save alongside the image
+            extension: File extension (default: .png)
+        
+        Returns:
+            artifact: The registered ImageArtifact
+        """
+        if not isinstance(image, ImageArtifact):
+            image = ImageArtifact.from_bytes(image, IMAGE_MIME_TYPES.get(extension, "image/png"))
+        
+        image.path = os.path.join(self.images_dir, self._generate_filename("image", extension))
+        image.persisted = _persist_executor.submit(
+            self._persist, image.data, prompt, extension, image.path
+        )
+        artifact_store.put(image)
+        return image
+    
+    def save_image(self, image_bytes, prompt=None, extension=".png", filepath=None):
         """
         Save an image to the local filesystem.
         
@@ -120,31 +250,67 @@ class FileStorage:
             image_bytes: The image data as bytes
             prompt: Optional prompt text to save alongside the image
             extension: File extension (default: .png)
-            
+            filepath: Optional destination path (default: new unique file in images_dir)
+        
         Returns:
             filepath: The path to the saved image
         """
         try:
-            # Generate a unique filename
-            filename = self._generate_filename("image", extension)
-            filepath = os.path.join(self.images_dir, filename)
-            
-            # Save the image
-            with open(filepath, "wb") as f:
-                f.write(image_bytes)
-            
-            # Save the prompt if provided
-            if prompt:
-                prompt_filepath = os.path.join(self.images_dir, f"{filename}.txt")
-                with open(prompt_filepath, "w") as f:
-                    f.write(prompt)
-            
-            logger.info(f"Image saved successfully to {filepath}")
-            return filepath
+            return self._write_image(image_bytes, prompt, extension, filepath)
         except Exception as e:
             logger.error(f"Failed to save image: {str(e)}")
             return None
     
+    def _persist(self, image_bytes, prompt, extension, filepath):
+        """Background write for persist_image; raises on failure so the artifact's future records it."""
+        try:
+            return self._write_image(image_bytes, prompt, extension, filepath)
+        except Exception as e:
+            logger.error(f"Failed to persist image {filepath}: {type(e).__name__}: {str(e)}")
+            stage_errors.inc(stage="persist", error=type(e).__name__)
+            raise
+    
+    def _write_image(self, image_bytes, prompt=None, extension=".png", filepath=None):
+        """Body of save_image, raising on failure."""
+        # Generate a unique filename
+        if filepath is None:
+            filepath = os.path.join(self.images_dir, self._generate_filename("image", extension))
+        filename = os.path.basename(filepath)
+        
+        # Save the image
+        with open(filepath, "wb") as f:
+            f.write(image_bytes)
+        
+        # Save the prompt if provided
+        if prompt:
+            prompt_filepath = os.path.join(self.images_dir, f"{filename}.txt")
+            with open(prompt_filepath, "w") as f:
+                f.write(prompt)
+        
+        logger.info(f"Image saved successfully to {filepath}")
+        
+        # Hand off to the rendition pipeline (skipped at once if its queue is full)
+        if self.rendition_pipeline:
+            self.rendition_pipeline.submit(filepath)
+        return filepath
+    
+    def load_image_prompt(self, image_path):
+        """
+        Read the prompt saved alongside an image by save_image.
+        
+        Args:
+            image_path: Path of the saved image
+        
+        Returns:
+            prompt: The prompt text, or None if none was saved
+        """
+        prompt_filepath = os.path.join(self.images_dir, f"{os.path.basename(image_path)}.txt")
+        try:
+            with open(prompt_filepath) as f:
+                return f.read() or None
+        except OSError:
+            return None
+    
     def save_video(self, video_bytes, prompt=None, extension=".mp4"):
         """
         Save a video to the local filesystem.
@@ -153,7 +319,7 @@ class FileStorage:
             video_bytes: The video data as bytes
             prompt: Optional prompt text to save alongside the video
             extension: File extension (default: .mp4)
-            
+        
         Returns:
             filepath: The path to the saved video
         """
@@ -176,4 +342,4 @@ class FileStorage:
             return filepath
         except Exception as e:
             logger.error(f"Failed to save video: {str(e)}")
-            return None 
\ No newline at end of file
+            return None
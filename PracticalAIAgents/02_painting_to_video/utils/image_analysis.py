@@ -0,0 +1,201 @@
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Any, Dict
+
+import numpy as np
+import structlog
+
+from config import ANALYSIS_WORKERS, ANALYSIS_PALETTE_SIZE, ANALYSIS_CACHE_SIZE
+from utils.artifact import ImageArtifact
+from utils.metrics import instrument_stage
+
+logger = structlog.get_logger()
+
+# Images are downsampled to this longest edge before analysis
+ANALYSIS_MAX_EDGE = 256
+KMEANS_ITERATIONS = 12
+EDGE_THRESHOLD = 32.0  # Gradient magnitude (0-255 scale) counted as an edge
+HISTOGRAM_BINS = 8
+MIN_PALETTE_SHARE = 0.02  # Palette colors below this share are left out of prompt text
+
+
+def kmeans_palette(pixels: np.ndarray, k: int, iterations: int = KMEANS_ITERATIONS):
+    """
+    Vectorized k-means over RGB pixels.
+
+    Centroids are seeded at evenly spaced luminance quantiles, which makes the
+    result deterministic and spreads seeds across dark and light tones.
+
+    Args:
+        pixels: (N, 3) float32 array of RGB values
+        k: Number of palette colors
+        iterations: Lloyd iterations
+
+    Returns:
+        (centroids, shares) sorted by descending share
+    """
+    k = min(k, len(pixels))
+    luminance = pixels @ np.array([0.2126, 0.7152, 0.0722], dtype=np.float32)
+    order = np.argsort(luminance)
+    seeds = order[np.linspace(0, len(order) - 1, k).astype(int)]
+    centroids = pixels[seeds].copy()
+    pixel_norms = (pixels ** 2).sum(axis=1, keepdims=True)
+
+    for _ in range(iterations):
+        # Squared distances via |x|^2 - 2x.c + |c|^2, without an (N, k, 3) temporary
+        distances = pixel_norms - 2 * pixels @ centroids.T + (centroids ** 2).sum(axis=1)
+        labels = distances.argmin(axis=1)
+        counts = np.bincount(labels, minlength=k).astype(np.float32)
+        sums = np.stack([np.bincount(labels, weights=pixels[:, c], minlength=k) for c in range(3)], axis=1)
+        occupied = counts > 0
+        updated = centroids.copy()
+        updated[occupied] = sums[occupied] / counts[occupied, None]
+        if np.allclose(updated, centroids, atol=0.5):
+            centroids = updated
+            break
+        centroids = updated
+
+    shares = counts / counts.sum()
+    ranking = np.argsort(-shares)
+    return centroids[ranking], shares[ranking]
+
+
+def analyze_image_bytes(image_bytes: bytes, palette_size: int = ANALYSIS_PALETTE_SIZE) -> Dict[str, Any]:
+    """
+    Compute palette, tonal and composition statistics for an encoded image.
+
+    Runs in a worker process, so it takes plain bytes and returns plain data.
+
+    Args:
+        image_bytes: Encoded image (PNG, JPEG, WebP, ...)
+        palette_size: Number of dominant colors to extract
+
+    Returns:
+        Dictionary with palette, brightness/contrast, histogram, edge density and aspect
+    """
+    from PIL import Image
+
+    with Image.open(BytesIO(image_bytes)) as image:
+        width, height = image.size
+        image = image.convert("RGB")
+        image.thumbnail((ANALYSIS_MAX_EDGE, ANALYSIS_MAX_EDGE))
+        rgb = np.asarray(image, dtype=np.float32)
+
+    pixels = rgb.reshape(-1, 3)
+    centroids, shares = kmeans_palette(pixels, palette_size)
+
+    luminance = rgb @ np.array([0.2126, 0.7152, 0.0722], dtype=np.float32)
+    histogram, _ = np.histogram(luminance, bins=HISTOGRAM_BINS, range=(0, 255))
+
+    # Edge density: share of pixels whose luminance gradient exceeds the threshold
+    # (np.gradient needs 2 pixels along each axis; a 1-pixel strip has no edges to measure)
+    if min(luminance.shape) < 2:
+        edge_density = 0.0
+    else:
+        gy, gx = np.gradient(luminance)
+        edge_density = float((np.hypot(gx, gy) > EDGE_THRESHOLD).mean())
+
+    # Saturation from the max/min channel spread, to tell muted from vivid palettes
+    channel_max = rgb.max(axis=2)
+    channel_min = rgb.min(axis=2)
+    saturation = np.where(channel_max > 0, (channel_max - channel_min) / np.maximum(channel_max, 1), 0)
+
+    return {
+        "width": width,
+        "height": height,
+        "aspect_ratio": round(width / height, 3),
+        "palette": [
+            {"hex": "#{:02x}{:02x}{:02x}".format(*np.clip(c, 0, 255).round().astype(int)), "share": round(float(s), 3)}
+            for c, s in zip(centroids, shares)
+        ],
+        "brightness": round(float(luminance.mean()) / 255, 3),
+        "contrast": round(float(luminance.std()) / 255, 3),
+        "saturation": round(float(saturation.mean()), 3),
+        "luminance_histogram": [round(float(v), 3) for v in histogram / histogram.sum()],
+        "edge_density": round(edge_density, 3),
+    }
+
+
+def describe_analysis(analysis: Dict[str, Any]) -> str:
+    """
+    Render an analysis as prompt text.
+
+    Args:
+        analysis: Output of analyze_image_bytes
+
+    Returns:
+        Multi-line description of the measured visual properties
+    """
+    aspect = analysis["aspect_ratio"]
+    orientation = "landscape" if aspect > 1.05 else "portrait" if aspect < 0.95 else "square"
+    # Skip slivers left by near-duplicate clusters
+    palette = ", ".join(f"{c['hex']} ({c['share']:.0%})" for c in analysis["palette"] if c["share"] >= MIN_PALETTE_SHARE)
+    shadows, highlights = analysis["luminance_histogram"][:2], analysis["luminance_histogram"][-2:]
+    return "\n".join([
+        f"Dimensions: {analysis['width']}x{analysis['height']} ({orientation}, aspect {aspect})",
+        f"Dominant palette: {palette}",
+        f"Brightness: {analysis['brightness']:.2f} (0 dark - 1 bright), contrast: {analysis['contrast']:.2f}, saturation: {analysis['saturation']:.2f}",
+        f"Tonal distribution: {sum(shadows):.0%} deep shadows, {sum(highlights):.0%} highlights",
+        f"Edge density: {analysis['edge_density']:.2f} (low = soft, broad forms; high = fine detail, busy texture)",
+    ])
+
+
+class ImageAnalyzer:
+    """
+    Runs image analysis in a process pool with a per-image-hash cache.
+
+    Concurrent requests for the same image share one computation.
+    """
+
+    def __init__(self, max_workers: int = ANALYSIS_WORKERS, cache_size: int = ANALYSIS_CACHE_SIZE):
+        self.max_workers = max_workers
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._executor = None
+        self._executor_lock = threading.Lock()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._executor
+
+    @instrument_stage("image_analysis")
+    async def analyze(self, artifact: ImageArtifact) -> Dict[str, Any]:
+        """
+        Analyze an image, reusing cached results for identical bytes.
+
+        Args:
+            artifact: The image to analyze
+
+        Returns:
+            Analysis dictionary (see analyze_image_bytes)
+        """
+        key = artifact.sha256
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        if key in self._pending:
+            return await asyncio.shield(self._pending[key])
+
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._get_executor(), analyze_image_bytes, artifact.to_bytes())
+        self._pending[key] = future
+        try:
+            analysis = await future
+        finally:
+            del self._pending[key]
+
+        self._cache[key] = analysis
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        logger.debug(f"Analyzed image {key[:12]}: {analysis}")
+        return analysis
+
+
+# Shared analyzer so the cache spans all prompt generations in the process
+image_analyzer = ImageAnalyzer()
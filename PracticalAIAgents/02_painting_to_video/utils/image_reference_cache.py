@@ -0,0 +1,131 @@
+import asyncio
+import os
+import shutil
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict
+
+import structlog
+
+from config import IMAGE_REFERENCE_TTL, IMAGE_REFERENCE_REFRESH_MARGIN, IMAGE_REFERENCE_GCS_PREFIX
+from utils.artifact import ImageArtifact
+
+logger = structlog.get_logger()
+
+
+@dataclass
+class ImageReference:
+    """An uploaded image that generation requests can point at by URI."""
+    uri: str
+    mime_type: str
+    expires_at: float
+    size: int
+
+
+class GCSImageUploader:
+    """
+    Uploads images to Cloud Storage for Vertex AI Veo requests (gs:// URIs).
+
+    Gemini Files API URIs cannot be used here: Veo's image input takes a
+    gcs_uri only on Vertex AI, and the Developer API rejects it outright.
+    Objects are content-addressed, so an image already in the bucket is not
+    uploaded again; expire them with a bucket lifecycle rule.
+    """
+
+    def __init__(self, bucket: str, prefix: str = IMAGE_REFERENCE_GCS_PREFIX):
+        # Optional dependency, needed only when the cache is enabled on Vertex AI
+        from google.cloud import storage
+        if not bucket:
+            raise ValueError("IMAGE_REFERENCE_GCS_BUCKET must be set to upload image references")
+        self.bucket = storage.Client().bucket(bucket)
+        self.prefix = prefix.strip("/")
+
+    def upload(self, artifact: ImageArtifact) -> ImageReference:
+        extension = artifact.mime_type.split("/")[-1]
+        blob = self.bucket.blob(f"{self.prefix}/{artifact.sha256}.{extension}")
+        if not blob.exists():
+            blob.upload_from_string(artifact.to_bytes(), content_type=artifact.mime_type)
+        return ImageReference(
+            uri=f"gs://{self.bucket.name}/{blob.name}",
+            mime_type=artifact.mime_type,
+            expires_at=time.time() + IMAGE_REFERENCE_TTL,
+            size=artifact.size,
+        )
+
+
+class LocalImageUploader:
+    """
+    Local stand-in for GCSImageUploader.
+
+    Stores a content-addressed copy of the image and returns a file:// URI,
+    so sweeps can be exercised offline against a Vertex AI stand-in client.
+    No provider can read the URI; it is for --offline runs only.
+    """
+
+    def __init__(self, upload_dir: str):
+        self.upload_dir = upload_dir
+        os.makedirs(self.upload_dir, exist_ok=True)
+
+    def upload(self, artifact: ImageArtifact) -> ImageReference:
+        extension = artifact.mime_type.split("/")[-1]
+        path = os.path.join(self.upload_dir, f"{artifact.sha256}.{extension}")
+        if not os.path.exists(path):
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(artifact.data)
+            shutil.move(tmp_path, path)
+        return ImageReference(
+            uri=Path(path).as_uri(),
+            mime_type=artifact.mime_type,
+            expires_at=time.time() + IMAGE_REFERENCE_TTL,
+            size=artifact.size,
+        )
+
+
+class ImageReferenceCache:
+    """
+    Upload-once cache mapping image content hashes to uploaded references.
+
+    Concurrent requests for the same image share a single upload, and a
+    reference is reused until it gets within the refresh margin of expiry.
+    """
+
+    def __init__(self, uploader, refresh_margin: float = IMAGE_REFERENCE_REFRESH_MARGIN):
+        self.uploader = uploader
+        self.refresh_margin = refresh_margin
+        self._references: Dict[str, ImageReference] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.stats = {"hits": 0, "uploads": 0, "bytes_uploaded": 0, "bytes_saved": 0}
+
+    async def get_reference(self, artifact: ImageArtifact) -> ImageReference:
+        """
+        Return a valid reference for the image, uploading it if needed.
+
+        Args:
+            artifact: The image to reference
+
+        Returns:
+            ImageReference with a URI usable in generation requests
+        """
+        key = artifact.sha256
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            reference = self._references.get(key)
+            if reference and reference.expires_at - time.time() > self.refresh_margin:
+                self.stats["hits"] += 1
+                self.stats["bytes_saved"] += reference.size
+                logger.debug(f"Reusing uploaded image {key[:12]}: {reference.uri}")
+                return reference
+
+            start = time.perf_counter()
+            reference = await asyncio.to_thread(self.uploader.upload, artifact)
+            self._references[key] = reference
+            self.stats["uploads"] += 1
+            self.stats["bytes_uploaded"] += reference.size
+            logger.info(f"Uploaded image {key[:12]} ({reference.size} bytes) in {time.perf_counter() - start:.2f}s: {reference.uri}")
+            return reference
+
+    def invalidate(self, artifact: ImageArtifact):
+        """Forget the reference for an image, e.g. after the provider rejected it."""
+        self._references.pop(artifact.sha256, None)
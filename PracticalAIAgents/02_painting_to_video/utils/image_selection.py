@@ -0,0 +1,136 @@
+import asyncio
+import os
+import re
+from dataclasses import dataclass
+from io import BytesIO
+from typing import List, Optional
+from urllib.parse import urlsplit
+
+import structlog
+from PIL import Image
+
+from config import MINIMUM_IMAGE_SIZE, PREFERRED_IMAGE_FORMATS, IMAGE_PROBE_BYTES, IMAGE_PROBE_TIMEOUT, IMAGE_PROBE_MAX_CANDIDATES
+from models.models import ArtworkDetails
+from utils.metrics import instrument_stage, stage_errors, bytes_transferred
+from utils.postprocessing import normalize_url
+from utils.providers import http_get
+
+logger = structlog.get_logger()
+
+FORMAT_EXTENSIONS = {"JPEG": ".jpg", "PNG": ".png", "WEBP": ".webp", "GIF": ".gif", "BMP": ".bmp", "TIFF": ".tiff", "AVIF": ".avif"}
+# Size markers in file names ("DT1502-thumb", "img_800x600", "photo@2x"), stripped to tell renditions of one image apart from other images
+SIZE_SUFFIX = re.compile(r"([-_.@](\d+x\d*|\d*x\d+|thumb(nail)?|small|medium|large|preview))+$")
+
+
+@dataclass
+class ImageProbe:
+    """Dimensions and format of a remote image, read from its first bytes."""
+    url: str
+    width: int
+    height: int
+    extension: str
+
+    @property
+    def preferred_format(self) -> bool:
+        return self.extension in PREFERRED_IMAGE_FORMATS
+
+    @property
+    def meets_size(self) -> bool:
+        return max(self.width, self.height) >= MINIMUM_IMAGE_SIZE
+
+
+def _stem(url: str) -> str:
+    name = os.path.splitext(os.path.basename(urlsplit(url).path))[0].lower()
+    return SIZE_SUFFIX.sub("", name)
+
+
+def probe_image(url: str, probe_bytes: int = IMAGE_PROBE_BYTES, timeout: float = IMAGE_PROBE_TIMEOUT) -> Optional[ImageProbe]:
+    """
+    Read an image's dimensions and format without downloading it.
+
+    Asks for the first probe_bytes with a Range header and stops reading
+    there even if the server ignores Range and sends the whole file.
+
+    Args:
+        url: Image URL
+        probe_bytes: Bytes to fetch; enough for the header of JPEG (past EXIF), PNG and WebP
+        timeout: Seconds for the request
+
+    Returns:
+        ImageProbe, or None if the image could not be fetched or its header parsed
+    """
+    try:
+        response = http_get(url, headers={"Range": f"bytes=0-{probe_bytes - 1}"}, stream=True, timeout=timeout)
+        try:
+            response.raise_for_status()
+            head = bytearray()
+            for chunk in response.iter_content(chunk_size=8192):
+                head += chunk
+                if len(head) >= probe_bytes:
+                    break
+        finally:
+            response.close()
+        bytes_transferred.inc(len(head), stage="image_selection", direction="in")
+        # Opening only parses the header, so a truncated body is fine
+        with Image.open(BytesIO(bytes(head))) as image:
+            width, height = image.size
+            image_format = image.format
+    except Exception as e:
+        logger.debug(f"Could not probe image {url}: {type(e).__name__}: {str(e)}")
+        stage_errors.inc(stage="image_selection", error=type(e).__name__)
+        return None
+    return ImageProbe(url, width, height, FORMAT_EXTENSIONS.get(image_format, f".{(image_format or '').lower()}"))
+
+
+def pick_best(probes: List[ImageProbe], chosen_url: Optional[str] = None) -> Optional[ImageProbe]:
+    """
+    Best source image among probed candidates.
+
+    Candidates meeting MINIMUM_IMAGE_SIZE in a PREFERRED_IMAGE_FORMATS format
+    come first. Among those, renditions of the image the extractor chose (same
+    file name apart from size markers) beat other images on the page, which
+    may be banners or related works; then larger beats smaller.
+    """
+    chosen_stem = _stem(chosen_url) if chosen_url else None
+    ranked = sorted(
+        probes,
+        key=lambda probe: (probe.meets_size and probe.preferred_format, probe.preferred_format, _stem(probe.url) == chosen_stem, probe.width * probe.height),
+        reverse=True,
+    )
+    return ranked[0] if ranked else None
+
+
+@instrument_stage("image_selection")
+async def select_source_image(artwork_details: ArtworkDetails, candidate_urls: List[str]) -> ArtworkDetails:
+    """
+    Point main_image_url at the best of the page's images before anything is downloaded
+
+    Every candidate (the extractor's choice plus the images the crawler found)
+    is probed concurrently for its header only; see pick_best for the rules.
+
+    Args:
+        artwork_details: Extracted details; main_image_url is the extractor's choice
+        candidate_urls: Other image URLs found on the artwork page
+
+    Returns:
+        The details with main_image_url replaced if a better image was found
+    """
+    chosen = artwork_details.image_urls.main_image_url
+    chosen = normalize_url(chosen) if chosen else None
+    urls = [normalize_url(url) for url in candidate_urls if url and not url.startswith("data:")]
+    candidates = list(dict.fromkeys(([chosen] if chosen else []) + urls))[:IMAGE_PROBE_MAX_CANDIDATES]
+    if not candidates:
+        return artwork_details
+
+    probes = [probe for probe in await asyncio.gather(*(asyncio.to_thread(probe_image, url) for url in candidates)) if probe]
+    best = pick_best(probes, chosen)
+    if best is None:
+        logger.warning(f"None of {len(candidates)} candidate images could be probed, keeping {chosen}")
+        return artwork_details
+    if not (best.meets_size and best.preferred_format):
+        logger.warning(f"No candidate image is {MINIMUM_IMAGE_SIZE}px in {', '.join(PREFERRED_IMAGE_FORMATS)}; best is {best.width}x{best.height} {best.extension}")
+    if best.url == chosen:
+        return artwork_details
+    logger.info(f"Source image: {best.url} ({best.width}x{best.height}) instead of {chosen}")
+    image_urls = artwork_details.image_urls.model_copy(update={"main_image_url": best.url})
+    return artwork_details.model_copy(update={"image_urls": image_urls})
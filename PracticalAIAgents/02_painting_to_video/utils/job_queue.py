@@ -0,0 +1,272 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+
+import structlog
+
+from config import (
+    JOB_QUEUE_PATH, JOB_QUEUE_JOURNAL_MODE, JOB_QUEUE_SHARDS, JOB_QUEUE_LEASE_SECONDS, JOB_QUEUE_MAX_ATTEMPTS,
+    JOB_QUEUE_RETRY_BACKOFF, JOB_QUEUE_STEAL,
+)
+
+logger = structlog.get_logger()
+
+DEFAULT_DB_PATH = JOB_QUEUE_PATH or os.path.join(os.path.dirname(os.path.abspath(__file__)), "outputs", "job_queue.db")
+
+# Rollback journals keep all state in the database file; WAL also needs a shared-memory index only one host can map
+JOURNAL_MODES = {"WAL", "DELETE", "TRUNCATE"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    artwork_url TEXT NOT NULL,
+    generate_video INTEGER NOT NULL,
+    mode TEXT NOT NULL,
+    shard INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    lease_owner TEXT,
+    lease_expires REAL,
+    not_before REAL NOT NULL,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    last_error TEXT,
+    result TEXT,
+    cost_usd REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_ready ON jobs (status, shard, not_before);
+"""
+
+
+def shard_of(artwork_url: str, shards: int = JOB_QUEUE_SHARDS) -> int:
+    """Stable shard of an artwork URL, so repeat URLs land on the same worker and its warm caches."""
+    return int(hashlib.sha256(artwork_url.encode("utf-8")).hexdigest()[:8], 16) % shards
+
+
+def owned_shards(index: int, workers: int, shards: int = JOB_QUEUE_SHARDS) -> List[int]:
+    """Shards worker `index` of `workers` leases first."""
+    return [shard for shard in range(shards) if shard % workers == index]
+
+
+class SQLiteJobQueue:
+    """
+    Artwork job queue in a SQLite file shared by worker processes.
+
+    A worker leases jobs for JOB_QUEUE_LEASE_SECONDS and keeps the lease alive
+    with heartbeats; a job whose lease expires (its worker died or hung) is
+    handed out again. Every lease counts as an attempt, and a failed job is
+    requeued with exponential backoff until max_attempts is reached, unless
+    the failure is permanent (a dead link will not come back on a retry).
+
+    Leasing takes the database write lock (BEGIN IMMEDIATE), so concurrent
+    workers never lease the same job. WAL journaling only works for processes
+    on one host, since its index lives in shared memory; a fleet spanning
+    several hosts needs journal_mode "DELETE" (or "TRUNCATE") and the file on
+    a shared filesystem with working POSIX locks.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, shards: int = JOB_QUEUE_SHARDS, journal_mode: str = JOB_QUEUE_JOURNAL_MODE):
+        journal_mode = journal_mode.upper()
+        if journal_mode not in JOURNAL_MODES:
+            raise ValueError(f"Unsupported journal mode {journal_mode!r}, expected one of {', '.join(sorted(JOURNAL_MODES))}")
+        self.db_path = db_path
+        self.shards = shards
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        # Used from worker threads (asyncio.to_thread), so share one connection behind a lock
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute(f"PRAGMA journal_mode={journal_mode}")
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _write(self, sql: str, params: Iterable = ()) -> int:
+        """Run one write statement in its own immediate transaction; returns the affected row count."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rowcount = self._conn.execute(sql, tuple(params)).rowcount
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return rowcount
+
+    def enqueue(self, artwork_urls: List[str], generate_video: bool = False, mode: str = "full", max_attempts: int = JOB_QUEUE_MAX_ATTEMPTS) -> List[int]:
+        """
+        Add one job per artwork URL.
+
+        Args:
+            artwork_urls: URLs of the artwork pages
+            generate_video: Flag to generate video (full mode only)
+            mode: "full" or "direct-video"
+            max_attempts: Leases before a failing job is given up
+
+        Returns:
+            The new job IDs
+        """
+        now = time.time()
+        ids = []
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                for url in artwork_urls:
+                    cursor = self._conn.execute(
+                        "INSERT INTO jobs (artwork_url, generate_video, mode, shard, status, max_attempts, not_before, created_at, updated_at) "
+                        "VALUES (?, ?, ?, ?, 'queued', ?, ?, ?, ?)",
+                        (url, int(generate_video), mode, shard_of(url, self.shards), max_attempts, now, now, now),
+                    )
+                    ids.append(cursor.lastrowid)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return ids
+
+    def lease(self, worker_id: str, shards: List[int], limit: int, lease_seconds: float = JOB_QUEUE_LEASE_SECONDS, steal: bool = JOB_QUEUE_STEAL) -> List[Dict]:
+        """
+        Lease up to limit ready jobs, from the worker's own shards first.
+
+        Ready means queued and past its retry backoff, or leased with an
+        expired lease. With steal, other shards are leased once the own ones
+        are empty, so an idle worker helps with a skewed queue.
+
+        Args:
+            worker_id: Lease owner
+            shards: Shards this worker owns (see owned_shards)
+            limit: Maximum jobs to lease
+            lease_seconds: Lease length before a heartbeat is needed
+            steal: Fall back to jobs from other shards
+
+        Returns:
+            Leased jobs as dicts, attempts already incremented
+        """
+        if limit <= 0:
+            return []
+        now = time.time()
+        ready = "((status = 'queued' AND not_before <= ?) OR (status = 'leased' AND lease_expires < ?))"
+        shard_list = ",".join(str(int(shard)) for shard in shards)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._conn.execute(
+                    f"SELECT * FROM jobs WHERE {ready} AND shard IN ({shard_list}) ORDER BY id LIMIT ?",
+                    (now, now, limit),
+                ).fetchall() if shards else []
+                if steal and len(rows) < limit:
+                    rows += self._conn.execute(
+                        f"SELECT * FROM jobs WHERE {ready} AND shard NOT IN ({shard_list}) ORDER BY id LIMIT ?",
+                        (now, now, limit - len(rows)),
+                    ).fetchall()
+                leased = []
+                for row in rows:
+                    if row["status"] == "leased":
+                        logger.warning(f"Job {row['id']} lease held by {row['lease_owner']} expired")
+                        if row["attempts"] >= row["max_attempts"]:
+                            # Its workers keep dying or hanging on it; stop handing it out
+                            self._conn.execute(
+                                "UPDATE jobs SET status = 'failed', last_error = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ? WHERE id = ?",
+                                (f"Lease expired on attempt {row['attempts']} of {row['max_attempts']}", now, row["id"]),
+                            )
+                            continue
+                    self._conn.execute(
+                        "UPDATE jobs SET status = 'leased', lease_owner = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                        (worker_id, now + lease_seconds, now, row["id"]),
+                    )
+                    leased.append(row)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [{**dict(row), "attempts": row["attempts"] + 1, "generate_video": bool(row["generate_video"])} for row in leased]
+
+    def heartbeat(self, worker_id: str, job_ids: List[int], lease_seconds: float = JOB_QUEUE_LEASE_SECONDS) -> List[int]:
+        """
+        Extend the worker's leases.
+
+        Returns:
+            IDs whose lease the worker no longer holds (expired and taken over)
+        """
+        lost = []
+        for job_id in job_ids:
+            updated = self._write(
+                "UPDATE jobs SET lease_expires = ?, updated_at = ? WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+                (time.time() + lease_seconds, time.time(), job_id, worker_id),
+            )
+            if not updated:
+                lost.append(job_id)
+        return lost
+
+    def complete(self, job_id: int, worker_id: str, result: Dict, cost_usd: float = 0.0) -> bool:
+        """
+        Store a job's result. cost_usd is added to what earlier failed attempts spent.
+
+        Returns:
+            False if the lease was lost meanwhile (another worker owns the job now)
+        """
+        return bool(self._write(
+            "UPDATE jobs SET status = 'done', result = ?, cost_usd = COALESCE(cost_usd, 0) + ?, last_error = NULL, lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+            "WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+            (json.dumps(result), cost_usd, time.time(), job_id, worker_id),
+        ))
+
+    def fail(self, job_id: int, worker_id: str, error: str, result: Optional[Dict] = None, cost_usd: float = 0.0,
+             backoff: float = JOB_QUEUE_RETRY_BACKOFF, permanent: bool = False) -> Optional[str]:
+        """
+        Record a failed attempt: requeue with backoff, or give up after max_attempts.
+
+        Args:
+            permanent: Give up now; retrying cannot help (e.g. the URL failed preflight)
+
+        Returns:
+            The job's new status ("queued" or "failed"), or None if the lease was lost
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT attempts, max_attempts FROM jobs WHERE id = ? AND status = 'leased' AND lease_owner = ?", (job_id, worker_id)).fetchone()
+        if row is None:
+            return None
+        status = "queued" if row["attempts"] < row["max_attempts"] and not permanent else "failed"
+        delay = backoff * 2 ** (row["attempts"] - 1)
+        updated = self._write(
+            "UPDATE jobs SET status = ?, last_error = ?, result = ?, cost_usd = COALESCE(cost_usd, 0) + ?, not_before = ?, "
+            "lease_owner = NULL, lease_expires = NULL, updated_at = ? WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+            (status, error, json.dumps(result) if result else None, cost_usd, time.time() + delay, time.time(), job_id, worker_id),
+        )
+        return status if updated else None
+
+    def release(self, job_id: int, worker_id: str) -> bool:
+        """Hand a leased job back (worker shutting down) without counting the attempt."""
+        return bool(self._write(
+            "UPDATE jobs SET status = 'queued', attempts = attempts - 1, lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+            "WHERE id = ? AND status = 'leased' AND lease_owner = ?",
+            (time.time(), job_id, worker_id),
+        ))
+
+    def counts(self) -> Dict[str, int]:
+        """Jobs per status."""
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    def unfinished(self) -> int:
+        """Jobs queued or leased."""
+        counts = self.counts()
+        return counts.get("queued", 0) + counts.get("leased", 0)
+
+    def jobs(self, status: Optional[str] = None, limit: int = 100) -> List[Dict]:
+        """Most recent jobs, optionally of one status, with results decoded."""
+        query, params = "SELECT * FROM jobs", ()
+        if status:
+            query, params = query + " WHERE status = ?", (status,)
+        with self._lock:
+            rows = self._conn.execute(query + " ORDER BY id DESC LIMIT ?", params + (limit,)).fetchall()
+        return [{**dict(row), "result": json.loads(row["result"]) if row["result"] else None} for row in rows]
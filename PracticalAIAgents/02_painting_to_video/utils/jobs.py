@@ -0,0 +1,235 @@
+import asyncio
+import datetime
+import uuid
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, List, Optional
+
+import structlog
+
+from config import (
+    DAEMON_CONCURRENCY, DAEMON_JOB_HISTORY, BATCH_COST_BUDGET_USD, TRACE_STORE_ENABLED,
+    PRIORITY_CLASSES, DEFAULT_PRIORITY_CLASS, BATCH_PRIORITY_CLASS, DEFAULT_TENANT,
+)
+from utils.cost_ledger import CostLedger
+from utils.metrics import progress_scope, start_metrics_server
+from utils.scheduler import FairScheduler, priority_scope
+
+logger = structlog.get_logger()
+
+
+class QueueFullError(RuntimeError):
+    """Raised when a submission would exceed the manager's pending artwork limit."""
+
+
+class Job:
+    """
+    One submitted set of artworks and its progress events.
+
+    Events are kept for the job's lifetime, so a watcher that subscribes late
+    still sees everything from job_queued onwards.
+    """
+
+    def __init__(self, artwork_urls: List[str], generate_video: bool = False, mode: str = "full", priority: str = DEFAULT_PRIORITY_CLASS, tenant: str = DEFAULT_TENANT):
+        self.job_id = uuid.uuid4().hex[:12]
+        self.artwork_urls = artwork_urls
+        self.generate_video = generate_video
+        self.mode = mode
+        self.priority = priority
+        self.tenant = tenant
+        self.status = "queued"
+        self.submitted_at = datetime.datetime.now().isoformat()
+        self.results: List[Optional[Dict]] = [None] * len(artwork_urls)
+        self.ledger = CostLedger(f"job:{self.job_id}", budget_usd=BATCH_COST_BUDGET_USD, budget_tokens=None, budget_calls=None)
+        self.events: List[Dict] = []
+        self._subscribers: List[asyncio.Queue] = []
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("done", "failed", "cancelled")
+
+    def emit(self, event: Dict):
+        """Record an event and pass it to every watcher."""
+        event = {"job_id": self.job_id, "seq": len(self.events), "time": datetime.datetime.now().isoformat(), **event}
+        self.events.append(event)
+        for queue in self._subscribers:
+            queue.put_nowait(event)
+
+    async def stream(self, after: int = 0, keepalive: Optional[float] = None) -> AsyncIterator[Optional[Dict]]:
+        """
+        Every event so far, then live events until the job finishes.
+
+        Args:
+            after: Skip events with a lower seq (to resume a dropped stream)
+            keepalive: Yield None after this many idle seconds, so callers can ping their client
+
+        Yields:
+            Events in seq order (and None for idle keepalive ticks)
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        history = self.events[max(after, 0):]
+        self._subscribers.append(queue)
+        try:
+            for event in history:
+                yield event
+            if self.done:
+                return
+            while True:
+                try:
+                    event = await asyncio.wait_for(queue.get(), keepalive)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                yield event
+                if event["type"] == "job_done":
+                    return
+        finally:
+            self._subscribers.remove(queue)
+
+    def summary(self) -> Dict:
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            "mode": self.mode,
+            "generate_video": self.generate_video,
+            "priority": self.priority,
+            "tenant": self.tenant,
+            "submitted_at": self.submitted_at,
+            "artworks": len(self.artwork_urls),
+            "completed": sum(result is not None for result in self.results),
+            "failed": sum(bool(result and result["error"]) for result in self.results),
+            "cost_usd": round(self.ledger.cost_usd, 6),
+        }
+
+
+class JobManager:
+    """
+    Runs submitted jobs in the warm process.
+
+    All jobs share one pool of artwork slots (DAEMON_CONCURRENCY), on top of
+    the process-wide provider limits, so a burst of submissions queues instead
+    of multiplying the load on the providers. Both are FairSchedulers, so an
+    interactive job's artworks and provider calls go ahead of queued bulk
+    work. With max_pending set, a submission that would leave more artworks
+    waiting or running is refused.
+    """
+
+    def __init__(self, concurrency: int = DAEMON_CONCURRENCY, history: int = DAEMON_JOB_HISTORY, max_pending: Optional[int] = None):
+        self.concurrency = concurrency
+        self.history = history
+        self.max_pending = max_pending
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self.slots = FairScheduler("artworks", concurrency)
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def submit(self, artwork_urls: List[str], generate_video: bool = False, mode: str = "full", priority: Optional[str] = None, tenant: Optional[str] = None) -> Job:
+        """
+        Queue a job; its artworks start as soon as slots are free.
+
+        Args:
+            artwork_urls: URLs of the artwork pages
+            generate_video: Flag to generate video (full mode only)
+            mode: "full" or "direct-video"
+            priority: PRIORITY_CLASSES entry (DEFAULT_PRIORITY_CLASS for one artwork, BATCH_PRIORITY_CLASS for several if None)
+            tenant: Tenant sharing its class's slots fairly with other tenants
+
+        Returns:
+            The queued Job
+
+        Raises:
+            QueueFullError: if max_pending artworks are already waiting or running
+            ValueError: for an unknown priority class
+        """
+        priority = priority or (DEFAULT_PRIORITY_CLASS if len(artwork_urls) == 1 else BATCH_PRIORITY_CLASS)
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown priority class {priority!r}, expected one of {sorted(PRIORITY_CLASSES)}")
+        pending = self.pending_artworks
+        if self.max_pending is not None and pending + len(artwork_urls) > self.max_pending:
+            raise QueueFullError(f"{pending} artworks pending, limit is {self.max_pending}")
+        job = Job(artwork_urls, generate_video, mode, priority, tenant or DEFAULT_TENANT)
+        self.jobs[job.job_id] = job
+        job.emit({"type": "job_queued", "artworks": len(artwork_urls), "mode": mode, "generate_video": generate_video, "priority": job.priority, "tenant": job.tenant})
+        self._tasks[job.job_id] = asyncio.get_running_loop().create_task(self._run(job))
+        self._forget_finished()
+        logger.info(f"Job {job.job_id} queued with {len(artwork_urls)} artworks ({job.priority}, tenant {job.tenant})")
+        return job
+
+    @property
+    def pending_artworks(self) -> int:
+        """Artworks of unfinished jobs without a result yet."""
+        return sum(result is None for job in self.jobs.values() if not job.done for result in job.results)
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    async def _run(self, job: Job):
+        import workflow
+        job.status = "running"
+
+        async def run_item(index: int, url: str):
+            def forward(event: Dict):
+                job.emit({**event, "artwork_url": url})
+
+            with priority_scope(job.priority, job.tenant), progress_scope(forward):
+                forward({"type": "artwork_queued"})
+                result = await workflow.run_batch_item(url, job.generate_video, job.mode, job.ledger, self.slots)
+            job.results[index] = result.model_dump()
+            job.emit({"type": "result", "artwork_url": url, "result": job.results[index]})
+
+        try:
+            await asyncio.gather(*(run_item(i, url) for i, url in enumerate(job.artwork_urls)))
+            job.status = "done"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+            raise
+        except Exception as e:
+            logger.error(f"Job {job.job_id} failed: {type(e).__name__}: {str(e)}")
+            job.status = "failed"
+        finally:
+            self._tasks.pop(job.job_id, None)
+            job.emit({"type": "job_done", "status": job.status, "summary": job.summary(), "cost": job.ledger.summary()})
+            logger.info(f"Job {job.job_id} {job.status}: {job.summary()['completed']}/{len(job.artwork_urls)} artworks, ${job.ledger.cost_usd:.4f}")
+
+    def _forget_finished(self):
+        """Drop the oldest finished jobs beyond the history limit."""
+        finished = [job_id for job_id, job in self.jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self.jobs[job_id]
+
+    async def shutdown(self):
+        """Cancel running jobs."""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def warm_up(metrics_port: Optional[int] = None):
+    """
+    Load everything a job needs once, for long-running processes (daemon, service).
+
+    Imports the workflow (SDKs, agents and generator clients, so the provider
+    mode must already be set), enables the trace store and metrics endpoint,
+    and starts the shared crawler.
+
+    Args:
+        metrics_port: Serve Prometheus metrics on this port (None disables)
+    """
+    import workflow  # noqa: F401
+    from utils.providers import start_shared_crawler
+    from utils.trace_store import enable_trace_store
+
+    if metrics_port:
+        start_metrics_server(metrics_port)
+    if TRACE_STORE_ENABLED:
+        enable_trace_store()
+    await start_shared_crawler()
+
+
+async def cool_down(manager: JobManager):
+    """Cancel running jobs, stop the shared crawler and finish queued renditions."""
+    from utils.providers import stop_shared_crawler
+    from utils.renditions import shutdown_rendition_pipeline
+
+    await manager.shutdown()
+    await stop_shared_crawler()
+    await asyncio.to_thread(shutdown_rendition_pipeline)
@@ -0,0 +1,92 @@
+import asyncio
+import contextlib
+import functools
+import inspect
+import time
+from typing import Dict, Optional
+
+import structlog
+
+from config import PROVIDER_CONCURRENCY, PROVIDER_CLASS_SHARES
+from utils.metrics import stage_queue_wait
+from utils.scheduler import FairScheduler
+
+logger = structlog.get_logger()
+
+
+class ProviderLimits:
+    """
+    Process-wide concurrency limits per provider.
+
+    Every workflow in the process (a CLI batch, or all jobs submitted to the
+    daemon) draws from the same slots, so a provider's quota is respected
+    however the work arrives. Slots are handed out by a FairScheduler, so
+    interactive work is not stuck behind queued bulk calls. Time spent
+    waiting for a slot is recorded in artwork_stage_queue_wait_seconds as
+    stage "provider:<name>".
+    """
+
+    def __init__(self, limits: Dict[str, int] = PROVIDER_CONCURRENCY, shares: Dict[str, Dict[str, float]] = PROVIDER_CLASS_SHARES):
+        self.limits = dict(limits)
+        self.shares = shares
+        self._schedulers: Dict[str, FairScheduler] = {}
+        self._loop = None
+
+    def scheduler(self, provider: str) -> Optional[FairScheduler]:
+        limit = self.limits.get(provider)
+        if not limit:
+            return None
+        # Waiters are futures of one event loop; start over if a new loop is running
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._schedulers = {}
+        if provider not in self._schedulers:
+            self._schedulers[provider] = FairScheduler(provider, limit, self.shares.get(provider))
+        return self._schedulers[provider]
+
+    @contextlib.asynccontextmanager
+    async def slot(self, provider: str):
+        """Hold one of the provider's slots for the duration of the block."""
+        scheduler = self.scheduler(provider)
+        if scheduler is None:
+            yield
+            return
+        start = time.perf_counter()
+        async with scheduler:
+            stage_queue_wait.observe(time.perf_counter() - start, stage=f"provider:{provider}")
+            yield
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Scheduler state per provider used so far."""
+        return {provider: scheduler.snapshot() for provider, scheduler in self._schedulers.items()}
+
+
+provider_limits = ProviderLimits()
+
+
+def limited(provider: str):
+    """
+    Decorator running an async provider call inside one of the provider's slots.
+
+    An async generator (a streamed response) holds its slot until it is exhausted or closed.
+
+    Args:
+        provider: Key in PROVIDER_CONCURRENCY
+    """
+    def decorator(func):
+        if inspect.isasyncgenfunction(func):
+            @functools.wraps(func)
+            async def stream_wrapper(*args, **kwargs):
+                async with provider_limits.slot(provider):
+                    async with contextlib.aclosing(func(*args, **kwargs)) as stream:
+                        async for chunk in stream:
+                            yield chunk
+            return stream_wrapper
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            async with provider_limits.slot(provider):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,465 @@
+import bisect
+import contextlib
+import contextvars
+import datetime
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Sequence, Tuple
+
+import structlog
+from agents import RunHooks, custom_span
+
+from utils.cost_ledger import check_budget, record_response_usage
+from utils.failures import StageError
+
+logger = structlog.get_logger()
+
+# Latency buckets in seconds, spanning fast local stages to multi-minute Veo jobs
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300, 600)
+
+
+def _escape_label(value) -> str:
+    """Escape a label value for the text exposition format."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _Metric:
+    """Base class for labelled metrics."""
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _format_labels(self, key: Tuple[str, ...], extra: Optional[Dict[str, str]] = None) -> str:
+        pairs = list(zip(self.labelnames, key)) + list((extra or {}).items())
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in pairs) + "}"
+
+
+class Counter(_Metric):
+    """Monotonically increasing count."""
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            return [f"{self.name}{self._format_labels(k)} {v}" for k, v in self._values.items()]
+
+    def snapshot(self):
+        with self._lock:
+            return {",".join(k) or "total": v for k, v in self._values.items()}
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Gauge(_Metric):
+    """Value that goes up and down, e.g. in-flight requests."""
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._peaks: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            value = self._values.get(key, 0) + amount
+            self._values[key] = value
+            self._peaks[key] = max(self._peaks.get(key, 0), value)
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+            self._peaks[key] = max(self._peaks.get(key, 0), value)
+
+    def render(self):
+        with self._lock:
+            return [f"{self.name}{self._format_labels(k)} {v}" for k, v in self._values.items()]
+
+    def snapshot(self):
+        with self._lock:
+            return {",".join(k) or "total": {"value": v, "peak": self._peaks.get(k, v)} for k, v in self._values.items()}
+
+    def reset(self):
+        with self._lock:
+            self._values.clear()
+            self._peaks.clear()
+
+
+class Histogram(_Metric):
+    """Bucketed distribution of observations (Prometheus cumulative buckets)."""
+    kind = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = LATENCY_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(buckets)
+        self._counts: Dict[Tuple[str, ...], list] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts = self._counts.setdefault(key, [0] * (len(self.buckets) + 1))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._sums[key] = self._sums.get(key, 0) + value
+
+    def quantile(self, q: float, key: Tuple[str, ...]) -> Optional[float]:
+        """Estimate a quantile by linear interpolation inside the matching bucket."""
+        counts = self._counts.get(key)
+        if not counts:
+            return None
+        total = sum(counts)
+        rank = q * total
+        cumulative = 0
+        for i, count in enumerate(counts):
+            if cumulative + count >= rank and count:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * ((rank - cumulative) / count)
+            cumulative += count
+        return self.buckets[-1]
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for key, counts in self._counts.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    lines.append(f"{self.name}_bucket{self._format_labels(key, {'le': bound})} {cumulative}")
+                lines.append(f"{self.name}_bucket{self._format_labels(key, {'le': '+Inf'})} {sum(counts)}")
+                lines.append(f"{self.name}_sum{self._format_labels(key)} {self._sums[key]}")
+                lines.append(f"{self.name}_count{self._format_labels(key)} {sum(counts)}")
+        return lines
+
+    def snapshot(self):
+        with self._lock:
+            keys = list(self._counts)
+        summary = {}
+        for key in keys:
+            count = sum(self._counts[key])
+            summary[",".join(key) or "total"] = {
+                "count": count,
+                "mean": round(self._sums[key] / count, 4),
+                "p50": round(self.quantile(0.5, key), 4),
+                "p95": round(self.quantile(0.95, key), 4),
+                "p99": round(self.quantile(0.99, key), 4),
+            }
+        return summary
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+            self._sums.clear()
+
+
+class MetricsRegistry:
+    """Holds metrics and renders them in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labelnames, buckets=buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self) -> Dict[str, Dict]:
+        return {name: metric.snapshot() for name, metric in self._metrics.items()}
+
+    def reset(self):
+        """Clear all recorded values (benchmarks reset between load levels)."""
+        for metric in self._metrics.values():
+            metric.reset()
+
+
+registry = MetricsRegistry()
+
+stage_latency = registry.histogram("artwork_stage_latency_seconds", "Latency of pipeline stages", ["stage", "status"])
+stage_in_flight = registry.gauge("artwork_stage_in_flight", "Stage calls currently running", ["stage"])
+stage_queue_wait = registry.histogram("artwork_stage_queue_wait_seconds", "Time work waited in a queue before a stage started", ["stage"])
+stage_errors = registry.counter("artwork_stage_errors_total", "Failed stage calls", ["stage", "error"])
+stage_ttfb = registry.histogram("artwork_stage_ttfb_seconds", "Time from the start of a streaming stage to its first chunk", ["stage"])
+bytes_transferred = registry.counter("artwork_bytes_transferred_total", "Bytes sent to or received from providers", ["stage", "direction"])
+agent_latency = registry.histogram("artwork_agent_latency_seconds", "Agent run latency", ["agent"])
+llm_latency = registry.histogram("artwork_llm_latency_seconds", "Latency of individual model calls", ["agent"])
+tool_latency = registry.histogram("artwork_tool_latency_seconds", "Tool call latency as seen by agents", ["tool"])
+
+
+# Stage currently executing (copied into tasks and tool threads), for per-stage fault injection
+_current_stage: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_stage", default=None)
+
+
+def current_stage() -> Optional[str]:
+    return _current_stage.get()
+
+
+# Receives stage progress events for the job currently executing (daemon and service modes)
+_progress_callback: contextvars.ContextVar[Optional[Callable[[Dict], None]]] = contextvars.ContextVar("progress_callback", default=None)
+
+
+@contextlib.contextmanager
+def progress_scope(callback: Callable[[Dict], None]):
+    """Send stage progress events from code inside the block to callback."""
+    token = _progress_callback.set(callback)
+    try:
+        yield
+    finally:
+        _progress_callback.reset(token)
+
+
+def emit_progress(event: Dict):
+    """Report a progress event to the current progress_scope(), if any."""
+    callback = _progress_callback.get()
+    if callback is not None:
+        callback(event)
+
+
+def instrument_stage(stage: str):
+    """
+    Decorator recording latency, in-flight count and errors for an async stage.
+
+    The call is also wrapped in a "stage:<name>" custom span, so stages show up
+    in traces (and the local trace store) next to agent and tool spans, and its
+    start and end are reported to the current progress_scope() callback.
+
+    A stage that returns None is counted as failed. A StageError is counted
+    under its own error label (e.g. "rai_filtered"), other exceptions under
+    their type name.
+
+    Async generators (streaming stages) are timed from the first iteration to
+    the last chunk, with the wait for the first chunk recorded separately in
+    artwork_stage_ttfb_seconds; one that yields nothing counts as failed.
+
+    Args:
+        stage: Stage label used in metrics
+    """
+    def decorator(func):
+        if inspect.isasyncgenfunction(func):
+            return _instrument_stream(stage, func)
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            stage_in_flight.inc(stage=stage)
+            start = time.perf_counter()
+            status = "ok"
+            token = _current_stage.set(stage)
+            emit_progress({"type": "stage", "stage": stage, "status": "started"})
+            try:
+                with custom_span(f"stage:{stage}"):
+                    result = await func(*args, **kwargs)
+                if result is None:
+                    status = "error"
+                    stage_errors.inc(stage=stage, error="empty_result")
+                return result
+            except Exception as e:
+                status = "error"
+                stage_errors.inc(stage=stage, error=_error_label(e))
+                raise
+            finally:
+                _current_stage.reset(token)
+                elapsed = time.perf_counter() - start
+                stage_latency.observe(elapsed, stage=stage, status=status)
+                emit_progress({"type": "stage", "stage": stage, "status": status, "seconds": round(elapsed, 3)})
+                stage_in_flight.dec(stage=stage)
+        return wrapper
+    return decorator
+
+
+def _error_label(e: Exception) -> str:
+    return e.error if isinstance(e, StageError) else type(e).__name__
+
+
+def _instrument_stream(stage: str, func):
+    """instrument_stage for an async generator."""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        stage_in_flight.inc(stage=stage)
+        start = time.perf_counter()
+        status = "ok"
+        chunks = 0
+        emit_progress({"type": "stage", "stage": stage, "status": "started"})
+        # The consumer runs between chunks, so the span and current stage are only set
+        # while the generator itself runs, never across a yield
+        span = custom_span(f"stage:{stage}")
+        span.start()
+        stream = func(*args, **kwargs)
+        try:
+            while True:
+                token = _current_stage.set(stage)
+                try:
+                    chunk = await stream.__anext__()
+                except StopAsyncIteration:
+                    break
+                finally:
+                    _current_stage.reset(token)
+                if chunks == 0:
+                    stage_ttfb.observe(time.perf_counter() - start, stage=stage)
+                chunks += 1
+                yield chunk
+            if chunks == 0:
+                status = "error"
+                stage_errors.inc(stage=stage, error="empty_result")
+        except Exception as e:
+            status = "error"
+            stage_errors.inc(stage=stage, error=_error_label(e))
+            raise
+        finally:
+            await stream.aclose()
+            span.finish()
+            elapsed = time.perf_counter() - start
+            stage_latency.observe(elapsed, stage=stage, status=status)
+            emit_progress({"type": "stage", "stage": stage, "status": status, "seconds": round(elapsed, 3)})
+            stage_in_flight.dec(stage=stage)
+    return wrapper
+
+
+class MetricsRunHooks(RunHooks):
+    """
+    Run hooks recording agent, model call and tool latencies.
+
+    They also feed model usage into the current cost ledger and check its
+    budget before every model and tool call, so an over-budget run stops at
+    the next step.
+    """
+
+    def __init__(self):
+        self._started: Dict[tuple, list] = {}
+
+    def _start(self, key):
+        self._started.setdefault(key, []).append(time.perf_counter())
+
+    def _elapsed(self, key) -> Optional[float]:
+        starts = self._started.get(key)
+        if not starts:
+            return None
+        return time.perf_counter() - starts.pop()
+
+    async def on_agent_start(self, context, agent):
+        self._start(("agent", id(context.context), agent.name))
+
+    async def on_agent_end(self, context, agent, output):
+        elapsed = self._elapsed(("agent", id(context.context), agent.name))
+        if elapsed is not None:
+            agent_latency.observe(elapsed, agent=agent.name)
+
+    async def on_llm_start(self, context, agent, system_prompt, input_items):
+        check_budget()
+        self._start(("llm", id(context.context), agent.name))
+
+    async def on_llm_end(self, context, agent, response):
+        elapsed = self._elapsed(("llm", id(context.context), agent.name))
+        if elapsed is not None:
+            llm_latency.observe(elapsed, agent=agent.name)
+        model = agent.model if isinstance(agent.model, str) else getattr(agent.model, "model", "unknown")
+        record_response_usage(f"agent:{agent.name}", model, response.usage)
+
+    async def on_tool_start(self, context, agent, tool):
+        check_budget()
+        self._start(("tool", getattr(context, "tool_call_id", None) or id(context.context), tool.name))
+
+    async def on_tool_end(self, context, agent, tool, result):
+        elapsed = self._elapsed(("tool", getattr(context, "tool_call_id", None) or id(context.context), tool.name))
+        if elapsed is not None:
+            tool_latency.observe(elapsed, tool=tool.name)
+
+
+# Shared hooks instance passed to every Runner.run in the workflow
+metrics_hooks = MetricsRunHooks()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """
+    Serve /metrics on a background thread.
+
+    Args:
+        port: Port to listen on
+        host: Interface to bind (local only by default)
+
+    Returns:
+        The running server (call shutdown() to stop it)
+    """
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    logger.info(f"Metrics available at http://{host}:{port}/metrics")
+    return server
+
+
+def write_run_summary(output_dir: str, extra: Optional[Dict] = None) -> str:
+    """
+    Write a JSON snapshot of all metrics for the current run.
+
+    Args:
+        output_dir: Directory for summary files
+        extra: Additional fields (e.g. the artwork URL) to include
+
+    Returns:
+        Path of the written summary
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    path = os.path.join(output_dir, f"run_{timestamp}.json")
+    summary = {"timestamp": datetime.datetime.now().isoformat(), **(extra or {}), "metrics": registry.snapshot()}
+    with open(path, "w") as f:
+        json.dump(summary, f, indent=2)
+    logger.info(f"Metrics summary written to {path}")
+    return path
@@ -0,0 +1,419 @@
+import asyncio
+import fcntl
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, Future
+from dataclasses import dataclass
+from io import BytesIO
+from typing import List, Optional, Tuple
+
+import numpy as np
+import structlog
+from PIL import Image
+
+from config import PHASH_ENABLED, PHASH_REUSE_OUTPUTS, PHASH_INDEX_PATH, PHASH_SOURCE_DISTANCE, PHASH_OUTPUT_DISTANCE, PHASH_URL_CACHE_SIZE
+from utils.artifact import ImageArtifact
+from utils.metrics import registry, instrument_stage, stage_latency
+
+logger = structlog.get_logger()
+
+DEFAULT_INDEX_PATH = PHASH_INDEX_PATH or os.path.join(os.path.dirname(os.path.abspath(__file__)), "outputs", "phash_index.bin")
+HASH_SIZE = 8  # 8x8 bits per hash
+PHASH_SAMPLE = 32  # pHash takes the low frequencies of a 32x32 DCT
+
+KINDS = {"source": b"s"[0], "image": b"i"[0], "video": b"v"[0]}
+# Hash file record; ref_offset/ref_length locate the entry's ref (path or URL) in the .refs file
+RECORD = np.dtype([
+    ("key_phash", "<u8"), ("key_dhash", "<u8"), ("own_phash", "<u8"), ("own_dhash", "<u8"),
+    ("ref_offset", "<u8"), ("ref_length", "<u4"), ("kind", "u1"), ("reserved", "V3"),
+])
+
+perceptual_duplicates = registry.counter("artwork_perceptual_duplicates_total", "Near-duplicate images found by perceptual hash", ["kind", "action"])
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    """Orthonormal DCT-II basis; D @ X @ D.T is the 2-D DCT of X."""
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    matrix = np.cos(np.pi * (2 * x + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+_DCT = _dct_matrix(PHASH_SAMPLE)
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def _pack(bits: np.ndarray) -> int:
+    return int.from_bytes(np.packbits(bits.ravel()).tobytes(), "big")
+
+
+@dataclass(frozen=True)
+class ImageHash:
+    """64-bit pHash (DCT low frequencies) and dHash (horizontal gradients) of an image."""
+    phash: int
+    dhash: int
+
+    def distance(self, other: "ImageHash") -> Tuple[int, int]:
+        """Differing bits in the pHash and the dHash."""
+        return bin(self.phash ^ other.phash).count("1"), bin(self.dhash ^ other.dhash).count("1")
+
+    def __str__(self) -> str:
+        return f"{self.phash:016x}{self.dhash:016x}"
+
+
+def hash_image_bytes(image_bytes: bytes) -> ImageHash:
+    """
+    Perceptual hashes of encoded image bytes.
+
+    pHash compares the 8x8 lowest DCT frequencies of a 32x32 grayscale copy
+    with their median; dHash compares neighbouring pixels of a 9x8 copy.
+    Both survive rescaling, recompression and small color shifts, and a
+    match on both is much less likely to be a false positive than either.
+    """
+    with Image.open(BytesIO(image_bytes)) as image:
+        # Lets JPEG decode at a fraction of full size; a no-op for other formats
+        image.draft("L", (PHASH_SAMPLE * 4, PHASH_SAMPLE * 4))
+        gray = image.convert("L")
+    sample = np.asarray(gray.resize((PHASH_SAMPLE, PHASH_SAMPLE), Image.Resampling.LANCZOS), dtype=np.float64)
+    low = (_DCT @ sample @ _DCT.T)[:HASH_SIZE, :HASH_SIZE]
+    # The DC term is overall brightness; leave it out of the median
+    phash = _pack(low > np.median(low.ravel()[1:]))
+    gradient = np.asarray(gray.resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.LANCZOS), dtype=np.int16)
+    dhash = _pack(gradient[:, 1:] > gradient[:, :-1])
+    return ImageHash(phash, dhash)
+
+
+def _popcount(values: np.ndarray) -> np.ndarray:
+    """Set bits per uint64 element."""
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(values)
+    return _POPCOUNT8[values.view(np.uint8)].reshape(-1, 8).sum(axis=-1, dtype=np.uint8)
+
+
+class PerceptualHashIndex:
+    """
+    Append-only index of perceptual hashes with vectorized Hamming search.
+
+    Every entry keeps two hash pairs as uint64: the key it is found by (the
+    source's hashes, also for the images and videos generated from that
+    source) and its own hashes (the generated image's, for "image" entries).
+    Each hash lives in its own contiguous array, so a search is one XOR and
+    popcount pass over the pHashes, with dHashes compared only for the few
+    entries that pass; a few million entries take tens of milliseconds.
+
+    On disk, entries are fixed-size binary records (RECORD) in the hash file,
+    read back with one np.fromfile, and refs (paths or URLs) are appended to
+    a separate .refs file that the records point into; refs are only read
+    for matches. Appends hold an flock on the hash file, so processes can
+    share it, and each process picks up the others' entries when the file
+    has grown since its last look (checked on every search).
+    """
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH, capacity: int = 1024):
+        self.path = path
+        self.refs_path = os.path.splitext(path)[0] + ".refs"
+        self._lock = threading.Lock()
+        self._count = 0
+        # Columns: key pHash, key dHash, own pHash, own dHash
+        self._hashes = [np.zeros(capacity, dtype=np.uint64) for _ in range(4)]
+        self._kinds = np.zeros(capacity, dtype=np.uint8)
+        self._ref_offsets = np.zeros(capacity, dtype=np.uint64)
+        self._ref_lengths = np.zeros(capacity, dtype=np.uint32)
+        start = time.perf_counter()
+        with self._lock:
+            self._refresh()
+        if self._count:
+            logger.info(f"Loaded {self._count} perceptual hashes from {self.path} in {time.perf_counter() - start:.2f}s")
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _grow(self, needed: int):
+        capacity = len(self._kinds)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2)
+
+        def grown(array: np.ndarray) -> np.ndarray:
+            larger = np.zeros(capacity, dtype=array.dtype)
+            larger[:self._count] = array[:self._count]
+            return larger
+
+        self._hashes = [grown(column) for column in self._hashes]
+        self._kinds = grown(self._kinds)
+        self._ref_offsets = grown(self._ref_offsets)
+        self._ref_lengths = grown(self._ref_lengths)
+
+    def _refresh(self, fd: Optional[int] = None):
+        """Read records appended (by any process) since the last refresh. Call with self._lock held."""
+        try:
+            size = os.fstat(fd).st_size if fd is not None else os.stat(self.path).st_size
+        except FileNotFoundError:
+            return
+        # A torn last record (crash mid-write) is left out until the next writer truncates it
+        available = size // RECORD.itemsize
+        if available <= self._count:
+            return
+        if fd is None:
+            records = np.fromfile(self.path, dtype=RECORD, count=available - self._count, offset=self._count * RECORD.itemsize)
+        else:
+            data = os.pread(fd, (available - self._count) * RECORD.itemsize, self._count * RECORD.itemsize)
+            records = np.frombuffer(data, dtype=RECORD)
+        count, added = self._count, len(records)
+        self._grow(count + added)
+        for column, name in enumerate(("key_phash", "key_dhash", "own_phash", "own_dhash")):
+            self._hashes[column][count:count + added] = records[name]
+        self._kinds[count:count + added] = records["kind"]
+        self._ref_offsets[count:count + added] = records["ref_offset"]
+        self._ref_lengths[count:count + added] = records["ref_length"]
+        self._count += added
+
+    def add(self, kind: str, key: ImageHash, ref: str, own: Optional[ImageHash] = None):
+        """
+        Append an entry
+
+        Args:
+            kind: "source", "image" or "video"
+            key: Hashes the entry is found by (the source image's)
+            ref: URL or local path of the image or video
+            own: The entry's own hashes, if it is an image other than the source
+        """
+        own = own or key
+        ref_bytes = ref.replace("\n", " ").encode("utf-8") + b"\n"
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                size = os.fstat(fd).st_size
+                if size % RECORD.itemsize:
+                    # Drop a torn record, so this one lands on a record boundary
+                    size -= size % RECORD.itemsize
+                    os.ftruncate(fd, size)
+                # Catch up first: this process's columns must match the file record for record
+                self._refresh(fd)
+                refs_fd = os.open(self.refs_path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+                try:
+                    os.write(refs_fd, ref_bytes)
+                    ref_offset = os.lseek(refs_fd, 0, os.SEEK_CUR) - len(ref_bytes)
+                finally:
+                    os.close(refs_fd)
+                record = np.zeros(1, dtype=RECORD)
+                fields = zip(RECORD.names, (key.phash, key.dhash, own.phash, own.dhash, ref_offset, len(ref_bytes) - 1, KINDS[kind]))
+                for name, value in fields:
+                    record[name] = value
+                os.pwrite(fd, record.tobytes(), size)
+            finally:
+                os.close(fd)
+            self._grow(self._count + 1)
+            for column, value in enumerate((key.phash, key.dhash, own.phash, own.dhash)):
+                self._hashes[column][self._count] = value
+            self._kinds[self._count] = KINDS[kind]
+            self._ref_offsets[self._count] = ref_offset
+            self._ref_lengths[self._count] = len(ref_bytes) - 1
+            self._count += 1
+
+    def search(self, query: ImageHash, kind: str, max_distance: int, by: str = "key", limit: int = 5) -> List[Tuple[str, int]]:
+        """
+        Entries of a kind within max_distance bits of the query in both hashes
+
+        Args:
+            query: Hashes to look for
+            kind: "source", "image" or "video"
+            max_distance: Differing bits allowed in each of the pHash and the dHash
+            by: Compare against the entries' "key" (source) hashes or their "own" hashes
+            limit: Matches returned at most
+
+        Returns:
+            (ref, distance) pairs, nearest first and newest first among equals;
+            distance is the larger of the two hashes' bit differences
+        """
+        first = 0 if by == "key" else 2
+        with self._lock:
+            self._refresh()
+            count = self._count
+            phashes = self._hashes[first][:count]
+            dhashes = self._hashes[first + 1][:count]
+            kinds = self._kinds[:count]
+            ref_offsets = self._ref_offsets[:count]
+            ref_lengths = self._ref_lengths[:count]
+        if not count:
+            return []
+        phash_distances = _popcount(phashes ^ np.uint64(query.phash))
+        candidates = np.flatnonzero((phash_distances <= max_distance) & (kinds == KINDS[kind]))
+        distances = np.maximum(phash_distances[candidates], _popcount(dhashes[candidates] ^ np.uint64(query.dhash)))
+        candidates, distances = candidates[distances <= max_distance], distances[distances <= max_distance]
+        # Nearest first, then most recent
+        order = np.lexsort((-candidates, distances))[:limit]
+        matches = candidates[order]
+        refs = self._refs(ref_offsets[matches], ref_lengths[matches])
+        return [(ref, int(distance)) for ref, distance in zip(refs, distances[order])]
+
+    def _refs(self, offsets: np.ndarray, lengths: np.ndarray) -> List[str]:
+        """Refs of several entries, read with one open of the refs file."""
+        if not len(offsets):
+            return []
+        fd = os.open(self.refs_path, os.O_RDONLY)
+        try:
+            return [os.pread(fd, int(length), int(offset)).decode("utf-8", errors="replace") for offset, length in zip(offsets, lengths)]
+        finally:
+            os.close(fd)
+
+
+_index: Optional[PerceptualHashIndex] = None
+_index_lock = threading.Lock()
+# Futures of source hashes by URL; hashing runs beside the download's background write
+_url_hashes: "OrderedDict[str, Future]" = OrderedDict()
+_url_lock = threading.Lock()
+
+
+def get_index() -> PerceptualHashIndex:
+    """The process-wide index, loaded from DEFAULT_INDEX_PATH on first use."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = PerceptualHashIndex()
+        return _index
+
+
+def remember_source(url: str, artifact: ImageArtifact, executor: Executor) -> Optional[Future]:
+    """
+    Hash a downloaded source image in the background and remember it by URL, so later stages find it without the bytes.
+
+    The caller does not wait for the hash; source_hash does, if it is still running.
+
+    Args:
+        url: Normalized source image URL
+        artifact: The downloaded image
+        executor: Where to hash it (the artifact persist threads)
+
+    Returns:
+        Future of the hashes (None if the image could not be decoded), or None if PHASH_ENABLED is off
+    """
+    if not PHASH_ENABLED:
+        return None
+    future = executor.submit(_hash_source, url, artifact)
+    with _url_lock:
+        _url_hashes[url] = future
+        _url_hashes.move_to_end(url)
+        while len(_url_hashes) > PHASH_URL_CACHE_SIZE:
+            _url_hashes.popitem(last=False)
+    return future
+
+
+def _hash_source(url: str, artifact: ImageArtifact) -> Optional[ImageHash]:
+    start = time.perf_counter()
+    try:
+        image_hash = hash_image_bytes(artifact.to_bytes())
+    except Exception as e:
+        logger.warning(f"Could not hash image {url}: {type(e).__name__}: {str(e)}")
+        stage_latency.observe(time.perf_counter() - start, stage="perceptual_hash", status="error")
+        return None
+    stage_latency.observe(time.perf_counter() - start, stage="perceptual_hash", status="ok")
+    return image_hash
+
+
+async def source_hash(url: Optional[str]) -> Optional[ImageHash]:
+    """Hashes of a source image downloaded earlier in this process, if any, waiting for them if still being computed."""
+    if not url:
+        return None
+    with _url_lock:
+        future = _url_hashes.get(url)
+    if future is None:
+        return None
+    return await asyncio.wrap_future(future)
+
+
+async def hash_artifact(artifact: ImageArtifact) -> Optional[ImageHash]:
+    """hash_image_bytes off the event loop; None if the image could not be decoded (or PHASH_ENABLED is off)."""
+    if not PHASH_ENABLED:
+        return None
+    return await _hash_artifact(artifact)
+
+
+@instrument_stage("perceptual_hash")
+async def _hash_artifact(artifact: ImageArtifact) -> Optional[ImageHash]:
+    try:
+        return await asyncio.to_thread(hash_image_bytes, artifact.to_bytes())
+    except Exception as e:
+        logger.warning(f"Could not hash image {artifact.path}: {type(e).__name__}: {str(e)}")
+        return None
+
+
+def _existing(matches: List[Tuple[str, int]]) -> Optional[str]:
+    return next((ref for ref, _ in matches if os.path.exists(ref)), None)
+
+
+async def reusable_output(source: Optional[ImageHash], kind: str) -> Optional[str]:
+    """
+    Output of a kind generated earlier from the same picture, if its file still exists
+
+    Args:
+        source: Hashes of the source image (None finds nothing)
+        kind: "image" or "video"
+
+    Returns:
+        Local path of the earlier output (None unless PHASH_REUSE_OUTPUTS)
+    """
+    if source is None or not (PHASH_ENABLED and PHASH_REUSE_OUTPUTS):
+        return None
+    matches = await asyncio.to_thread(lambda: get_index().search(source, kind, PHASH_SOURCE_DISTANCE))
+    path = await asyncio.to_thread(_existing, matches)
+    if path:
+        perceptual_duplicates.inc(kind=kind, action="reused")
+    return path
+
+
+async def record_source(source: Optional[ImageHash], url: str) -> Optional[str]:
+    """
+    Add a source image to the index unless the same picture is already there
+
+    Args:
+        source: Hashes of the source image
+        url: Source image URL
+
+    Returns:
+        URL of the earlier source it duplicates (e.g. another print of the same plate), or None
+    """
+    if source is None or not PHASH_ENABLED:
+        return None
+    index = get_index()
+    matches = await asyncio.to_thread(index.search, source, "source", PHASH_SOURCE_DISTANCE)
+    duplicate = next((ref for ref, _ in matches if ref != url), None)
+    if duplicate:
+        perceptual_duplicates.inc(kind="source", action="seen")
+        logger.info(f"Source image {url} looks like {duplicate}")
+    if not matches:
+        await asyncio.to_thread(index.add, "source", source, url)
+    return duplicate
+
+
+async def record_output(source: Optional[ImageHash], kind: str, path: str, own: Optional[ImageHash] = None) -> Optional[str]:
+    """
+    Add a generated image or video to the index, flagging generated images that repeat an earlier one
+
+    Args:
+        source: Hashes of the source image it was generated from (the output's own hashes if unknown)
+        kind: "image" or "video"
+        path: Local path of the output
+        own: The generated image's hashes
+
+    Returns:
+        Path of an earlier generated image it nearly duplicates, or None
+    """
+    key = source or own
+    if key is None or not PHASH_ENABLED:
+        return None
+    index = get_index()
+    redundant = None
+    if own is not None:
+        matches = await asyncio.to_thread(index.search, own, kind, PHASH_OUTPUT_DISTANCE, "own")
+        redundant = next((ref for ref, _ in matches if ref != path), None)
+        if redundant:
+            perceptual_duplicates.inc(kind=kind, action="flagged")
+            logger.warning(f"Generated {kind} {path} is nearly identical to {redundant}")
+    await asyncio.to_thread(index.add, kind, key, path, own)
+    return redundant
@@ -0,0 +1,130 @@
+import asyncio
+import re
+from typing import Optional
+from urllib.parse import urljoin, urlsplit
+
+import requests
+import structlog
+
+from config import PREFLIGHT_TIMEOUT, PREFLIGHT_MAX_REDIRECTS, PREFLIGHT_CONTENT_TYPES, PREFLIGHT_ALLOW_UNLISTED, PREFLIGHT_MUSEUMS
+from models.models import PreflightResult
+from utils.metrics import instrument_stage, stage_errors
+from utils.providers import http_get, http_head, provider_mode
+
+logger = structlog.get_logger()
+
+REDIRECT_STATUSES = {301, 302, 303, 307, 308}
+# Servers answering HEAD with these often serve the page to a GET; retry with a streamed GET
+HEAD_REJECTED_STATUSES = {403, 405, 501}
+# Statuses that say nothing about the link itself; the URL goes through rather than dropping a live page
+INCONCLUSIVE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+_PATH_PATTERNS = {museum: [re.compile(pattern) for pattern in spec["paths"]] for museum, spec in PREFLIGHT_MUSEUMS.items()}
+
+
+def museum_of(url: str) -> Optional[str]:
+    """PREFLIGHT_MUSEUMS entry whose hosts (or their subdomains) serve this URL, or None."""
+    host = (urlsplit(url).hostname or "").lower()
+    for museum, spec in PREFLIGHT_MUSEUMS.items():
+        if any(host == allowed or host.endswith("." + allowed) for allowed in spec["hosts"]):
+            return museum
+    return None
+
+
+def _reject(result: PreflightResult, error: str, reason: str) -> PreflightResult:
+    result.ok = False
+    result.reason = reason
+    stage_errors.inc(stage="preflight", error=error)
+    logger.warning(f"Preflight rejected {result.url}: {reason}")
+    return result
+
+
+def _let_through(result: PreflightResult, reason: str) -> PreflightResult:
+    result.ok = True
+    result.reason = reason
+    logger.warning(f"Preflight inconclusive for {result.url}: {reason}")
+    return result
+
+
+def _probe(url: str, timeout: float):
+    """One hop: HEAD, or a streamed GET (headers only) where HEAD is refused."""
+    response = http_head(url, timeout=timeout, allow_redirects=False)
+    if response.status_code in HEAD_REJECTED_STATUSES:
+        response = http_get(url, timeout=timeout, allow_redirects=False, stream=True)
+        response.close()
+    return response
+
+
+def validate_artwork_url(url: str, timeout: float = PREFLIGHT_TIMEOUT, max_redirects: int = PREFLIGHT_MAX_REDIRECTS) -> PreflightResult:
+    """
+    Check that a URL is worth a crawl and two LLM calls, for the cost of a round trip.
+
+    The host must belong to a PREFLIGHT_MUSEUMS entry (unless
+    PREFLIGHT_ALLOW_UNLISTED, or offline, where stand-in pages exist for any
+    URL). Redirects are followed hop by hop and must stay on that museum's
+    hosts, and a redirect without a Location header is rejected; the final
+    page must answer 2xx with an HTML content type, and its
+    path must match one of the museum's artwork page patterns (a redirect to
+    a search or home page means the object is gone).
+
+    Timeouts and 429/5xx answers are inconclusive: the URL is let through
+    with a reason, since they say nothing about whether the page exists.
+
+    Args:
+        url: URL of the artwork page
+        timeout: Seconds per probe
+        max_redirects: Redirects followed before giving up
+
+    Returns:
+        PreflightResult; ok is False for links that should be dropped
+    """
+    result = PreflightResult(url=url, ok=False)
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        return _reject(result, "bad_url", "Not an http(s) URL")
+    result.museum = museum_of(url)
+    if result.museum is None and not (PREFLIGHT_ALLOW_UNLISTED or provider_mode() == "offline"):
+        return _reject(result, "not_allowlisted", f"{parts.hostname} is not a known museum site (see PREFLIGHT_MUSEUMS)")
+
+    current = url
+    for _ in range(max_redirects + 1):
+        try:
+            response = _probe(current, timeout)
+        except requests.Timeout:
+            return _let_through(result, f"No answer within {timeout}s")
+        except requests.RequestException as e:
+            return _reject(result, "unreachable", f"Unreachable ({type(e).__name__})")
+        location = response.headers.get("location")
+        if response.status_code not in REDIRECT_STATUSES or not location:
+            break
+        current = urljoin(current, location)
+        result.redirects.append(current)
+        if result.museum and museum_of(current) != result.museum:
+            return _reject(result, "redirect_off_site", f"Redirected off the {result.museum} site to {current}")
+    else:
+        return _reject(result, "too_many_redirects", f"More than {max_redirects} redirects")
+
+    result.final_url = current
+    result.status_code = response.status_code
+    result.content_type = response.headers.get("content-type")
+    if response.status_code in REDIRECT_STATUSES:
+        # The loop only stops on a redirect when it names no target
+        return _reject(result, "redirect_no_location", f"HTTP {response.status_code} without a Location header")
+    if response.status_code in INCONCLUSIVE_STATUSES:
+        return _let_through(result, f"HTTP {response.status_code}")
+    if response.status_code >= 400:
+        return _reject(result, f"http_{response.status_code}", f"HTTP {response.status_code}")
+    if result.museum and not any(pattern.search(urlsplit(current).path) for pattern in _PATH_PATTERNS[result.museum]):
+        redirected = f" (redirected to {current})" if result.redirects else ""
+        return _reject(result, "not_artwork_page", f"Not a {result.museum} artwork page{redirected}")
+    media_type = (result.content_type or "").split(";")[0].strip().lower()
+    if media_type and media_type not in PREFLIGHT_CONTENT_TYPES:
+        return _reject(result, "content_type", f"Not a web page ({media_type})")
+    result.ok = True
+    return result
+
+
+@instrument_stage("preflight")
+async def preflight_artwork_url(url: str) -> PreflightResult:
+    """validate_artwork_url off the event loop, timed as the "preflight" stage."""
+    return await asyncio.to_thread(validate_artwork_url, url)
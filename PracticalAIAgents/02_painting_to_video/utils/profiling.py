@@ -0,0 +1,261 @@
+import asyncio
+import cProfile
+import datetime
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+import structlog
+
+from config import PROFILE_STALL_THRESHOLD, PROFILE_WATCH_INTERVAL, PROFILE_SAMPLE_INTERVAL, PROFILE_TOP_SITES
+
+logger = structlog.get_logger()
+
+PROFILES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "outputs", "profiles")
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # PracticalAIAgents/
+METRICS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "metrics.py")
+# Provider stand-ins and replay shims count as library code when attributing stalls
+NON_PROJECT_FILES = {
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+    for name in ("standins.py", "cassette.py", "profiling.py")
+}
+
+
+def _short_path(filename: str) -> str:
+    """Path relative to the project or site-packages; stdlib files by name."""
+    if filename.startswith(PROJECT_DIR):
+        return os.path.relpath(filename, PROJECT_DIR)
+    index = filename.rfind("site-packages" + os.sep)
+    if index >= 0:
+        return filename[index + len("site-packages" + os.sep):]
+    return os.path.basename(filename)
+
+
+def _frames(thread_id: int) -> List:
+    """Frames of a thread, outermost first."""
+    frame = sys._current_frames().get(thread_id)
+    frames = []
+    while frame is not None:
+        frames.append(frame)
+        frame = frame.f_back
+    return frames[::-1]
+
+
+def _label(frame) -> str:
+    return f"{frame.f_code.co_name} ({_short_path(frame.f_code.co_filename)}:{frame.f_code.co_firstlineno})"
+
+
+def _is_idle(frames) -> bool:
+    """Whether the loop thread is waiting in the selector (not running a callback)."""
+    return bool(frames) and frames[-1].f_code.co_name == "select" and "selectors" in frames[-1].f_code.co_filename
+
+
+def _stage_of(frames) -> Optional[str]:
+    """Innermost instrument_stage() wrapper on the stack, i.e. the stage the running code belongs to."""
+    for frame in reversed(frames):
+        if frame.f_code.co_name == "wrapper" and frame.f_code.co_filename == METRICS_FILE:
+            return frame.f_locals.get("stage")
+    return None
+
+
+def blocking_site(frames) -> str:
+    """
+    Call site responsible for a stall: the innermost project frame, plus the
+    innermost frame overall when that is library code (e.g. an SDK's HTTP read).
+    """
+    project = [f for f in frames if f.f_code.co_filename.startswith(PROJECT_DIR) and f.f_code.co_filename not in NON_PROJECT_FILES]
+    leaf = frames[-1] if frames else None
+    if not project:
+        return f"{leaf.f_code.co_name} ({_short_path(leaf.f_code.co_filename)}:{leaf.f_lineno})" if leaf else "<unknown>"
+    site = project[-1]
+    label = f"{site.f_code.co_name} ({_short_path(site.f_code.co_filename)}:{site.f_lineno})"
+    if leaf is not site:
+        label += f" -> {leaf.f_code.co_name} ({_short_path(leaf.f_code.co_filename)}:{leaf.f_lineno})"
+    return label
+
+
+class LoopStallWatchdog:
+    """
+    Detects event-loop stalls and records what the loop thread was doing.
+
+    A heartbeat task stamps the time every PROFILE_WATCH_INTERVAL; a watcher
+    thread notices when the stamp is older than the threshold (a callback is
+    blocking the loop) and samples the loop thread's stack until it recovers.
+    """
+
+    def __init__(self, threshold: float = PROFILE_STALL_THRESHOLD, interval: float = PROFILE_WATCH_INTERVAL):
+        self.threshold = threshold
+        self.interval = interval
+        self.stalls: List[Dict] = []
+        self._last_beat = time.perf_counter()
+        self._stop = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat_task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+
+    async def _heartbeat(self):
+        while True:
+            self._last_beat = time.perf_counter()
+            await asyncio.sleep(self.interval)
+
+    def _watch(self):
+        stall = None
+        while not self._stop.wait(self.interval):
+            lag = time.perf_counter() - self._last_beat
+            if lag > self.threshold:
+                frames = _frames(self._loop_thread_id)
+                if _is_idle(frames):
+                    continue  # Recovered between the check and the sample
+                if stall is None:
+                    stall = {"started": datetime.datetime.now().isoformat(), "stage": _stage_of(frames), "sites": Counter(), "stack": [_label(f) for f in frames]}
+                stall["sites"][blocking_site(frames)] += 1
+                stall["seconds"] = lag
+            elif stall is not None:
+                self._record(stall)
+                stall = None
+        if stall is not None:
+            # Still stalled when stop() was called (e.g. the run ended inside a blocking call)
+            self._record(stall)
+
+    def _record(self, stall: Dict):
+        stall["seconds"] = round(stall["seconds"], 3)
+        self.stalls.append(stall)
+        logger.debug(f"Event loop stalled {stall['seconds']}s in {stall['sites'].most_common(1)[0][0]}")
+
+    def start(self):
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.perf_counter()
+        self._heartbeat_task = asyncio.get_running_loop().create_task(self._heartbeat())
+        self._thread = threading.Thread(target=self._watch, name="loop-stall-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+        if self._heartbeat_task:
+            self._heartbeat_task.cancel()
+
+    def top_sites(self, limit: int = PROFILE_TOP_SITES) -> List[Dict]:
+        """Blocking call sites ranked by time they held the loop."""
+        sites = defaultdict(lambda: {"blocked_seconds": 0.0, "stalls": 0, "max_stall_seconds": 0.0})
+        for stall in self.stalls:
+            samples = sum(stall["sites"].values())
+            for site, count in stall["sites"].items():
+                entry = sites[site]
+                # Split the stall's duration between the sites sampled during it
+                entry["blocked_seconds"] += stall["seconds"] * count / samples
+                entry["stalls"] += 1
+                entry["max_stall_seconds"] = max(entry["max_stall_seconds"], stall["seconds"])
+        ranked = sorted(sites.items(), key=lambda item: item[1]["blocked_seconds"], reverse=True)[:limit]
+        return [{"site": site, **{k: round(v, 3) for k, v in stats.items()}} for site, stats in ranked]
+
+
+class StageSampler:
+    """
+    Sampling profiler for the loop thread that attributes samples to stages.
+
+    Every PROFILE_SAMPLE_INTERVAL the loop thread's stack is folded into one
+    line ("stage;frame;frame...") as used by flamegraph.pl and speedscope.
+    Samples taken while the loop waits for I/O are counted as idle.
+    """
+
+    def __init__(self, interval: float = PROFILE_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._loop_thread_id: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frames = _frames(self._loop_thread_id)
+            if not frames:
+                continue
+            if _is_idle(frames):
+                self.samples["idle"] += 1
+                continue
+            stage = _stage_of(frames) or "no_stage"
+            self.samples[";".join([stage] + [_label(f) for f in frames])] += 1
+
+    def start(self):
+        self._loop_thread_id = threading.get_ident()
+        self._thread = threading.Thread(target=self._sample, name="stage-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def write_folded(self, output_dir: str) -> Dict[str, int]:
+        """Write stacks.folded plus one file per stage; returns sample counts per stage."""
+        per_stage: Dict[str, List[str]] = defaultdict(list)
+        with open(os.path.join(output_dir, "stacks.folded"), "w") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+                per_stage[stack.split(";", 1)[0]].append(f"{stack} {count}")
+        counts = {}
+        for stage, lines in per_stage.items():
+            counts[stage] = sum(int(line.rsplit(" ", 1)[1]) for line in lines)
+            if stage != "idle":
+                with open(os.path.join(output_dir, f"stacks_{stage}.folded"), "w") as f:
+                    f.write("\n".join(lines) + "\n")
+        return counts
+
+
+async def profiled(awaitable, sample_stages: bool = False, output_dir: Optional[str] = None):
+    """
+    Await a workflow with the loop-stall watchdog (and optionally the stage sampler and cProfile) running.
+
+    On exit the top blocking call sites are logged, and stalls.json (plus
+    stacks*.folded and run.pstats when sampling) is written to output_dir.
+
+    Args:
+        awaitable: The workflow coroutine to run
+        sample_stages: Also sample stacks per stage and record a cProfile of the loop thread
+        output_dir: Where to write profiles (utils/outputs/profiles/<timestamp> by default)
+
+    Returns:
+        The workflow's result
+    """
+    output_dir = output_dir or os.path.join(PROFILES_DIR, datetime.datetime.now().strftime("%Y%m%d_%H%M%S"))
+    os.makedirs(output_dir, exist_ok=True)
+    watchdog = LoopStallWatchdog()
+    sampler = StageSampler() if sample_stages else None
+    profiler = cProfile.Profile() if sample_stages else None
+
+    watchdog.start()
+    if sampler:
+        sampler.start()
+        profiler.enable()
+    start = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        elapsed = time.perf_counter() - start
+        watchdog.stop()
+        summary = {
+            "seconds": round(elapsed, 2),
+            "stall_threshold": watchdog.threshold,
+            "stalls": len(watchdog.stalls),
+            "stalled_seconds": round(sum(s["seconds"] for s in watchdog.stalls), 3),
+            "top_sites": watchdog.top_sites(),
+        }
+        if sampler:
+            profiler.disable()
+            sampler.stop()
+            profiler.dump_stats(os.path.join(output_dir, "run.pstats"))
+            summary["stage_samples"] = sampler.write_folded(output_dir)
+        with open(os.path.join(output_dir, "stalls.json"), "w") as f:
+            json.dump({**summary, "details": [{**s, "sites": dict(s["sites"])} for s in watchdog.stalls]}, f, indent=2)
+
+        logger.info(f"Event loop stalled {summary['stalls']} times over {watchdog.threshold}s, "
+                    f"{summary['stalled_seconds']}s of {summary['seconds']}s in total. Top blocking call sites:")
+        for site in summary["top_sites"]:
+            logger.info(f"  {site['blocked_seconds']:8.3f}s  {site['stalls']:4d} stalls  max {site['max_stall_seconds']:.3f}s  {site['site']}")
+        logger.info(f"Profile written to {output_dir}")
@@ -0,0 +1,240 @@
+import atexit
+import os
+from typing import Callable, Dict, Optional, Tuple
+
+import httpx
+import requests
+import structlog
+
+from config import PROVIDER_MODE, CASSETTE_DIR, REPLAY_TIMING
+
+logger = structlog.get_logger()
+
+PROVIDER_MODES = ("live", "offline", "record", "replay")
+# Modes that call the real providers (and need API keys)
+LIVE_PROVIDER_MODES = ("live", "record")
+DEFAULT_CASSETTE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "outputs", "cassettes", "latest")
+
+_mode = PROVIDER_MODE
+_cassette = None
+
+
+def provider_mode() -> str:
+    return _mode
+
+
+def set_provider_mode(
+    mode: str,
+    latency_scale: Optional[float] = None,
+    latency: Optional[Dict[str, Tuple[float, float]]] = None,
+    failure_rates: Optional[Dict[str, float]] = None,
+    seed: Optional[int] = None,
+    cassette: Optional[str] = None,
+    replay_timing: Optional[str] = None,
+):
+    """
+    Select live providers, offline stand-ins, or record/replay of live traffic.
+
+    Generators create their clients when agents_def is imported, so call this
+    before importing workflow (or the agents_def modules), and before enabling
+    the local trace store.
+
+    Args:
+        mode: "live", "offline", "record" or "replay"
+        latency_scale: Multiplier applied to every stand-in latency
+        latency: Per-provider (median, p99) seconds overriding STANDIN_LATENCY
+        failure_rates: Per-provider failure probability overriding STANDIN_FAILURE_RATES
+        seed: Seed for stand-in latency and failure draws
+        cassette: Cassette directory to record to or replay from (CASSETTE_DIR by default)
+        replay_timing: "original" to wait each call's recorded duration, "fast" to answer immediately
+    """
+    global _mode, _cassette
+    if mode not in PROVIDER_MODES:
+        raise ValueError(f"Unknown provider mode {mode!r}, expected one of {PROVIDER_MODES}")
+    _mode = mode
+    if mode in ("record", "replay"):
+        from utils.cassette import Cassette
+        if _cassette:
+            _cassette.close()
+        _cassette = Cassette(cassette or CASSETTE_DIR or DEFAULT_CASSETTE_DIR, mode, replay_timing or REPLAY_TIMING)
+        atexit.register(_cassette.close)
+        _configure_agents_sdk()
+    elif mode == "offline":
+        from utils import standins
+        if latency_scale is not None:
+            standins.settings.latency_scale = latency_scale
+        if latency:
+            standins.settings.latency.update(latency)
+        if failure_rates:
+            standins.settings.failure_rates.update(failure_rates)
+        if seed is not None:
+            standins.settings._random.seed(seed)
+        _configure_agents_sdk()
+    logger.info(f"Provider mode: {mode}")
+
+
+def get_openai_client():
+    """Sync OpenAI client, for code running outside an event loop."""
+    from openai import OpenAI
+    if _mode == "live":
+        return OpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+    if _mode == "record":
+        from utils.cassette import RecordingTransport
+        return OpenAI(api_key=os.environ.get("OPENAI_API_KEY"), http_client=httpx.Client(transport=RecordingTransport(_cassette, "openai")))
+    if _mode == "replay":
+        from utils.cassette import ReplayTransport
+        return OpenAI(api_key="replay", http_client=httpx.Client(transport=ReplayTransport(_cassette)))
+    from utils.standins import StandInTransport, STANDIN_HOST
+    return OpenAI(api_key="stand-in", base_url=f"https://{STANDIN_HOST}/v1", http_client=httpx.Client(transport=StandInTransport()))
+
+
+def get_async_openai_client():
+    """Async OpenAI client for the Agents SDK."""
+    from openai import AsyncOpenAI
+    if _mode == "live":
+        return AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"))
+    if _mode == "record":
+        from utils.cassette import AsyncRecordingTransport
+        return AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"), http_client=httpx.AsyncClient(transport=AsyncRecordingTransport(_cassette, "openai")))
+    if _mode == "replay":
+        from utils.cassette import AsyncReplayTransport
+        return AsyncOpenAI(api_key="replay", http_client=httpx.AsyncClient(transport=AsyncReplayTransport(_cassette)))
+    from utils.standins import AsyncStandInTransport, STANDIN_HOST
+    return AsyncOpenAI(api_key="stand-in", base_url=f"https://{STANDIN_HOST}/v1", http_client=httpx.AsyncClient(transport=AsyncStandInTransport()))
+
+
+def _configure_agents_sdk():
+    """
+    Send Agents SDK model calls through the stand-in or the cassette.
+
+    Outside record mode the hosted trace exporter is dropped so offline and
+    replayed runs never upload traces; processors added afterwards, such as
+    the local trace store, still apply.
+    """
+    from agents import set_default_openai_client, set_trace_processors
+    set_default_openai_client(get_async_openai_client(), use_for_tracing=False)
+    if _mode != "record":
+        set_trace_processors([])
+
+
+def get_genai_client(**kwargs):
+    """Gemini client for the image and video generators."""
+    if _mode in ("record", "replay"):
+        from google import genai
+        from utils.cassette import RecordingTransport, ReplayTransport
+        transport = RecordingTransport(_cassette, "gemini") if _mode == "record" else ReplayTransport(_cassette)
+        http_options = dict(kwargs.pop("http_options", None) or {})
+        http_options["httpx_client"] = httpx.Client(transport=transport)
+        if _mode == "replay":
+            kwargs["api_key"] = "replay"
+        return genai.Client(http_options=http_options, **kwargs)
+    if _mode == "live":
+        from google import genai
+        return genai.Client(**kwargs)
+    from utils.standins import StandInGenaiClient
+    return StandInGenaiClient(**kwargs)
+
+
+def _new_crawler():
+    if _mode in ("live", "record"):
+        from crawl4ai import AsyncWebCrawler
+        if _mode == "record":
+            from utils.cassette import RecordingCrawler
+            return RecordingCrawler(_cassette, AsyncWebCrawler())
+        return AsyncWebCrawler()
+    if _mode == "replay":
+        from utils.cassette import ReplayCrawler
+        return ReplayCrawler(_cassette)
+    from utils.standins import StandInCrawler
+    return StandInCrawler()
+
+
+class _SharedCrawlerLease:
+    """Hands out the warm shared crawler for one `async with` without closing it."""
+
+    def __init__(self, crawler):
+        self._crawler = crawler
+
+    async def __aenter__(self):
+        return self._crawler
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+_shared_crawler = None
+
+
+async def start_shared_crawler():
+    """Start one crawler (and its browser) that get_crawler() hands out until stop_shared_crawler()."""
+    global _shared_crawler
+    if _shared_crawler is None:
+        _shared_crawler = await _new_crawler().__aenter__()
+        logger.info("Shared crawler started")
+
+
+async def stop_shared_crawler():
+    global _shared_crawler
+    if _shared_crawler is not None:
+        crawler, _shared_crawler = _shared_crawler, None
+        await crawler.__aexit__(None, None, None)
+
+
+def get_crawler():
+    """crawl4ai crawler (used as an async context manager); the shared one when started."""
+    if _shared_crawler is not None:
+        return _SharedCrawlerLease(_shared_crawler)
+    return _new_crawler()
+
+
+def http_get(url: str, **kwargs):
+    """requests.get, or the stand-in image server."""
+    if _mode == "live":
+        return requests.get(url, **kwargs)
+    if _mode == "record":
+        from utils.cassette import recording_http_get
+        return recording_http_get(_cassette, url, **kwargs)
+    if _mode == "replay":
+        from utils.cassette import replay_http_get
+        return replay_http_get(_cassette, url, **kwargs)
+    from utils.standins import standin_http_get
+    return standin_http_get(url, **kwargs)
+
+
+def http_head(url: str, **kwargs):
+    """requests.head, or the stand-in page server."""
+    if _mode == "live":
+        return requests.head(url, **kwargs)
+    if _mode == "record":
+        from utils.cassette import recording_http_head
+        return recording_http_head(_cassette, url, **kwargs)
+    if _mode == "replay":
+        from utils.cassette import replay_http_head
+        return replay_http_head(_cassette, url, **kwargs)
+    from utils.standins import standin_http_head
+    return standin_http_head(url, **kwargs)
+
+
+def poll_interval(seconds: float) -> float:
+    """Provider polling interval; replaying as fast as possible skips the waits."""
+    if _mode == "replay" and _cassette.timing == "fast":
+        return 0.0
+    return seconds
+
+
+def generated_name(kind: str, make: Callable[[], str]) -> str:
+    """
+    A locally generated name (such as an output filename) that replay must reproduce.
+
+    Recorded model responses refer to these names, so record mode saves them in
+    the cassette and replay mode hands them out again in the same order.
+    """
+    if _mode in ("record", "replay"):
+        from utils.cassette import recorded_name
+        return recorded_name(_cassette, kind, make)
+    return make()
+
+
+# Apply a non-live PROVIDER_MODE from config.py to the Agents SDK as well
+if _mode != "live":
+    set_provider_mode(_mode)
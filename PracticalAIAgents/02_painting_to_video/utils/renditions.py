@@ -0,0 +1,375 @@
+import atexit
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import structlog
+
+from config import (
+    RENDITIONS_ENABLED,
+    RENDITION_THUMBNAIL_SIZES,
+    RENDITION_FORMATS,
+    RENDITION_QUALITY,
+    RENDITION_WORKERS,
+    RENDITION_QUEUE_SIZE,
+    RENDITION_SUBMIT_TIMEOUT,
+    RENDITION_MAX_POOL_RESTARTS,
+)
+from utils.metrics import stage_latency, stage_queue_wait, stage_errors
+
+logger = structlog.get_logger()
+
+# Pillow save() format names for the rendition formats we support
+PIL_FORMATS = {
+    "webp": "WEBP",
+    "avif": "AVIF",
+    "jpeg": "JPEG",
+    "png": "PNG",
+}
+
+
+def render_image(source_path: str, output_dir: str, thumbnail_sizes: List[int], formats: List[str], quality: int) -> List[Dict]:
+    """
+    Encode thumbnails and compact copies of one image.
+
+    Runs inside a worker process, so it only takes plain picklable arguments
+    and imports Pillow locally.
+
+    Args:
+        source_path: Path to the saved full-size image
+        output_dir: Directory where renditions are written
+        thumbnail_sizes: Longest-edge sizes for WebP thumbnails
+        formats: Formats for full-size compact copies (e.g. webp, avif)
+        quality: Encoder quality setting
+
+    Returns:
+        One stats record per rendition (sizes, dimensions, encode time, error)
+    """
+    from PIL import Image
+
+    try:
+        # AVIF support ships as a plugin on older Pillow releases
+        import pillow_avif  # noqa: F401
+    except ImportError:
+        pass
+
+    stem = Path(source_path).stem
+    source_bytes = os.path.getsize(source_path)
+    records = []
+
+    with Image.open(source_path) as image:
+        image.load()
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+
+        targets = [(f"thumb{size}", size, "webp") for size in thumbnail_sizes]
+        targets += [("full", None, fmt) for fmt in formats]
+
+        for kind, size, fmt in targets:
+            output_path = os.path.join(output_dir, f"{stem}_{kind}.{fmt}")
+            record = {
+                "source": source_path,
+                "source_bytes": source_bytes,
+                "output": output_path,
+                "kind": kind,
+                "format": fmt,
+            }
+            start = time.perf_counter()
+            try:
+                rendition = image
+                if size:
+                    rendition = image.copy()
+                    rendition.thumbnail((size, size), Image.Resampling.LANCZOS)
+                rendition.save(output_path, PIL_FORMATS[fmt], quality=quality)
+                record["width"], record["height"] = rendition.size
+                record["bytes"] = os.path.getsize(output_path)
+            except Exception as e:
+                record["error"] = str(e)
+            record["encode_ms"] = round((time.perf_counter() - start) * 1000, 2)
+            records.append(record)
+
+    return records
+
+
+class RenditionPipeline:
+    """
+    Post-save pipeline producing thumbnails and WebP/AVIF copies of saved images.
+
+    Encoding runs in a ProcessPoolExecutor fed by a dispatcher thread. The queue
+    in front of the pool is bounded; when the pool falls behind, new images are
+    skipped (by default at once) instead of piling up work or blocking the
+    caller. A broken pool (e.g. a worker killed for running out of memory) is
+    replaced up to RENDITION_MAX_POOL_RESTARTS times, then renditions are
+    turned off for the process.
+
+    Stats are written only from the dispatcher and the pool's callback thread,
+    never from the thread calling submit() (often the event loop).
+    """
+
+    def __init__(
+        self,
+        output_dir: str,
+        stats_path: str,
+        thumbnail_sizes: List[int] = RENDITION_THUMBNAIL_SIZES,
+        formats: List[str] = RENDITION_FORMATS,
+        quality: int = RENDITION_QUALITY,
+        max_workers: int = RENDITION_WORKERS,
+        queue_size: int = RENDITION_QUEUE_SIZE,
+        max_pool_restarts: int = RENDITION_MAX_POOL_RESTARTS,
+    ):
+        self.output_dir = output_dir
+        self.stats_path = stats_path
+        self.thumbnail_sizes = thumbnail_sizes
+        self.formats = formats
+        self.quality = quality
+        self.max_workers = max_workers
+        self.max_pool_restarts = max_pool_restarts
+        self.pool_restarts = 0
+        self.disabled = False
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        # Limits work handed to the pool so the bounded queue is the only buffer
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._stats_lock = threading.Lock()
+        # Records for skipped images, written with the next batch of stats
+        self._unwritten = deque()
+        self._pool_lock = threading.Lock()
+        self._executor = None
+        self._dispatcher = None
+        self._start_lock = threading.Lock()
+
+        os.makedirs(self.output_dir, exist_ok=True)
+
+    def _ensure_started(self):
+        """Start the process pool and dispatcher thread on first use."""
+        with self._start_lock:
+            if self._dispatcher is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                self._dispatcher = threading.Thread(
+                    target=self._dispatch_loop, name="rendition-dispatcher", daemon=True
+                )
+                self._dispatcher.start()
+
+    def submit(self, source_path: str, timeout: Optional[float] = RENDITION_SUBMIT_TIMEOUT) -> bool:
+        """
+        Queue an image for rendition.
+
+        Args:
+            source_path: Path to the saved full-size image
+            timeout: Seconds to wait for a free queue slot (0 does not wait, None waits forever)
+
+        Returns:
+            True if queued, False if the queue stayed full for the whole timeout
+            or renditions have been disabled
+        """
+        if self.disabled:
+            return False
+        self._ensure_started()
+        try:
+            if timeout == 0:
+                self._queue.put_nowait((source_path, time.monotonic()))
+            else:
+                self._queue.put((source_path, time.monotonic()), timeout=timeout)
+            return True
+        except queue.Full:
+            logger.warning(f"Rendition queue full, skipping renditions for {source_path}")
+            self._unwritten.append({"source": source_path, "error": "queue full"})
+            return False
+
+    def _dispatch_loop(self):
+        """Move queued images into the process pool as worker slots free up."""
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            source_path, enqueued_at = item
+            if self.disabled:
+                self._write_stats([{"source": source_path, "error": "renditions disabled"}])
+                continue
+            self._slots.acquire()
+            if self._unwritten:
+                self._write_stats([])
+            queue_wait_ms = round((time.monotonic() - enqueued_at) * 1000, 2)
+            executor = self._executor
+            try:
+                future = executor.submit(
+                    render_image, source_path, self.output_dir,
+                    self.thumbnail_sizes, self.formats, self.quality
+                )
+            except Exception as e:
+                # The dispatcher must outlive a bad submit, or the queue fills and every image is skipped
+                self._slots.release()
+                logger.error(f"Rendition submit failed for {source_path}: {type(e).__name__}: {str(e)}")
+                stage_errors.inc(stage="renditions", error=type(e).__name__)
+                self._write_stats([{"source": source_path, "error": f"{type(e).__name__}: {str(e)}"}])
+                if isinstance(e, BrokenProcessPool):
+                    self._replace_pool(executor)
+                continue
+            future.add_done_callback(
+                lambda f, path=source_path, wait=queue_wait_ms, pool=executor: self._on_done(f, path, wait, pool)
+            )
+
+    def _replace_pool(self, broken: ProcessPoolExecutor):
+        """
+        Swap a broken process pool for a new one, or turn renditions off after too many.
+
+        Called from the dispatcher and from the pool's callback thread, once per
+        failed image, so only the first call for a given pool replaces it.
+
+        Args:
+            broken: The pool that failed
+        """
+        with self._pool_lock:
+            if broken is not self._executor:
+                return
+            broken.shutdown(wait=False, cancel_futures=True)
+            if self.pool_restarts >= self.max_pool_restarts:
+                self.disabled = True
+                logger.error(f"Rendition pool broke {self.pool_restarts + 1} times; renditions disabled")
+                return
+            self.pool_restarts += 1
+            logger.warning(f"Rendition pool broken, starting a new one (restart {self.pool_restarts}/{self.max_pool_restarts})")
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+
+    def _on_done(self, future, source_path: str, queue_wait_ms: float, executor: ProcessPoolExecutor):
+        """Release the worker slot and record stats for a finished image."""
+        self._slots.release()
+        try:
+            records = future.result()
+        except Exception as e:
+            logger.error(f"Rendition failed for {source_path}: {type(e).__name__}: {str(e)}")
+            records = [{"source": source_path, "error": f"{type(e).__name__}: {str(e)}"}]
+            if isinstance(e, BrokenProcessPool):
+                self._replace_pool(executor)
+        for record in records:
+            record["queue_wait_ms"] = queue_wait_ms
+            if "error" in record:
+                stage_errors.inc(stage="renditions", error="encode_failed")
+            else:
+                stage_latency.observe(record["encode_ms"] / 1000, stage="renditions", status="ok")
+        stage_queue_wait.observe(queue_wait_ms / 1000, stage="renditions")
+        self._write_stats(records)
+        logger.debug(f"Renditions done for {source_path}: {len(records)} outputs")
+
+    def _write_stats(self, records: List[Dict]):
+        """Append stats records, after any left by skipped images, to the JSONL stats file."""
+        with self._stats_lock:
+            skipped = []
+            while self._unwritten:
+                skipped.append(self._unwritten.popleft())
+            records = skipped + records
+            if not records:
+                return
+            with open(self.stats_path, "a") as f:
+                for record in records:
+                    f.write(json.dumps(record) + "\n")
+
+    def shutdown(self, wait: bool = True):
+        """
+        Drain the queue and stop the dispatcher and process pool.
+
+        The pipeline starts again on the next submit().
+
+        Args:
+            wait: Block until every queued image has been rendered
+        """
+        with self._start_lock:
+            if self._dispatcher is None:
+                return
+            self._queue.put(None)
+            if wait:
+                self._dispatcher.join()
+            with self._pool_lock:
+                executor = self._executor
+            executor.shutdown(wait=wait)
+            self._dispatcher = None
+        self._write_stats([])
+
+
+def summarize_stats(stats_path: str) -> Dict[str, Dict]:
+    """
+    Aggregate rendition stats per kind and format for benchmarking.
+
+    Args:
+        stats_path: Path to the JSONL stats file written by RenditionPipeline
+
+    Returns:
+        Mapping of "kind/format" to count, average bytes, average size ratio
+        against the source and encode time percentiles
+    """
+    groups = {}
+    errors = 0
+    with open(stats_path) as f:
+        for line in f:
+            record = json.loads(line)
+            if "error" in record:
+                errors += 1
+                continue
+            groups.setdefault(f"{record['kind']}/{record['format']}", []).append(record)
+
+    summary = {}
+    for key, records in groups.items():
+        encode_times = sorted(r["encode_ms"] for r in records)
+        summary[key] = {
+            "count": len(records),
+            "avg_bytes": round(sum(r["bytes"] for r in records) / len(records)),
+            "avg_ratio": round(sum(r["bytes"] / r["source_bytes"] for r in records) / len(records), 4),
+            "p50_encode_ms": encode_times[len(encode_times) // 2],
+            "max_encode_ms": encode_times[-1],
+        }
+    summary["errors"] = {"count": errors}
+    return summary
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def get_rendition_pipeline(output_dir: str) -> Optional[RenditionPipeline]:
+    """
+    Return the shared rendition pipeline, creating it on first use.
+
+    Args:
+        output_dir: Directory for renditions and the stats file
+
+    Returns:
+        The shared RenditionPipeline, or None if renditions are disabled
+    """
+    global _pipeline
+    if not RENDITIONS_ENABLED:
+        return None
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = RenditionPipeline(
+                output_dir=output_dir,
+                stats_path=os.path.join(output_dir, "rendition_stats.jsonl"),
+            )
+            # Only a fallback: concurrent.futures refuses new work once its own exit
+            # hook has run, which is before atexit's, so entry points call
+            # shutdown_rendition_pipeline() themselves while the pool still accepts images
+            atexit.register(_pipeline.shutdown)
+        return _pipeline
+
+
+def shutdown_rendition_pipeline():
+    """Render every image still queued in the shared pipeline, then stop it (blocks)."""
+    with _pipeline_lock:
+        pipeline = _pipeline
+    if pipeline is not None:
+        pipeline.shutdown()
+
+
+if __name__ == "__main__":
+    import sys
+
+    stats_file = sys.argv[1] if len(sys.argv) > 1 else os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "outputs", "renditions", "rendition_stats.jsonl"
+    )
+    print(json.dumps(summarize_stats(stats_file), indent=2))
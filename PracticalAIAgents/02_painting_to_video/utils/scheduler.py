@@ -0,0 +1,199 @@
+import asyncio
+import contextlib
+import contextvars
+import math
+import time
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+import structlog
+
+from config import PRIORITY_CLASSES, DEFAULT_PRIORITY_CLASS, DEFAULT_TENANT, TENANT_WEIGHTS
+from utils.metrics import registry
+
+logger = structlog.get_logger()
+
+scheduler_wait = registry.histogram("artwork_scheduler_wait_seconds", "Time work waited for a scheduler slot", ["resource", "priority"])
+scheduler_in_flight = registry.gauge("artwork_scheduler_in_flight", "Scheduler slots held", ["resource", "priority"])
+scheduler_preemptions = registry.counter("artwork_scheduler_preemptions_total", "Slots granted ahead of queued work of a preempted class", ["resource", "priority"])
+
+# Priority class and tenant of the job currently executing (copied into tasks and tool threads)
+_current_priority: contextvars.ContextVar[Tuple[str, str]] = contextvars.ContextVar(
+    "current_priority", default=(DEFAULT_PRIORITY_CLASS, DEFAULT_TENANT)
+)
+
+
+def current_priority() -> Tuple[str, str]:
+    """(priority class, tenant) of the running job."""
+    return _current_priority.get()
+
+
+@contextlib.contextmanager
+def priority_scope(priority_class: str, tenant: str = DEFAULT_TENANT):
+    """
+    Schedule every slot acquired inside the block as this class and tenant.
+
+    Raises:
+        ValueError: for a class not in PRIORITY_CLASSES
+    """
+    if priority_class not in PRIORITY_CLASSES:
+        raise ValueError(f"Unknown priority class {priority_class!r}, expected one of {sorted(PRIORITY_CLASSES)}")
+    token = _current_priority.set((priority_class, tenant))
+    try:
+        yield
+    finally:
+        _current_priority.reset(token)
+
+
+class FairScheduler:
+    """
+    Slots of one resource (a provider's quota, or artwork runs) shared by priority classes and tenants.
+
+    Waiting work is granted slots by weighted fair queuing: each class has a
+    virtual time that advances by 1/weight per grant, and the backlogged class
+    with the lowest virtual time goes next; tenants within a class are
+    balanced the same way (TENANT_WEIGHTS), and each tenant's work is FIFO.
+    A class never holds more than max_share of the slots, so the others
+    always keep some headroom.
+
+    A class that preempts others (PRIORITY_CLASSES[...]["preempts"]) is
+    served first whenever it has work waiting: queued work of the preempted
+    classes stays queued until it is empty. Work already holding a slot
+    (e.g. a submitted Veo operation) is never interrupted.
+
+    Usable like a semaphore (`async with scheduler:`); the class and tenant
+    come from the surrounding priority_scope(). A slot is always returned to
+    the class it was granted to, even if the scope changed meanwhile.
+    """
+
+    def __init__(self, name: str, capacity: int, shares: Optional[Dict[str, float]] = None):
+        """
+        Args:
+            name: Resource name for metrics and logs
+            capacity: Slots in total
+            shares: Per-class overrides of PRIORITY_CLASSES max_share for this resource
+        """
+        self.name = name
+        self.capacity = capacity
+        self.limits = {
+            cls: max(1, math.floor(capacity * (shares or {}).get(cls, spec.get("max_share", 1.0))))
+            for cls, spec in PRIORITY_CLASSES.items()
+        }
+        self.in_flight = {cls: 0 for cls in PRIORITY_CLASSES}
+        self._held = 0
+        self._waiting: Dict[str, Dict[str, Deque[asyncio.Future]]] = {cls: {} for cls in PRIORITY_CLASSES}
+        self._class_vtime = {cls: 0.0 for cls in PRIORITY_CLASSES}
+        self._tenant_vtime: Dict[str, Dict[str, float]] = {cls: {} for cls in PRIORITY_CLASSES}
+        # Classes granted to each task's open `async with` blocks, innermost last
+        self._entered: Dict[asyncio.Task, List[str]] = {}
+
+    def _backlogged(self, cls: str) -> bool:
+        return bool(self._waiting[cls])
+
+    def _enqueue(self, cls: str, tenant: str, future: asyncio.Future):
+        tenants = self._waiting[cls]
+        if not tenants:
+            # A class becoming backlogged starts no further behind than the furthest-behind backlogged class, so idle time is not banked as credit
+            active = [self._class_vtime[c] for c in PRIORITY_CLASSES if self._backlogged(c)]
+            self._class_vtime[cls] = max(self._class_vtime[cls], min(active)) if active else 0.0
+        if tenant not in tenants:
+            active = [self._tenant_vtime[cls][t] for t in tenants]
+            self._tenant_vtime[cls][tenant] = max(self._tenant_vtime[cls].get(tenant, 0.0), min(active)) if active else 0.0
+            tenants[tenant] = deque()
+        tenants[tenant].append(future)
+
+    def _dequeue(self, cls: str, tenant: str, future: asyncio.Future):
+        queue = self._waiting[cls].get(tenant)
+        if queue and future in queue:
+            queue.remove(future)
+            if not queue:
+                del self._waiting[cls][tenant]
+
+    def _dispatch(self):
+        """Grant free slots to waiting work in fair-queuing order."""
+        while self._held < self.capacity:
+            eligible = [cls for cls in PRIORITY_CLASSES if self._backlogged(cls) and self.in_flight[cls] < self.limits[cls]]
+            preempted = {victim for cls in eligible for victim in PRIORITY_CLASSES[cls].get("preempts", ())}
+            candidates = [cls for cls in eligible if cls not in preempted]
+            if not candidates:
+                return
+            cls = min(candidates, key=lambda c: self._class_vtime[c])
+            tenants = self._waiting[cls]
+            tenant = min(tenants, key=lambda t: self._tenant_vtime[cls][t])
+            future = tenants[tenant].popleft()
+            if not tenants[tenant]:
+                del tenants[tenant]
+            self._class_vtime[cls] += 1 / PRIORITY_CLASSES[cls]["weight"]
+            self._tenant_vtime[cls][tenant] += 1 / TENANT_WEIGHTS.get(tenant, 1)
+            for victim in preempted:
+                if self._backlogged(victim):
+                    scheduler_preemptions.inc(resource=self.name, priority=victim)
+            self._grant(cls)
+            future.set_result(None)
+
+    def _grant(self, cls: str):
+        self.in_flight[cls] += 1
+        self._held += 1
+        scheduler_in_flight.inc(resource=self.name, priority=cls)
+
+    async def acquire(self, priority_class: Optional[str] = None, tenant: Optional[str] = None) -> str:
+        """
+        Wait for a slot as the given (or current) class and tenant.
+
+        Returns:
+            The class the slot was granted to; pass it to release()
+        """
+        current_class, current_tenant = current_priority()
+        cls, tenant = priority_class or current_class, tenant or current_tenant
+        start = time.perf_counter()
+        if self._held < self.capacity and self.in_flight[cls] < self.limits[cls] and not any(self._waiting.values()):
+            self._grant(cls)
+        else:
+            future = asyncio.get_running_loop().create_future()
+            self._enqueue(cls, tenant, future)
+            self._dispatch()
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    self.release(cls)  # Granted just as the waiter was cancelled
+                else:
+                    self._dequeue(cls, tenant, future)
+                raise
+        scheduler_wait.observe(time.perf_counter() - start, resource=self.name, priority=cls)
+        return cls
+
+    def release(self, cls: str):
+        """Return a slot granted to a class (as returned by acquire())."""
+        self.in_flight[cls] -= 1
+        self._held -= 1
+        scheduler_in_flight.dec(resource=self.name, priority=cls)
+        self._dispatch()
+
+    async def __aenter__(self):
+        cls = await self.acquire()
+        self._entered.setdefault(asyncio.current_task(), []).append(cls)
+        return self
+
+    async def __aexit__(self, *exc):
+        task = asyncio.current_task()
+        granted = self._entered[task]
+        cls = granted.pop()
+        if not granted:
+            del self._entered[task]
+        self.release(cls)
+        return False
+
+    def snapshot(self) -> Dict:
+        """Slots held and work waiting per class."""
+        return {
+            "capacity": self.capacity,
+            "classes": {
+                cls: {
+                    "in_flight": self.in_flight[cls],
+                    "limit": self.limits[cls],
+                    "waiting": sum(len(queue) for queue in self._waiting[cls].values()),
+                }
+                for cls in PRIORITY_CLASSES
+            },
+        }
@@ -0,0 +1,718 @@
+import asyncio
+import datetime
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from functools import lru_cache
+from io import BytesIO
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional, Tuple
+
+import httpx
+import numpy as np
+import structlog
+from google.genai import errors as genai_errors
+from google.genai import types
+
+from config import STANDIN_LATENCY, STANDIN_FAILURE_RATES, STANDIN_LATENCY_SCALE, STANDIN_TEXT_WORDS, STANDIN_VIDEO_BYTES, STANDIN_FIRST_TOKEN_SHARE
+from utils.faults import faults
+
+logger = structlog.get_logger()
+
+STANDIN_HOST = "standin.local"
+# z-score of the 99th percentile of a standard normal, used to fit lognormal latencies
+Z_99 = 2.326
+HANDLE_PATTERN = re.compile(r"\b([a-z_]+):([0-9a-f]{4,40})\b")
+URL_PATTERN = re.compile(r"https?://[^\s\"'<>]+")
+LOCAL_PATH_PATTERN = re.compile(r"(?<![\w/:])(/?[\w./-]+\.(png|jpe?g|webp|mp4))\b")
+REPR_FIELD_PATTERN = re.compile(r"(\w+)='([^']*)'")
+DATA_URL_PATTERN = re.compile(r"data:image/[^\"]+")
+# Tokens billed per image input at low detail; inline base64 is not counted as text
+IMAGE_INPUT_TOKENS = 85
+FIELD_PATTERN = re.compile(r"^\s*([A-Z][\w ]{1,30}):\s*(.+)$", re.MULTILINE)
+WORDS = (
+    "luminous layered brushwork muted ochre glaze twilight harbor figure drifting mist "
+    "impasto cobalt shadow warm horizon gentle camera pan soft light textured canvas "
+    "quiet rhythm golden hour reflections slow zoom atmosphere depth sweeping strokes"
+).split()
+
+
+class StandInSettings:
+    """Latency, failure and scale settings shared by all stand-ins."""
+
+    def __init__(
+        self,
+        latency: Dict[str, Tuple[float, float]] = STANDIN_LATENCY,
+        failure_rates: Dict[str, float] = STANDIN_FAILURE_RATES,
+        latency_scale: float = STANDIN_LATENCY_SCALE,
+        seed: Optional[int] = None,
+    ):
+        self.latency = dict(latency)
+        self.failure_rates = dict(failure_rates)
+        self.latency_scale = latency_scale
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample_latency(self, provider: str) -> float:
+        """
+        Draw a latency from a lognormal fitted to the provider's (median, p99).
+
+        Args:
+            provider: Key in STANDIN_LATENCY (openai, imagen, veo, crawl, download, upload)
+
+        Returns:
+            Seconds, already multiplied by latency_scale
+        """
+        median, p99 = self.latency.get(provider, (0.0, 0.0))
+        if median <= 0:
+            return 0.0
+        sigma = max(math.log(p99 / median), 0.0) / Z_99 if p99 > median else 0.0
+        with self._lock:
+            value = self._random.lognormvariate(math.log(median), sigma)
+        return value * self.latency_scale
+
+    def pick(self, options):
+        with self._lock:
+            return self._random.choice(options)
+
+    def should_fail(self, provider: str) -> bool:
+        rate = self.failure_rates.get(provider, 0.0)
+        if rate <= 0:
+            return False
+        with self._lock:
+            return self._random.random() < rate
+
+
+settings = StandInSettings()
+
+
+def _latency(provider: str) -> float:
+    """Sampled latency for one call plus any injected latency spike (both scaled)."""
+    return settings.sample_latency(provider) + faults.spike(provider) * settings.latency_scale
+
+
+def _failure_status(provider: str) -> Optional[int]:
+    """Status of an error to return for this call (STANDIN_FAILURE_RATES or the fault profile), or None."""
+    if settings.should_fail(provider):
+        return settings.pick((429, 500, 503))
+    return faults.error_status(provider)
+
+
+def _seed(*parts: str) -> int:
+    return int.from_bytes(hashlib.sha256("|".join(parts).encode("utf-8")).digest()[:8], "big")
+
+
+def _words(seed_text: str, count: int) -> str:
+    rng = random.Random(_seed(seed_text))
+    return " ".join(rng.choice(WORDS) for _ in range(count))
+
+
+@lru_cache(maxsize=64)
+def synthetic_image(seed_text: str, width: int, height: int, image_format: str = "PNG") -> bytes:
+    """
+    Deterministic blocky image for a seed, so different prompts/URLs get different bytes.
+
+    Args:
+        seed_text: Prompt or URL the image stands in for
+        width: Output width
+        height: Output height
+        image_format: Pillow format name (PNG, JPEG)
+
+    Returns:
+        Encoded image bytes
+    """
+    from PIL import Image
+
+    rng = np.random.default_rng(_seed(seed_text))
+    blocks = rng.integers(0, 256, size=(16, 9 if width < height else 16, 3), dtype=np.uint8)
+    image = Image.fromarray(blocks).resize((width, height), Image.Resampling.BILINEAR)
+    buffer = BytesIO()
+    image.save(buffer, image_format, quality=85)
+    return buffer.getvalue()
+
+
+# OpenAI Responses API (used by TextGenerator and the Agents SDK)
+def _message_text(content: Any) -> str:
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        return "\n".join(part.get("text", "") for part in content if isinstance(part, dict))
+    return ""
+
+
+def _add_facts(facts: Dict[str, Any], text: str):
+    """Pick handles, URLs, local paths and "Key: value" fields out of free text."""
+    for kind, digest in HANDLE_PATTERN.findall(text):
+        facts[kind] = f"{kind}:{digest}"
+    for url in URL_PATTERN.findall(text):
+        facts.setdefault("url", url)
+        if re.search(r"\.(png|jpe?g|webp)$", url, re.IGNORECASE):
+            facts.setdefault("image_url", url)
+    for path, ext in LOCAL_PATH_PATTERN.findall(text):
+        if path.startswith("//"):
+            continue
+        facts["video_path" if ext == "mp4" else "image_path"] = path
+    for key, value in FIELD_PATTERN.findall(text):
+        facts.setdefault(key.strip().lower().replace(" ", "_"), value.strip())
+
+
+class StandInResponder:
+    """
+    Scripted policy answering Responses API requests like a cooperative model.
+
+    It calls the function tools named in the instructions once each, in
+    declaration order, filling arguments from handles, URLs and paths seen in
+    the conversation, then returns output matching the requested JSON schema.
+    Plain text requests (TextGenerator) get deterministic filler prose.
+    """
+
+    def respond(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        items = body.get("input") or []
+        if isinstance(items, str):
+            items = [{"role": "user", "content": items}]
+
+        facts: Dict[str, Any] = {}
+        last_output: Dict[str, Any] = {}
+        called = set()
+        for item in items:
+            item_type = item.get("type", "message")
+            if item_type == "message" and item.get("role") == "user":
+                text = _message_text(item.get("content"))
+                _add_facts(facts, text)
+                # Something to search for when no URL was given (e.g. a fighter name)
+                facts.setdefault("query", re.sub(r"[^a-z0-9]+", "-", text.lower()).strip("-")[-60:])
+            elif item_type == "function_call":
+                called.add(item.get("name"))
+                # Arguments the model chose earlier (e.g. a URL it then validated) remain known
+                try:
+                    arguments = json.loads(item.get("arguments") or "{}")
+                except ValueError:
+                    arguments = {}
+                for key, value in arguments.items():
+                    if isinstance(value, str):
+                        facts.setdefault(key, value)
+            elif item_type == "function_call_output":
+                output = item.get("output")
+                output = output if isinstance(output, str) else json.dumps(output)
+                if output.startswith("An error occurred"):
+                    facts["error"] = output
+                last_output = self._parse_output(output, facts)
+
+        tools = [t for t in body.get("tools") or [] if t.get("type") == "function"]
+        instructions = body.get("instructions") or ""
+        allowed = [t for t in tools if t["name"] in instructions] or tools
+        pending = [t for t in allowed if t["name"] not in called]
+
+        if pending and "error" not in facts:
+            tool = pending[0]
+            arguments = {
+                name: self._argument(name, tool["name"], facts)
+                for name in tool.get("parameters", {}).get("properties", {})
+            }
+            output_item = {
+                "type": "function_call",
+                "id": f"fc_{uuid.uuid4().hex[:24]}",
+                "call_id": f"call_{uuid.uuid4().hex[:24]}",
+                "name": tool["name"],
+                "arguments": json.dumps(arguments),
+                "status": "completed",
+            }
+            output_chars = len(output_item["arguments"])
+        else:
+            text_format = (body.get("text") or {}).get("format") or {}
+            if text_format.get("type") == "json_schema":
+                schema = text_format.get("schema", {})
+                text = json.dumps(self._fill(schema, schema, "", facts, last_output))
+            else:
+                seed_text = json.dumps(items, sort_keys=True, default=str)
+                text = _words(seed_text, STANDIN_TEXT_WORDS).capitalize() + "."
+            output_item = {
+                "type": "message",
+                "id": f"msg_{uuid.uuid4().hex[:24]}",
+                "role": "assistant",
+                "status": "completed",
+                "content": [{"type": "output_text", "text": text, "annotations": []}],
+            }
+            output_chars = len(text)
+
+        request_text, images = DATA_URL_PATTERN.subn("", json.dumps(body, default=str))
+        input_tokens = len(request_text) // 4 + images * IMAGE_INPUT_TOKENS
+        output_tokens = max(1, output_chars // 4)
+        return {
+            "id": f"resp_{uuid.uuid4().hex}",
+            "object": "response",
+            "created_at": int(time.time()),
+            "status": "completed",
+            "model": body.get("model", "stand-in"),
+            "output": [output_item],
+            "parallel_tool_calls": True,
+            "tool_choice": "auto",
+            "tools": [],
+            "temperature": body.get("temperature"),
+            "top_p": 1.0,
+            "error": None,
+            "incomplete_details": None,
+            "instructions": None,
+            "metadata": {},
+            "usage": {
+                "input_tokens": input_tokens,
+                "input_tokens_details": {"cached_tokens": 0},
+                "output_tokens": output_tokens,
+                "output_tokens_details": {"reasoning_tokens": 0},
+                "total_tokens": input_tokens + output_tokens,
+            },
+        }
+
+    def _parse_output(self, output: str, facts: Dict[str, Any]) -> Dict[str, Any]:
+        _add_facts(facts, output)
+        try:
+            parsed = json.loads(output)
+        except ValueError:
+            # Tool outputs that are pydantic models arrive as their repr: key='value' ...
+            parsed = dict(REPR_FIELD_PATTERN.findall(output))
+        if not isinstance(parsed, dict):
+            return {}
+        for key, value in parsed.items():
+            if isinstance(value, str) and HANDLE_PATTERN.fullmatch(value):
+                continue  # Already recorded under its handle kind
+            facts[key] = value
+        return parsed
+
+    def _argument(self, name: str, tool_name: str, facts: Dict[str, Any]) -> Any:
+        if name in ("artwork_url", "url"):
+            return facts.get("url", f"https://{STANDIN_HOST}/search/{facts.get('query', 'page')}")
+        if name == "prompt":
+            return facts.get("video_prompt" if "video" in tool_name else "prompt", "stand-in prompt")
+        if name == "image_prompt":
+            return facts.get("prompt", "stand-in prompt")
+        if name == "input":
+            # Agent-as-tool: hand the sub-agent everything known so far
+            return "\n".join(f"{k}: {v}" for k, v in facts.items() if isinstance(v, str) and k != "error")
+        return facts.get(name, f"stand-in {name}")
+
+    def _fill(self, schema: Dict, root: Dict, name: str, facts: Dict[str, Any], last_output: Dict[str, Any]) -> Any:
+        if "$ref" in schema:
+            schema = root.get("$defs", {}).get(schema["$ref"].split("/")[-1], {})
+        nullable = False
+        if "anyOf" in schema:
+            options = [s for s in schema["anyOf"] if s.get("type") != "null"]
+            nullable = len(options) < len(schema["anyOf"])
+            schema = options[0] if options else {}
+        schema_type = schema.get("type")
+        if schema_type == "object":
+            return {k: self._fill(v, root, k, facts, last_output) for k, v in schema.get("properties", {}).items()}
+        if schema_type == "array":
+            return []
+        if schema_type in ("integer", "number"):
+            return 0
+        if schema_type == "boolean":
+            return False
+        if name in last_output and isinstance(last_output[name], str):
+            return last_output[name]
+        if name in facts:
+            return facts[name]
+        if name.lower().endswith("url"):
+            return facts.get("image_url") if "image" in name.lower() else facts.get("url")
+        if nullable:
+            return None
+        return f"Stand-in {name}"
+
+
+def _sse_chunks(response: Dict[str, Any], words_per_delta: int = 3) -> List[bytes]:
+    """A finished response as Responses API stream events, text split into small deltas."""
+    events = [("response.created", {"response": {**response, "status": "in_progress", "output": [], "usage": None}})]
+    for output_index, item in enumerate(response["output"]):
+        events.append(("response.output_item.added", {"output_index": output_index, "item": {**item, "status": "in_progress", "content": []} if item["type"] == "message" else item}))
+        for content_index, part in enumerate(item.get("content", [])):
+            if part.get("type") != "output_text":
+                continue
+            words = re.findall(r"\S+\s*", part["text"])
+            for start in range(0, len(words), words_per_delta):
+                events.append(("response.output_text.delta", {
+                    "item_id": item["id"], "output_index": output_index, "content_index": content_index,
+                    "delta": "".join(words[start:start + words_per_delta]), "logprobs": [],
+                }))
+            events.append(("response.output_text.done", {
+                "item_id": item["id"], "output_index": output_index, "content_index": content_index, "text": part["text"], "logprobs": [],
+            }))
+        events.append(("response.output_item.done", {"output_index": output_index, "item": item}))
+    events.append(("response.completed", {"response": response}))
+    return [
+        f"event: {kind}\ndata: {json.dumps({'type': kind, 'sequence_number': seq, **data})}\n\n".encode("utf-8")
+        for seq, (kind, data) in enumerate(events)
+    ]
+
+
+def _multipart_file(request: httpx.Request) -> Tuple[str, bytes]:
+    """Name and bytes of the "file" field of a multipart upload."""
+    header = f"Content-Type: {request.headers['content-type']}\r\n\r\n".encode("utf-8")
+    message = BytesParser(policy=default_policy).parsebytes(header + request.content)
+    for part in message.iter_parts():
+        if part.get_param("name", header="content-disposition") == "file":
+            return part.get_filename() or "upload", part.get_payload(decode=True)
+    raise ValueError("No file field in upload")
+
+
+class _StandInBatches:
+    """
+    In-process Files and Batch API: batches complete after a "batch" latency.
+
+    Shared by every stand-in transport, so a batch created through one
+    client can be polled through another, as with the real API.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.files: Dict[str, Tuple[str, bytes]] = {}
+        self.batches: Dict[str, Dict[str, Any]] = {}
+
+    def _file_object(self, file_id: str) -> Dict[str, Any]:
+        filename, content = self.files[file_id]
+        return {"id": file_id, "object": "file", "bytes": len(content), "created_at": int(time.time()), "filename": filename, "purpose": "batch"}
+
+    def handle(self, request: httpx.Request, responder: StandInResponder) -> Optional[httpx.Response]:
+        """Response to a /files or /batches call, or None for other endpoints."""
+        path = request.url.path.split("/v1", 1)[-1]
+        with self._lock:
+            if request.method == "POST" and path == "/files":
+                file_id = f"file-{uuid.uuid4().hex[:24]}"
+                self.files[file_id] = _multipart_file(request)
+                return httpx.Response(200, json=self._file_object(file_id), request=request)
+            if request.method == "GET" and path.startswith("/files/") and path.endswith("/content"):
+                file_id = path.split("/")[2]
+                if file_id not in self.files:
+                    return httpx.Response(404, json={"error": {"message": f"No such file {file_id}"}}, request=request)
+                return httpx.Response(200, content=self.files[file_id][1], request=request)
+            if request.method == "POST" and path == "/batches":
+                body = json.loads(request.content or b"{}")
+                if body.get("input_file_id") not in self.files:
+                    return httpx.Response(400, json={"error": {"message": f"No such file {body.get('input_file_id')}"}}, request=request)
+                batch_id = f"batch_{uuid.uuid4().hex[:24]}"
+                self.batches[batch_id] = {
+                    "id": batch_id, "object": "batch", "endpoint": body.get("endpoint"), "input_file_id": body["input_file_id"],
+                    "completion_window": body.get("completion_window", "24h"), "status": "in_progress", "created_at": int(time.time()),
+                    "output_file_id": None, "error_file_id": None, "errors": None,
+                    "request_counts": {"total": 0, "completed": 0, "failed": 0},
+                    "_ready_at": time.monotonic() + _latency("batch"),
+                }
+                return httpx.Response(200, json=self._public(self.batches[batch_id]), request=request)
+            if request.method == "GET" and path.startswith("/batches/"):
+                batch = self.batches.get(path.split("/")[2])
+                if batch is None:
+                    return httpx.Response(404, json={"error": {"message": f"No such batch {path.split('/')[2]}"}}, request=request)
+                if batch["status"] == "in_progress" and time.monotonic() >= batch["_ready_at"]:
+                    self._complete(batch, responder)
+                return httpx.Response(200, json=self._public(batch), request=request)
+        return None
+
+    def _complete(self, batch: Dict[str, Any], responder: StandInResponder):
+        """Answer every request line of a due batch, as the real API does when it finishes."""
+        if _failure_status("batch"):
+            batch.update(status="failed", errors={"object": "list", "data": [{"code": "server_error", "message": "Stand-in injected batch failure"}]})
+            return
+        lines = [json.loads(line) for line in self.files[batch["input_file_id"]][1].decode("utf-8").splitlines() if line.strip()]
+        output = []
+        for line in lines:
+            output.append(json.dumps({
+                "id": f"batch_req_{uuid.uuid4().hex[:24]}",
+                "custom_id": line["custom_id"],
+                "response": {"status_code": 200, "request_id": uuid.uuid4().hex, "body": responder.respond(line["body"])},
+                "error": None,
+            }))
+        output_id = f"file-{uuid.uuid4().hex[:24]}"
+        self.files[output_id] = ("batch_output.jsonl", "\n".join(output).encode("utf-8"))
+        batch.update(status="completed", output_file_id=output_id, request_counts={"total": len(lines), "completed": len(lines), "failed": 0})
+
+    @staticmethod
+    def _public(batch: Dict[str, Any]) -> Dict[str, Any]:
+        return {key: value for key, value in batch.items() if not key.startswith("_")}
+
+
+batch_store = _StandInBatches()
+
+
+class _ResponsesHandler:
+    """Shared request handling for the sync and async transports."""
+
+    def __init__(self, responder: StandInResponder):
+        self.responder = responder
+
+    def handle(self, request: httpx.Request) -> Tuple[httpx.Response, Optional[List[bytes]]]:
+        """The response, plus its SSE chunks if the request asked to stream (the transport paces them)."""
+        batch_response = batch_store.handle(request, self.responder)
+        if batch_response is not None:
+            return batch_response, None
+        status = _failure_status("openai")
+        if status:
+            error_type = "rate_limit_exceeded" if status == 429 else "server_error"
+            return httpx.Response(status, json={"error": {"message": f"Stand-in injected {status}", "type": error_type}}, request=request), None
+        if request.method != "POST" or not request.url.path.endswith("/responses"):
+            return httpx.Response(404, json={"error": {"message": f"Stand-in does not serve {request.url.path}"}}, request=request), None
+        body = json.loads(request.content or b"{}")
+        response = self.responder.respond(body)
+        if faults.fires("openai", "rai_filtered"):
+            # Billed like any other call, but the model declines
+            response["output"] = [{
+                "type": "message",
+                "id": f"msg_{uuid.uuid4().hex[:24]}",
+                "role": "assistant",
+                "status": "completed",
+                "content": [{"type": "refusal", "refusal": "I'm sorry, but I can't help with that request."}],
+            }]
+        if body.get("stream"):
+            return httpx.Response(200, headers={"content-type": "text/event-stream"}, request=request), _sse_chunks(response)
+        return httpx.Response(200, json=response, request=request), None
+
+
+class StandInTransport(httpx.BaseTransport):
+    """httpx transport answering OpenAI Responses, Files and Batch API calls in-process (sync clients)."""
+
+    def __init__(self, responder: Optional[StandInResponder] = None):
+        self._handler = _ResponsesHandler(responder or StandInResponder())
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        request.read()
+        time.sleep(_latency("openai"))
+        response, chunks = self._handler.handle(request)
+        return httpx.Response(response.status_code, headers=response.headers, content=b"".join(chunks), request=request) if chunks else response
+
+
+class AsyncStandInTransport(httpx.AsyncBaseTransport):
+    """httpx transport answering OpenAI Responses, Files and Batch API calls in-process (async clients)."""
+
+    def __init__(self, responder: Optional[StandInResponder] = None):
+        self._handler = _ResponsesHandler(responder or StandInResponder())
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        await request.aread()
+        latency = _latency("openai")
+        response, chunks = self._handler.handle(request)
+        if not chunks:
+            await asyncio.sleep(latency)
+            return response
+        # Streamed: the first event after STANDIN_FIRST_TOKEN_SHARE of the latency, the rest spread over the remainder
+        await asyncio.sleep(latency * STANDIN_FIRST_TOKEN_SHARE)
+        gap = latency * (1 - STANDIN_FIRST_TOKEN_SHARE) / len(chunks)
+
+        async def paced():
+            for i, chunk in enumerate(chunks):
+                if i:
+                    await asyncio.sleep(gap)
+                yield chunk
+
+        return httpx.Response(response.status_code, headers=response.headers, content=paced(), request=request)
+
+
+# Gemini (Imagen generate_images, Veo generate_videos, Files API)
+GENAI_ERROR_STATUS = {429: "RESOURCE_EXHAUSTED", 500: "INTERNAL", 503: "UNAVAILABLE"}
+
+
+def _genai_failure(provider: str):
+    """Raise a Gemini-style API error when a failure is injected for the provider."""
+    status = _failure_status(provider)
+    if status:
+        error_class = genai_errors.ClientError if status < 500 else genai_errors.ServerError
+        raise error_class(status, {"error": {"code": status, "message": f"Stand-in injected failure ({provider})", "status": GENAI_ERROR_STATUS[status]}})
+
+
+class _StandInModels:
+    def __init__(self, client: "StandInGenaiClient"):
+        self._client = client
+
+    def generate_images(self, model: str, prompt: str, config: Optional[types.GenerateImagesConfig] = None):
+        time.sleep(_latency("imagen"))
+        _genai_failure("imagen")
+        if faults.fires("imagen", "rai_filtered"):
+            return types.GenerateImagesResponse(generated_images=[])
+        count = (config.number_of_images if config and config.number_of_images else 1)
+        portrait = bool(config and config.aspect_ratio == "9:16")
+        width, height = (768, 1344) if portrait else (1024, 1024)
+        return types.GenerateImagesResponse(generated_images=[
+            types.GeneratedImage(image=types.Image(image_bytes=synthetic_image(f"{prompt}#{i}", width, height), mime_type="image/png"))
+            for i in range(count)
+        ])
+
+    def generate_videos(self, model: str, prompt: str, image: Optional[types.Image] = None, config: Optional[types.GenerateVideosConfig] = None):
+        if image is not None and image.gcs_uri and not self._client.vertexai:
+            # Raised client-side by google-genai before any request is sent
+            raise ValueError("gcs_uri parameter is only supported in Gemini Enterprise Agent Platform mode, not in Gemini Developer API mode.")
+        time.sleep(_latency("veo_submit"))
+        _genai_failure("veo_submit")
+        name = f"models/{model}/operations/standin-{uuid.uuid4().hex[:12]}"
+        count = (config.number_of_videos if config and config.number_of_videos else 1)
+        # How the operation ends is decided up front: videos, an error, RAI filtering, or never
+        outcome = "videos"
+        if _failure_status("veo"):
+            outcome = "error"
+        elif faults.fires("veo", "rai_filtered"):
+            outcome = "rai_filtered"
+        elif faults.fires("veo", "hang"):
+            outcome = "hang"
+        self._client._operations[name] = (time.monotonic() + _latency("veo"), prompt, count, outcome)
+        return types.GenerateVideosOperation(name=name, done=False)
+
+
+class _StandInOperations:
+    def __init__(self, client: "StandInGenaiClient"):
+        self._client = client
+
+    def get(self, operation):
+        ready_at, prompt, count, outcome = self._client._operations[operation.name]
+        if time.monotonic() < ready_at or outcome == "hang":
+            return types.GenerateVideosOperation(name=operation.name, done=False)
+        if outcome == "error":
+            return types.GenerateVideosOperation(name=operation.name, done=True, error={"code": 13, "message": "Stand-in injected operation failure"})
+        if outcome == "rai_filtered":
+            return types.GenerateVideosOperation(name=operation.name, done=True, response=types.GenerateVideosResponse(
+                generated_videos=[],
+                rai_media_filtered_count=count,
+                rai_media_filtered_reasons=["Stand-in injected: video filtered by safety policy"],
+            ))
+        videos = [
+            types.GeneratedVideo(video=types.Video(uri=f"https://{STANDIN_HOST}/files/{_seed(prompt, str(i)):x}.mp4", mime_type="video/mp4"))
+            for i in range(count)
+        ]
+        return types.GenerateVideosOperation(
+            name=operation.name,
+            done=True,
+            response=types.GenerateVideosResponse(generated_videos=videos),
+        )
+
+    def cancel(self, operation):
+        self._client._operations.pop(operation.name, None)
+
+
+class _StandInFiles:
+    def upload(self, file, config: Optional[types.UploadFileConfig] = None):
+        time.sleep(_latency("upload"))
+        _genai_failure("upload")
+        data = file.read() if hasattr(file, "read") else open(file, "rb").read()
+        digest = hashlib.sha256(data).hexdigest()[:16]
+        return types.File(
+            name=f"files/{digest}",
+            uri=f"https://{STANDIN_HOST}/files/{digest}",
+            mime_type=(config.mime_type if config else None) or "image/png",
+            size_bytes=len(data),
+            expiration_time=datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(hours=48),
+        )
+
+    def download(self, file):
+        time.sleep(_latency("download"))
+        _genai_failure("download")
+        if faults.fires("download", "truncate"):
+            raise httpx.RemoteProtocolError("peer closed connection without sending complete message body (incomplete chunked read)")
+        data = (hashlib.sha256(str(file.uri).encode("utf-8")).digest() * (STANDIN_VIDEO_BYTES // 32 + 1))[:STANDIN_VIDEO_BYTES]
+        if isinstance(file, types.Video):
+            file.video_bytes = data
+        return data
+
+
+class StandInGenaiClient:
+    """In-process stand-in for google.genai.Client covering the calls the generators make."""
+
+    def __init__(self, **kwargs):
+        # Mirrors genai.Client: Vertex AI mode comes from the argument or GOOGLE_GENAI_USE_VERTEXAI
+        vertexai = kwargs.get("vertexai")
+        if vertexai is None:
+            vertexai = os.environ.get("GOOGLE_GENAI_USE_VERTEXAI", "").lower() in ("true", "1")
+        self.vertexai = bool(vertexai)
+        self._operations: Dict[str, tuple] = {}
+        self.models = _StandInModels(self)
+        self.operations = _StandInOperations(self)
+        self.files = _StandInFiles()
+
+
+# crawl4ai and plain HTTP downloads
+class StandInCrawler:
+    """Async context manager mimicking AsyncWebCrawler.arun() with synthetic pages."""
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def arun(self, url: str, config=None):
+        await asyncio.sleep(_latency("crawl"))
+        status = _failure_status("crawl")
+        if status:
+            return SimpleNamespace(success=False, cleaned_html="", error_message=f"Stand-in injected crawl failure (HTTP {status})")
+        key = f"{_seed(url):x}"
+        page = "\n".join([
+            "<div>",
+            f"<p>Title: Stand-in Study {key[:6]}</p>",
+            f"<p>Artist: Painter {key[6:10]}</p>",
+            "<p>Medium: Oil on canvas</p>",
+            f"<p>Description: {_words(url, 60)}</p>",
+            # Listed first, the way many collection pages lead with a preview
+            f'<img src="https://{STANDIN_HOST}/images/{key}-thumb.jpg" alt="thumbnail">',
+            f'<img src="https://{STANDIN_HOST}/images/{key}.jpg" alt="main image">',
+            "</div>",
+        ])
+        return SimpleNamespace(success=True, cleaned_html=page, error_message=None)
+
+
+class StandInHTTPResponse:
+    """Minimal requests.Response lookalike for image downloads and preflight probes."""
+
+    def __init__(self, url: str, status_code: int, content: bytes, content_type: str, headers: Optional[Dict[str, str]] = None):
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.headers = {**(headers or {}), "content-type": content_type}
+
+    def iter_content(self, chunk_size: int = 1):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def json(self):
+        return json.loads(self.content)
+
+    def close(self):
+        pass
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            import requests
+            raise requests.HTTPError(f"{self.status_code} Stand-in error for url: {self.url}", response=self)
+
+
+def standin_http_get(url: str, headers: Optional[Dict[str, str]] = None, **kwargs) -> StandInHTTPResponse:
+    """Serve a deterministic JPEG for any image URL (a small one for "-thumb" URLs), honouring Range, and Met Collection API objects."""
+    time.sleep(_latency("download"))
+    status = _failure_status("download")
+    if status:
+        return StandInHTTPResponse(url, status, b"", "text/plain")
+    object_id = re.search(r"collectionapi\.metmuseum\.org/.*/objects/(\d+)", url)
+    if object_id:
+        key = f"{_seed(url):x}"
+        record = {"objectID": int(object_id.group(1)), "primaryImage": f"https://{STANDIN_HOST}/images/{key}.jpg"}
+        return StandInHTTPResponse(url, 200, json.dumps(record).encode("utf-8"), "application/json")
+    width, height = (300, 400) if "-thumb" in url else (1200, 1600)
+    content = synthetic_image(url, width, height, "JPEG")
+    byte_range = re.fullmatch(r"bytes=(\d+)-(\d*)", (headers or {}).get("Range", ""))
+    if byte_range:
+        start, end = int(byte_range.group(1)), byte_range.group(2)
+        part = content[start:int(end) + 1 if end else None]
+        return StandInHTTPResponse(url, 206, part, "image/jpeg", {"content-range": f"bytes {start}-{start + len(part) - 1}/{len(content)}"})
+    if faults.fires("download", "truncate"):
+        # Connection dropped mid-body; requests hands back whatever arrived
+        content = content[: len(content) // 3]
+    return StandInHTTPResponse(url, 200, content, "image/jpeg")
+
+
+def standin_http_head(url: str, **kwargs) -> StandInHTTPResponse:
+    """Answer a preflight probe: every page exists and is HTML."""
+    time.sleep(_latency("preflight"))
+    status = _failure_status("preflight")
+    if status:
+        return StandInHTTPResponse(url, status, b"", "text/plain")
+    return StandInHTTPResponse(url, 200, b"", "text/html; charset=utf-8")
@@ -0,0 +1,188 @@
+import asyncio
+import json
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+import structlog
+
+from config import PROMPT_BATCH_MODE, BATCH_PRIORITY_CLASS, TEXT_BATCH_WINDOW, TEXT_BATCH_MAX_REQUESTS, TEXT_BATCH_MAX_BYTES, TEXT_BATCH_POLL_INTERVAL
+from utils.metrics import registry
+from utils.providers import poll_interval
+from utils.scheduler import current_priority
+
+logger = structlog.get_logger()
+
+BATCH_MODES = ("off", "bulk", "always")
+TERMINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+
+text_batch_requests = registry.gauge("artwork_text_batch_requests", "Text requests parked for the Batch API", ["state"])
+text_batch_jobs = registry.counter("artwork_text_batch_jobs_total", "Batch API jobs by final status", ["status"])
+
+_mode = PROMPT_BATCH_MODE
+
+
+def set_batch_mode(mode: str):
+    """
+    Choose which prompt requests go through the Batch API
+
+    Args:
+        mode: "off", "bulk" (work running in the BATCH_PRIORITY_CLASS) or "always"
+    """
+    global _mode
+    if mode not in BATCH_MODES:
+        raise ValueError(f"Unknown batch mode {mode!r}, expected one of {BATCH_MODES}")
+    _mode = mode
+    logger.info(f"Prompt batch mode: {mode}")
+
+
+def use_batch_api() -> bool:
+    """Whether the running job's prompt requests should be parked for the Batch API."""
+    return _mode == "always" or (_mode == "bulk" and current_priority()[0] == BATCH_PRIORITY_CLASS)
+
+
+class BatchRequestError(RuntimeError):
+    """Raised for a request whose batch failed or expired, or that the batch answered with an error."""
+
+
+def output_text(body: Dict[str, Any]) -> str:
+    """Text of a Responses API response body (like Response.output_text)."""
+    return "".join(
+        part.get("text", "")
+        for item in body.get("output") or [] if item.get("type") == "message"
+        for part in item.get("content") or [] if part.get("type") == "output_text"
+    )
+
+
+class ResponsesBatcher:
+    """
+    Parks Responses API requests and sends them as OpenAI Batch API jobs.
+
+    Requests arriving within TEXT_BATCH_WINDOW of the first waiting one are
+    written to one JSONL file (up to TEXT_BATCH_MAX_REQUESTS or
+    TEXT_BATCH_MAX_BYTES) and submitted as a single batch; each batch is then
+    polled on its own, and its results are handed back to the waiting callers
+    by custom_id. Nothing holds a connection or a provider slot meanwhile.
+    """
+
+    def __init__(self, client, window: float = TEXT_BATCH_WINDOW, max_requests: int = TEXT_BATCH_MAX_REQUESTS,
+                 max_bytes: int = TEXT_BATCH_MAX_BYTES, poll_seconds: float = TEXT_BATCH_POLL_INTERVAL):
+        """
+        Args:
+            client: Async OpenAI client (or the stand-in/cassette one)
+            window: Seconds to collect requests before submitting a batch
+            max_requests: Requests per batch file
+            max_bytes: Bytes per batch file (image inputs travel as data URLs)
+            poll_seconds: Seconds between batch status polls
+        """
+        self.client = client
+        self.window = window
+        self.max_requests = max_requests
+        self.max_bytes = max_bytes
+        self.poll_seconds = poll_seconds
+        self._pending: List[Tuple[str, str, asyncio.Future]] = []
+        self._pending_bytes = 0
+        self._flush_timer: Optional[asyncio.TimerHandle] = None
+        self._tasks = set()
+
+    async def submit(self, body: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Queue one /v1/responses request and wait for its batch.
+
+        Args:
+            body: Request body as for responses.create (no stream)
+
+        Returns:
+            The response body
+
+        Raises:
+            BatchRequestError: if the batch or this request failed
+        """
+        custom_id = f"req-{uuid.uuid4().hex}"
+        line = json.dumps({"custom_id": custom_id, "method": "POST", "url": "/v1/responses", "body": body})
+        if self._pending and self._pending_bytes + len(line) > self.max_bytes:
+            self.flush()
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((custom_id, line, future))
+        self._pending_bytes += len(line) + 1
+        text_batch_requests.inc(state="collecting")
+        if len(self._pending) >= self.max_requests:
+            self.flush()
+        elif self._flush_timer is None:
+            self._flush_timer = asyncio.get_running_loop().call_later(self.window, self.flush)
+        return await future
+
+    def flush(self):
+        """Submit the collected requests as a batch now."""
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        requests, self._pending, self._pending_bytes = self._pending, [], 0
+        if not requests:
+            return
+        text_batch_requests.dec(len(requests), state="collecting")
+        task = asyncio.get_running_loop().create_task(self._run_batch(requests))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, requests: List[Tuple[str, str, asyncio.Future]]):
+        text_batch_requests.inc(len(requests), state="submitted")
+        try:
+            results = await self._execute("\n".join(line for _, line, _ in requests).encode("utf-8"), len(requests))
+        except Exception as e:
+            logger.error(f"Batch of {len(requests)} requests failed: {type(e).__name__}: {str(e)}")
+            results = {}
+            error = str(e)
+        else:
+            error = "No result in the batch output"
+        finally:
+            text_batch_requests.dec(len(requests), state="submitted")
+
+        for custom_id, _, future in requests:
+            if future.done():
+                continue  # The caller gave up (e.g. its job was cancelled)
+            result = results.get(custom_id)
+            response = (result or {}).get("response") or {}
+            if response.get("status_code") == 200:
+                future.set_result(response["body"])
+            else:
+                reason = (result or {}).get("error") or (response.get("body") or {}).get("error") or error
+                future.set_exception(BatchRequestError(str(reason)))
+
+    async def _execute(self, jsonl: bytes, count: int) -> Dict[str, Dict]:
+        """Upload, submit and poll one batch; returns its output and error lines by custom_id."""
+        input_file = await self.client.files.create(file=("requests.jsonl", jsonl), purpose="batch")
+        batch = await self.client.batches.create(input_file_id=input_file.id, endpoint="/v1/responses", completion_window="24h")
+        logger.info(f"Submitted batch {batch.id} with {count} requests ({len(jsonl)} bytes)")
+        while batch.status not in TERMINAL_STATUSES:
+            await asyncio.sleep(poll_interval(self.poll_seconds))
+            batch = await self.client.batches.retrieve(batch.id)
+        text_batch_jobs.inc(status=batch.status)
+        counts = batch.request_counts
+        logger.info(f"Batch {batch.id} {batch.status}" + (f": {counts.completed} completed, {counts.failed} failed" if counts else ""))
+
+        results = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            content = await self.client.files.content(file_id)
+            for line in content.text.splitlines():
+                if line.strip():
+                    result = json.loads(line)
+                    results[result["custom_id"]] = result
+        if batch.status != "completed" and not results:
+            reasons = "; ".join(error.message or error.code or "" for error in (batch.errors.data or [])) if batch.errors else ""
+            raise BatchRequestError(f"Batch {batch.id} {batch.status}" + (f": {reasons}" if reasons else ""))
+        return results
+
+
+_batcher: Optional[ResponsesBatcher] = None
+_batcher_loop = None
+
+
+def get_batcher(client) -> ResponsesBatcher:
+    """The process-wide batcher for the running event loop, created with client on first use."""
+    global _batcher, _batcher_loop
+    loop = asyncio.get_running_loop()
+    if _batcher is None or _batcher_loop is not loop:
+        _batcher, _batcher_loop = ResponsesBatcher(client), loop
+    return _batcher
@@ -0,0 +1,313 @@
+import argparse
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import structlog
+from agents.tracing import TracingProcessor, add_trace_processor, set_trace_processors
+
+from config import TRACE_STORE_PATH, TRACE_STORE_SPAN_TYPES, TRACE_EXPORT_HOSTED
+
+logger = structlog.get_logger()
+
+DEFAULT_DB_PATH = TRACE_STORE_PATH or os.path.join(os.path.dirname(os.path.abspath(__file__)), "outputs", "traces.db")
+
+# Long span attributes (generation inputs/outputs) are cut to this many characters
+MAX_ATTRIBUTE_CHARS = 2000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    trace_id TEXT PRIMARY KEY,
+    workflow_name TEXT,
+    group_id TEXT,
+    metadata TEXT,
+    started_at REAL,
+    ended_at REAL
+);
+CREATE TABLE IF NOT EXISTS spans (
+    span_id TEXT PRIMARY KEY,
+    trace_id TEXT,
+    parent_id TEXT,
+    type TEXT,
+    name TEXT,
+    started_at REAL,
+    ended_at REAL,
+    duration_ms REAL,
+    error TEXT,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS spans_trace ON spans (trace_id);
+CREATE INDEX IF NOT EXISTS spans_name ON spans (name);
+"""
+
+
+def _timestamp(value: Optional[str]) -> Optional[float]:
+    """Convert an SDK ISO timestamp to epoch seconds."""
+    if not value:
+        return None
+    return datetime.datetime.fromisoformat(value).timestamp()
+
+
+def _truncate(value: Any) -> Any:
+    """Shorten long strings inside exported span data."""
+    if isinstance(value, str) and len(value) > MAX_ATTRIBUTE_CHARS:
+        return value[:MAX_ATTRIBUTE_CHARS] + "..."
+    if isinstance(value, dict):
+        return {k: _truncate(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_truncate(v) for v in value]
+    return value
+
+
+def span_name(data: Dict[str, Any]) -> str:
+    """
+    Build a stable, queryable name for a span from its exported data.
+
+    Args:
+        data: Output of span.span_data.export()
+
+    Returns:
+        Name such as "agent:Artwork Coordinator", "tool:generate_image",
+        "handoff:A->B" or "stage:crawl" (custom spans keep their own name)
+    """
+    span_type = data.get("type", "unknown")
+    if span_type == "function":
+        return f"tool:{data.get('name')}"
+    if span_type == "generation":
+        return f"generation:{data.get('model')}"
+    if span_type == "handoff":
+        return f"handoff:{data.get('from_agent')}->{data.get('to_agent')}"
+    if span_type == "response":
+        return "response"
+    if span_type == "custom":
+        return data.get("name")
+    return f"{span_type}:{data.get('name')}"
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    index = min(len(sorted_values) - 1, max(0, round(q * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class SQLiteTraceProcessor(TracingProcessor):
+    """
+    Trace processor writing runs and selected spans to a local SQLite database.
+
+    Runs alongside (or instead of) the hosted exporter, so traces can be
+    inspected offline with the CLI at the bottom of this module.
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH, span_types: List[str] = TRACE_STORE_SPAN_TYPES):
+        self.db_path = db_path
+        self.span_types = set(span_types)
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        # Spans end on the event loop and in tool threads, so share one connection behind a lock
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def _execute(self, sql: str, params: tuple):
+        try:
+            with self._lock:
+                self._conn.execute(sql, params)
+                self._conn.commit()
+        except sqlite3.Error as e:
+            # Never let trace storage break a run
+            logger.warning(f"Failed to store trace data: {str(e)}")
+
+    def on_trace_start(self, trace):
+        self._execute(
+            "INSERT OR REPLACE INTO runs (trace_id, workflow_name, group_id, metadata, started_at) VALUES (?, ?, ?, ?, ?)",
+            (trace.trace_id, trace.name, getattr(trace, "group_id", None),
+             json.dumps(getattr(trace, "metadata", None), default=str), time.time())
+        )
+
+    def on_trace_end(self, trace):
+        self._execute("UPDATE runs SET ended_at = ? WHERE trace_id = ?", (time.time(), trace.trace_id))
+
+    def on_span_start(self, span):
+        pass
+
+    def on_span_end(self, span):
+        data = span.span_data.export()
+        if data.get("type") not in self.span_types:
+            return
+        started_at = _timestamp(span.started_at)
+        ended_at = _timestamp(span.ended_at) or time.time()
+        duration_ms = round((ended_at - started_at) * 1000, 3) if started_at else None
+        self._execute(
+            "INSERT OR REPLACE INTO spans VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (span.span_id, span.trace_id, span.parent_id, data.get("type"), span_name(data),
+             started_at, ended_at, duration_ms,
+             json.dumps(span.error, default=str) if span.error else None,
+             json.dumps(_truncate(data), default=str))
+        )
+
+    def shutdown(self):
+        with self._lock:
+            self._conn.close()
+
+    def force_flush(self):
+        pass
+
+
+_processor = None
+
+
+def enable_trace_store(db_path: str = DEFAULT_DB_PATH, hosted: bool = TRACE_EXPORT_HOSTED) -> SQLiteTraceProcessor:
+    """
+    Register the SQLite trace processor once per process.
+
+    Args:
+        db_path: Database file to write to
+        hosted: Keep the hosted exporter; set False on air-gapped machines so
+            the store is the only processor
+
+    Returns:
+        The registered processor
+    """
+    global _processor
+    if _processor is None:
+        _processor = SQLiteTraceProcessor(db_path)
+        if hosted:
+            add_trace_processor(_processor)
+        else:
+            set_trace_processors([_processor])
+        logger.info(f"Storing traces in {db_path}")
+    return _processor
+
+
+class TraceStore:
+    """Read-side queries over a trace database."""
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        self._conn = sqlite3.connect(db_path)
+        self._conn.row_factory = sqlite3.Row
+
+    def slowest_runs(self, limit: int = 10) -> List[Dict]:
+        rows = self._conn.execute(
+            """SELECT r.trace_id, r.workflow_name, datetime(r.started_at, 'unixepoch') AS started_at,
+                      ROUND((r.ended_at - r.started_at) * 1000, 1) AS duration_ms,
+                      COUNT(s.span_id) AS spans,
+                      SUM(s.error IS NOT NULL) AS errors
+               FROM runs r LEFT JOIN spans s ON s.trace_id = r.trace_id
+               WHERE r.ended_at IS NOT NULL
+               GROUP BY r.trace_id ORDER BY duration_ms DESC LIMIT ?""",
+            (limit,)
+        )
+        return [dict(row) for row in rows]
+
+    def slowest_spans(self, limit: int = 10, span_type: Optional[str] = None) -> List[Dict]:
+        sql = "SELECT trace_id, span_id, type, name, duration_ms, error FROM spans"
+        params: tuple = ()
+        if span_type:
+            sql += " WHERE type = ?"
+            params = (span_type,)
+        rows = self._conn.execute(sql + " ORDER BY duration_ms DESC LIMIT ?", params + (limit,))
+        return [dict(row) for row in rows]
+
+    def span_percentiles(self) -> Dict[str, Dict]:
+        """p50/p95/p99 duration per span name."""
+        durations: Dict[str, List[float]] = {}
+        for name, duration in self._conn.execute("SELECT name, duration_ms FROM spans WHERE duration_ms IS NOT NULL"):
+            durations.setdefault(name, []).append(duration)
+        summary = {}
+        for name, values in sorted(durations.items()):
+            values.sort()
+            summary[name] = {
+                "count": len(values),
+                "p50_ms": round(percentile(values, 0.50), 1),
+                "p95_ms": round(percentile(values, 0.95), 1),
+                "p99_ms": round(percentile(values, 0.99), 1),
+            }
+        return summary
+
+    def chrome_trace(self, trace_id: str) -> Dict:
+        """
+        Export one run in the Chrome trace event format (chrome://tracing, Perfetto).
+
+        Overlapping sibling spans (parallel tool calls) are placed on separate
+        lanes, since complete events on one thread must nest.
+        """
+        run = self._conn.execute("SELECT * FROM runs WHERE trace_id = ?", (trace_id,)).fetchone()
+        if run is None:
+            raise KeyError(f"Unknown trace {trace_id!r}")
+        spans = self._conn.execute(
+            "SELECT * FROM spans WHERE trace_id = ? AND started_at IS NOT NULL ORDER BY started_at, ended_at DESC",
+            (trace_id,)
+        ).fetchall()
+
+        origin = run["started_at"]
+        lanes: List[List[float]] = []  # Stack of open end times per lane
+        events = []
+        for span in spans:
+            start, end = span["started_at"], span["ended_at"]
+            for tid, stack in enumerate(lanes):
+                while stack and stack[-1] <= start:
+                    stack.pop()
+                if not stack or end <= stack[-1]:
+                    break
+            else:
+                lanes.append([])
+                tid = len(lanes) - 1
+            lanes[tid].append(end)
+
+            args = json.loads(span["data"])
+            if span["error"]:
+                args["error"] = json.loads(span["error"])
+            events.append({
+                "name": span["name"],
+                "cat": span["type"],
+                "ph": "X",
+                "ts": round((start - origin) * 1e6),
+                "dur": round((end - start) * 1e6),
+                "pid": 1,
+                "tid": tid,
+                "args": args,
+            })
+
+        return {
+            "traceEvents": events,
+            "displayTimeUnit": "ms",
+            "metadata": {"trace_id": trace_id, "workflow_name": run["workflow_name"]},
+        }
+
+
+def _print_table(rows: List[Dict]):
+    for row in rows:
+        print("  ".join(f"{key}={value}" for key, value in row.items()))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query locally stored agent traces")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="Trace database path")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    runs_parser = subparsers.add_parser("runs", help="Slowest runs")
+    runs_parser.add_argument("--limit", type=int, default=10)
+    spans_parser = subparsers.add_parser("spans", help="Slowest spans (stages)")
+    spans_parser.add_argument("--limit", type=int, default=10)
+    spans_parser.add_argument("--type", choices=["agent", "function", "generation", "response", "handoff", "custom"])
+    subparsers.add_parser("percentiles", help="p50/p95/p99 per span name")
+    export_parser = subparsers.add_parser("export", help="Export a run as Chrome/Perfetto trace JSON")
+    export_parser.add_argument("trace_id")
+    export_parser.add_argument("--output", "-o", help="Output file (defaults to <trace_id>.json)")
+    args = parser.parse_args()
+
+    store = TraceStore(args.db)
+    if args.command == "runs":
+        _print_table(store.slowest_runs(args.limit))
+    elif args.command == "spans":
+        _print_table(store.slowest_spans(args.limit, args.type))
+    elif args.command == "percentiles":
+        print(json.dumps(store.span_percentiles(), indent=2))
+    else:
+        output = args.output or f"{args.trace_id}.json"
+        with open(output, "w") as f:
+            json.dump(store.chrome_trace(args.trace_id), f)
+        print(f"Wrote {output}")
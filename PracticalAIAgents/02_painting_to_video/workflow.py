@@ -1,47 +1,353 @@
 import asyncio
-from agents import trace, Runner
-from config import WORKFLOW_NAME
+import contextlib
+import os
+import sys
+from typing import Dict, List, Optional
+from agents import trace, Runner, AgentsException
+from config import WORKFLOW_NAME, DIRECT_VIDEO_WORKFLOW_NAME, METRICS_PORT, TRACE_STORE_ENABLED, BATCH_CONCURRENCY, BATCH_COST_BUDGET_USD, PREFLIGHT_ENABLED
 from agents_def.coordination_agent import coordination_agent
+from agents_def.artwork_agents import extract_artwork_details
+from agents_def.prompt_agents import text_generator
+from agents_def.prompt_generator import generate_video_prompt
+from agents_def.video_agents import video_generator
+from models.models import ProcessingResult, ProcessingHandles, ArtworkDetails, ArtworkImageURL
 import structlog
 from agents_def.workflow_context import WorkflowContext
+from utils.metrics import metrics_hooks, start_metrics_server, write_run_summary, progress_scope
+from utils.trace_store import enable_trace_store
+from utils.cost_ledger import CostLedger, BudgetExceededError, ledger_scope
+from utils.failures import StageError, find_stage_error
+from utils.preflight import preflight_artwork_url
+from utils.perceptual_hash import source_hash, record_source, reusable_output, record_output
+from utils.postprocessing import normalize_url
+from utils.renditions import shutdown_rendition_pipeline
 
 logger = structlog.get_logger()
 
-async def main(artwork_url: str = None, generate_video: bool = False):
+# Per-run metrics summaries land next to the generated media
+METRICS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "utils", "outputs", "metrics")
+
+async def process_artwork(artwork_url: str, generate_video: bool = False, coordinator=coordination_agent, ledger: Optional[CostLedger] = None) -> ProcessingResult:
+    """
+    Run the full agentic workflow: extract, prompt, render an image and optionally a video
+    
+    Args:
+        artwork_url: URL of the artwork page
+        generate_video: Flag to generate video
+        coordinator: Coordinator agent to run (see build_coordination_agent)
+        ledger: Cost ledger for this artwork (a fresh one with the configured budget if None)
+    
+    Returns:
+        ProcessingResult produced by the coordinator; if a stage raised StageError,
+        the run stops there and the result names the failed stage
+    """
+    ledger = ledger or CostLedger(artwork_url)
+    with trace(workflow_name=WORKFLOW_NAME), ledger_scope(ledger):
+        # Agentic workflow orchestration
+        user_input = f"URL: {artwork_url}"
+        context = WorkflowContext(generate_video)
+        try:
+            run_result = await Runner.run(
+                coordinator,
+                user_input,
+                context=context,
+                hooks=metrics_hooks
+            )
+        except BudgetExceededError as e:
+            logger.error(str(e))
+            return partial_result(context, str(e))
+        except AgentsException as e:
+            # The stage tools re-raise StageError (wrapped by the SDK), so the coordinator never retries with an error as input
+            stage_error = find_stage_error(e)
+            if stage_error is None:
+                raise
+            logger.error(str(stage_error))
+            return partial_result(context, str(stage_error), stage_error.stage)
+        # The coordinator only saw handles; resolve them to the real data here
+        return context.artifacts.to_processing_result(run_result.final_output)
+
+def partial_result(context: WorkflowContext, error: str, failed_stage: Optional[str] = None) -> ProcessingResult:
+    """
+    Result of a coordinator run stopped early, keeping the artwork, prompts and image it produced
+    
+    Args:
+        context: Context of the stopped run
+        error: Why the run stopped
+        failed_stage: Stage that raised StageError, if one did
+    
+    Returns:
+        ProcessingResult with the error and whatever the run produced before it
+    """
+    def latest(kind: str) -> Optional[str]:
+        handles = context.artifacts.handles(kind)
+        return handles[-1] if handles else None
+    
+    image = latest("image")
+    result = context.artifacts.to_processing_result(ProcessingHandles(
+        artwork=latest("artwork"),
+        prompt=latest("prompt"),
+        image_path=context.artifacts.get(image) if image else None,
+        video_prompt=latest("video_prompt"),
+        error=error
+    ))
+    return result.model_copy(update={"failed_stage": failed_stage})
+
+async def animate_artwork(artwork_url: str, ledger: Optional[CostLedger] = None) -> ProcessingResult:
+    """
+    Direct artwork-to-video fast mode
+    
+    Skips the image prompt rewrite and the Imagen render: the downloaded source
+    image goes straight into Veo (img2video) with a prompt from a single
+    generate_video_prompt call.
+    
+    Args:
+        artwork_url: URL of the artwork page
+        ledger: Cost ledger for this artwork (a fresh one with the configured budget if None)
+    
+    Returns:
+        ProcessingResult with the video prompt and video path, or the error and failed stage
+    """
+    ledger = ledger or CostLedger(artwork_url)
+    with trace(workflow_name=DIRECT_VIDEO_WORKFLOW_NAME), ledger_scope(ledger):
+        try:
+            return await _animate_artwork(artwork_url)
+        except BudgetExceededError as e:
+            logger.error(str(e))
+            return ProcessingResult(
+                artwork_details=ArtworkDetails(image_urls=ArtworkImageURL(source_url=artwork_url)),
+                error=str(e)
+            )
+
+async def _animate_artwork(artwork_url: str) -> ProcessingResult:
+    """Body of animate_artwork, run inside its trace and ledger scope"""
+    artwork_details = await extract_artwork_details(artwork_url)
+    if artwork_details is None:
+        return ProcessingResult(
+            artwork_details=ArtworkDetails(image_urls=ArtworkImageURL(source_url=artwork_url)),
+            error="Failed to extract artwork details",
+            failed_stage="extraction"
+        )
+    
+    source_image_url = artwork_details.image_urls.main_image_url
+    if not source_image_url:
+        return ProcessingResult(artwork_details=artwork_details, error="No source image found for artwork", failed_stage="extraction")
+    
+    # Download once; the bytes stay in memory for the prompt and video stages
+    source_image_path = await asyncio.to_thread(video_generator.file_storage.download_image, source_image_url)
+    if not source_image_path:
+        return ProcessingResult(artwork_details=artwork_details, error=f"Failed to download source image: {source_image_url}", failed_stage="download")
+    
+    # A near-duplicate of an already animated source (a rerun, another print of the same plate) reuses that video
+    source = await source_hash(normalize_url(source_image_url))
+    await record_source(source, normalize_url(source_image_url))
+    reused = await reusable_output(source, "video")
+    if reused:
+        logger.info(f"Source image {source_image_url} was already animated; reusing {reused}")
+        return ProcessingResult(artwork_details=artwork_details, generated_video_path=reused)
+    
+    video_prompt = None
+    try:
+        video_prompt = await generate_video_prompt(artwork_details, text_generator, image_url=source_image_path)
+        video_path = await video_generator.generate(prompt=video_prompt, image_path=source_image_path)
+    except StageError as e:
+        logger.error(str(e))
+        return ProcessingResult(artwork_details=artwork_details, generated_video_prompt=video_prompt, error=str(e), failed_stage=e.stage)
+    await record_output(source, "video", video_path)
+    return ProcessingResult(
+        artwork_details=artwork_details,
+        generated_video_prompt=video_prompt,
+        generated_video_path=video_path
+    )
+
+async def preflight(artwork_url: str) -> Optional[ProcessingResult]:
+    """
+    Run the URL preflight before any agent or browser is started
+    
+    Args:
+        artwork_url: URL of the artwork page
+    
+    Returns:
+        A failed ProcessingResult (failed_stage "preflight") if the link should be dropped, else None
+    """
+    try:
+        check = await preflight_artwork_url(artwork_url)
+    except Exception as e:
+        # A broken check (e.g. a cassette recorded without probes) must not block the artwork
+        logger.warning(f"Preflight skipped for {artwork_url}: {type(e).__name__}: {str(e)}")
+        return None
+    if check.ok:
+        return None
+    return ProcessingResult(
+        artwork_details=ArtworkDetails(image_urls=ArtworkImageURL(source_url=artwork_url)),
+        error=f"Preflight failed: {check.reason}",
+        failed_stage="preflight"
+    )
+
+async def run_artwork(artwork_url: str, generate_video: bool = False, mode: str = "full", ledger: Optional[CostLedger] = None, check_url: bool = PREFLIGHT_ENABLED) -> ProcessingResult:
+    """
+    Process one artwork in the given mode
+    
+    Args:
+        artwork_url: URL of the artwork page
+        generate_video: Flag to generate video (full mode only)
+        mode: "full" for the agentic workflow, "direct-video" to animate the source artwork directly
+        ledger: Cost ledger for this artwork
+        check_url: Preflight the URL first and fail fast on dead links
+    
+    Returns:
+        ProcessingResult for the artwork
+    """
+    if check_url:
+        rejected = await preflight(artwork_url)
+        if rejected:
+            return rejected
+    if mode == "direct-video":
+        return await animate_artwork(artwork_url, ledger)
+    return await process_artwork(artwork_url, generate_video, ledger=ledger)
+
+async def run_batch_item(artwork_url: str, generate_video: bool, mode: str, ledger: CostLedger, semaphore, check_url: bool = PREFLIGHT_ENABLED) -> ProcessingResult:
+    """
+    Process one artwork of a batch once a concurrency slot is free
+    
+    The URL is preflighted before waiting for a slot, so dead links drop out
+    without holding one. The artwork is skipped if the batch ledger is
+    already over budget, and any exception becomes a failed result instead
+    of propagating.
+    
+    Args:
+        artwork_url: URL of the artwork page
+        generate_video: Flag to generate video (full mode only)
+        mode: "full" or "direct-video"
+        ledger: Batch ledger; the artwork's own ledger is created under it
+        semaphore: Concurrency slots shared by the batch (an asyncio.Semaphore, or the FairScheduler shared by every daemon job)
+        check_url: Preflight the URL first and fail fast on dead links
+    
+    Returns:
+        ProcessingResult for the artwork
+    """
+    if check_url:
+        rejected = await preflight(artwork_url)
+        if rejected:
+            return rejected
+    async with semaphore:
+        try:
+            ledger.check()
+        except BudgetExceededError as e:
+            return ProcessingResult(
+                artwork_details=ArtworkDetails(image_urls=ArtworkImageURL(source_url=artwork_url)),
+                error=f"Skipped: {str(e)}"
+            )
+        try:
+            return await run_artwork(artwork_url, generate_video, mode, CostLedger(artwork_url, parent=ledger), check_url=False)
+        except Exception as e:
+            # One artwork's provider failure (e.g. a 429 the SDK gave up on) must not sink the batch
+            logger.error(f"Error processing {artwork_url}: {type(e).__name__}: {str(e)}")
+            return ProcessingResult(
+                artwork_details=ArtworkDetails(image_urls=ArtworkImageURL(source_url=artwork_url)),
+                error=f"{type(e).__name__}: {str(e)}"
+            )
+
+async def process_batch(artwork_urls: List[str], generate_video: bool = False, mode: str = "full", concurrency: int = BATCH_CONCURRENCY, ledger: Optional[CostLedger] = None, check_urls: bool = PREFLIGHT_ENABLED) -> List[ProcessingResult]:
+    """
+    Process several artworks concurrently under a shared batch budget
+    
+    Each artwork gets its own ledger (with the per-artwork budget) whose usage
+    also counts against the batch ledger. Once the batch budget is spent,
+    remaining artworks are skipped.
+    
+    Args:
+        artwork_urls: URLs of the artwork pages
+        generate_video: Flag to generate video (full mode only)
+        mode: "full" or "direct-video"
+        concurrency: Maximum artworks in flight
+        ledger: Batch ledger (a fresh one with BATCH_COST_BUDGET_USD if None)
+        check_urls: Preflight each URL (off for URLs known to be good, e.g. from a catalog)
+    
+    Returns:
+        One ProcessingResult per URL, in input order
+    """
+    ledger = ledger or CostLedger("batch", budget_usd=BATCH_COST_BUDGET_USD, budget_tokens=None, budget_calls=None)
+    semaphore = asyncio.Semaphore(concurrency)
+    return await asyncio.gather(*(run_batch_item(url, generate_video, mode, ledger, semaphore, check_urls) for url in artwork_urls))
+
+def log_result_summary(result: ProcessingResult):
+    """Log the outcome of one artwork"""
+    if result.error:
+        logger.error(f"Error: {result.error}")
+    else:
+        ad = result.artwork_details
+        logger.info(f"Processed: {ad.title} by {ad.artist}")
+        if result.generated_prompt:
+            logger.info(f"Generated prompt: {result.generated_prompt[:100]}...")
+        if result.generated_video_prompt:
+            logger.info(f"Generated video prompt: {result.generated_video_prompt[:100]}...")
+        logger.info(f"Generated image path: {result.generated_image_path}")
+        logger.info(f"Generated video path: {result.generated_video_path}")
+
+def print_prompt_progress(event: Dict):
+    """Write prompts to stderr as they form (progress_scope callback for single-artwork CLI runs)"""
+    if event["type"] == "prompt_delta":
+        if event["offset"] == 0:
+            sys.stderr.write(f"\n{event['prompt'].capitalize()} prompt: ")
+        sys.stderr.write(event["delta"])
+        sys.stderr.flush()
+    elif event["type"] == "prompt_done":
+        sys.stderr.write("\n")
+
+async def main(artwork_url: str = None, generate_video: bool = False, mode: str = "full", metrics_port: int = METRICS_PORT, artwork_urls: Optional[List[str]] = None, concurrency: int = BATCH_CONCURRENCY, stream_prompts: bool = False):
     """
     Main entry point for the artwork processing workflow
     
     Args:
         artwork_url: URL of the artwork page (optional, uses default if None)
         generate_video: Flag to generate video (optional, default is False)
+        mode: "full" for the agentic workflow, "direct-video" to animate the source artwork directly
+        metrics_port: Serve Prometheus metrics on this port while running (None disables)
+        artwork_urls: Process these URLs as one batch instead of a single artwork_url
+        concurrency: Artworks processed at once in batch mode
+        stream_prompts: Print prompts to stderr as they are generated (ignored for batches, whose prompts would interleave)
     """
     # Default artwork URL if none provided
-    if artwork_url is None:
+    if artwork_url is None and not artwork_urls:
         logger.error("No artwork URL provided. Using default URL.")
         # exit the program
         exit()
     
+    if metrics_port:
+        start_metrics_server(metrics_port)
+    if TRACE_STORE_ENABLED:
+        enable_trace_store()
+    
+    batch_ledger = CostLedger("batch", budget_usd=BATCH_COST_BUDGET_USD, budget_tokens=None, budget_calls=None)
     try:
-        with trace(workflow_name=WORKFLOW_NAME):
-            # Agentic workflow orchestration
-            user_input = f"URL: {artwork_url}"
-            run_result = await Runner.run(
-                coordination_agent,
-                user_input,
-                context=WorkflowContext(generate_video)
-            )
-            result = run_result.final_output
-            logger.info("\nFinal Result Summary:")
-            if result.error:
-                logger.error(f"Error: {result.error}")
-            else:
-                ad = result.artwork_details
-                logger.info(f"Processed: {ad.title} by {ad.artist}")
-                logger.info(f"Generated prompt: {result.generated_prompt[:100]}...")
-                logger.info(f"Generated image path: {result.generated_image_path}")
-                logger.info(f"Generated video path: {result.generated_video_path}")
+        if artwork_urls:
+            results = await process_batch(artwork_urls, generate_video, mode, concurrency, ledger=batch_ledger)
+        else:
+            with progress_scope(print_prompt_progress) if stream_prompts else contextlib.nullcontext():
+                results = [await run_artwork(artwork_url, generate_video, mode, CostLedger(artwork_url, parent=batch_ledger))]
+        logger.info("\nFinal Result Summary:")
+        # Artwork ledgers are labelled by URL; skipped artworks have none
+        artwork_ledgers = {child.label: child for child in batch_ledger.children}
+        for url, result in zip(artwork_urls or [artwork_url], results):
+            log_result_summary(result)
+            if url in artwork_ledgers:
+                artwork_ledger = artwork_ledgers[url]
+                logger.info(f"Cost: ${artwork_ledger.cost_usd:.4f} over {artwork_ledger.calls} calls, {artwork_ledger.tokens} tokens")
+        if artwork_urls:
+            logger.info(f"Batch cost: ${batch_ledger.cost_usd:.4f} over {batch_ledger.calls} calls")
+        return results if artwork_urls else results[0]
     except Exception as e:
         logger.error(f"Critical error: {str(e)}")
+    finally:
+        # Finish queued renditions while the process pool still takes work (it stops before atexit hooks run)
+        await asyncio.to_thread(shutdown_rendition_pipeline)
+        write_run_summary(METRICS_DIR, {
+            "artwork_url": artwork_url,
+            "artwork_urls": artwork_urls,
+            "mode": mode,
+            "generate_video": generate_video,
+            "cost": batch_ledger.summary(),
+        })
 
 if __name__ == "__main__":
-    asyncio.run(main()) 
\ No newline at end of file
+    asyncio.run(main())
@@ -0,0 +1,366 @@
+"""
+Instrumentation for the UFC script: stage, agent and tool latencies, a
+/metrics endpoint, run summaries, a local trace store and an event-loop
+stall detector.
+
+Thin copies of the painting pipeline's utils.metrics, utils.trace_store and
+utils.profiling, so the script does not import from that project. Traces go
+to the pipeline's database with the same schema, so its trace CLI
+(python -m utils.trace_store, from 02_painting_to_video) lists UFC runs too.
+"""
+import asyncio
+import cProfile
+import datetime
+import functools
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+from agents import RunHooks
+from agents.tracing import TracingProcessor, add_trace_processor
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PIPELINE_OUTPUTS = os.path.join(SCRIPT_DIR, "02_painting_to_video", "utils", "outputs")
+# Run summaries, traces and profiles go next to the painting pipeline's, whatever the working directory
+METRICS_DIR = os.path.join(PIPELINE_OUTPUTS, "metrics")
+TRACE_DB_PATH = os.path.join(PIPELINE_OUTPUTS, "traces.db")
+PROFILES_DIR = os.path.join(PIPELINE_OUTPUTS, "profiles")
+
+TRACE_SPAN_TYPES = {"agent", "function", "generation", "response", "handoff", "custom"}
+MAX_ATTRIBUTE_CHARS = 2000  # Long span attributes are cut to this many characters
+STALL_THRESHOLD = 0.1  # Event-loop stalls longer than this (seconds) are recorded
+WATCH_INTERVAL = 0.02  # Seconds between loop heartbeats, and between stack samples during a stall
+TOP_SITES = 10  # Blocking call sites listed in the exit summary
+
+
+# --- Latencies -------------------------------------------------------------
+
+_latencies: Dict[str, List[float]] = defaultdict(list)
+_errors: Counter = Counter()
+_metrics_lock = threading.Lock()
+
+
+def observe(name: str, seconds: float, error: Optional[str] = None):
+    """Record one timed call ("stage:crawl", "agent:UFC URL Finder", "tool:crawl_url")."""
+    with _metrics_lock:
+        _latencies[name].append(seconds)
+        if error:
+            _errors[f"{name}:{error}"] += 1
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    return sorted_values[min(len(sorted_values) - 1, max(0, round(q * len(sorted_values)) - 1))]
+
+
+def snapshot() -> Dict[str, Any]:
+    """Count, p50/p95/p99 and max seconds per timed name, plus error counts."""
+    with _metrics_lock:
+        latencies = {name: sorted(values) for name, values in _latencies.items()}
+        errors = dict(_errors)
+    return {
+        "latency_seconds": {
+            name: {"count": len(values), **{f"p{int(q * 100)}": round(_percentile(values, q), 4) for q in (0.5, 0.95, 0.99)}, "max": round(values[-1], 4)}
+            for name, values in latencies.items()
+        },
+        "errors": errors,
+    }
+
+
+def instrument_stage(stage: str):
+    """Decorator timing an async function as a stage, counting its failures."""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                result = await func(*args, **kwargs)
+            except Exception as e:
+                observe(f"stage:{stage}", time.perf_counter() - start, type(e).__name__)
+                raise
+            observe(f"stage:{stage}", time.perf_counter() - start)
+            return result
+        return wrapper
+    return decorator
+
+
+class MetricsRunHooks(RunHooks):
+    """Run hooks recording agent and tool latencies."""
+
+    def __init__(self):
+        self._started: Dict[tuple, list] = {}
+
+    def _start(self, key):
+        self._started.setdefault(key, []).append(time.perf_counter())
+
+    def _stop(self, key, name: str):
+        starts = self._started.get(key)
+        if starts:
+            observe(name, time.perf_counter() - starts.pop())
+
+    async def on_agent_start(self, context, agent):
+        self._start(("agent", id(context.context), agent.name))
+
+    async def on_agent_end(self, context, agent, output):
+        self._stop(("agent", id(context.context), agent.name), f"agent:{agent.name}")
+
+    async def on_tool_start(self, context, agent, tool):
+        self._start(("tool", getattr(context, "tool_call_id", None) or id(context.context), tool.name))
+
+    async def on_tool_end(self, context, agent, tool, result):
+        self._stop(("tool", getattr(context, "tool_call_id", None) or id(context.context), tool.name), f"tool:{tool.name}")
+
+
+# Shared hooks instance passed to every Runner.run in the script
+metrics_hooks = MetricsRunHooks()
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        lines = ["# TYPE ufc_latency_seconds summary"]
+        for name, stats in snapshot()["latency_seconds"].items():
+            for q in ("50", "95", "99"):
+                lines.append(f'ufc_latency_seconds{{name="{name}",quantile="0.{q}"}} {stats["p" + q]}')
+            lines.append(f'ufc_latency_seconds_count{{name="{name}"}} {stats["count"]}')
+        body = ("\n".join(lines) + "\n").encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve /metrics on a background thread."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    print(f"Metrics available at http://{host}:{port}/metrics")
+    return server
+
+
+def write_run_summary(output_dir: str = METRICS_DIR, extra: Optional[Dict] = None) -> str:
+    """Write a JSON snapshot of the run's latencies and errors; returns its path."""
+    os.makedirs(output_dir, exist_ok=True)
+    path = os.path.join(output_dir, f"run_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S_%f')}.json")
+    with open(path, "w") as f:
+        json.dump({"timestamp": datetime.datetime.now().isoformat(), **(extra or {}), "metrics": snapshot()}, f, indent=2)
+    print(f"Metrics summary written to {path}")
+    return path
+
+
+# --- Trace store -----------------------------------------------------------
+
+# Must match utils/trace_store.py in the painting pipeline, which owns the database
+TRACE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    trace_id TEXT PRIMARY KEY,
+    workflow_name TEXT,
+    group_id TEXT,
+    metadata TEXT,
+    started_at REAL,
+    ended_at REAL
+);
+CREATE TABLE IF NOT EXISTS spans (
+    span_id TEXT PRIMARY KEY,
+    trace_id TEXT,
+    parent_id TEXT,
+    type TEXT,
+    name TEXT,
+    started_at REAL,
+    ended_at REAL,
+    duration_ms REAL,
+    error TEXT,
+    data TEXT
+);
+CREATE INDEX IF NOT EXISTS spans_trace ON spans (trace_id);
+CREATE INDEX IF NOT EXISTS spans_name ON spans (name);
+"""
+
+
+def _timestamp(value: Optional[str]) -> Optional[float]:
+    return datetime.datetime.fromisoformat(value).timestamp() if value else None
+
+
+def _truncate(value: Any) -> Any:
+    if isinstance(value, str) and len(value) > MAX_ATTRIBUTE_CHARS:
+        return value[:MAX_ATTRIBUTE_CHARS] + "..."
+    if isinstance(value, dict):
+        return {k: _truncate(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_truncate(v) for v in value]
+    return value
+
+
+def span_name(data: Dict[str, Any]) -> str:
+    """Same span names as the pipeline's store, e.g. "agent:UFC URL Finder" or "tool:crawl_url"."""
+    span_type = data.get("type", "unknown")
+    if span_type == "function":
+        return f"tool:{data.get('name')}"
+    if span_type == "generation":
+        return f"generation:{data.get('model')}"
+    if span_type == "handoff":
+        return f"handoff:{data.get('from_agent')}->{data.get('to_agent')}"
+    if span_type == "response":
+        return "response"
+    if span_type == "custom":
+        return data.get("name")
+    return f"{span_type}:{data.get('name')}"
+
+
+class SQLiteTraceProcessor(TracingProcessor):
+    """Trace processor writing runs and spans to the local SQLite trace database."""
+
+    def __init__(self, db_path: str = TRACE_DB_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(TRACE_SCHEMA)
+        self._lock = threading.Lock()
+
+    def _execute(self, sql: str, params: tuple):
+        try:
+            with self._lock:
+                self._conn.execute(sql, params)
+                self._conn.commit()
+        except sqlite3.Error as e:
+            # Never let trace storage break a run
+            print(f"Failed to store trace data: {str(e)}")
+
+    def on_trace_start(self, trace):
+        self._execute(
+            "INSERT OR REPLACE INTO runs (trace_id, workflow_name, group_id, metadata, started_at) VALUES (?, ?, ?, ?, ?)",
+            (trace.trace_id, trace.name, getattr(trace, "group_id", None),
+             json.dumps(getattr(trace, "metadata", None), default=str), time.time())
+        )
+
+    def on_trace_end(self, trace):
+        self._execute("UPDATE runs SET ended_at = ? WHERE trace_id = ?", (time.time(), trace.trace_id))
+
+    def on_span_start(self, span):
+        pass
+
+    def on_span_end(self, span):
+        data = span.span_data.export()
+        if data.get("type") not in TRACE_SPAN_TYPES:
+            return
+        started_at = _timestamp(span.started_at)
+        ended_at = _timestamp(span.ended_at) or time.time()
+        self._execute(
+            "INSERT OR REPLACE INTO spans VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (span.span_id, span.trace_id, span.parent_id, data.get("type"), span_name(data),
+             started_at, ended_at, round((ended_at - started_at) * 1000, 3) if started_at else None,
+             json.dumps(span.error, default=str) if span.error else None,
+             json.dumps(_truncate(data), default=str))
+        )
+
+    def shutdown(self):
+        with self._lock:
+            self._conn.close()
+
+    def force_flush(self):
+        pass
+
+
+def enable_trace_store(db_path: str = TRACE_DB_PATH) -> SQLiteTraceProcessor:
+    """Store this run's traces locally, next to the hosted export."""
+    processor = SQLiteTraceProcessor(db_path)
+    add_trace_processor(processor)
+    print(f"Storing traces in {db_path}")
+    return processor
+
+
+# --- Profiling -------------------------------------------------------------
+
+def _frame_label(frame) -> str:
+    return f"{frame.f_code.co_name} ({os.path.basename(frame.f_code.co_filename)}:{frame.f_lineno})"
+
+
+def _blocking_site(thread_id: int) -> Optional[str]:
+    """Innermost frame of this script on the loop thread's stack, plus the library call it is in."""
+    frame = sys._current_frames().get(thread_id)
+    if frame is None or (frame.f_code.co_name == "select" and "selectors" in frame.f_code.co_filename):
+        return None  # Idle in the selector: the loop has recovered
+    leaf, site = frame, None
+    while frame is not None and site is None:
+        if frame.f_code.co_filename.startswith(SCRIPT_DIR) and frame.f_code.co_filename != os.path.abspath(__file__):
+            site = frame
+        frame = frame.f_back
+    if site is None:
+        return _frame_label(leaf)
+    return _frame_label(site) + ("" if site is leaf else f" -> {_frame_label(leaf)}")
+
+
+class LoopStallWatchdog:
+    """Samples the loop thread's stack whenever a heartbeat task is late by more than STALL_THRESHOLD."""
+
+    def __init__(self, threshold: float = STALL_THRESHOLD, interval: float = WATCH_INTERVAL):
+        self.threshold = threshold
+        self.interval = interval
+        self.sites: Dict[str, float] = defaultdict(float)
+        self._last_beat = time.perf_counter()
+        self._stop = threading.Event()
+
+    async def _heartbeat(self):
+        while True:
+            self._last_beat = time.perf_counter()
+            await asyncio.sleep(self.interval)
+
+    def _watch(self, thread_id: int):
+        while not self._stop.wait(self.interval):
+            if time.perf_counter() - self._last_beat > self.threshold:
+                site = _blocking_site(thread_id)
+                if site:
+                    self.sites[site] += self.interval
+
+    async def run(self, coro):
+        heartbeat = asyncio.get_running_loop().create_task(self._heartbeat())
+        watcher = threading.Thread(target=self._watch, args=(threading.get_ident(),), name="loop-stall-watchdog", daemon=True)
+        watcher.start()
+        try:
+            return await coro
+        finally:
+            self._stop.set()
+            watcher.join()
+            heartbeat.cancel()
+
+    def report(self, limit: int = TOP_SITES):
+        ranked = sorted(self.sites.items(), key=lambda item: item[1], reverse=True)[:limit]
+        print(f"\nTop blocking call sites (stalls over {self.threshold}s):" if ranked else "\nNo event-loop stalls recorded")
+        for site, seconds in ranked:
+            print(f"  {seconds:7.2f}s  {site}")
+
+
+async def profiled(coro, with_cprofile: bool = False):
+    """
+    Run a coroutine under the stall watchdog and report the top blocking call sites at exit
+
+    Args:
+        coro: The run to profile
+        with_cprofile: Also profile the whole run with cProfile and write a pstats file
+    """
+    watchdog = LoopStallWatchdog()
+    profiler = cProfile.Profile() if with_cprofile else None
+    if profiler:
+        profiler.enable()
+    try:
+        return await watchdog.run(coro)
+    finally:
+        watchdog.report()
+        if profiler:
+            profiler.disable()
+            os.makedirs(PROFILES_DIR, exist_ok=True)
+            path = os.path.join(PROFILES_DIR, f"ufc_{datetime.datetime.now().strftime('%Y%m%d_%H%M%S')}.pstats")
+            profiler.dump_stats(path)
+            print(f"cProfile stats written to {path}")